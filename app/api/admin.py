@@ -1,22 +1,27 @@
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import StreamingResponse, FileResponse
-from starlette.background import BackgroundTask
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from fastapi import APIRouter, Query, HTTPException, Request
+from fastapi.responses import FileResponse, StreamingResponse
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta
 import asyncio
 import time
 from pydantic import BaseModel
 import csv
 import io
 import os
-import zipfile
 import tempfile
-import shutil
+import threading
 from pathlib import Path
-from openpyxl import Workbook
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
+from app.core.api_cache import get_data_version
 from app.core.database import get_db_connection
+from app.core.io_executor import run_io
 from app.core.config import get_settings
 from app.core.timezone import get_beijing_now_naive
+from app.core.cache_warmer import warm_paths
+from app.core import deletion_queue, export_jobs, upload_analytics
+from app.core.export_service import EXPORT_MEDIA_TYPES, iter_text, stream_zip, write_data_file
+from app.core.http_cache import cached_file_response, content_disposition, file_response, make_etag
 from app.core.upload_types import (
     DEFAULT_UPLOAD_TYPE,
     UPLOAD_TYPE_LOGISTICS,
@@ -27,6 +32,12 @@ from app.core.upload_types import (
 settings = get_settings()
 router = APIRouter()
 
+# 导出时每批读取的行数(键集分页, 每批单独持有数据库锁)
+_EXPORT_BATCH_SIZE = 1000
+
+# 记录列表可返回分组计数的筛选维度(facets=)
+RECORD_FACETS = ('status', 'logistics', 'doc_type', 'upload_type')
+
 
 def normalize_upload_type_filter(upload_type: Optional[str]) -> Optional[str]:
     """Normalize optional upload business type query filter."""
@@ -58,6 +69,90 @@ def append_upload_type_filter(
         where_clauses.append("1 = 0")
 
 
+def _parse_facets(facets: Optional[str]) -> List[str]:
+    """facets 查询参数(逗号分隔) -> 去重后的维度列表"""
+    requested: List[str] = []
+    for name in (facets or "").split(","):
+        name = name.strip()
+        if not name or name in requested:
+            continue
+        if name not in RECORD_FACETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"facets只能包含: {', '.join(RECORD_FACETS)}"
+            )
+        requested.append(name)
+    return requested
+
+
+def _query_facets(
+    cursor,
+    dimensions: List[str],
+    base_where: str,
+    base_params: List[Any],
+    facet_filters: Dict[str, Tuple[List[str], List[Any]]],
+    upload_type_expr: str,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """一条语句计算各维度的分组计数
+
+    公共条件只扫描一次(CTE), 每个维度的计数应用除该维度自身以外的筛选条件,
+    即返回"切换到该选项后"的记录数。
+    """
+    arms = []
+    params = list(base_params)
+    for dimension in dimensions:
+        other_clauses: List[str] = []
+        for name, (clauses, values) in facet_filters.items():
+            if name != dimension:
+                other_clauses.extend(clauses)
+                params.extend(values)
+        arms.append(
+            f"SELECT '{dimension}' AS facet, {dimension} AS value, COUNT(*) AS count "
+            f"FROM filtered WHERE {' AND '.join(other_clauses) or '1 = 1'} GROUP BY {dimension}"
+        )
+
+    cursor.execute(f"""
+        WITH filtered AS (
+            SELECT status, logistics, doc_type, {upload_type_expr} AS upload_type
+            FROM upload_history
+            WHERE {base_where}
+        )
+        {' UNION ALL '.join(arms)}
+        ORDER BY facet, count DESC, value
+    """, params)
+
+    result: Dict[str, List[Dict[str, Any]]] = {dimension: [] for dimension in dimensions}
+    for facet, value, count in cursor.fetchall():
+        result[facet].append({"value": value, "count": count})
+    return result
+
+
+def _export_values(row) -> List[Any]:
+    """导出查询结果行 -> 导出数据文件的一行(列顺序见 export_service.EXPORT_COLUMNS)"""
+    return [row[0], row[1], row[2], row[3] or '', row[4] or '', row[5], row[6], row[7], row[8], row[9], row[11] or '']
+
+
+def _export_temp_path(export_format: str) -> str:
+    fd, path = tempfile.mkstemp(prefix="export_", suffix=f".{export_format}")
+    os.close(fd)
+    return path
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _discard_export_file(task: "asyncio.Future", path: str) -> None:
+    """ZIP发送结束且数据文件生成任务完成后删除临时文件(客户端中途断开时也会执行)"""
+    if not task.cancelled() and task.exception() is not None:
+        import logging
+        logging.getLogger(__name__).error(f"[导出] 数据文件生成失败: {str(task.exception())}")
+    _remove_file(path)
+
+
 @router.get("/records")
 async def get_admin_records(
     page: int = Query(1, ge=1, description="页码"),
@@ -70,7 +165,8 @@ async def get_admin_records(
     end_date: Optional[str] = Query(None, description="结束日期（YYYY-MM-DD）"),
     logistics: Optional[str] = Query(None, description="物流公司筛选"),
     customer_name: Optional[str] = Query(None, description="客户名称筛选(包含匹配,查询该客户相关单据)"),
-    upload_type: Optional[str] = Query(None, description="上传业务类型筛选")
+    upload_type: Optional[str] = Query(None, description="上传业务类型筛选"),
+    facets: Optional[str] = Query(None, description="返回分组计数的维度, 逗号分隔(status/logistics/doc_type/upload_type)")
 ) -> Dict[str, Any]:
     """
     获取上传记录列表（管理页面）
@@ -86,6 +182,7 @@ async def get_admin_records(
     - end_date: 结束日期（格式：YYYY-MM-DD）
     - logistics: 物流公司筛选（'全部物流'表示不过滤）
     - upload_type: 上传业务类型筛选（物流/仓库）
+    - facets: 同时返回这些筛选维度的各选项记录数（status/logistics/doc_type/upload_type，逗号分隔）
 
     响应格式:
     {
@@ -93,10 +190,12 @@ async def get_admin_records(
         "page": 1,
         "page_size": 20,
         "total_pages": 8,
-        "records": [...]
+        "records": [...],
+        "facets": {"status": [{"value": "success", "count": 120}, ...]}  // 仅在传入facets时返回
     }
     """
     upload_type_filter = normalize_upload_type_filter(upload_type)
+    facet_dimensions = _parse_facets(facets)
 
     with get_db_connection() as conn:
         cursor = conn.cursor()
@@ -119,18 +218,10 @@ async def get_admin_records(
             search_pattern = f"%{search}%"
             params.extend([search_pattern, search_pattern])
 
-        if doc_type:
-            where_clauses.append("doc_type = ?")
-            params.append(doc_type)
-
         if product_type:
             where_clauses.append("product_type = ?")
             params.append(product_type)
 
-        if status:
-            where_clauses.append("status = ?")
-            params.append(status)
-
         if start_date:
             where_clauses.append("DATE(upload_time) >= ?")
             params.append(start_date)
@@ -139,16 +230,34 @@ async def get_admin_records(
             where_clauses.append("DATE(upload_time) <= ?")
             params.append(end_date)
 
-        if logistics and logistics != "全部物流":
-            where_clauses.append("logistics = ?")
-            params.append(logistics)
-
         # 客户名称: 包含匹配(LIKE), 输入部分名称即可查出该客户的全部相关单据
         if customer_name and customer_name.strip():
             where_clauses.append("customer_name LIKE ?")
             params.append(f"%{customer_name.strip()}%")
 
-        append_upload_type_filter(where_clauses, params, upload_type_filter, has_upload_type)
+        base_where_sql = " AND ".join(where_clauses)
+        base_params = list(params)
+
+        # 可返回分组计数的维度的条件单独记录: 计算某维度的计数时不应用该维度自身的条件
+        facet_filters: Dict[str, Tuple[List[str], List[Any]]] = {}
+        if doc_type:
+            facet_filters['doc_type'] = (["doc_type = ?"], [doc_type])
+
+        if status:
+            facet_filters['status'] = (["status = ?"], [status])
+
+        if logistics and logistics != "全部物流":
+            facet_filters['logistics'] = (["logistics = ?"], [logistics])
+
+        upload_type_clauses: List[str] = []
+        upload_type_params: List[Any] = []
+        append_upload_type_filter(upload_type_clauses, upload_type_params, upload_type_filter, has_upload_type)
+        if upload_type_clauses:
+            facet_filters['upload_type'] = (upload_type_clauses, upload_type_params)
+
+        for clauses, values in facet_filters.values():
+            where_clauses.extend(clauses)
+            params.extend(values)
 
         where_sql = " AND ".join(where_clauses)
 
@@ -195,7 +304,18 @@ async def get_admin_records(
                 "upload_type": row[15]
             })
 
-        return {
+        # 后台预热下一页记录的文件, 翻页时图片直接命中缓存
+        if page < total_pages and "webdav_path" in columns:
+            cursor.execute(f"""
+                SELECT webdav_path
+                FROM upload_history
+                WHERE {where_sql} AND webdav_path IS NOT NULL AND webdav_path != ''
+                ORDER BY upload_time DESC
+                LIMIT ? OFFSET ?
+            """, params + [page_size, offset + page_size])
+            warm_paths([row[0] for row in cursor.fetchall()], priority=True)
+
+        result = {
             "total": total,
             "page": page,
             "page_size": page_size,
@@ -203,6 +323,18 @@ async def get_admin_records(
             "records": records
         }
 
+        if facet_dimensions:
+            upload_type_expr = (
+                f"COALESCE(NULLIF(upload_type, ''), '{DEFAULT_UPLOAD_TYPE}')"
+                if has_upload_type
+                else f"'{DEFAULT_UPLOAD_TYPE}'"
+            )
+            result["facets"] = _query_facets(
+                cursor, facet_dimensions, base_where_sql, base_params, facet_filters, upload_type_expr
+            )
+
+        return result
+
 
 
 
@@ -210,64 +342,64 @@ async def get_admin_records(
 async def get_logistics_options() -> Dict[str, List[str]]:
     """获取可选的物流公司列表(含默认'全部物流')
 
+    数据来自名称字典(由 upload_history 上的触发器维护), 不扫描上传记录。
+
     Returns:
         包含logistics_list的字典
     """
     with get_db_connection() as conn:
         cursor = conn.cursor()
         cursor.execute("""
-            SELECT DISTINCT logistics
-            FROM upload_history
-            WHERE logistics IS NOT NULL AND logistics != ''
-            ORDER BY logistics ASC
+            SELECT name FROM name_dictionary
+            WHERE kind = 'logistics'
+            ORDER BY name ASC
         """)
         rows = cursor.fetchall()
 
     logistics_list = ["全部物流"]
-    logistics_list.extend([row[0] for row in rows if row[0]])
+    logistics_list.extend([row[0] for row in rows])
 
     return {"logistics_list": logistics_list}
 
 
-@router.get("/export")
-async def export_records(
-    search: Optional[str] = Query(None, description="搜索关键词"),
-    doc_type: Optional[str] = Query(None, description="单据类型筛选"),
-    product_type: Optional[str] = Query(None, description="产品类型筛选"),
-    status: Optional[str] = Query(None, description="状态筛选"),
-    start_date: Optional[str] = Query(None, description="开始日期"),
-    end_date: Optional[str] = Query(None, description="结束日期"),
-    logistics: Optional[str] = Query(None, description="物流公司筛选"),
-    customer_name: Optional[str] = Query(None, description="客户名称筛选(包含匹配)"),
-    upload_type: Optional[str] = Query(None, description="上传业务类型筛选"),
-    include_excel: bool = Query(True, description="是否包含Excel数据"),
-    include_images: bool = Query(True, description="是否包含图片文件")
-):
-    """
-    导出上传记录，支持选择性导出Excel和/或图片
+@router.get("/customer-names")
+async def get_customer_names(
+    q: str = Query("", description="输入的客户名称片段"),
+    limit: int = Query(20, ge=1, le=100, description="最多返回条数")
+) -> Dict[str, List[str]]:
+    """客户名称联想(包含匹配, 以输入开头的名称优先), 数据来自名称字典
 
-    响应:
-    - Both: ZIP文件 (Excel + images/)
-    - Excel only: 直接.xlsx文件
-    - Images only: ZIP文件 (仅images/)
+    Returns:
+        {"names": [...]}
     """
-    import logging
-    from app.core.file_manager import FileManager
+    keyword = q.strip()
+    if not keyword:
+        return {"names": []}
 
-    logger = logging.getLogger(__name__)
-    file_manager = None
-    temp_dir: Optional[str] = None
+    escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT name FROM name_dictionary
+            WHERE kind = 'customer_name' AND name LIKE ? ESCAPE '\\'
+            ORDER BY INSTR(name, ?) != 1, name ASC
+            LIMIT ?
+        """, (f"%{escaped}%", keyword, limit))
+        rows = cursor.fetchall()
 
-    # 参数校验: 至少需要选择一项
-    if not include_excel and not include_images:
-        raise HTTPException(
-            status_code=400,
-            detail="至少选择一项导出内容 (include_excel 或 include_images)"
-        )
+    return {"names": [row[0] for row in rows]}
 
-    upload_type_filter = normalize_upload_type_filter(upload_type)
 
-    try:
+class _ExportQuery:
+    """导出查询: 按筛选条件键集分页读取记录
+
+    构造时执行一次导出查询(字段缺失等错误在响应开始前以HTTP 500返回), 之后每批单独获取连接,
+    生成/发送期间不占用全局数据库锁。
+    """
+
+    def __init__(self, filters: Dict[str, Any], count: bool = False):
+        upload_type_filter = normalize_upload_type_filter(filters.get("upload_type"))
+
         with get_db_connection() as conn:
             cursor = conn.cursor()
 
@@ -284,36 +416,39 @@ async def export_records(
             where_clauses = ["deleted_at IS NULL"]
             params = []
 
+            search = filters.get("search")
             if search:
                 where_clauses.append("(doc_number LIKE ? OR file_name LIKE ?)")
                 search_pattern = f"%{search}%"
                 params.extend([search_pattern, search_pattern])
 
-            if doc_type:
+            if filters.get("doc_type"):
                 where_clauses.append("doc_type = ?")
-                params.append(doc_type)
+                params.append(filters["doc_type"])
 
-            if product_type:
+            if filters.get("product_type"):
                 where_clauses.append("product_type = ?")
-                params.append(product_type)
+                params.append(filters["product_type"])
 
-            if status:
+            if filters.get("status"):
                 where_clauses.append("status = ?")
-                params.append(status)
+                params.append(filters["status"])
 
-            if start_date:
+            if filters.get("start_date"):
                 where_clauses.append("DATE(upload_time) >= ?")
-                params.append(start_date)
+                params.append(filters["start_date"])
 
-            if end_date:
+            if filters.get("end_date"):
                 where_clauses.append("DATE(upload_time) <= ?")
-                params.append(end_date)
+                params.append(filters["end_date"])
 
+            logistics = filters.get("logistics")
             if logistics and logistics != "全部物流":
                 where_clauses.append("logistics = ?")
                 params.append(logistics)
 
             # 客户名称: 包含匹配(LIKE)
+            customer_name = filters.get("customer_name")
             if customer_name and customer_name.strip():
                 where_clauses.append("customer_name LIKE ?")
                 params.append(f"%{customer_name.strip()}%")
@@ -326,196 +461,405 @@ async def export_records(
             has_webdav_path = "webdav_path" in columns
             webdav_select = "webdav_path" if has_webdav_path else "NULL as webdav_path"
 
-            cursor.execute(f"""
+            self.base_params = [DEFAULT_UPLOAD_TYPE] + params
+            self.select_sql = f"""
                 SELECT {upload_type_select},
                        doc_number, doc_type, product_type, customer_name, business_id, upload_time, file_name,
-                       file_size, status, local_file_path, notes, {webdav_select}
+                       file_size, status, local_file_path, notes, {webdav_select},
+                       COALESCE(upload_time, '') AS sort_time, id
                 FROM upload_history
                 WHERE {where_sql}
-                ORDER BY upload_time DESC
-            """, [DEFAULT_UPLOAD_TYPE] + params)
-
-            rows = cursor.fetchall()
-
-        logger.info(f"[导出] 查询到 {len(rows)} 条记录, include_excel={include_excel}, include_images={include_images}")
-
-        temp_dir = tempfile.mkdtemp()
-        timestamp = get_beijing_now_naive().strftime('%Y%m%d_%H%M%S')
-        is_empty = len(rows) == 0
-
-        # 生成Excel
-        excel_path = None
-        if include_excel:
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "上传记录"
-            headers = ["上传业务类型", "单据编号", "单据类型", "产品类型", "客户名称", "业务ID", "上传时间", "文件名", "文件大小(字节)", "状态", "备注"]
-            ws.append(headers)
-
-            for row in rows:
-                upload_type_val, doc_number, doc_type_val, product_type_val, customer_name_val, business_id, upload_time, file_name, file_size, status_val, local_file_path, notes, webdav_path = row
-                ws.append([upload_type_val, doc_number, doc_type_val, product_type_val or '', customer_name_val or '', business_id, upload_time, file_name, file_size, status_val, notes or ''])
-
-            excel_filename = f"upload_records_{timestamp}.xlsx"
-            excel_path = os.path.join(temp_dir, excel_filename)
-            wb.save(excel_path)
-            logger.info(f"[导出] Excel生成完成: {excel_filename}")
-
-        # 收集图片文件
-        image_files = []
-        if include_images:
-            for row in rows:
-                upload_type_val, doc_number, doc_type_val, product_type_val, customer_name_val, business_id, upload_time, file_name, file_size, status_val, local_file_path, notes, webdav_path = row
-                arcname = os.path.join("images", file_name or f"{business_id}_{doc_number or 'unknown'}")
-                local_exists = local_file_path and os.path.exists(local_file_path)
-
-                if local_exists:
-                    image_files.append({
-                        "arcname": arcname,
-                        "local_path": local_file_path,
-                        "webdav_path": None,
-                        "doc_number": doc_number,
-                        "business_id": business_id
-                    })
-                elif webdav_path:
-                    image_files.append({
-                        "arcname": arcname,
-                        "local_path": None,
-                        "webdav_path": webdav_path,
-                        "doc_number": doc_number,
-                        "business_id": business_id
-                    })
-                else:
-                    logger.debug(f"[导出] 记录无可用图片 doc_number={doc_number} business_id={business_id}")
-
-        # 构建响应
-        if include_excel and include_images:
-            zip_filename = f"upload_records_{timestamp}.zip"
-            zip_path = os.path.join(temp_dir, zip_filename)
-
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                zipf.write(excel_path, arcname=f"upload_records_{timestamp}.xlsx")
-
-                image_local_count, image_webdav_count, image_missing_count = await _add_images_to_zip(
-                    zipf, image_files, file_manager, logger
-                )
+            """
+
+            cursor.execute(f"{self.select_sql} LIMIT 1", self.base_params)
+            self.is_empty = cursor.fetchone() is None
+            image_source = "(local_file_path IS NOT NULL AND local_file_path != '')"
+            if has_webdav_path:
+                image_source = f"({image_source} OR (webdav_path IS NOT NULL AND webdav_path != ''))"
+            cursor.execute(
+                f"SELECT 1 FROM upload_history WHERE {where_sql} AND {image_source} LIMIT 1", params
+            )
+            self.has_images = cursor.fetchone() is not None
+
+            self.total = 0
+            if count and not self.is_empty:
+                cursor.execute(f"SELECT COUNT(*) FROM upload_history WHERE {where_sql}", params)
+                self.total = cursor.fetchone()[0]
+
+    def fetch_batch(self, after: Optional[Tuple[str, int]] = None) -> Tuple[List[Any], Optional[Tuple[str, int]]]:
+        """读取键集 after 之后的一批记录, 返回 (记录, 下一批的键集); 已是最后一批时键集为None
+
+        阻塞的数据库查询: 在事件循环中需要通过 run_io 调用
+        """
+        keyset_sql = ""
+        page_params = list(self.base_params)
+        if after is not None:
+            keyset_sql = "AND (COALESCE(upload_time, '') < ? OR (COALESCE(upload_time, '') = ? AND id < ?))"
+            page_params.extend([after[0], after[0], after[1]])
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"{self.select_sql} {keyset_sql} ORDER BY COALESCE(upload_time, '') DESC, id DESC LIMIT ?",
+                page_params + [_EXPORT_BATCH_SIZE]
+            )
+            batch = cursor.fetchall()
+        if len(batch) < _EXPORT_BATCH_SIZE:
+            return batch, None
+        return batch, (batch[-1][13], batch[-1][14])
+
+    def iter_rows(self, cancelled: Optional[threading.Event] = None):
+        """按 (upload_time, id) 键集分页读取(在线程池中使用); cancelled 被设置后在下一批之前停止"""
+        after = None
+        while True:
+            if cancelled is not None and cancelled.is_set():
+                return
+            batch, after = self.fetch_batch(after)
+            yield from batch
+            if after is None:
+                return
+
+    def iter_values(
+        self,
+        progress: Optional[Dict[str, int]] = None,
+        cancelled: Optional[threading.Event] = None,
+    ):
+        """导出数据文件的行; 传入 progress 时累加 rows_done, cancelled 被设置后停止分页"""
+        for row in self.iter_rows(cancelled):
+            if progress is not None:
+                progress["rows_done"] += 1
+            yield _export_values(row)
+
+    def _image_job_batch(
+        self, after: Optional[Tuple[str, int]]
+    ) -> Tuple[int, List[Dict[str, Any]], Optional[Tuple[str, int]]]:
+        """读取一批记录并检查本地图片是否存在, 返回 (记录数, 图片任务, 下一批的键集)"""
+        import logging
+
+        logger = logging.getLogger(__name__)
+        batch, after = self.fetch_batch(after)
+        jobs = []
+        for row in batch:
+            doc_number, business_id, file_name = row[1], row[5], row[7]
+            local_file_path, webdav_path = row[10], row[12]
+            arcname = "images/" + (file_name or f"{business_id}_{doc_number or 'unknown'}")
+            if local_file_path and os.path.exists(local_file_path):
+                jobs.append({
+                    "arcname": arcname,
+                    "local_path": local_file_path,
+                    "webdav_path": None,
+                    "doc_number": doc_number,
+                    "business_id": business_id
+                })
+            elif webdav_path:
+                jobs.append({
+                    "arcname": arcname,
+                    "local_path": None,
+                    "webdav_path": webdav_path,
+                    "doc_number": doc_number,
+                    "business_id": business_id
+                })
+            else:
+                logger.debug(f"[导出] 记录无可用图片 doc_number={doc_number} business_id={business_id}")
+        return len(batch), jobs, after
+
+    async def iter_image_jobs(self, progress: Optional[Dict[str, int]] = None):
+        """图片任务(异步惰性生成): 每批的查询和本地文件检查都在I/O线程池中执行; 传入 progress 时累加 rows_done"""
+        after = None
+        while True:
+            rows, jobs, after = await run_io(self._image_job_batch, after)
+            if progress is not None:
+                progress["rows_done"] += rows
+            for job in jobs:
+                yield job
+            if after is None:
+                return
+
+
+def _validate_export_options(include_excel: bool, include_images: bool, export_format: str) -> None:
+    # 参数校验: 至少需要选择一项
+    if not include_excel and not include_images:
+        raise HTTPException(
+            status_code=400,
+            detail="至少选择一项导出内容 (include_excel 或 include_images)"
+        )
+    if export_format not in EXPORT_MEDIA_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"format必须为以下值之一: {', '.join(EXPORT_MEDIA_TYPES)}"
+        )
 
-                if image_local_count == 0 and image_webdav_count == 0:
-                    zipf.writestr(zipfile.ZipInfo("images/"), b"")
 
-            logger.info(f"[导出] ZIP打包完成: {zip_filename}")
+def _export_filename(include_excel: bool, include_images: bool, export_format: str) -> str:
+    timestamp = get_beijing_now_naive().strftime('%Y%m%d_%H%M%S')
+    if not include_images:
+        return f"upload_records_{timestamp}.{export_format}"
+    return f"upload_records_{timestamp}.zip" if include_excel else f"images_{timestamp}.zip"
 
-            response = FileResponse(
-                path=zip_path,
-                media_type="application/zip",
-                filename=zip_filename,
-                background=BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True)
-            )
-            if is_empty:
-                response.headers["X-Export-Empty"] = "true"
-            return response
-
-        if include_excel and not include_images:
-            response = FileResponse(
-                path=excel_path,
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                filename=f"upload_records_{timestamp}.xlsx",
-                background=BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True)
+
+async def _zip_chunks(
+    query: _ExportQuery,
+    include_excel: bool,
+    export_format: str,
+    zip_filename: str,
+    stats: Dict[str, Any],
+    progress: Optional[Dict[str, int]] = None,
+):
+    """ZIP字节流: 图片按到达顺序写入; 数据文件同时在线程池中生成, 写在图片之后"""
+    trailing = None
+    # 客户端中途断开时通知线程池中的数据文件生成停止分页读取
+    cancelled = threading.Event()
+    if include_excel:
+        data_path = _export_temp_path(export_format)
+        data_filename = f"{os.path.splitext(zip_filename)[0]}.{export_format}"
+
+        async def build_data_file():
+            await run_in_threadpool(
+                write_data_file, export_format, query.iter_values(progress, cancelled), data_path
             )
-            if is_empty:
-                response.headers["X-Export-Empty"] = "true"
-            return response
+            return data_filename, data_path
+
+        trailing = asyncio.ensure_future(build_data_file())
+    image_progress = None if include_excel else progress
+    try:
+        async for chunk in stream_zip(query.iter_image_jobs(image_progress), stats=stats, trailing=trailing):
+            if progress is not None:
+                progress["images_written"] = stats["written"]
+                progress["images_missing"] = stats["missing"]
+            yield chunk
+    finally:
+        cancelled.set()
+        if trailing is not None:
+            trailing.add_done_callback(lambda task: _discard_export_file(task, data_path))
+
 
-        if not include_excel and include_images:
-            zip_filename = f"images_{timestamp}.zip"
-            zip_path = os.path.join(temp_dir, zip_filename)
+@router.get("/export")
+async def export_records(
+    search: Optional[str] = Query(None, description="搜索关键词"),
+    doc_type: Optional[str] = Query(None, description="单据类型筛选"),
+    product_type: Optional[str] = Query(None, description="产品类型筛选"),
+    status: Optional[str] = Query(None, description="状态筛选"),
+    start_date: Optional[str] = Query(None, description="开始日期"),
+    end_date: Optional[str] = Query(None, description="结束日期"),
+    logistics: Optional[str] = Query(None, description="物流公司筛选"),
+    customer_name: Optional[str] = Query(None, description="客户名称筛选(包含匹配)"),
+    upload_type: Optional[str] = Query(None, description="上传业务类型筛选"),
+    include_excel: bool = Query(True, description="是否包含Excel数据"),
+    include_images: bool = Query(True, description="是否包含图片文件"),
+    export_format: str = Query("xlsx", alias="format", description="数据文件格式: xlsx/csv/ndjson")
+):
+    """
+    导出上传记录，支持选择性导出数据文件(Excel/CSV/NDJSON)和/或图片
 
-            with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-                image_local_count, image_webdav_count, image_missing_count = await _add_images_to_zip(
-                    zipf, image_files, file_manager, logger
+    响应:
+    - Both: ZIP文件 (images/ + 数据文件)
+    - 仅数据: xlsx 为完整文件; csv/ndjson 直接流式发送
+    - Images only: ZIP文件 (仅images/)
+
+    ZIP以流式响应边生成边发送(见 app.core.export_service), 不再先在临时目录打包。
+    记录按键集分页逐批读取, xlsx 使用 openpyxl 只写模式, 内存占用与记录数无关。
+    大批量导出建议使用后台导出任务(POST /export/jobs), 避免经反向代理时请求超时。
+    """
+    import logging
+
+    logger = logging.getLogger(__name__)
+
+    _validate_export_options(include_excel, include_images, export_format)
+
+    try:
+        query = _ExportQuery({
+            "search": search,
+            "doc_type": doc_type,
+            "product_type": product_type,
+            "status": status,
+            "start_date": start_date,
+            "end_date": end_date,
+            "logistics": logistics,
+            "customer_name": customer_name,
+            "upload_type": upload_type,
+        })
+
+        logger.info(
+            f"[导出] 开始导出 format={export_format}, include_excel={include_excel}, "
+            f"include_images={include_images}, 无记录={query.is_empty}"
+        )
+
+        filename = _export_filename(include_excel, include_images, export_format)
+        headers = {"Content-Disposition": content_disposition("attachment", filename)}
+        if query.is_empty or (not include_excel and not query.has_images):
+            headers["X-Export-Empty"] = "true"
+
+        if not include_images:
+            media_type = EXPORT_MEDIA_TYPES[export_format]
+            if export_format != "xlsx":
+                # 文本格式直接流式发送; 同步迭代器由Starlette放到线程池中逐块读取
+                return StreamingResponse(
+                    iter_text(export_format, query.iter_values()), media_type=media_type, headers=headers
                 )
 
-                if image_local_count == 0 and image_webdav_count == 0:
-                    zipf.writestr(zipfile.ZipInfo("images/"), b"")
+            # xlsx 需要完整文件: 只写模式在线程池中生成到临时文件, 发送后删除
+            data_path = _export_temp_path(export_format)
+            try:
+                await run_in_threadpool(write_data_file, export_format, query.iter_values(), data_path)
+            except Exception:
+                _remove_file(data_path)
+                raise
+            logger.info(f"[导出] Excel生成完成: {filename}")
+            return FileResponse(
+                data_path,
+                media_type=media_type,
+                headers=headers,
+                background=BackgroundTask(_remove_file, data_path)
+            )
 
+        async def zip_body():
+            zip_stats: Dict[str, Any] = {}
+            chunks = _zip_chunks(query, include_excel, export_format, filename, zip_stats)
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                # 客户端断开时立即关闭内层生成器, 让线程池中的数据文件生成停止分页
+                await chunks.aclose()
+            if zip_stats.get("error"):
+                logger.warning(f"[导出] ZIP发送完成但内容不完整: {filename}, 错误={zip_stats['error']}")
+                return
             logger.info(
-                f"[导出] 图片ZIP打包完成: {zip_filename}, 本地={image_local_count}, WebDAV={image_webdav_count}, 缺失={image_missing_count}"
+                f"[导出] ZIP发送完成: {filename}, 图片={zip_stats['written']}, 缺失={zip_stats['missing']}"
             )
 
-            response = FileResponse(
-                path=zip_path,
-                media_type="application/zip",
-                filename=zip_filename,
-                background=BackgroundTask(shutil.rmtree, temp_dir, ignore_errors=True)
-            )
-            if is_empty or (image_local_count == 0 and image_webdav_count == 0):
-                response.headers["X-Export-Empty"] = "true"
-            return response
+        return StreamingResponse(zip_body(), media_type="application/zip", headers=headers)
 
     except HTTPException:
         # 不吞掉明确的HTTP错误
         raise
     except Exception as e:
         logger.error(f"[导出] 导出失败: {str(e)}", exc_info=True)
-        if temp_dir and os.path.exists(temp_dir):
-            shutil.rmtree(temp_dir, ignore_errors=True)
 
         if "Excel" in str(e) or "Workbook" in str(e):
             raise HTTPException(status_code=500, detail="Excel文件生成失败")
-        if "ZIP" in str(e) or "zipfile" in str(e):
-            raise HTTPException(status_code=500, detail="压缩文件创建失败")
         raise HTTPException(status_code=500, detail=f"导出失败: {str(e)}")
 
 
-async def _add_images_to_zip(zipf, image_files, file_manager, logger):
-    """将图片添加到ZIP的辅助函数，支持本地文件和WebDAV下载"""
-    from app.core.file_manager import FileManager
-
-    image_local_count = 0
-    image_webdav_count = 0
-    image_missing_count = 0
-    download_jobs = []
-
-    for img in image_files:
-        if img["local_path"]:
-            try:
-                zipf.write(img["local_path"], arcname=img["arcname"])
-                image_local_count += 1
-            except Exception as e:  # noqa: BLE001
-                logger.warning(f"[导出] 本地图片添加失败: {img['arcname']}, 错误: {e}")
-                image_missing_count += 1
-        elif img["webdav_path"]:
-            download_jobs.append(img)
-        else:
-            image_missing_count += 1
-
-    if download_jobs:
-        if file_manager is None:
-            file_manager = FileManager()
+class ExportJobRequest(BaseModel):
+    """后台导出任务请求模型(字段含义同 GET /export 的查询参数)"""
+    search: Optional[str] = None
+    doc_type: Optional[str] = None
+    product_type: Optional[str] = None
+    status: Optional[str] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    logistics: Optional[str] = None
+    customer_name: Optional[str] = None
+    upload_type: Optional[str] = None
+    include_excel: bool = True
+    include_images: bool = True
+    format: str = "xlsx"
+    force: bool = False  # 不复用已有结果, 重新生成
+
+
+@router.post("/export/jobs")
+async def create_export_job(request: ExportJobRequest) -> Dict[str, Any]:
+    """
+    提交后台导出任务
 
-        concurrency_limit = 15
-        semaphore = asyncio.Semaphore(concurrency_limit)
+    相同参数且上传记录没有变化时, 在 EXPORT_JOB_TTL_MINUTES 内复用已有任务(包括进行中的任务), 响应中 reused=true。
+    之后轮询 GET /export/jobs/{job_id} 获取进度, 完成后从 download_url 下载。
+    """
+    import logging
 
-        async def download_and_write(job):
-            async with semaphore:
-                try:
-                    file_content = await file_manager.get_file(job["webdav_path"])
-                    zipf.writestr(job["arcname"], file_content)
-                    return True
-                except Exception as e:  # noqa: BLE001
-                    logger.warning(
-                        f"[导出] WebDAV图片获取失败 doc_number={job['doc_number']} "
-                        f"webdav_path={job['webdav_path']} 错误={str(e)}"
-                    )
-                    return False
+    logger = logging.getLogger(__name__)
 
-        results = await asyncio.gather(*(download_and_write(job) for job in download_jobs))
-        webdav_success = sum(1 for r in results if r)
-        webdav_failed = len(results) - webdav_success
-        image_webdav_count += webdav_success
-        image_missing_count += webdav_failed
+    export_format = request.format
+    _validate_export_options(request.include_excel, request.include_images, export_format)
+    params = request.model_dump(exclude={"force"})
+    filters = {
+        k: v for k, v in params.items() if k not in ("include_excel", "include_images", "format")
+    }
+    # 记录有变化时不复用旧结果; 读不到版本号时不复用
+    data_version = await run_io(get_data_version, ["upload_history"])
+    params["data_version"] = data_version
+    force = request.force or data_version is None
+
+    job = None if force else export_jobs.find_reusable(params)
+    reused = job is not None
+    if job is None:
+        # 只有需要新建任务时才查询和统计行数
+        try:
+            query = await run_io(_ExportQuery, filters, count=True)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"[导出任务] 查询失败: {str(e)}", exc_info=True)
+            raise HTTPException(status_code=500, detail=f"导出失败: {str(e)}")
+
+        include_excel, include_images = request.include_excel, request.include_images
+        filename = _export_filename(include_excel, include_images, export_format)
+
+        async def build(path: str, progress: Dict[str, int]) -> None:
+            progress["rows_total"] = query.total
+            if not include_images:
+                await run_in_threadpool(write_data_file, export_format, query.iter_values(progress), path)
+                return
+            zip_stats: Dict[str, Any] = {}
+            chunks = _zip_chunks(query, include_excel, export_format, filename, zip_stats, progress)
+            f = await run_io(open, path, "wb")
+            try:
+                async for chunk in chunks:
+                    await run_io(f.write, chunk)
+            finally:
+                await chunks.aclose()
+                await run_io(f.close)
+            if zip_stats.get("error"):
+                # ZIP本身是完整的, 但内容缺失: 任务记为失败, 不让客户端下载不完整的结果
+                raise RuntimeError(zip_stats["error"])
+
+        media_type = EXPORT_MEDIA_TYPES[export_format] if not include_images else "application/zip"
+        job, reused = export_jobs.submit(params, filename, media_type, build, force=force)
+        if not reused:
+            job.empty = query.is_empty or (not include_excel and not query.has_images)
+
+    result = job.to_dict()
+    result.update({
+        "reused": reused,
+        "download_url": f"/api/admin/export/jobs/{job.job_id}/download",
+    })
+    return result
+
+
+@router.get("/export/jobs/{job_id}")
+async def get_export_job(job_id: str) -> Dict[str, Any]:
+    """
+    查询导出任务进度
 
-    return image_local_count, image_webdav_count, image_missing_count
+    status: queued / running / done / failed;
+    progress: rows_total, rows_done, images_written, images_missing
+    """
+    job = export_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导出任务不存在或已过期")
+    result = job.to_dict()
+    result["download_url"] = f"/api/admin/export/jobs/{job.job_id}/download"
+    return result
+
+
+@router.get("/export/jobs/{job_id}/download")
+async def download_export_job(job_id: str, request: Request):
+    """下载导出任务结果, 支持Range断点续传"""
+    job = export_jobs.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="导出任务不存在或已过期")
+    if job.status != export_jobs.STATUS_DONE:
+        raise HTTPException(status_code=409, detail=f"导出任务尚未完成: {job.status}")
+    export_jobs.hold_for_download(job)
+    try:
+        return file_response(
+            request,
+            job.path,
+            job.media_type,
+            headers={"Content-Disposition": content_disposition("attachment", job.filename)},
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="导出文件已被清理, 请重新导出")
 
 
 @router.get("/statistics")
@@ -604,6 +948,69 @@ async def get_statistics() -> Dict[str, Any]:
         }
 
 
+# 分析接口未指定日期范围时统计最近的天数
+_ANALYTICS_DEFAULT_DAYS = 30
+
+
+def _parse_analytics_date(value: str, name: str):
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name}格式应为YYYY-MM-DD")
+
+
+@router.get("/analytics")
+async def get_analytics(
+    start_date: Optional[str] = Query(None, description="开始日期（YYYY-MM-DD），默认结束日期前29天"),
+    end_date: Optional[str] = Query(None, description="结束日期（YYYY-MM-DD），默认今天"),
+    bucket: str = Query("day", description="时间粒度: day/week/month"),
+    group_by: Optional[str] = Query(None, description="分组维度: logistics/doc_type"),
+    logistics: Optional[str] = Query(None, description="物流公司筛选"),
+    doc_type: Optional[str] = Query(None, description="单据类型筛选")
+) -> Dict[str, Any]:
+    """
+    按时间段统计上传量、失败率与用友云上传耗时(基于日汇总表, 与记录总数无关)
+
+    响应格式:
+    {
+        "start_date": "2026-01-01",
+        "end_date": "2026-01-30",
+        "bucket": "day",
+        "group_by": "logistics",
+        "items": [
+            {"period": "2026-01-01", "logistics": "顺丰", "total": 20, "success_count": 18,
+             "failed_count": 1, "failure_rate": 0.0526, "avg_latency_ms": 850}
+        ],
+        "summary": {"total": 20, ...}
+    }
+    """
+    if bucket not in upload_analytics.BUCKETS:
+        raise HTTPException(status_code=400, detail=f"bucket必须为以下值之一: {', '.join(upload_analytics.BUCKETS)}")
+    if group_by is not None and group_by not in upload_analytics.GROUP_BY_FIELDS:
+        raise HTTPException(
+            status_code=400, detail=f"group_by必须为以下值之一: {', '.join(upload_analytics.GROUP_BY_FIELDS)}"
+        )
+
+    end = _parse_analytics_date(end_date, "end_date") if end_date else get_beijing_now_naive().date()
+    start = (
+        _parse_analytics_date(start_date, "start_date") if start_date
+        else end - timedelta(days=_ANALYTICS_DEFAULT_DAYS - 1)
+    )
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date不能晚于end_date")
+
+    if logistics == "全部物流":
+        logistics = None
+    return upload_analytics.query_upload_stats(start, end, bucket, group_by, logistics, doc_type)
+
+
+@router.post("/analytics/rebuild")
+async def rebuild_analytics() -> Dict[str, Any]:
+    """按上传记录重新生成日汇总(汇总与明细不一致时手动修复)"""
+    rows = await run_in_threadpool(upload_analytics.rebuild)
+    return {"success": True, "rows": rows}
+
+
 class DeleteRecordsRequest(BaseModel):
     """删除记录请求模型"""
     ids: List[int]
@@ -640,7 +1047,8 @@ async def delete_records(request: DeleteRecordsRequest) -> Dict[str, Any]:
 
     说明:
     - 采用软删除策略，只标记deleted_at字段，不物理删除数据
-    - 不删除本地文件系统的文件
+    - 启用存储回收(DELETE_REAPER_ENABLED)时同一事务内加入回收队列, 宽限期(DELETE_GRACE_HOURS)后
+      由定时任务批量删除本地备份、缓存和WebDAV上的文件, 接口不等待文件删除; 未启用时不删除任何文件
     - 幂等性设计：重复删除已删除的记录不报错
     - 不调用用友云API
     """
@@ -668,6 +1076,8 @@ async def delete_records(request: DeleteRecordsRequest) -> Dict[str, Any]:
             """, [current_time] + request.ids)
 
             deleted_count = cursor.rowcount
+            if settings.DELETE_REAPER_ENABLED:
+                deletion_queue.enqueue(cursor, request.ids, current_time)
             conn.commit()
 
             return {
@@ -835,16 +1245,303 @@ async def update_notes(
             raise HTTPException(status_code=500, detail=f"更新失败: {str(e)}")
 
 
+# 批量更新每次请求的最大条目数
+_BATCH_UPDATE_MAX_ITEMS = 500
+
+
+class CheckStatusItem(BaseModel):
+    id: int
+    checked: bool
+
+
+class BatchCheckStatusRequest(BaseModel):
+    """批量更新检查状态请求模型"""
+    items: List[CheckStatusItem]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "items": [{"id": 1, "checked": True}, {"id": 2, "checked": False}]
+            }
+        }
+
+
+class NotesItem(BaseModel):
+    id: int
+    notes: str
+
+
+class BatchNotesRequest(BaseModel):
+    """批量更新备注请求模型"""
+    items: List[NotesItem]
+
+    class Config:
+        schema_extra = {
+            "example": {
+                "items": [{"id": 1, "notes": "这是备注内容"}, {"id": 2, "notes": ""}]
+            }
+        }
+
+
+def _apply_batch_update(column: str, values: Dict[int, Any], errors: Dict[int, str]) -> Dict[int, str]:
+    """在一个事务中把 values(记录ID -> 新值) 写入 column
+
+    不存在或已删除的记录写入 errors; 返回合并后的 errors(记录ID -> 错误信息)。
+    """
+    if not values:
+        return errors
+    ids = list(values)
+    current_time = get_beijing_now_naive().isoformat()
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+
+        try:
+            existing = set()
+            for i in range(0, len(ids), _BATCH_UPDATE_MAX_ITEMS):
+                batch = ids[i:i + _BATCH_UPDATE_MAX_ITEMS]
+                placeholders = ','.join('?' * len(batch))
+                cursor.execute(f"""
+                    SELECT id FROM upload_history
+                    WHERE id IN ({placeholders}) AND deleted_at IS NULL
+                """, batch)
+                existing.update(row[0] for row in cursor.fetchall())
+
+            cursor.executemany(
+                f"UPDATE upload_history SET {column} = ?, updated_at = ? WHERE id = ?",
+                [(values[record_id], current_time, record_id) for record_id in ids if record_id in existing]
+            )
+            conn.commit()
+
+        except Exception as e:
+            conn.rollback()
+            raise HTTPException(status_code=500, detail=f"更新失败: {str(e)}")
+
+    for record_id in ids:
+        if record_id not in existing:
+            errors[record_id] = "记录不存在或已删除"
+    return errors
+
+
+def _batch_response(item_ids: List[int], values: Dict[int, Any], errors: Dict[int, str], field: str) -> Dict[str, Any]:
+    """逐条结果: 同一记录在请求中出现多次时以最后一次为准, 结果按首次出现的顺序返回"""
+    results = []
+    for record_id in dict.fromkeys(item_ids):
+        if record_id in errors:
+            results.append({"id": record_id, "success": False, "error": errors[record_id]})
+        else:
+            value = values[record_id]
+            results.append({"id": record_id, "success": True, field: bool(value) if field == "checked" else value})
+    updated = sum(1 for item in results if item["success"])
+    return {
+        "success": updated == len(results),
+        "updated": updated,
+        "failed": len(results) - updated,
+        "results": results,
+    }
+
+
+def _validate_batch_size(count: int) -> None:
+    if count == 0:
+        raise HTTPException(status_code=400, detail="请至少提交一条记录")
+    if count > _BATCH_UPDATE_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多更新{_BATCH_UPDATE_MAX_ITEMS}条记录")
+
+
+@router.patch("/records/check")
+async def batch_update_check_status(request: BatchCheckStatusRequest) -> Dict[str, Any]:
+    """
+    批量更新检查状态(单个事务)
+
+    请求体:
+    {
+        "items": [{"id": 1, "checked": true}, {"id": 2, "checked": false}]
+    }
+
+    响应格式:
+    {
+        "success": false,
+        "updated": 1,
+        "failed": 1,
+        "results": [
+            {"id": 1, "success": true, "checked": true},
+            {"id": 2, "success": false, "error": "记录不存在或已删除"}
+        ]
+    }
+
+    错误响应:
+    - 400: 条目为空或超过500条
+    - 500: 服务器内部错误(整批回滚)
+    """
+    _validate_batch_size(len(request.items))
+
+    values: Dict[int, Any] = {}
+    for item in request.items:
+        values[item.id] = 1 if item.checked else 0
+
+    errors = _apply_batch_update("checked", values, {})
+    return _batch_response([item.id for item in request.items], values, errors, "checked")
+
+
+@router.patch("/records/notes")
+async def batch_update_notes(request: BatchNotesRequest) -> Dict[str, Any]:
+    """
+    批量更新备注(单个事务)
+
+    请求体:
+    {
+        "items": [{"id": 1, "notes": "备注内容"}, {"id": 2, "notes": ""}]
+    }
+
+    响应格式同 PATCH /records/check, 成功条目返回保存后的 notes(空字符串保存为null)。
+    超过1000字符的备注单条失败, 不影响其他条目。
+    """
+    _validate_batch_size(len(request.items))
+
+    values: Dict[int, Any] = {}
+    errors: Dict[int, str] = {}
+    for item in request.items:
+        if len(item.notes) > 1000:
+            values.pop(item.id, None)
+            errors[item.id] = "备注内容不能超过1000字符"
+            continue
+        errors.pop(item.id, None)
+        values[item.id] = item.notes.strip() or None
+
+    errors = _apply_batch_update("notes", values, errors)
+    return _batch_response([item.id for item in request.items], values, errors, "notes")
+
+
+# 预览接口支持的图片类型
+_PREVIEW_MEDIA_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".bmp": "image/bmp",
+    ".webp": "image/webp"
+}
+# 预览清单单次最多包含的记录数
+_MANIFEST_MAX_ITEMS = 200
+# 预览URL带有与内容一致的版本号时, 浏览器可长期缓存且无需重新验证
+_IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _preview_media_type(file_extension: Optional[str]) -> str:
+    return _PREVIEW_MEDIA_TYPES.get(file_extension.lower() if file_extension else "", "application/octet-stream")
+
+
+def _preview_version(
+    local_file_path: Optional[str], webdav_path: Optional[str], file_size: Optional[int]
+) -> Optional[Tuple[str, str]]:
+    """预览内容的版本号, 返回 (版本号, 来源 local/webdav); 无可用文件时返回None
+
+    与预览接口的取文件顺序一致: 本地文件存在时按 路径+mtime+大小, 否则按 WebDAV路径+大小
+    (WebDAV文件名带时间戳, 内容不会被改写)。
+    """
+    if local_file_path:
+        try:
+            stat_result = os.stat(local_file_path)
+            return make_etag(local_file_path, stat_result.st_mtime, stat_result.st_size)[1:17], "local"
+        except OSError:
+            pass
+    if webdav_path:
+        return make_etag(webdav_path, file_size)[1:17], "webdav"
+    return None
+
+
+class PreviewManifestRequest(BaseModel):
+    """预览清单请求模型"""
+    ids: List[int]
+
+
+def _manifest_item(row, file_manager) -> Dict[str, Any]:
+    record_id, local_file_path, file_extension, file_size, webdav_path = row
+    item: Dict[str, Any] = {
+        "id": record_id,
+        "media_type": _preview_media_type(file_extension),
+        "size": file_size,
+    }
+    version = _preview_version(local_file_path, webdav_path, file_size)
+    if version is None:
+        item.update({"version": None, "url": None, "cache": "missing"})
+        return item
+    version, source = version
+    item.update({
+        "version": version,
+        "url": f"/api/admin/files/{record_id}/preview?v={version}",
+        "cache": "local" if source == "local" else file_manager.cache_state(webdav_path),
+    })
+    return item
+
+
+@router.post("/files/manifest")
+async def get_preview_manifest(request: PreviewManifestRequest) -> Dict[str, Any]:
+    """
+    批量获取预览清单: 一次查询返回多条记录的预览URL与缓存状态
+
+    请求体:
+    {"ids": [1, 2, 3]}
+
+    响应格式:
+    {
+        "items": [
+            {"id": 1, "url": "/api/admin/files/1/preview?v=...", "version": "...",
+             "cache": "memory", "media_type": "image/jpeg", "size": 102400}
+        ],
+        "missing_ids": [3]
+    }
+
+    cache: local(本地文件)/memory(内存热点缓存)/disk(磁盘缓存)/remote(需从WebDAV获取)/missing(无可用文件)
+    url 带内容版本号, 内容不变时URL不变, 浏览器可跨页面复用缓存。
+    """
+    from app.core.file_manager import FileManager
+
+    if not request.ids:
+        raise HTTPException(status_code=400, detail="请至少提交一条记录")
+    if len(request.ids) > _MANIFEST_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"单次最多查询{_MANIFEST_MAX_ITEMS}条记录")
+
+    record_ids = list(dict.fromkeys(request.ids))
+    placeholders = ",".join("?" * len(record_ids))
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT id, local_file_path, file_extension, file_size, webdav_path
+            FROM upload_history
+            WHERE id IN ({placeholders}) AND deleted_at IS NULL
+        """, record_ids)
+        rows = {row[0]: tuple(row) for row in cursor.fetchall()}
+
+    file_manager = FileManager()
+    found = [rows[record_id] for record_id in record_ids if record_id in rows]
+    # 缓存状态检查涉及文件stat, 放到I/O线程池
+    items = await run_io(lambda: [_manifest_item(row, file_manager) for row in found])
+    return {
+        "items": items,
+        "missing_ids": [record_id for record_id in record_ids if record_id not in rows],
+    }
+
+
 @router.get("/files/{record_id}/preview")
-async def preview_file(record_id: int):
+async def preview_file(
+    record_id: int,
+    request: Request,
+    v: Optional[str] = Query(None, description="内容版本号(来自预览清单), 与当前内容一致时允许长期缓存")
+):
     """
     预览文件（返回图片用于浏览器直接显示）
 
     路径参数:
     - record_id: 记录ID
 
+    查询参数:
+    - v: 预览清单返回的内容版本号; 与当前内容一致时响应可被浏览器长期缓存(immutable)
+
     响应:
     - 200: 返回图片文件内容（浏览器直接显示）
+    - 206: Range请求, 返回部分内容
+    - 304: If-None-Match 与ETag一致, 内容未变化
     - 404: 记录不存在、已删除或文件不存在
     - 500: 服务器错误
 
@@ -852,101 +1549,85 @@ async def preview_file(record_id: int):
 
     文件获取策略:
     1. 优先从本地文件路径读取(旧数据)
-    2. 如果本地文件不存在,尝试从WebDAV缓存读取(新数据)
+    2. 如果本地文件不存在,依次尝试内存热点缓存、磁盘缓存(新数据)
     3. 如果缓存也不存在,从WebDAV下载并缓存
     """
     import logging
     import time
     from app.core.file_manager import FileManager
-    from fastapi.responses import Response
 
     logger = logging.getLogger(__name__)
     file_manager = FileManager()
 
     # 性能监控 - 开始计时
     start_time = time.time()
-    access_method = "unknown"  # 文件访问方式: local/cache/webdav
-
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    access_method = "unknown"  # 文件访问方式: local/memory/cache/webdav
 
-        try:
+    try:
+        # 只在查询期间持有数据库连接, 文件传输不占用全局数据库锁
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
             # 查询文件路径和扩展名
             cursor.execute("""
-                SELECT local_file_path, file_extension, file_name, webdav_path
+                SELECT local_file_path, file_extension, file_name, webdav_path, file_size
                 FROM upload_history
                 WHERE id = ? AND deleted_at IS NULL
             """, [record_id])
-
             row = cursor.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail="记录不存在或已删除")
 
-            local_file_path, file_extension, file_name, webdav_path = row
+        if not row:
+            raise HTTPException(status_code=404, detail="记录不存在或已删除")
+
+        local_file_path, file_extension, file_name, webdav_path, file_size = row
+
+        # 根据文件扩展名确定 MIME 类型
+        media_type = _preview_media_type(file_extension)
+        cache_control = "public, max-age=3600"
+        if v is not None:
+            version = _preview_version(local_file_path, webdav_path, file_size)
+            if version is not None and version[0] == v:
+                cache_control = _IMMUTABLE_CACHE_CONTROL
+        preview_headers = {
+            "Content-Disposition": content_disposition("inline", file_name or ""),
+            "Cache-Control": cache_control
+        }
 
-            # 根据文件扩展名确定 MIME 类型
-            extension_to_mime = {
-                ".jpg": "image/jpeg",
-                ".jpeg": "image/jpeg",
-                ".png": "image/png",
-                ".gif": "image/gif",
-                ".bmp": "image/bmp",
-                ".webp": "image/webp"
-            }
-            media_type = extension_to_mime.get(file_extension.lower() if file_extension else "", "application/octet-stream")
+        # 策略1: 优先检查本地文件是否存在
+        if local_file_path and os.path.exists(local_file_path):
+            access_method = "local"
+            elapsed_time = (time.time() - start_time) * 1000  # 转换为毫秒
+            logger.info(f"[性能] 预览文件 record_id={record_id} 方式=本地文件 耗时={elapsed_time:.2f}ms")
 
-            # 策略1: 优先检查本地文件是否存在
-            if local_file_path and os.path.exists(local_file_path):
-                access_method = "local"
-                elapsed_time = (time.time() - start_time) * 1000  # 转换为毫秒
-                logger.info(f"[性能] 预览文件 record_id={record_id} 方式=本地文件 耗时={elapsed_time:.2f}ms")
-
-                return FileResponse(
-                    path=local_file_path,
-                    media_type=media_type,
-                    filename=file_name
+            return file_response(request, local_file_path, media_type, preview_headers)
+
+        # 策略2: 如果有webdav_path,依次尝试内存热点缓存、磁盘缓存和WebDAV
+        if webdav_path:
+            try:
+                response, access_method = await cached_file_response(
+                    request, file_manager, webdav_path, media_type, preview_headers
                 )
 
-            # 策略2: 如果有webdav_path,尝试从WebDAV获取
-            if webdav_path:
-                try:
-                    # 检查是否是缓存命中
-                    cache_path = file_manager._get_cache_path(webdav_path)
-                    is_cache_hit = file_manager._is_cache_valid(cache_path)
-                    access_method = "cache" if is_cache_hit else "webdav"
-
-                    # 从WebDAV获取文件(会自动尝试缓存)
-                    file_content = await file_manager.get_file(webdav_path)
-
-                    elapsed_time = (time.time() - start_time) * 1000
-                    logger.info(f"[性能] 预览文件 record_id={record_id} 方式={access_method} 耗时={elapsed_time:.2f}ms")
-
-                    return Response(
-                        content=file_content,
-                        media_type=media_type,
-                        headers={
-                            "Content-Disposition": f'inline; filename="{file_name}"',
-                            "Cache-Control": "public, max-age=3600"
-                        }
-                    )
-                except Exception as e:
-                    # WebDAV获取失败,记录日志但继续尝试其他方式
-                    elapsed_time = (time.time() - start_time) * 1000
-                    logger.warning(f"[性能] 预览文件失败 record_id={record_id} 方式={access_method} 耗时={elapsed_time:.2f}ms 错误={str(e)}")
-
-            # 策略3: 都失败了,返回404
-            raise HTTPException(status_code=404, detail="文件不存在或无法访问")
+                elapsed_time = (time.time() - start_time) * 1000
+                logger.info(f"[性能] 预览文件 record_id={record_id} 方式={access_method} 耗时={elapsed_time:.2f}ms")
+                return response
+            except Exception as e:
+                # WebDAV获取失败,记录日志但继续尝试其他方式
+                elapsed_time = (time.time() - start_time) * 1000
+                logger.warning(f"[性能] 预览文件失败 record_id={record_id} 方式={access_method} 耗时={elapsed_time:.2f}ms 错误={str(e)}")
 
-        except HTTPException:
-            raise
-        except Exception as e:
-            elapsed_time = (time.time() - start_time) * 1000
-            logger.error(f"[性能] 预览失败 record_id={record_id} 耗时={elapsed_time:.2f}ms 错误={str(e)}")
-            raise HTTPException(status_code=500, detail=f"预览失败: {str(e)}")
+        # 策略3: 都失败了,返回404
+        raise HTTPException(status_code=404, detail="文件不存在或无法访问")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        elapsed_time = (time.time() - start_time) * 1000
+        logger.error(f"[性能] 预览失败 record_id={record_id} 耗时={elapsed_time:.2f}ms 错误={str(e)}")
+        raise HTTPException(status_code=500, detail=f"预览失败: {str(e)}")
 
 
 @router.get("/files/{record_id}/download")
-async def download_file(record_id: int):
+async def download_file(record_id: int, request: Request):
     """
     下载单个文件
 
@@ -955,87 +1636,75 @@ async def download_file(record_id: int):
 
     响应:
     - 200: 返回文件下载流（触发浏览器下载）
+    - 206: Range请求(断点续传), 返回部分内容
+    - 304: If-None-Match 与ETag一致, 内容未变化
     - 404: 记录不存在、已删除或文件不存在
     - 500: 服务器错误
 
     文件获取策略:
     1. 优先从本地文件路径读取(旧数据)
-    2. 如果本地文件不存在,尝试从WebDAV获取(新数据)
+    2. 如果本地文件不存在,尝试从缓存/WebDAV获取(新数据)
     """
     import logging
     import time
     from app.core.file_manager import FileManager
-    from fastapi.responses import Response
 
     logger = logging.getLogger(__name__)
     file_manager = FileManager()
 
     # 性能监控 - 开始计时
     start_time = time.time()
-    access_method = "unknown"  # 文件访问方式: local/cache/webdav
-
-    with get_db_connection() as conn:
-        cursor = conn.cursor()
+    access_method = "unknown"  # 文件访问方式: local/memory/cache/webdav
 
-        try:
+    try:
+        # 只在查询期间持有数据库连接, 文件传输不占用全局数据库锁
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
             # 查询文件路径和文件名
             cursor.execute("""
                 SELECT local_file_path, file_name, webdav_path
                 FROM upload_history
                 WHERE id = ? AND deleted_at IS NULL
             """, [record_id])
-
             row = cursor.fetchone()
-            if not row:
-                raise HTTPException(status_code=404, detail="记录不存在或已删除")
 
-            local_file_path, file_name, webdav_path = row
+        if not row:
+            raise HTTPException(status_code=404, detail="记录不存在或已删除")
 
-            # 策略1: 优先检查本地文件是否存在
-            if local_file_path and os.path.exists(local_file_path):
-                access_method = "local"
-                elapsed_time = (time.time() - start_time) * 1000  # 转换为毫秒
-                logger.info(f"[性能] 下载文件 record_id={record_id} 方式=本地文件 耗时={elapsed_time:.2f}ms")
-
-                return FileResponse(
-                    path=local_file_path,
-                    media_type="application/octet-stream",
-                    filename=file_name,
-                    headers={"Content-Disposition": f'attachment; filename="{file_name}"'}
+        local_file_path, file_name, webdav_path = row
+        download_headers = {
+            "Content-Disposition": content_disposition("attachment", file_name or "")
+        }
+
+        # 策略1: 优先检查本地文件是否存在
+        if local_file_path and os.path.exists(local_file_path):
+            access_method = "local"
+            elapsed_time = (time.time() - start_time) * 1000  # 转换为毫秒
+            logger.info(f"[性能] 下载文件 record_id={record_id} 方式=本地文件 耗时={elapsed_time:.2f}ms")
+
+            return file_response(request, local_file_path, "application/octet-stream", download_headers)
+
+        # 策略2: 如果有webdav_path,依次尝试内存热点缓存、磁盘缓存和WebDAV
+        if webdav_path:
+            try:
+                response, access_method = await cached_file_response(
+                    request, file_manager, webdav_path, "application/octet-stream", download_headers
                 )
 
-            # 策略2: 如果有webdav_path,尝试从WebDAV获取
-            if webdav_path:
-                try:
-                    # 检查是否是缓存命中
-                    cache_path = file_manager._get_cache_path(webdav_path)
-                    is_cache_hit = file_manager._is_cache_valid(cache_path)
-                    access_method = "cache" if is_cache_hit else "webdav"
-
-                    # 从WebDAV获取文件
-                    file_content = await file_manager.get_file(webdav_path)
-
-                    elapsed_time = (time.time() - start_time) * 1000
-                    logger.info(f"[性能] 下载文件 record_id={record_id} 方式={access_method} 耗时={elapsed_time:.2f}ms")
-
-                    return Response(
-                        content=file_content,
-                        media_type="application/octet-stream",
-                        headers={
-                            "Content-Disposition": f'attachment; filename="{file_name}"'
-                        }
-                    )
-                except Exception as e:
-                    # WebDAV获取失败,记录日志
-                    elapsed_time = (time.time() - start_time) * 1000
-                    logger.warning(f"[性能] 下载文件失败 record_id={record_id} 方式={access_method} 耗时={elapsed_time:.2f}ms 错误={str(e)}")
-
-            # 策略3: 都失败了,返回404
-            raise HTTPException(status_code=404, detail="文件不存在或无法访问")
+                elapsed_time = (time.time() - start_time) * 1000
+                logger.info(f"[性能] 下载文件 record_id={record_id} 方式={access_method} 耗时={elapsed_time:.2f}ms")
+                return response
+            except Exception as e:
+                # WebDAV获取失败,记录日志
+                elapsed_time = (time.time() - start_time) * 1000
+                logger.warning(f"[性能] 下载文件失败 record_id={record_id} 方式={access_method} 耗时={elapsed_time:.2f}ms 错误={str(e)}")
 
-        except HTTPException:
-            raise
-        except Exception as e:
-            elapsed_time = (time.time() - start_time) * 1000
-            logger.error(f"[性能] 下载失败 record_id={record_id} 耗时={elapsed_time:.2f}ms 错误={str(e)}")
-            raise HTTPException(status_code=500, detail=f"下载失败: {str(e)}")
+        # 策略3: 都失败了,返回404
+        raise HTTPException(status_code=404, detail="文件不存在或无法访问")
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        elapsed_time = (time.time() - start_time) * 1000
+        logger.error(f"[性能] 下载失败 record_id={record_id} 耗时={elapsed_time:.2f}ms 错误={str(e)}")
+        raise HTTPException(status_code=500, detail=f"下载失败: {str(e)}")
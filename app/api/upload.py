@@ -2,6 +2,7 @@ from fastapi import APIRouter, UploadFile, File, Form, HTTPException, Background
 from typing import List, Optional
 import asyncio
 import os
+import time
 import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
@@ -9,6 +10,7 @@ from app.core.config import get_settings
 from app.core.yonyou_client import YonYouClient
 from app.core.database import get_db_connection
 from app.core.file_manager import FileManager
+from app.core.io_executor import run_io
 from app.core.timezone import get_beijing_now_naive
 from app.core.upload_types import (
     DEFAULT_UPLOAD_TYPE,
@@ -57,7 +59,7 @@ def generate_unique_filename(doc_number: str, file_extension: str, storage_path:
 
 def save_file_locally(file_content: bytes, file_path: str) -> None:
     """
-    保存文件到本地
+    保存文件到本地(同步, 由调用方通过 run_io 放到磁盘I/O线程池执行)
 
     Args:
         file_content: 文件内容
@@ -136,7 +138,7 @@ async def background_upload_to_yonyou(
         # 2. 保存到本地作为备份（如果WebDAV失败）
         if not webdav_result.get('success') and local_file_path:
             try:
-                save_file_locally(file_content, local_file_path)
+                await run_io(save_file_locally, file_content, local_file_path)
                 print(f"本地备份保存成功: {local_file_path}")
             except Exception as e:
                 print(f"本地备份保存失败: {str(e)}")
@@ -152,14 +154,18 @@ async def background_upload_to_yonyou(
         error_code = None
         error_message = None
         retry_count = 0
+        # 最后一次上传请求的耗时(毫秒), 计入上传日汇总的延迟统计
+        latency_ms = None
 
         for attempt in range(settings.MAX_RETRY_COUNT):
+            started = time.monotonic()
             result = await yonyou_client.upload_file(
                 file_content,
                 new_filename,
                 business_id,
                 business_type=business_type
             )
+            latency_ms = int((time.monotonic() - started) * 1000)
 
             if result["success"]:
                 yonyou_file_id = result["data"]["id"]
@@ -222,6 +228,7 @@ async def background_upload_to_yonyou(
                         cache_expiry_time = ?,
                         local_file_path = ?,
                         retry_count = ?,
+                        yonyou_latency_ms = ?,
                         updated_at = ?
                     WHERE id = ?
                 """, (
@@ -233,6 +240,7 @@ async def background_upload_to_yonyou(
                     cache_expiry_time,
                     local_path_value,
                     retry_count,
+                    latency_ms,
                     get_beijing_now_naive().isoformat(),
                     record_id
                 ))
@@ -250,6 +258,7 @@ async def background_upload_to_yonyou(
                         cache_expiry_time = ?,
                         local_file_path = ?,
                         retry_count = ?,
+                        yonyou_latency_ms = ?,
                         updated_at = ?
                     WHERE id = ?
                 """, (
@@ -262,6 +271,7 @@ async def background_upload_to_yonyou(
                     cache_expiry_time,
                     local_path_value,
                     retry_count,
+                    latency_ms,
                     get_beijing_now_naive().isoformat(),
                     record_id
                 ))
@@ -351,7 +361,7 @@ async def background_save_warehouse_upload(
 
         if not storage_success and local_file_path:
             try:
-                save_file_locally(file_content, local_file_path)
+                await run_io(save_file_locally, file_content, local_file_path)
                 storage_success = True
                 print(f"仓库文件本地保存成功: {local_file_path}")
             except Exception as e:
@@ -10,12 +10,17 @@ import logging
 import os
 import tempfile
 
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query
 from pydantic import BaseModel
 
 from ..core.config import get_settings
-from ..core.webdav_client import WebDAVClient
+from ..core.webdav_client import WebDAVClient, get_verification_stats
+from ..core.webdav_health import webdav_health
+from ..core.integrity_scanner import get_integrity_findings, run_integrity_scan
 from ..core.file_manager import FileManager
+from ..core import deletion_queue, sync_queue
+from ..core.sync_concurrency import sync_progress
+from ..core.storage_tiers import get_storage_tiers_report
 from ..core.backup_service import BackupService
 from ..core.timezone import get_beijing_now_naive_iso
 
@@ -41,6 +46,9 @@ class WebDAVStatusResponse(BaseModel):
     pending_sync_count: int = 0
     total_cached_files: int = 0
     cache_size_mb: float = 0.0
+    upload_verification: Dict[str, Any] = {}
+    sync_queue: Dict[str, Any] = {}
+    sync_progress: Dict[str, Any] = {}
     message: Optional[str] = None
 
 
@@ -74,6 +82,12 @@ async def get_webdav_status():
             pending_sync_count=pending_sync_count,
             total_cached_files=cache_stats.get('total_files', 0),
             cache_size_mb=cache_stats.get('total_size_mb', 0.0),
+            upload_verification={
+                "strategy": settings.WEBDAV_UPLOAD_VERIFY,
+                "stats": get_verification_stats()
+            },
+            sync_queue=sync_queue.get_queue_stats(),
+            sync_progress=sync_progress.snapshot(),
             message="WebDAV服务正常" if webdav_available else "WebDAV服务不可用"
         )
 
@@ -230,6 +244,8 @@ async def detailed_health_check():
         else:
             health_info["overall_status"] = "unhealthy"
 
+        # 被动健康统计(基于真实请求结果), 不参与上面的检查项计数
+        health_info["passive_health"] = webdav_health.snapshot()
         health_info["check_time"] = get_beijing_now_naive_iso()
         health_info["healthy_checks"] = healthy_checks
         health_info["total_checks"] = total_checks
@@ -305,6 +321,55 @@ async def trigger_cache_cleanup(background_tasks: BackgroundTasks):
         raise HTTPException(status_code=500, detail=error_msg)
 
 
+@router.get("/integrity/findings")
+async def list_integrity_findings(
+    status: str = Query("open", pattern="^(open|resolved|all)$", description="open未解决/resolved已恢复/all全部"),
+    page: int = Query(1, ge=1, description="页码"),
+    limit: int = Query(50, ge=1, le=200, description="每页记录数")
+):
+    """查询WebDAV完整性巡检发现的问题"""
+    try:
+        result = get_integrity_findings(status=status, page=page, limit=limit)
+        return {"success": True, **result}
+
+    except Exception as e:
+        error_msg = f"获取完整性巡检结果失败: {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+
+@router.get("/storage/tiers")
+async def get_storage_tiers():
+    """各存储层(内存/磁盘缓存/待同步/本地备份/WebDAV)占用、最近一次分层策略执行结果与删除回收队列"""
+    try:
+        return {
+            "success": True,
+            **get_storage_tiers_report(file_manager),
+            "deletion_queue": deletion_queue.get_queue_stats(),
+        }
+
+    except Exception as e:
+        error_msg = f"获取分层存储统计失败: {str(e)}"
+        logger.error(error_msg)
+        raise HTTPException(status_code=500, detail=error_msg)
+
+
+@router.post("/integrity/scan")
+async def trigger_integrity_scan(background_tasks: BackgroundTasks):
+    """手动触发一轮完整性巡检(后台执行, 游标照常前进)"""
+    webdav_available = await file_manager.check_webdav_health()
+    if not webdav_available:
+        raise HTTPException(status_code=503, detail="WebDAV服务不可用，无法执行巡检")
+
+    background_tasks.add_task(run_integrity_scan, webdav_client)
+    logger.info("手动触发WebDAV完整性巡检")
+
+    return {
+        "success": True,
+        "message": "完整性巡检任务已启动"
+    }
+
+
 @router.get("/backup/status", response_model=BackupStatusResponse)
 async def get_backup_status():
     """获取备份状态"""
@@ -367,8 +432,13 @@ async def get_webdav_config():
             "timeout": settings.WEBDAV_TIMEOUT,
             "retry_count": settings.WEBDAV_RETRY_COUNT,
             "retry_delay": settings.WEBDAV_RETRY_DELAY,
+            "upload_verify": settings.WEBDAV_UPLOAD_VERIFY,
+            "upload_verify_sample_rate": settings.WEBDAV_UPLOAD_VERIFY_SAMPLE_RATE,
             "cache_dir": settings.CACHE_DIR,
             "cache_days": settings.CACHE_DAYS,
+            "cache_max_bytes": settings.CACHE_MAX_BYTES,
+            "cache_eviction_policy": settings.CACHE_EVICTION_POLICY,
+            "cache_layout": settings.CACHE_LAYOUT,
             "temp_storage_dir": settings.TEMP_STORAGE_DIR,
             "backup_enabled": settings.BACKUP_ENABLED,
             "backup_retention_days": settings.BACKUP_RETENTION_DAYS,
@@ -0,0 +1,175 @@
+"""
+JSON接口的压缩与ETag重验证
+管理页面会频繁轮询记录列表、统计等接口, 这些JSON响应由 JSONCacheMiddleware 统一处理:
+
+- 响应体不小于 API_GZIP_MIN_BYTES 且客户端接受gzip时压缩(API_GZIP_LEVEL=0 关闭)
+- 按规则匹配的接口附带弱ETag: 由请求路径、查询参数和相关表的数据版本号生成。
+  版本号由 data_versions 表维护, 表内容每变化一次触发器加1(见 database.VERSIONED_TABLES),
+  读取只需一次主键查询
+- If-None-Match 与当前ETag一致时直接返回304, 不再执行接口查询
+- 数据库缺少 data_versions 表(未执行 init_database 的旧库)时不生成ETag, 只做压缩
+
+先读版本号再执行查询: 期间数据变化只会让下次请求多取一次完整内容, 不会返回过期数据。
+"""
+
+import gzip
+import logging
+import re
+import sqlite3
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import get_settings
+from .database import get_db_connection
+from .http_cache import etag_matches, make_etag
+
+logger = logging.getLogger(__name__)
+
+
+class CacheRule:
+    """一条ETag规则: 路径正则 + 响应依赖的表
+
+    on_not_modified: 返回304前调用(参数为路径匹配结果), 用于保留访问记录等副作用
+    """
+
+    __slots__ = ('pattern', 'tables', 'on_not_modified')
+
+    def __init__(
+        self,
+        pattern: str,
+        tables: Sequence[str],
+        on_not_modified: Optional[Callable[["re.Match"], None]] = None,
+    ):
+        self.pattern = re.compile(pattern)
+        self.tables = tuple(tables)
+        self.on_not_modified = on_not_modified
+
+
+def get_data_version(tables: Iterable[str]) -> Optional[str]:
+    """相关表的数据版本号; data_versions 表不存在或缺少某张表的版本时返回None"""
+    tables = list(tables)
+    placeholders = ",".join("?" * len(tables))
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"SELECT table_name, version FROM data_versions WHERE table_name IN ({placeholders})",
+                tables,
+            )
+            versions = {row[0]: row[1] for row in cursor.fetchall()}
+    except sqlite3.Error as e:
+        logger.debug(f"读取数据版本号失败, 不生成ETag: {str(e)}")
+        return None
+    if len(versions) != len(tables):
+        return None
+    return ",".join(f"{table}:{versions[table]}" for table in tables)
+
+
+def _accepts_gzip(headers: Headers) -> bool:
+    for coding in headers.get("accept-encoding", "").split(","):
+        name, _, params = coding.strip().partition(";")
+        if name.strip().lower() == "gzip":
+            return params.replace(" ", "") not in ("q=0", "q=0.0")
+    return False
+
+
+class JSONCacheMiddleware:
+    """JSON响应压缩 + 基于数据版本号的ETag/304 (纯ASGI中间件, 不影响流式与文件响应)"""
+
+    def __init__(self, app: ASGIApp, rules: Sequence[CacheRule] = ()):
+        self.app = app
+        self.rules: List[CacheRule] = list(rules)
+
+    def _match(self, path: str) -> Optional[Tuple[CacheRule, "re.Match"]]:
+        for rule in self.rules:
+            match = rule.pattern.match(path)
+            if match:
+                return rule, match
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        etag = None
+        matched = self._match(scope["path"])
+        if matched is not None:
+            rule, match = matched
+            version = get_data_version(rule.tables)
+            if version is not None:
+                etag = "W/" + make_etag(scope["path"], scope.get("query_string", b"").decode("latin-1"), version)
+                if_none_match = headers.get("if-none-match")
+                if if_none_match and etag_matches(if_none_match, etag):
+                    if rule.on_not_modified is not None:
+                        rule.on_not_modified(match)
+                    response = Response(
+                        status_code=304,
+                        headers={"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"},
+                    )
+                    await response(scope, receive, send)
+                    return
+
+        settings = get_settings()
+        gzip_level = settings.API_GZIP_LEVEL if _accepts_gzip(headers) else 0
+        responder = _JSONResponder(self.app, etag, gzip_level, settings.API_GZIP_MIN_BYTES)
+        await responder(scope, receive, send)
+
+
+class _JSONResponder:
+    """缓冲JSON响应体, 发送前压缩并附加ETag; 其他类型的响应原样透传"""
+
+    def __init__(self, app: ASGIApp, etag: Optional[str], gzip_level: int, min_bytes: int):
+        self.app = app
+        self.etag = etag
+        self.gzip_level = gzip_level
+        self.min_bytes = min_bytes
+        self.send: Send = None  # type: ignore[assignment]
+        self.start_message: Optional[Message] = None
+        self.passthrough = False
+        self.body = bytearray()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self._send)
+
+    async def _send(self, message: Message) -> None:
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        if message["type"] == "http.response.start":
+            headers = Headers(raw=message["headers"])
+            content_type = headers.get("content-type", "")
+            if not content_type.startswith("application/json") or "content-encoding" in headers:
+                self.passthrough = True
+                await self.send(message)
+                return
+            self.start_message = message
+            return
+
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        self.body += message.get("body", b"")
+        if message.get("more_body", False):
+            return
+
+        start = self.start_message
+        headers = MutableHeaders(raw=start["headers"])
+        body = bytes(self.body)
+        if self.etag is not None and start["status"] == 200:
+            headers["ETag"] = self.etag
+            headers["Cache-Control"] = "no-cache"
+        if self.gzip_level and len(body) >= self.min_bytes:
+            body = gzip.compress(body, compresslevel=self.gzip_level)
+            headers["Content-Encoding"] = "gzip"
+        headers.add_vary_header("Accept-Encoding")
+        headers["Content-Length"] = str(len(body))
+        await self.send(start)
+        await self.send({"type": "http.response.body", "body": body})
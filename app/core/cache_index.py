@@ -0,0 +1,355 @@
+"""
+本地磁盘缓存索引
+记录 CACHE_DIR 下每个缓存文件的大小、最后访问时间和命中次数,
+提供硬性字节预算与LRU/LFU淘汰, 清理只处理被淘汰的条目而不再遍历整个目录。
+
+索引在内存中维护。进程正常关闭时把索引快照写入 CACHE_DIR/.cache_inventory.json,
+下次启动直接加载快照(保留访问顺序与命中次数), 不再遍历缓存目录; 快照加载后即删除,
+因此只有正常关闭后留下的快照会被信任。快照不存在(首次启动、异常退出)时扫描一次缓存
+目录重建: 最后访问时间取文件mtime(缓存命中时会更新mtime), 命中次数从0开始。
+同一缓存目录的所有 FileManager 实例共享同一个索引。
+"""
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+# 流式下载写入中的临时文件后缀(见 FileManager._stream_file)
+PART_FILE_MARKER = ".part-"
+
+# 索引快照文件(位于缓存目录根下, 重建时跳过)
+INVENTORY_FILE = ".cache_inventory.json"
+INVENTORY_VERSION = 1
+
+
+class CacheEntry:
+    """单个缓存文件的索引信息"""
+
+    __slots__ = ('size', 'last_access', 'hits')
+
+    def __init__(self, size: int, last_access: float, hits: int = 0):
+        self.size = size
+        self.last_access = last_access
+        self.hits = hits
+
+
+class CacheIndex:
+    """单个缓存目录的索引
+
+    - _entries 按最后访问时间排序(最旧在前), LRU淘汰直接从头部弹出
+    - _frequency 按命中次数分桶, 桶内同样按最后访问排序, LFU淘汰取最小桶的头部
+    所有操作都在线程锁内完成, 可在线程池中调用。
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._frequency: Dict[int, "OrderedDict[str, None]"] = {}
+        self._loaded = False
+        self.source: Optional[str] = None
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    # ---------- 内部: 频次分桶 ----------
+
+    def _bucket_add(self, path: str, hits: int) -> None:
+        self._frequency.setdefault(hits, OrderedDict())[path] = None
+
+    def _bucket_remove(self, path: str, hits: int) -> None:
+        bucket = self._frequency.get(hits)
+        if bucket is None:
+            return
+        bucket.pop(path, None)
+        if not bucket:
+            del self._frequency[hits]
+
+    def _insert(self, path: str, entry: CacheEntry) -> None:
+        self._entries[path] = entry
+        self._bucket_add(path, entry.hits)
+        self.total_bytes += entry.size
+
+    def _pop(self, path: str) -> Optional[CacheEntry]:
+        entry = self._entries.pop(path, None)
+        if entry is not None:
+            self._bucket_remove(path, entry.hits)
+            self.total_bytes -= entry.size
+        return entry
+
+    # ---------- 加载 ----------
+
+    @property
+    def inventory_path(self) -> str:
+        return os.path.join(self.root, INVENTORY_FILE)
+
+    def ensure_loaded(self) -> None:
+        if not self._loaded:
+            self.load()
+
+    def load(self) -> None:
+        """优先加载索引快照, 没有可用快照时扫描目录重建"""
+        if not self.load_snapshot():
+            self.rebuild()
+
+    def load_snapshot(self) -> bool:
+        """加载并删除索引快照, 返回是否成功"""
+        path = self.inventory_path
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            logger.warning(f"读取缓存索引快照失败, 改为扫描目录: {str(e)}")
+            self._remove_inventory()
+            return False
+        # 先删除再使用: 本次进程异常退出时, 下次启动会重新扫描而不是沿用过期快照
+        self._remove_inventory()
+
+        if not isinstance(data, dict) or data.get('version') != INVENTORY_VERSION:
+            logger.warning("缓存索引快照版本不匹配, 改为扫描目录")
+            return False
+
+        with self._lock:
+            self._entries.clear()
+            self._frequency.clear()
+            self.total_bytes = 0
+            try:
+                for relative, size, last_access, hits in data.get('entries', []):
+                    abs_path = os.path.abspath(os.path.join(self.root, relative))
+                    self._insert(abs_path, CacheEntry(int(size), float(last_access), int(hits)))
+            except (TypeError, ValueError) as e:
+                logger.warning(f"缓存索引快照内容无效, 改为扫描目录: {str(e)}")
+                self._entries.clear()
+                self._frequency.clear()
+                self.total_bytes = 0
+                return False
+            self._loaded = True
+            self.source = 'snapshot'
+
+        logger.info(
+            f"缓存索引已从快照加载: {self.root} 共{len(self._entries)}个文件, "
+            f"{self.total_bytes / 1024 / 1024:.2f}MB"
+        )
+        return True
+
+    def save_snapshot(self) -> Optional[str]:
+        """把当前索引写入快照(先写临时文件再原子替换), 返回快照路径; 索引未加载时不写"""
+        with self._lock:
+            if not self._loaded:
+                return None
+            entries = [
+                [os.path.relpath(path, self.root), entry.size, entry.last_access, entry.hits]
+                for path, entry in self._entries.items()
+            ]
+
+        path = self.inventory_path
+        part_path = f"{path}{PART_FILE_MARKER}{os.getpid()}"
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            with open(part_path, 'w', encoding='utf-8') as f:
+                json.dump(
+                    {'version': INVENTORY_VERSION, 'saved_at': time.time(), 'entries': entries},
+                    f,
+                    separators=(',', ':'),
+                )
+            os.replace(part_path, path)
+        except OSError as e:
+            logger.error(f"写入缓存索引快照失败 {path}: {str(e)}")
+            try:
+                os.remove(part_path)
+            except OSError:
+                pass
+            return None
+
+        logger.info(f"缓存索引快照已保存: {path} 共{len(entries)}个文件")
+        return path
+
+    def _remove_inventory(self) -> None:
+        try:
+            os.remove(self.inventory_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"删除缓存索引快照失败 {self.inventory_path}: {str(e)}")
+
+    def rebuild(self) -> None:
+        """扫描缓存目录重建索引, 顺带删除上次进程中断遗留的下载临时文件"""
+        found: List[Tuple[float, str, int]] = []
+        stale_parts = 0
+
+        stack = [self.root]
+        while stack:
+            directory = stack.pop()
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(entry.path)
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            if entry.name.startswith(INVENTORY_FILE) and directory == self.root:
+                                if PART_FILE_MARKER in entry.name:
+                                    os.remove(entry.path)
+                                continue
+                            if PART_FILE_MARKER in entry.name:
+                                os.remove(entry.path)
+                                stale_parts += 1
+                                continue
+                            stat = entry.stat(follow_symlinks=False)
+                            found.append((stat.st_mtime, os.path.abspath(entry.path), stat.st_size))
+                        except OSError as e:
+                            logger.warning(f"索引缓存文件失败 {entry.path}: {str(e)}")
+            except FileNotFoundError:
+                continue
+
+        found.sort()
+        with self._lock:
+            self._entries.clear()
+            self._frequency.clear()
+            self.total_bytes = 0
+            for mtime, path, size in found:
+                self._insert(path, CacheEntry(size, mtime))
+            self._loaded = True
+            self.source = 'scan'
+
+        logger.info(
+            f"缓存索引重建完成: {self.root} 共{len(found)}个文件, "
+            f"{self.total_bytes / 1024 / 1024:.2f}MB, 清理临时文件{stale_parts}个"
+        )
+
+    # ---------- 查询与更新 ----------
+
+    def get(self, path: str) -> Optional[CacheEntry]:
+        self.ensure_loaded()
+        with self._lock:
+            return self._entries.get(os.path.abspath(path))
+
+    def record_hit(self, path: str) -> None:
+        """记录一次缓存命中: 移到LRU尾部并增加命中次数"""
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                return
+            self._bucket_remove(path, entry.hits)
+            entry.hits += 1
+            entry.last_access = time.time()
+            self._bucket_add(path, entry.hits)
+            self._entries.move_to_end(path)
+            self.hits += 1
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def add(self, path: str, size: int) -> None:
+        """登记新写入(或被覆盖)的缓存文件"""
+        self.ensure_loaded()
+        path = os.path.abspath(path)
+        with self._lock:
+            previous = self._pop(path)
+            hits = previous.hits if previous else 0
+            self._insert(path, CacheEntry(size, time.time(), hits))
+
+    def discard(self, path: str) -> None:
+        """从索引中移除(文件已被外部删除)"""
+        with self._lock:
+            self._pop(os.path.abspath(path))
+
+    # ---------- 淘汰 ----------
+
+    def _next_victim(self, policy: str) -> Optional[str]:
+        if not self._entries:
+            return None
+        if policy == 'lfu':
+            bucket = self._frequency[min(self._frequency)]
+            return next(iter(bucket))
+        return next(iter(self._entries))
+
+    def take_victims(
+        self,
+        max_bytes: int,
+        policy: str = 'lru',
+        expire_before: Optional[float] = None,
+        keep: Optional[str] = None
+    ) -> List[Tuple[str, int]]:
+        """选出需要淘汰的文件并从索引中移除, 返回 [(路径, 大小)], 由调用方删除文件
+
+        - expire_before: 最后访问早于该时间戳的条目一律淘汰(按LRU从头部取, 遇到未过期即停止)
+        - max_bytes: 字节预算, 超出部分按 policy 淘汰; <=0 表示不限制
+        - keep: 刚写入的文件, 预算淘汰时不选它(单个文件大于预算时除外)
+        工作量只与被淘汰的条目数成正比。
+        """
+        keep = os.path.abspath(keep) if keep else None
+        victims: List[Tuple[str, int]] = []
+
+        with self._lock:
+            if expire_before is not None:
+                while self._entries:
+                    path, entry = next(iter(self._entries.items()))
+                    if entry.last_access >= expire_before:
+                        break
+                    self._pop(path)
+                    victims.append((path, entry.size))
+
+            skipped: Optional[Tuple[str, CacheEntry]] = None
+            reserved = 0
+            while max_bytes > 0 and self.total_bytes + reserved > max_bytes:
+                path = self._next_victim(policy)
+                if path is None:
+                    break
+                entry = self._pop(path)
+                if path == keep and skipped is None:
+                    skipped, reserved = (path, entry), entry.size
+                    continue
+                victims.append((path, entry.size))
+            if skipped is not None:
+                if max_bytes > 0 and self.total_bytes + reserved > max_bytes:
+                    victims.append((skipped[0], reserved))
+                else:
+                    self._insert(*skipped)
+
+            self.evictions += len(victims)
+            self.evicted_bytes += sum(size for _, size in victims)
+
+        return victims
+
+    def stats(self) -> Dict[str, Any]:
+        self.ensure_loaded()
+        with self._lock:
+            return {
+                'inventory_source': self.source,
+                'total_files': len(self._entries),
+                'total_size': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'evicted_bytes': self.evicted_bytes,
+            }
+
+
+_indexes: Dict[str, CacheIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_cache_index(cache_dir: str) -> CacheIndex:
+    """获取缓存目录对应的共享索引(首次使用时加载快照或扫描目录)"""
+    root = os.path.abspath(cache_dir)
+    with _indexes_lock:
+        index = _indexes.get(root)
+        if index is None:
+            index = _indexes[root] = CacheIndex(root)
+    return index
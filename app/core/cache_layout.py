@@ -0,0 +1,144 @@
+"""
+磁盘缓存目录布局
+CACHE_LAYOUT 决定 WebDAV 文件在 CACHE_DIR 下的存放位置:
+
+- mirror(默认): 镜像WebDAV目录, files/2026/01/02/a.jpg -> CACHE_DIR/2026/01/02/a.jpg,
+  按日期目录无限增长
+- sharded: 按缓存键的哈希前缀分片, files/2026/01/02/a.jpg ->
+  CACHE_DIR/objects/3f/a2/3fa2...c1.jpg, 每级最多256个子目录, 目录大小与总文件数无关
+
+WebDAV文件名带时间戳、内容不会被改写, 缓存键(去掉 files/ 前缀的WebDAV路径)即可唯一
+标识文件内容, 因此按缓存键哈希寻址等价于按内容寻址, 且读取前无需先下载计算内容哈希。
+"""
+
+import os
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .cache_index import INVENTORY_FILE, PART_FILE_MARKER
+
+LAYOUT_MIRROR = "mirror"
+LAYOUT_SHARDED = "sharded"
+LAYOUTS = (LAYOUT_MIRROR, LAYOUT_SHARDED)
+
+# sharded 布局的根目录(相对 CACHE_DIR)
+OBJECTS_DIR = "objects"
+
+
+def cache_key(webdav_path: str) -> str:
+    """缓存键: 去掉 files/ 前缀的WebDAV相对路径"""
+    if webdav_path.startswith('files/'):
+        return webdav_path[6:]
+    return webdav_path.lstrip('/')
+
+
+def sharded_relative_path(key: str) -> str:
+    """sharded 布局下缓存键对应的相对路径(保留扩展名, 便于按类型排查)"""
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+    ext = os.path.splitext(key)[1].lower()
+    return os.path.join(OBJECTS_DIR, digest[:2], digest[2:4], f"{digest}{ext}")
+
+
+def relative_cache_path(webdav_path: str, layout: str) -> str:
+    """WebDAV路径在指定布局下相对 CACHE_DIR 的路径"""
+    key = cache_key(webdav_path)
+    if layout == LAYOUT_SHARDED:
+        return sharded_relative_path(key)
+    return key
+
+
+def cache_path_for(cache_dir: str, webdav_path: str, layout: str) -> str:
+    """WebDAV路径在指定布局下的本地缓存路径"""
+    return os.path.join(cache_dir, relative_cache_path(webdav_path, layout))
+
+
+def _iter_cache_files(root: str, skip_dir: Optional[str] = None) -> Iterator[Tuple[str, str]]:
+    """遍历缓存目录下的普通文件, 返回 (绝对路径, 相对路径); 跳过下载临时文件与索引快照"""
+    for directory, dirnames, filenames in os.walk(root):
+        if skip_dir is not None and directory == root:
+            dirnames[:] = [d for d in dirnames if d != skip_dir]
+        for name in filenames:
+            if PART_FILE_MARKER in name or (directory == root and name.startswith(INVENTORY_FILE)):
+                continue
+            path = os.path.join(directory, name)
+            yield path, os.path.relpath(path, root)
+
+
+def _remove_empty_dirs(root: str) -> None:
+    for directory, _, _ in sorted(os.walk(root), key=lambda item: len(item[0]), reverse=True):
+        if directory != root:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                pass
+
+
+def migrate_cache_dir(
+    cache_dir: str,
+    target: str,
+    webdav_paths: Optional[Iterable[str]] = None,
+    dry_run: bool = False
+) -> Dict[str, int]:
+    """把缓存目录中的文件迁移到目标布局(需在服务停止时执行)
+
+    - mirror -> sharded: 相对路径即缓存键, 全部可迁移
+    - sharded -> mirror: 哈希不可逆, 依赖 webdav_paths(上传记录中的WebDAV路径)反查缓存键;
+      查不到的文件直接删除(缓存可随时从WebDAV重新下载)
+    迁移后删除索引快照, 下次启动重新扫描目录。
+
+    Returns:
+        {'moved': 迁移数, 'skipped': 目标已存在而删除的重复文件数, 'removed': 无法反查而删除的文件数}
+    """
+    if target not in LAYOUTS:
+        raise ValueError(f"未知的缓存布局: {target}")
+
+    root = os.path.abspath(cache_dir)
+    stats = {'moved': 0, 'skipped': 0, 'removed': 0}
+    if not os.path.isdir(root):
+        return stats
+
+    if target == LAYOUT_SHARDED:
+        moves = [
+            (path, os.path.join(root, sharded_relative_path(relative.replace(os.sep, '/'))))
+            for path, relative in _iter_cache_files(root, skip_dir=OBJECTS_DIR)
+        ]
+        orphans: List[str] = []
+    else:
+        by_hash = {}
+        for webdav_path in webdav_paths or ():
+            key = cache_key(webdav_path)
+            by_hash[sharded_relative_path(key)] = key
+        moves, orphans = [], []
+        objects_root = os.path.join(root, OBJECTS_DIR)
+        for path, relative in _iter_cache_files(objects_root):
+            key = by_hash.get(os.path.join(OBJECTS_DIR, relative))
+            if key is None:
+                orphans.append(path)
+            else:
+                moves.append((path, os.path.join(root, key)))
+
+    for source, destination in moves:
+        if dry_run:
+            stats['moved'] += 1
+            continue
+        if os.path.exists(destination):
+            os.remove(source)
+            stats['skipped'] += 1
+            continue
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        os.replace(source, destination)
+        stats['moved'] += 1
+
+    for path in orphans:
+        if not dry_run:
+            os.remove(path)
+        stats['removed'] += 1
+
+    if not dry_run:
+        _remove_empty_dirs(root)
+        try:
+            os.remove(os.path.join(root, INVENTORY_FILE))
+        except FileNotFoundError:
+            pass
+
+    return stats
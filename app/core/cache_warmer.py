@@ -0,0 +1,208 @@
+"""
+缓存预热
+管理端按页审核最近的上传, 每张图片第一次打开都要从WebDAV冷读取。预热在后台把
+即将被查看的文件提前下载到磁盘缓存:
+
+- 下一页: 管理端查询记录列表时, 把下一页记录的文件加入队列(优先处理)
+- 最近上传: 定时任务把最近 CACHE_WARM_RECENT_HOURS 小时内的上传加入队列
+
+预热以最多 CACHE_WARM_CONCURRENCY 个并发在后台执行, 每次下载前等待前台文件请求
+空闲 CACHE_WARM_IDLE_MS 毫秒, 让路交互请求; WebDAV判定为不可用时暂停预热。
+与前台请求同时下载同一文件时共享同一次下载(见 FileManager._coalesced_download)。
+"""
+
+import time
+import asyncio
+from collections import deque
+from datetime import timedelta
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set
+
+from .config import get_settings
+from .database import get_db_connection
+from .logging_config import get_logger
+from .timezone import get_beijing_now_naive
+from .webdav_health import webdav_health
+
+logger = get_logger(__name__)
+
+
+class CacheWarmer:
+    """后台缓存预热队列(进程内共享)"""
+
+    def __init__(self, concurrency: int, queue_size: int, idle_seconds: float):
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.idle_seconds = idle_seconds
+        self.file_manager = None
+        self._queue: Deque[str] = deque()
+        self._queued: Set[str] = set()
+        self._workers: Set["asyncio.Task[None]"] = set()
+        self._last_interactive = 0.0
+        self.warmed = 0
+        self.skipped = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def _get_file_manager(self):
+        if self.file_manager is None:
+            from .file_manager import FileManager
+            self.file_manager = FileManager()
+        return self.file_manager
+
+    def note_interactive(self) -> None:
+        """记录一次前台文件请求, 预热在其后空闲一段时间才继续"""
+        self._last_interactive = time.monotonic()
+
+    def enqueue(self, webdav_paths: Iterable[str], priority: bool = False) -> int:
+        """加入预热队列, 返回新加入的数量
+
+        Args:
+            priority: 放到队首(下一页预取), 队列满时挤掉队尾的任务
+        """
+        paths = [p for p in dict.fromkeys(webdav_paths) if p and p not in self._queued]
+        if priority:
+            paths.reverse()
+
+        added = 0
+        for path in paths:
+            if len(self._queue) >= self.queue_size:
+                if not priority:
+                    self.dropped += 1
+                    continue
+                self._queued.discard(self._queue.pop())
+                self.dropped += 1
+            if priority:
+                self._queue.appendleft(path)
+            else:
+                self._queue.append(path)
+            self._queued.add(path)
+            added += 1
+
+        if added:
+            self._spawn_workers()
+        return added
+
+    def _spawn_workers(self) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # 不在事件循环中(如同步调用), 等下次入队或定时任务再启动
+            return
+        self._workers = {w for w in self._workers if not w.done() and w.get_loop() is loop}
+        while len(self._workers) < min(self.concurrency, len(self._queue)):
+            worker = loop.create_task(self._worker())
+            self._workers.add(worker)
+            worker.add_done_callback(self._workers.discard)
+
+    async def _wait_for_idle(self) -> None:
+        while True:
+            remaining = self.idle_seconds - (time.monotonic() - self._last_interactive)
+            if remaining <= 0:
+                return
+            await asyncio.sleep(remaining)
+
+    async def _worker(self) -> None:
+        file_manager = self._get_file_manager()
+        while self._queue:
+            await self._wait_for_idle()
+            if webdav_health.snapshot()['available'] is False:
+                logger.info(f"WebDAV不可用, 暂停缓存预热, 丢弃{len(self._queue)}个任务")
+                self.dropped += len(self._queue)
+                self._queue.clear()
+                self._queued.clear()
+                return
+            if not self._queue:
+                return
+
+            webdav_path = self._queue.popleft()
+            self._queued.discard(webdav_path)
+            try:
+                if await file_manager.prefetch(webdav_path):
+                    self.warmed += 1
+                else:
+                    self.skipped += 1
+            except Exception as e:
+                self.failed += 1
+                logger.debug(f"缓存预热失败 {webdav_path}: {str(e)}")
+
+    async def join(self) -> None:
+        """等待当前队列处理完毕"""
+        while True:
+            workers = [w for w in self._workers if not w.done()]
+            if not workers:
+                return
+            await asyncio.gather(*workers, return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'queued': len(self._queue),
+            'active_workers': sum(1 for w in self._workers if not w.done()),
+            'warmed': self.warmed,
+            'skipped': self.skipped,
+            'failed': self.failed,
+            'dropped': self.dropped,
+        }
+
+
+_cache_warmer: Optional[CacheWarmer] = None
+
+
+def get_cache_warmer() -> CacheWarmer:
+    """获取进程内共享的缓存预热器"""
+    global _cache_warmer
+    if _cache_warmer is None:
+        settings = get_settings()
+        _cache_warmer = CacheWarmer(
+            settings.CACHE_WARM_CONCURRENCY,
+            settings.CACHE_WARM_QUEUE_SIZE,
+            settings.CACHE_WARM_IDLE_MS / 1000,
+        )
+    return _cache_warmer
+
+
+def note_interactive_request() -> None:
+    """前台文件请求入口调用, 预热让路"""
+    if _cache_warmer is not None:
+        _cache_warmer.note_interactive()
+
+
+def warm_paths(webdav_paths: List[str], priority: bool = False) -> int:
+    """把文件加入预热队列(CACHE_WARM_ENABLED关闭时忽略)"""
+    if not get_settings().CACHE_WARM_ENABLED or not webdav_paths:
+        return 0
+    return get_cache_warmer().enqueue(webdav_paths, priority=priority)
+
+
+def load_recent_paths(hours: int, limit: int) -> List[str]:
+    """最近N小时内上传成功、尚未删除的文件的WebDAV路径(新的在前)"""
+    since = (get_beijing_now_naive() - timedelta(hours=hours)).isoformat()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT webdav_path
+            FROM upload_history
+            WHERE status = 'success'
+              AND deleted_at IS NULL
+              AND webdav_path IS NOT NULL
+              AND webdav_path != ''
+              AND upload_time >= ?
+            ORDER BY upload_time DESC
+            LIMIT ?
+            """,
+            (since, limit),
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+async def warm_recent_uploads() -> Dict[str, Any]:
+    """定时预热最近上传的文件, 等待本轮队列处理完成后返回统计"""
+    settings = get_settings()
+    if not settings.CACHE_WARM_ENABLED or settings.CACHE_WARM_RECENT_HOURS <= 0:
+        return {'queued': 0, 'skipped_reason': 'disabled'}
+
+    paths = load_recent_paths(settings.CACHE_WARM_RECENT_HOURS, settings.CACHE_WARM_RECENT_LIMIT)
+    warmer = get_cache_warmer()
+    queued = warmer.enqueue(paths)
+    await warmer.join()
+    return {'candidates': len(paths), 'queued': queued, **warmer.stats()}
@@ -65,11 +65,58 @@ class Settings(BaseSettings):
     WEBDAV_TIMEOUT: int = 30
     WEBDAV_RETRY_COUNT: int = 3
     WEBDAV_RETRY_DELAY: int = 5
+    WEBDAV_CHUNK_SIZE: int = 64 * 1024  # 流式上传/下载的分块大小(字节), 决定单次传输的内存峰值
+    WEBDAV_DIR_CACHE_TTL: int = 3600  # 已确认存在的远端目录缓存时间(秒), 0表示每次上传都MKCOL
+    # 上传后校验策略: propfind(每次PROPFIND比对大小) / trust(信任201/204及回显的ETag/Content-Length)
+    # / sample(按比例抽样PROPFIND, 其余同trust) / deferred(不校验, 交由完整性巡检任务批量校验)
+    WEBDAV_UPLOAD_VERIFY: str = "propfind"
+    WEBDAV_UPLOAD_VERIFY_SAMPLE_RATE: float = 0.1  # sample策略下执行PROPFIND的比例
+    WEBDAV_INTEGRITY_DIRS_PER_RUN: int = 30  # 完整性巡检每轮按游标轮转扫描的日期目录数
+    WEBDAV_INTEGRITY_RECENT_DAYS: int = 2    # 最近N个日期目录每轮都扫描(覆盖deferred校验的新上传)
 
     # 缓存配置
     CACHE_DIR: str = "./cache"
     CACHE_DAYS: int = 7
+    CACHE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024  # 缓存目录硬性容量上限(字节), 0表示不限制
+    CACHE_EVICTION_POLICY: str = "lru"  # 超出容量时的淘汰策略: lru(最久未访问) / lfu(命中次数最少)
+    CACHE_LAYOUT: str = "mirror"  # 缓存目录布局: mirror(镜像WebDAV日期目录) / sharded(按哈希前缀分片)
+    HOT_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # 进程内热点对象缓存容量(字节), 0表示关闭
+    HOT_CACHE_MAX_OBJECT_BYTES: int = 2 * 1024 * 1024  # 单个对象超过该大小不进入内存缓存
+    # 缓存预热: 管理端翻页时预取下一页图片, 并定时预取最近上传的文件
+    CACHE_WARM_ENABLED: bool = True
+    CACHE_WARM_CONCURRENCY: int = 2  # 同时进行的预热下载数
+    CACHE_WARM_QUEUE_SIZE: int = 500  # 预热队列上限, 超出的任务直接丢弃
+    CACHE_WARM_IDLE_MS: int = 500  # 最近一次前台文件请求之后空闲该时长才继续预热(让路交互请求)
+    CACHE_WARM_RECENT_HOURS: int = 24  # 定时预热最近N小时内的上传, 0表示关闭定时预热
+    CACHE_WARM_RECENT_LIMIT: int = 200  # 定时预热每轮最多处理的文件数
+    CACHE_WARM_INTERVAL_MINUTES: int = 10  # 定时预热间隔
+    # 分层存储策略: 按访问时间/次数在 本地备份、磁盘缓存、WebDAV 之间移动对象
+    # 默认关闭: 降级会删除本地备份或移入可淘汰的磁盘缓存, 确认WebDAV存储可靠后再开启
+    STORAGE_TIERING_ENABLED: bool = False
+    STORAGE_TIERING_INTERVAL_MINUTES: int = 60  # 策略执行间隔
+    STORAGE_HOT_DAYS: int = 3  # N天内访问过(或上传)的对象为hot, 保证本地可读
+    STORAGE_HOT_MIN_HITS: int = 3  # CACHE_DAYS内缓存命中次数达到该值的对象也视为hot
+    STORAGE_LOCAL_RETENTION_DAYS: int = 30  # 本地备份保留天数, 超过后非hot对象降级(移入缓存或删除)
+    STORAGE_TIERING_MAX_MOVES: int = 200  # 每轮最多降级的本地备份数(每个需一次PROPFIND与一次完整下载校验)
+    # 删除记录的存储回收: 软删除后过了宽限期, 由定时任务删除本地备份、缓存和WebDAV上的文件
+    # 默认关闭; 只回收启用后删除的记录, 此前已删除的记录需用 scripts/enqueue_deleted_records.py 显式加入
+    DELETE_REAPER_ENABLED: bool = False
+    DELETE_REAPER_INTERVAL_MINUTES: int = 30  # 回收任务执行间隔
+    DELETE_GRACE_HOURS: int = 24  # 软删除后保留物理文件的小时数
+    DELETE_REAPER_BATCH_SIZE: int = 500  # 每轮最多回收的记录数
+    DELETE_REAPER_CONCURRENCY: int = 4  # 并发的WebDAV DELETE请求数
     TEMP_STORAGE_DIR: str = "./temp_storage"
+    IO_EXECUTOR_WORKERS: int = 4  # 磁盘I/O线程池大小(缓存/临时存储/本地备份的文件读写)
+    # 管理端导出: ZIP流式生成
+    EXPORT_IMAGE_CONCURRENCY: int = 8  # 导出ZIP时并发获取图片数
+    EXPORT_ZIP_QUEUE_SIZE: int = 16  # 已获取、等待写入ZIP的图片数上限(限制导出占用的内存)
+    # 管理端导出: 后台导出任务
+    EXPORT_JOB_DIR: str = "./data/exports"  # 导出任务生成的文件目录
+    EXPORT_JOB_TTL_MINUTES: int = 60  # 导出文件保留时间, 期间相同筛选条件的导出直接复用
+    EXPORT_JOB_CONCURRENCY: int = 2  # 同时执行的导出任务数, 其余排队
+    # JSON接口压缩(ETag重验证见 app.core.api_cache)
+    API_GZIP_MIN_BYTES: int = 1024  # 响应体达到该字节数才压缩
+    API_GZIP_LEVEL: int = 6  # gzip压缩级别, 0表示不压缩
 
     # 备份配置
     BACKUP_RETENTION_DAYS: int = 30
@@ -77,8 +124,18 @@ class Settings(BaseSettings):
     BACKUP_ENABLED: bool = True
 
     # WebDAV健康检查配置
-    HEALTH_CHECK_INTERVAL: int = 60  # 秒
+    HEALTH_CHECK_INTERVAL: int = 60  # 秒, 无真实请求时主动探测的间隔
+    HEALTH_WINDOW_SIZE: int = 10  # 被动健康统计的滑动窗口大小(最近N次WebDAV请求结果)
+    HEALTH_WINDOW_SECONDS: int = 300  # 超过该时间的请求结果不再参与统计
+    HEALTH_FAILURE_RATE: float = 0.5  # 窗口内失败率达到该值即判定为不可用
     SYNC_RETRY_INTERVAL: int = 300   # 5分钟
+    # 待同步文件补传: 并发上限按上传耗时与失败自适应(AIMD), 失败文件指数退避
+    SYNC_MIN_CONCURRENCY: int = 1
+    SYNC_MAX_CONCURRENCY: int = 8
+    SYNC_TARGET_LATENCY_MS: int = 3000  # 单个文件上传耗时超过该值视为WebDAV过载, 并发减半
+    SYNC_BATCH_SIZE: int = 1000  # 每轮最多领取的文件数(最近加入的优先)
+    SYNC_BACKOFF_BASE_SECONDS: int = 30  # 首次失败后的重试等待, 之后每次翻倍
+    SYNC_BACKOFF_MAX_SECONDS: int = 3600  # 重试等待上限
 
     # Token缓存配置
     TOKEN_CACHE_DURATION: int = 3600  # 1小时
@@ -162,6 +219,106 @@ class Settings(BaseSettings):
         if self.WEBDAV_RETRY_DELAY > 60:
             raise ValueError("WebDAV重试延迟不能超过60秒")
 
+        if not (4 * 1024 <= self.WEBDAV_CHUNK_SIZE <= 8 * 1024 * 1024):
+            raise ValueError("WEBDAV_CHUNK_SIZE必须在4KB-8MB之间")
+
+        if not (0 <= self.WEBDAV_DIR_CACHE_TTL <= 86400):
+            raise ValueError("WEBDAV_DIR_CACHE_TTL必须在0-86400秒之间")
+
+        self.WEBDAV_UPLOAD_VERIFY = self.WEBDAV_UPLOAD_VERIFY.strip().lower()
+        if self.WEBDAV_UPLOAD_VERIFY not in ('propfind', 'trust', 'sample', 'deferred'):
+            raise ValueError("WEBDAV_UPLOAD_VERIFY必须是propfind、trust、sample或deferred")
+        if not (0 <= self.WEBDAV_UPLOAD_VERIFY_SAMPLE_RATE <= 1):
+            raise ValueError("WEBDAV_UPLOAD_VERIFY_SAMPLE_RATE必须在0-1之间")
+        if not (1 <= self.WEBDAV_INTEGRITY_DIRS_PER_RUN <= 1000):
+            raise ValueError("WEBDAV_INTEGRITY_DIRS_PER_RUN必须在1-1000之间")
+        if not (0 <= self.WEBDAV_INTEGRITY_RECENT_DAYS <= 31):
+            raise ValueError("WEBDAV_INTEGRITY_RECENT_DAYS必须在0-31之间")
+
+        # 验证缓存配置
+        if self.CACHE_MAX_BYTES < 0:
+            raise ValueError("CACHE_MAX_BYTES不能为负数")
+        self.CACHE_EVICTION_POLICY = self.CACHE_EVICTION_POLICY.strip().lower()
+        if self.CACHE_EVICTION_POLICY not in ('lru', 'lfu'):
+            raise ValueError("CACHE_EVICTION_POLICY必须是lru或lfu")
+        self.CACHE_LAYOUT = self.CACHE_LAYOUT.strip().lower()
+        if self.CACHE_LAYOUT not in ('mirror', 'sharded'):
+            raise ValueError("CACHE_LAYOUT必须是mirror或sharded")
+        if self.HOT_CACHE_MAX_BYTES < 0:
+            raise ValueError("HOT_CACHE_MAX_BYTES不能为负数")
+        if self.HOT_CACHE_MAX_OBJECT_BYTES <= 0:
+            raise ValueError("HOT_CACHE_MAX_OBJECT_BYTES必须大于0")
+        if not (1 <= self.IO_EXECUTOR_WORKERS <= 64):
+            raise ValueError("IO_EXECUTOR_WORKERS必须在1-64之间")
+        if not (1 <= self.EXPORT_IMAGE_CONCURRENCY <= 32):
+            raise ValueError("EXPORT_IMAGE_CONCURRENCY必须在1-32之间")
+        if self.EXPORT_ZIP_QUEUE_SIZE <= 0:
+            raise ValueError("EXPORT_ZIP_QUEUE_SIZE必须大于0")
+        if self.EXPORT_JOB_TTL_MINUTES <= 0:
+            raise ValueError("EXPORT_JOB_TTL_MINUTES必须大于0")
+        if not (1 <= self.EXPORT_JOB_CONCURRENCY <= 8):
+            raise ValueError("EXPORT_JOB_CONCURRENCY必须在1-8之间")
+        if self.API_GZIP_MIN_BYTES < 0:
+            raise ValueError("API_GZIP_MIN_BYTES不能为负数")
+        if not (0 <= self.API_GZIP_LEVEL <= 9):
+            raise ValueError("API_GZIP_LEVEL必须在0-9之间")
+        if not (1 <= self.CACHE_WARM_CONCURRENCY <= 16):
+            raise ValueError("CACHE_WARM_CONCURRENCY必须在1-16之间")
+        if self.CACHE_WARM_QUEUE_SIZE <= 0:
+            raise ValueError("CACHE_WARM_QUEUE_SIZE必须大于0")
+        if self.CACHE_WARM_IDLE_MS < 0:
+            raise ValueError("CACHE_WARM_IDLE_MS不能为负数")
+        if self.CACHE_WARM_RECENT_HOURS < 0:
+            raise ValueError("CACHE_WARM_RECENT_HOURS不能为负数")
+        if self.CACHE_WARM_RECENT_LIMIT <= 0:
+            raise ValueError("CACHE_WARM_RECENT_LIMIT必须大于0")
+        if self.CACHE_WARM_INTERVAL_MINUTES <= 0:
+            raise ValueError("CACHE_WARM_INTERVAL_MINUTES必须大于0")
+
+        # 验证分层存储策略配置
+        if self.STORAGE_TIERING_INTERVAL_MINUTES <= 0:
+            raise ValueError("STORAGE_TIERING_INTERVAL_MINUTES必须大于0")
+        if self.STORAGE_HOT_DAYS < 0:
+            raise ValueError("STORAGE_HOT_DAYS不能为负数")
+        if self.STORAGE_HOT_MIN_HITS <= 0:
+            raise ValueError("STORAGE_HOT_MIN_HITS必须大于0")
+        if self.STORAGE_LOCAL_RETENTION_DAYS < 1:
+            raise ValueError("STORAGE_LOCAL_RETENTION_DAYS不能小于1")
+        if self.STORAGE_TIERING_MAX_MOVES < 0:
+            raise ValueError("STORAGE_TIERING_MAX_MOVES不能为负数")
+        if self.DELETE_REAPER_INTERVAL_MINUTES <= 0:
+            raise ValueError("DELETE_REAPER_INTERVAL_MINUTES必须大于0")
+        if self.DELETE_GRACE_HOURS < 0:
+            raise ValueError("DELETE_GRACE_HOURS不能为负数")
+        if self.DELETE_REAPER_BATCH_SIZE <= 0:
+            raise ValueError("DELETE_REAPER_BATCH_SIZE必须大于0")
+        if not (1 <= self.DELETE_REAPER_CONCURRENCY <= 16):
+            raise ValueError("DELETE_REAPER_CONCURRENCY必须在1-16之间")
+
+        # 验证WebDAV健康统计配置
+        if self.HEALTH_CHECK_INTERVAL <= 0:
+            raise ValueError("HEALTH_CHECK_INTERVAL必须大于0")
+        if not (1 <= self.HEALTH_WINDOW_SIZE <= 1000):
+            raise ValueError("HEALTH_WINDOW_SIZE必须在1-1000之间")
+        if self.HEALTH_WINDOW_SECONDS <= 0:
+            raise ValueError("HEALTH_WINDOW_SECONDS必须大于0")
+        if not (0 < self.HEALTH_FAILURE_RATE <= 1):
+            raise ValueError("HEALTH_FAILURE_RATE必须在0-1之间(不含0)")
+
+        # 验证待同步文件补传配置
+        if self.SYNC_MIN_CONCURRENCY < 1:
+            raise ValueError("SYNC_MIN_CONCURRENCY必须大于0")
+        if not (self.SYNC_MIN_CONCURRENCY <= self.SYNC_MAX_CONCURRENCY <= 32):
+            raise ValueError("SYNC_MAX_CONCURRENCY必须在SYNC_MIN_CONCURRENCY-32之间")
+        if self.SYNC_TARGET_LATENCY_MS <= 0:
+            raise ValueError("SYNC_TARGET_LATENCY_MS必须大于0")
+        if self.SYNC_BATCH_SIZE <= 0:
+            raise ValueError("SYNC_BATCH_SIZE必须大于0")
+        if self.SYNC_BACKOFF_BASE_SECONDS < 0:
+            raise ValueError("SYNC_BACKOFF_BASE_SECONDS不能为负数")
+        if self.SYNC_BACKOFF_MAX_SECONDS < self.SYNC_BACKOFF_BASE_SECONDS:
+            raise ValueError("SYNC_BACKOFF_MAX_SECONDS不能小于SYNC_BACKOFF_BASE_SECONDS")
+
         # 验证用友云上传失败重试配置
         if self.YONYOU_RETRY_INTERVAL_HOURS <= 0:
             raise ValueError("YONYOU_RETRY_INTERVAL_HOURS必须大于0")
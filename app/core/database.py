@@ -11,6 +11,24 @@ settings = get_settings()
 db_lock = threading.RLock()
 
 
+# 维护数据版本号的表 -> 计入版本的UPDATE字段(None表示任意字段)
+# logistics_tokens 每次门户访问都会更新 last_access_at, 只有影响门户内容的字段计入版本
+VERSIONED_TABLES = {
+    'upload_history': None,
+    'delivery_snapshot': None,
+    'app_meta': None,
+    'logistics_tokens': ('logistics_name', 'token', 'enabled'),
+    'name_dictionary': None,
+}
+
+
+# 名称字典收录的 upload_history 字段(字段名即字典的 kind): 物流公司下拉、客户名称联想
+NAME_DICTIONARY_COLUMNS = ('logistics', 'customer_name')
+
+# upload_history 中影响日汇总的字段; 只修改其他字段(备注、检查状态等)的UPDATE不触发汇总维护
+DAILY_ROLLUP_COLUMNS = ('upload_time', 'status', 'logistics', 'doc_type', 'deleted_at', 'yonyou_latency_ms')
+
+
 @contextmanager
 def get_db_connection():
     """获取数据库连接的上下文管理器，确保并发安全"""
@@ -116,6 +134,10 @@ def init_database():
         if 'upload_type' not in columns:
             cursor.execute("ALTER TABLE upload_history ADD COLUMN upload_type VARCHAR(20)")
 
+        # 添加用友云上传耗时字段 (最后一次上传请求的毫秒数, 用于日汇总的延迟统计)
+        if 'yonyou_latency_ms' not in columns:
+            cursor.execute("ALTER TABLE upload_history ADD COLUMN yonyou_latency_ms INTEGER DEFAULT NULL")
+
         # 创建索引
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_business_id
@@ -187,6 +209,12 @@ def init_database():
             ON upload_history(upload_type, upload_time)
         """)
 
+        # 管理端筛选维度分组计数(facets)的覆盖索引: 只按日期和这些维度筛选时不回表
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_records_facets
+            ON upload_history(deleted_at, upload_time, status, logistics, doc_type, upload_type)
+        """)
+
         # 物流专属链接token表 (物流待上传门户)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS logistics_tokens (
@@ -252,9 +280,208 @@ def init_database():
             )
         """)
 
+        # WebDAV完整性巡检发现的问题 (每条上传记录最多一行, 复查正常后标记resolved_at)
+        # issue: missing(远端不存在) / zero_size(远端0字节) / size_mismatch(大小不一致)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS webdav_integrity_findings (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                record_id INTEGER NOT NULL UNIQUE,
+                webdav_path TEXT NOT NULL,
+                file_name TEXT,
+                expected_size INTEGER,
+                remote_size INTEGER,
+                issue TEXT NOT NULL,
+                first_seen_at DATETIME,
+                last_seen_at DATETIME,
+                resolved_at DATETIME
+            )
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_wif_resolved_last_seen
+            ON webdav_integrity_findings(resolved_at, last_seen_at)
+        """)
+
+        # 待同步到WebDAV的临时文件队列 (取代 temp_storage/pending_sync.json)
+        # state: pending(等待同步) / syncing(处理中); next_attempt_at 为Unix时间戳
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS pending_sync_queue (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                webdav_path TEXT NOT NULL UNIQUE,
+                temp_path TEXT NOT NULL,
+                filename TEXT,
+                file_size INTEGER,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                created_at DATETIME,
+                updated_at DATETIME
+            )
+        """)
+
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_psq_state_next_attempt
+            ON pending_sync_queue(state, next_attempt_at)
+        """)
+
+        # 删除记录的存储回收队列: 启用回收(DELETE_REAPER_ENABLED)后软删除时加入, 宽限期后由回收任务删除物理文件
+        # 之前已软删除的记录不会自动加入, 需要时用 scripts/enqueue_deleted_records.py 显式加入
+        # state: pending(等待回收) / reaping(处理中); next_attempt_at 为宽限期结束或下次重试的Unix时间戳
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS deletion_queue (
+                record_id INTEGER PRIMARY KEY,
+                state TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                next_attempt_at REAL NOT NULL DEFAULT 0,
+                created_at DATETIME,
+                updated_at DATETIME
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_dq_state_next_attempt
+            ON deletion_queue(state, next_attempt_at)
+        """)
+
+        # 名称字典: upload_history 中出现过的物流公司/客户名称, 由触发器维护,
+        # 下拉选项与联想不必对全表做 DISTINCT
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'name_dictionary'"
+        )
+        dictionary_exists = cursor.fetchone() is not None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS name_dictionary (
+                kind TEXT NOT NULL,
+                name TEXT NOT NULL,
+                PRIMARY KEY (kind, name)
+            ) WITHOUT ROWID
+        """)
+        for column in NAME_DICTIONARY_COLUMNS:
+            add = (
+                f"INSERT OR IGNORE INTO name_dictionary (kind, name) "
+                f"SELECT '{column}', NEW.{column} WHERE NULLIF(NEW.{column}, '') IS NOT NULL;"
+            )
+            # 最后一条使用该名称的记录被删除或改名时移出字典
+            prune = (
+                f"DELETE FROM name_dictionary WHERE kind = '{column}' AND name = OLD.{column} "
+                f"AND NOT EXISTS (SELECT 1 FROM upload_history WHERE {column} = OLD.{column});"
+            )
+            for trigger, event, condition, body in (
+                ("insert", "INSERT", f"NEW.{column} IS NOT NULL", add),
+                ("update", f"UPDATE OF {column}", f"OLD.{column} IS NOT NEW.{column}", add + prune),
+                ("delete", "DELETE", f"OLD.{column} IS NOT NULL", prune),
+            ):
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_names_{column}_{trigger}
+                    AFTER {event} ON upload_history
+                    WHEN {condition}
+                    BEGIN {body} END
+                """)
+            if not dictionary_exists:
+                cursor.execute(f"""
+                    INSERT OR IGNORE INTO name_dictionary (kind, name)
+                    SELECT DISTINCT '{column}', {column} FROM upload_history
+                    WHERE {column} IS NOT NULL AND {column} != ''
+                """)
+
+        # 数据版本号: 表内容每变化一次加1, 供JSON接口生成ETag(见 app.core.api_cache)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS data_versions (
+                table_name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+
+        for table, update_columns in VERSIONED_TABLES.items():
+            cursor.execute(
+                "INSERT OR IGNORE INTO data_versions (table_name, version) VALUES (?, 0)", (table,)
+            )
+            bump = f"UPDATE data_versions SET version = version + 1 WHERE table_name = '{table}';"
+            update_of = f" OF {', '.join(update_columns)}" if update_columns else ""
+            for event in ("INSERT", f"UPDATE{update_of}", "DELETE"):
+                trigger = f"trg_{table}_version_{event.split()[0].lower()}"
+                cursor.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS {trigger}
+                    AFTER {event} ON {table}
+                    BEGIN {bump} END
+                """)
+
+        # 上传日汇总: 按 (日期, 物流公司, 单据类型) 计数, 由触发器随 upload_history 增量维护
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'upload_daily_stats'"
+        )
+        rollup_exists = cursor.fetchone() is not None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS upload_daily_stats (
+                day TEXT NOT NULL,
+                logistics TEXT NOT NULL DEFAULT '',
+                doc_type TEXT NOT NULL DEFAULT '',
+                total INTEGER NOT NULL DEFAULT 0,
+                success_count INTEGER NOT NULL DEFAULT 0,
+                failed_count INTEGER NOT NULL DEFAULT 0,
+                latency_total_ms INTEGER NOT NULL DEFAULT 0,
+                latency_count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, logistics, doc_type)
+            ) WITHOUT ROWID
+        """)
+
+        for trigger, event, row, sign in (
+            ("trg_upload_daily_insert", "INSERT", "NEW", "+"),
+            ("trg_upload_daily_update_old", f"UPDATE OF {', '.join(DAILY_ROLLUP_COLUMNS)}", "OLD", "-"),
+            ("trg_upload_daily_update_new", f"UPDATE OF {', '.join(DAILY_ROLLUP_COLUMNS)}", "NEW", "+"),
+            ("trg_upload_daily_delete", "DELETE", "OLD", "-"),
+        ):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {trigger}
+                AFTER {event} ON upload_history
+                WHEN {row}.deleted_at IS NULL AND DATE({row}.upload_time) IS NOT NULL
+                BEGIN {_daily_rollup_sql(row, sign)} END
+            """)
+
+        if not rollup_exists:
+            # 新建汇总表(含旧库升级): 从现有记录回填
+            rebuild_upload_daily_stats(cursor)
+
         conn.commit()
 
 
+def _daily_rollup_sql(row: str, sign: str) -> str:
+    """触发器语句: 把一行记录的贡献计入(sign='+')或移出(sign='-')日汇总"""
+    key = (
+        f"DATE({row}.upload_time), COALESCE({row}.logistics, ''), COALESCE({row}.doc_type, '')"
+    )
+    return f"""
+        INSERT OR IGNORE INTO upload_daily_stats (day, logistics, doc_type) VALUES ({key});
+        UPDATE upload_daily_stats
+        SET total = total {sign} 1,
+            success_count = success_count {sign} ({row}.status = 'success'),
+            failed_count = failed_count {sign} ({row}.status = 'failed'),
+            latency_total_ms = latency_total_ms {sign} COALESCE({row}.yonyou_latency_ms, 0),
+            latency_count = latency_count {sign} ({row}.yonyou_latency_ms IS NOT NULL)
+        WHERE (day, logistics, doc_type) = ({key});
+    """
+
+
+def rebuild_upload_daily_stats(cursor) -> int:
+    """按 upload_history 重建日汇总(在调用方的事务内执行), 返回汇总行数"""
+    cursor.execute("DELETE FROM upload_daily_stats")
+    cursor.execute("""
+        INSERT INTO upload_daily_stats
+            (day, logistics, doc_type, total, success_count, failed_count, latency_total_ms, latency_count)
+        SELECT DATE(upload_time), COALESCE(logistics, ''), COALESCE(doc_type, ''),
+               COUNT(*),
+               SUM(status = 'success'),
+               SUM(status = 'failed'),
+               COALESCE(SUM(yonyou_latency_ms), 0),
+               COUNT(yonyou_latency_ms)
+        FROM upload_history
+        WHERE deleted_at IS NULL AND DATE(upload_time) IS NOT NULL
+        GROUP BY 1, 2, 3
+    """)
+    return cursor.rowcount
+
+
 def verify_database_schema():
     """
     验证数据库schema是否包含WebDAV支持所需的必需字段
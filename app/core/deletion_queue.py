@@ -0,0 +1,365 @@
+"""
+删除记录的存储回收队列
+管理端删除记录只做软删除(标记 deleted_at); 启用回收(DELETE_REAPER_ENABLED, 默认关闭)时
+同一事务内把记录加入 deletion_queue 表, 接口不等待任何文件操作。宽限期(DELETE_GRACE_HOURS)过后由定时任务批量回收物理文件:
+本地备份(LOCAL_STORAGE_PATH 下的 local_file_path)、内存/磁盘缓存和WebDAV上的对象。
+
+- 启用前已删除的记录不会自动加入, 需要时由 scripts/enqueue_deleted_records.py 显式加入
+- 记录在宽限期内被恢复(deleted_at 已清空)或已不存在时直接移出队列, 不删除文件
+- 文件仍被其他未删除的记录引用时只移出队列, 不删除该文件
+- 文件还在待同步队列中(WebDAV上可能还没有)时推迟, 等补传完成后再删
+- WebDAV DELETE 并发数受 DELETE_REAPER_CONCURRENCY 限制; 远端已不存在视为删除成功
+- 删除失败按指数退避(SYNC_BACKOFF_*)推迟下次尝试
+
+与分层存储一样, 先读出条目, 网络请求和文件操作在数据库连接之外完成,
+持有全局数据库锁期间不做网络 I/O。
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import get_settings
+from .database import get_db_connection
+from .io_executor import run_io
+from .sync_concurrency import backoff_delay
+from . import sync_queue
+from .timezone import get_beijing_now_naive_iso
+
+if TYPE_CHECKING:
+    from .file_manager import FileManager
+
+logger = logging.getLogger(__name__)
+
+STATE_PENDING = "pending"
+STATE_REAPING = "reaping"
+
+# 单条 ... IN (...) 的参数个数上限(SQLite默认999)
+_SQL_BATCH = 500
+
+
+def enqueue(cursor, record_ids: List[int], deleted_at: str, grace_seconds: Optional[float] = None) -> int:
+    """把刚软删除的记录加入回收队列, 返回加入的条数
+
+    使用调用方的游标, 与软删除的UPDATE在同一事务中提交; 只加入 deleted_at 与本次删除时间
+    一致的记录(之前已删除的记录不会重新计算宽限期)。
+    """
+    if not record_ids:
+        return 0
+    if grace_seconds is None:
+        grace_seconds = get_settings().DELETE_GRACE_HOURS * 3600
+    due = time.time() + grace_seconds
+    now = get_beijing_now_naive_iso()
+    added = 0
+    for i in range(0, len(record_ids), _SQL_BATCH):
+        batch = record_ids[i:i + _SQL_BATCH]
+        placeholders = ",".join("?" * len(batch))
+        cursor.execute(
+            f"""
+            INSERT OR IGNORE INTO deletion_queue (record_id, state, next_attempt_at, created_at, updated_at)
+            SELECT id, ?, ?, ?, ? FROM upload_history
+            WHERE id IN ({placeholders}) AND deleted_at = ?
+            """,
+            [STATE_PENDING, due, now, now, *batch, deleted_at],
+        )
+        added += cursor.rowcount
+    return added
+
+
+def _deleted_not_queued_sql(deleted_before: Optional[str]) -> Tuple[str, List[Any]]:
+    where = "h.deleted_at IS NOT NULL AND q.record_id IS NULL"
+    params: List[Any] = []
+    if deleted_before:
+        where += " AND h.deleted_at < ?"
+        params.append(deleted_before)
+    return (
+        f"FROM upload_history h LEFT JOIN deletion_queue q ON q.record_id = h.id WHERE {where}",
+        params,
+    )
+
+
+def count_deleted_not_queued(deleted_before: Optional[str] = None) -> int:
+    """已软删除但不在回收队列中的记录数(启用回收前删除的记录)"""
+    from_sql, params = _deleted_not_queued_sql(deleted_before)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) {from_sql}", params)
+        return cursor.fetchone()[0]
+
+
+def enqueue_deleted(deleted_before: Optional[str] = None, grace_seconds: Optional[float] = None) -> int:
+    """把已软删除但不在队列中的记录显式加入回收队列, 返回加入的条数
+
+    启用回收前删除的记录不会自动回收, 只由 scripts/enqueue_deleted_records.py 调用;
+    同样要等宽限期(从加入时算起)过后才会被回收。
+    """
+    if grace_seconds is None:
+        grace_seconds = get_settings().DELETE_GRACE_HOURS * 3600
+    now = get_beijing_now_naive_iso()
+    from_sql, params = _deleted_not_queued_sql(deleted_before)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            INSERT OR IGNORE INTO deletion_queue (record_id, state, next_attempt_at, created_at, updated_at)
+            SELECT h.id, ?, ?, ?, ? {from_sql}
+            """,
+            [STATE_PENDING, time.time() + grace_seconds, now, now, *params],
+        )
+        conn.commit()
+        return cursor.rowcount
+
+
+def claim_due(limit: Optional[int] = None, now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """领取宽限期已过(或已到重试时间)的条目并标记为reaping, 附带记录当前的文件路径"""
+    now = time.time() if now is None else now
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT q.record_id, q.attempts, h.deleted_at, h.webdav_path, h.local_file_path
+            FROM deletion_queue q
+            LEFT JOIN upload_history h ON h.id = q.record_id
+            WHERE q.state = ? AND q.next_attempt_at <= ?
+            ORDER BY q.next_attempt_at, q.record_id
+            LIMIT ?
+            """,
+            (STATE_PENDING, now, -1 if limit is None else limit),
+        )
+        items = [dict(row) for row in cursor.fetchall()]
+        if items:
+            placeholders = ",".join("?" * len(items))
+            cursor.execute(
+                f"UPDATE deletion_queue SET state = ?, updated_at = ? WHERE record_id IN ({placeholders})",
+                [STATE_REAPING, get_beijing_now_naive_iso(), *[item["record_id"] for item in items]],
+            )
+        conn.commit()
+    return items
+
+
+def mark_done(record_ids: List[int]) -> None:
+    """回收完成(或无需回收), 移出队列"""
+    if not record_ids:
+        return
+    with get_db_connection() as conn:
+        for i in range(0, len(record_ids), _SQL_BATCH):
+            batch = record_ids[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            conn.execute(f"DELETE FROM deletion_queue WHERE record_id IN ({placeholders})", batch)
+        conn.commit()
+
+
+def mark_failed(record_id: int, error: str, retry_delay: float = 0, count_attempt: bool = True) -> None:
+    """放回pending, retry_delay 秒后才会再次被领取; count_attempt=False 时不计失败次数(推迟)"""
+    with get_db_connection() as conn:
+        conn.execute(
+            """
+            UPDATE deletion_queue
+            SET state = ?, attempts = attempts + ?, last_error = ?,
+                next_attempt_at = ?, updated_at = ?
+            WHERE record_id = ?
+            """,
+            (STATE_PENDING, 1 if count_attempt else 0, error[:1000], time.time() + retry_delay,
+             get_beijing_now_naive_iso(), record_id),
+        )
+        conn.commit()
+
+
+def release_stale_claims() -> int:
+    """进程重启后把上次未处理完的reaping条目放回pending, 返回条目数"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE deletion_queue SET state = ? WHERE state = ?",
+            (STATE_PENDING, STATE_REAPING),
+        )
+        conn.commit()
+        return cursor.rowcount
+
+
+def get_queue_stats() -> Dict[str, Any]:
+    """队列统计: 条目数、宽限期已过的条目数、重试中的条目数、最近一次错误"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT
+                COUNT(*) AS total,
+                SUM(CASE WHEN state = ? AND next_attempt_at <= ? THEN 1 ELSE 0 END) AS due,
+                SUM(CASE WHEN state = ? THEN 1 ELSE 0 END) AS reaping,
+                SUM(CASE WHEN attempts > 0 THEN 1 ELSE 0 END) AS retrying,
+                MIN(next_attempt_at) AS next_due_at
+            FROM deletion_queue
+            """,
+            (STATE_PENDING, time.time(), STATE_REAPING),
+        )
+        row = cursor.fetchone()
+        cursor.execute(
+            "SELECT last_error FROM deletion_queue WHERE last_error IS NOT NULL ORDER BY updated_at DESC LIMIT 1"
+        )
+        error_row = cursor.fetchone()
+    return {
+        "total": row["total"],
+        "due": row["due"] or 0,
+        "reaping": row["reaping"] or 0,
+        "retrying": row["retrying"] or 0,
+        "next_due_at": row["next_due_at"],
+        "last_error": error_row["last_error"] if error_row else None,
+    }
+
+
+def _live_references(column: str, values: Iterable[str]) -> Set[str]:
+    """仍被未删除记录引用的 webdav_path / local_file_path"""
+    values = list(values)
+    found: Set[str] = set()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for i in range(0, len(values), _SQL_BATCH):
+            batch = values[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            cursor.execute(
+                f"SELECT DISTINCT {column} FROM upload_history "
+                f"WHERE deleted_at IS NULL AND {column} IN ({placeholders})",
+                batch,
+            )
+            found.update(row[0] for row in cursor.fetchall())
+    return found
+
+
+def _remove_file(path: str) -> int:
+    """删除文件, 返回释放的字节数(文件不存在时为0)"""
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+
+def _remove_local_copies(
+    file_manager: "FileManager",
+    local_file_path: Optional[str],
+    webdav_path: Optional[str],
+    storage_root: str,
+) -> int:
+    """删除本地备份与磁盘缓存(同步, 供 run_io 调用), 返回释放的字节数
+
+    local_file_path 只在位于 LOCAL_STORAGE_PATH 下时删除。
+    """
+    freed = 0
+    if local_file_path:
+        path = os.path.realpath(local_file_path)
+        if os.path.commonpath([storage_root, path]) == storage_root:
+            freed += _remove_file(path)
+    if webdav_path:
+        cache_path = file_manager._get_cache_path(webdav_path)
+        file_manager.cache_index.discard(cache_path)
+        freed += _remove_file(cache_path)
+    return freed
+
+
+async def _delete_remote(file_manager: "FileManager", webdav_path: str) -> None:
+    """删除WebDAV对象; 远端已不存在视为成功, 其他失败抛出异常"""
+    client = file_manager.webdav_client
+    if await client.delete_file(webdav_path):
+        return
+    if await client.file_exists(webdav_path):
+        raise RuntimeError(f"WebDAV删除失败: {webdav_path}")
+
+
+def release(record_ids: List[int]) -> None:
+    """把已领取但未处理完的条目放回pending(不计失败次数)"""
+    if not record_ids:
+        return
+    with get_db_connection() as conn:
+        for i in range(0, len(record_ids), _SQL_BATCH):
+            batch = record_ids[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            conn.execute(
+                f"UPDATE deletion_queue SET state = ? WHERE state = ? AND record_id IN ({placeholders})",
+                [STATE_PENDING, STATE_REAPING, *batch],
+            )
+        conn.commit()
+
+
+async def reap_due(file_manager: "FileManager") -> Dict[str, Any]:
+    """回收一批宽限期已过的删除记录
+
+    无论中途出错还是任务被取消, 已回收的条目都会移出队列, 其余已领取的条目放回pending,
+    不会停留在reaping状态直到进程重启。
+
+    Returns:
+        {"claimed", "purged", "skipped", "deferred", "failed", "freed_bytes"}
+    """
+    settings = file_manager.settings
+    items = claim_due(limit=settings.DELETE_REAPER_BATCH_SIZE)
+    result = {'claimed': len(items), 'purged': 0, 'skipped': 0, 'deferred': 0, 'failed': 0, 'freed_bytes': 0}
+    if not items:
+        return result
+
+    done: List[int] = []
+    try:
+        work: List[Dict[str, Any]] = []
+        for item in items:
+            if item['deleted_at'] is None:
+                # 记录已恢复或已不存在
+                done.append(item['record_id'])
+                result['skipped'] += 1
+            else:
+                work.append(item)
+
+        live_remote = _live_references('webdav_path', {i['webdav_path'] for i in work if i['webdav_path']})
+        live_local = _live_references(
+            'local_file_path', {i['local_file_path'] for i in work if i['local_file_path']}
+        )
+        pending_sync = set(sync_queue.list_webdav_paths())
+        storage_root = os.path.realpath(settings.LOCAL_STORAGE_PATH)
+        semaphore = asyncio.Semaphore(settings.DELETE_REAPER_CONCURRENCY)
+
+        async def reap_one(item: Dict[str, Any]) -> None:
+            record_id = item['record_id']
+            webdav_path = item['webdav_path'] if item['webdav_path'] not in live_remote else None
+            local_file_path = item['local_file_path'] if item['local_file_path'] not in live_local else None
+
+            if webdav_path and webdav_path in pending_sync:
+                mark_failed(
+                    record_id, "文件尚在待同步队列中, 等待补传完成后再删除",
+                    retry_delay=settings.SYNC_RETRY_INTERVAL, count_attempt=False,
+                )
+                result['deferred'] += 1
+                return
+
+            try:
+                if webdav_path:
+                    file_manager.memory_cache.discard(webdav_path)
+                freed = await run_io(_remove_local_copies, file_manager, local_file_path, webdav_path, storage_root)
+                result['freed_bytes'] += freed
+                if webdav_path:
+                    async with semaphore:
+                        await _delete_remote(file_manager, webdav_path)
+            except Exception as e:
+                delay = backoff_delay(
+                    item['attempts'], settings.SYNC_BACKOFF_BASE_SECONDS, settings.SYNC_BACKOFF_MAX_SECONDS
+                )
+                mark_failed(record_id, str(e), retry_delay=delay)
+                result['failed'] += 1
+                logger.error(f"删除记录的文件回收失败 id={record_id}: {str(e)}, {delay:.0f}秒后重试")
+                return
+
+            done.append(record_id)
+            result['purged'] += 1
+
+        outcomes = await asyncio.gather(*(reap_one(item) for item in work), return_exceptions=True)
+        for item, outcome in zip(work, outcomes):
+            if isinstance(outcome, Exception):
+                # 更新队列状态时出错等: 条目在 finally 中放回pending
+                logger.error(f"删除记录的文件回收异常 id={item['record_id']}: {str(outcome)}")
+    finally:
+        try:
+            mark_done(done)
+        finally:
+            finished = set(done)
+            release([item['record_id'] for item in items if item['record_id'] not in finished])
+    return result
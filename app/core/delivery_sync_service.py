@@ -394,6 +394,17 @@ def get_token_row(token: str) -> Optional[Dict[str, Any]]:
         return {"id": row["id"], "logistics_name": row["logistics_name"]} if row else None
 
 
+def touch_token_access(token: str) -> None:
+    """记录门户访问时间; 门户请求命中ETag返回304(不再查询清单)时调用"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE logistics_tokens SET last_access_at = ? WHERE token = ? AND enabled = 1",
+            (get_beijing_now_naive().isoformat(), token),
+        )
+        conn.commit()
+
+
 def get_portal_data(token: str) -> Optional[Dict[str, Any]]:
     """物流侧: 该物流公司的待上传单据清单。token无效/禁用返回None"""
     token_row = get_token_row(token)
@@ -0,0 +1,224 @@
+"""
+后台导出任务
+大批量导出放在请求之外执行, 避免经反向代理时请求超时:
+
+- submit 提交导出参数, 立即返回任务ID; 生成过程在后台协程中进行,
+  同时执行的任务数由 EXPORT_JOB_CONCURRENCY 限制, 其余排队
+- 任务记录已处理的行数与图片数, 前端轮询展示进度
+- 生成结果写入 EXPORT_JOB_DIR, 下载走 file_response(支持Range断点续传)
+- 相同参数的导出在 EXPORT_JOB_TTL_MINUTES 内直接复用(进行中的任务也复用), 过期文件定时清理;
+  调用方把数据版本号放进参数, 数据变化后不复用旧结果
+- 每次下载都把过期时间顺延到至少 _DOWNLOAD_GRACE_SECONDS 之后, 清理不会删除刚开始下载或
+  正在断点续传的文件(已打开的文件被删除后仍可以读完)
+
+任务状态只保存在进程内; 重启后遗留的文件由清理任务按修改时间删除。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from .config import get_settings
+from .io_executor import run_io
+from .timezone import get_beijing_now_naive_iso
+
+logger = logging.getLogger(__name__)
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+# 生成函数: (输出文件路径, 进度字典) -> None
+ExportBuilder = Callable[[str, Dict[str, int]], Awaitable[None]]
+
+# 下载开始后至少保留结果文件的秒数
+_DOWNLOAD_GRACE_SECONDS = 10 * 60
+
+
+class ExportJob:
+    """单个导出任务"""
+
+    __slots__ = (
+        'job_id', 'key', 'filename', 'media_type', 'path', 'status', 'error',
+        'progress', 'created_at', 'finished_at', 'expires_at', 'size', 'empty',
+    )
+
+    def __init__(self, job_id: str, key: str, filename: str, media_type: str, path: str):
+        self.job_id = job_id
+        self.key = key
+        self.filename = filename
+        self.media_type = media_type
+        self.path = path
+        self.status = STATUS_QUEUED
+        self.error: Optional[str] = None
+        self.progress: Dict[str, int] = {
+            'rows_total': 0, 'rows_done': 0, 'images_written': 0, 'images_missing': 0,
+        }
+        self.created_at = get_beijing_now_naive_iso()
+        self.finished_at: Optional[str] = None
+        # time.time(); 仅完成/失败的任务有过期时间
+        self.expires_at: Optional[float] = None
+        self.size = 0
+        # 提交时由调用方标记: 筛选结果为空
+        self.empty = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.job_id,
+            'status': self.status,
+            'filename': self.filename,
+            'progress': dict(self.progress),
+            'size': self.size,
+            'empty': self.empty,
+            'error': self.error,
+            'created_at': self.created_at,
+            'finished_at': self.finished_at,
+            'expires_in': max(0, int(self.expires_at - time.time())) if self.expires_at else None,
+        }
+
+
+_jobs: Dict[str, ExportJob] = {}
+_by_key: Dict[str, str] = {}
+_tasks: Dict[str, "asyncio.Task"] = {}
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def job_key(params: Dict[str, Any]) -> str:
+    """导出参数的稳定摘要: 空值不参与, 字段顺序无关"""
+    normalized = {k: v for k, v in params.items() if v not in (None, '')}
+    payload = json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(get_settings().EXPORT_JOB_CONCURRENCY)
+    return _semaphore
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+async def _run(job: ExportJob, build: ExportBuilder) -> None:
+    ttl = get_settings().EXPORT_JOB_TTL_MINUTES * 60
+    part_path = f"{job.path}.part"
+    async with _get_semaphore():
+        job.status = STATUS_RUNNING
+        started = time.monotonic()
+        try:
+            await run_io(os.makedirs, os.path.dirname(job.path), exist_ok=True)
+            await build(part_path, job.progress)
+            await run_io(os.replace, part_path, job.path)
+            job.size = await run_io(os.path.getsize, job.path)
+            job.status = STATUS_DONE
+            logger.info(
+                f"[导出任务] 完成 {job.job_id}: {job.filename}, {job.size}字节, "
+                f"行={job.progress['rows_done']}, 图片={job.progress['images_written']}, "
+                f"耗时{time.monotonic() - started:.1f}秒"
+            )
+        except Exception as e:  # noqa: BLE001
+            job.status = STATUS_FAILED
+            job.error = str(e)
+            await run_io(_remove_file, part_path)
+            logger.error(f"[导出任务] 失败 {job.job_id}: {str(e)}", exc_info=True)
+        finally:
+            job.finished_at = get_beijing_now_naive_iso()
+            job.expires_at = time.time() + ttl
+            _tasks.pop(job.job_id, None)
+
+
+def submit(
+    params: Dict[str, Any],
+    filename: str,
+    media_type: str,
+    build: ExportBuilder,
+    force: bool = False,
+) -> Tuple[ExportJob, bool]:
+    """提交导出任务
+
+    Args:
+        params: 导出参数(筛选条件、格式等), 用于识别可复用的任务
+        filename: 下载文件名, 扩展名同时用作生成文件的扩展名
+        build: 把导出内容写入给定路径的协程函数
+        force: 不复用已有结果, 重新生成
+
+    Returns:
+        (任务, 是否复用了已有任务)
+    """
+    key = job_key(params)
+    existing = None if force else find_reusable(params)
+    if existing is not None:
+        return existing, True
+
+    job_id = uuid.uuid4().hex
+    extension = os.path.splitext(filename)[1]
+    path = os.path.join(os.path.abspath(get_settings().EXPORT_JOB_DIR), f"{job_id}{extension}")
+    job = ExportJob(job_id, key, filename, media_type, path)
+    _jobs[job_id] = job
+    _by_key[key] = job_id
+    _tasks[job_id] = asyncio.ensure_future(_run(job, build))
+    logger.info(f"[导出任务] 已提交 {job_id}: {filename}")
+    return job, False
+
+
+def find_reusable(params: Dict[str, Any]) -> Optional[ExportJob]:
+    """相同参数、未失败且未过期的任务(包括进行中的任务)"""
+    job = _jobs.get(_by_key.get(job_key(params), ''))
+    if job is None or job.status == STATUS_FAILED:
+        return None
+    if job.expires_at is not None and job.expires_at <= time.time():
+        return None
+    return job
+
+
+def get_job(job_id: str) -> Optional[ExportJob]:
+    return _jobs.get(job_id)
+
+
+def hold_for_download(job: ExportJob) -> None:
+    """下载开始时顺延过期时间, 避免清理任务删除正在读取的文件"""
+    if job.expires_at is not None:
+        job.expires_at = max(job.expires_at, time.time() + _DOWNLOAD_GRACE_SECONDS)
+
+
+def cleanup_expired() -> int:
+    """删除过期任务及其文件, 以及目录中不属于任何任务、超过保留时间的遗留文件; 返回删除的文件数"""
+    now = time.time()
+    removed = 0
+    for job_id, job in list(_jobs.items()):
+        if job.expires_at is None or job.expires_at > now:
+            continue
+        del _jobs[job_id]
+        if _by_key.get(job.key) == job_id:
+            del _by_key[job.key]
+        if os.path.exists(job.path):
+            _remove_file(job.path)
+            removed += 1
+
+    export_dir = get_settings().EXPORT_JOB_DIR
+    if not os.path.isdir(export_dir):
+        return removed
+    ttl = get_settings().EXPORT_JOB_TTL_MINUTES * 60
+    known = {job.path for job in _jobs.values()}
+    known |= {f"{path}.part" for path in known}
+    for entry in os.scandir(export_dir):
+        if not entry.is_file() or os.path.abspath(entry.path) in known:
+            continue
+        try:
+            if now - entry.stat().st_mtime > ttl:
+                _remove_file(entry.path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
@@ -0,0 +1,345 @@
+"""
+导出服务
+管理端导出的ZIP边生成边发送, 不再先在临时目录中打包完整文件:
+
+- ZipStream 基于 zipfile 写入不可回退的输出流(每个条目带数据描述符, 按需启用ZIP64),
+  每写完一个条目就把产生的字节交给响应
+- 图片已经是压缩格式, 条目一律 STORED, 不做无意义的压缩
+- 图片由 EXPORT_IMAGE_CONCURRENCY 个协程并发获取(本地文件走I/O线程池, WebDAV文件走
+  FileManager 缓存), 先到先写; 获取结果经过容量为 EXPORT_ZIP_QUEUE_SIZE 的队列交给写入端,
+  客户端读得慢时获取会暂停, 内存中最多同时保留 队列容量+并发数 张图片
+- 客户端断开时取消尚未完成的获取
+- 响应开始后读取记录或生成数据文件失败时, 写入错误说明条目并正常结束ZIP, 不留下截断的文件
+
+导出数据文件(xlsx/csv/ndjson)由调用方按键集分页逐批读出的行生成, 内存占用与行数无关:
+xlsx 使用 openpyxl 只写模式落到临时文件, csv/ndjson 可以直接作为响应流发送。
+"""
+
+import asyncio
+import csv
+import io
+import json
+import logging
+import os
+import zipfile
+from typing import (
+    TYPE_CHECKING, Any, AsyncIterable, AsyncIterator, Awaitable, Dict, Iterable, Iterator, List, Optional,
+    Sequence, Set, Tuple, Union
+)
+
+from openpyxl import Workbook
+
+from .config import get_settings
+from .io_executor import read_file, run_io
+from .timezone import get_beijing_now_naive
+
+if TYPE_CHECKING:
+    from .file_manager import FileManager
+
+logger = logging.getLogger(__name__)
+
+# 导出数据文件的列: (NDJSON字段名, Excel/CSV表头)
+EXPORT_COLUMNS: List[Tuple[str, str]] = [
+    ("upload_type", "上传业务类型"),
+    ("doc_number", "单据编号"),
+    ("doc_type", "单据类型"),
+    ("product_type", "产品类型"),
+    ("customer_name", "客户名称"),
+    ("business_id", "业务ID"),
+    ("upload_time", "上传时间"),
+    ("file_name", "文件名"),
+    ("file_size", "文件大小(字节)"),
+    ("status", "状态"),
+    ("notes", "备注"),
+]
+
+# 导出格式 -> 响应的 media_type(文件扩展名即格式名)
+EXPORT_MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# 文本格式每攒够这么多行交给响应一次, 避免逐行切换线程
+_TEXT_CHUNK_ROWS = 500
+# 数据文件写入ZIP时每次读取的字节数
+_FILE_CHUNK_SIZE = 256 * 1024
+# 导出中途出错时写入ZIP的说明文件
+EXPORT_ERROR_ARCNAME = "导出错误.txt"
+
+
+class _ChunkSink:
+    """zipfile 的输出目标: 只支持写入, 写入的字节由 drain() 取走"""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
+
+
+class ZipStream:
+    """流式ZIP写入器: 每次 add 返回该条目产生的字节, close 返回中央目录"""
+
+    def __init__(self):
+        self._sink = _ChunkSink()
+        self._zip = zipfile.ZipFile(self._sink, 'w', zipfile.ZIP_STORED, allowZip64=True)
+        self._names: Set[str] = set()
+        self._date_time = get_beijing_now_naive().timetuple()[:6]
+        self.entries = 0
+
+    def _unique_name(self, arcname: str) -> str:
+        """同名文件追加序号, 避免ZIP中出现重复条目"""
+        name = arcname
+        counter = 1
+        while name in self._names:
+            stem, dot, ext = arcname.rpartition('.')
+            name = f"{stem}_{counter}.{ext}" if dot and stem else f"{arcname}_{counter}"
+            counter += 1
+        self._names.add(name)
+        return name
+
+    def add(self, arcname: str, data: bytes) -> bytes:
+        info = zipfile.ZipInfo(self._unique_name(arcname), date_time=self._date_time)
+        info.compress_type = zipfile.ZIP_STORED
+        info.external_attr = 0o644 << 16
+        self._zip.writestr(info, data)
+        self.entries += 1
+        return self._sink.drain()
+
+    def open_entry(self, arcname: str, file_size: int):
+        """打开一个按块写入的条目(大文件不必整体读入内存), 写完后调用返回对象的 close()"""
+        info = zipfile.ZipInfo(self._unique_name(arcname), date_time=self._date_time)
+        info.compress_type = zipfile.ZIP_STORED
+        info.external_attr = 0o644 << 16
+        info.file_size = file_size
+        self.entries += 1
+        return self._zip.open(info, 'w')
+
+    def drain(self) -> bytes:
+        """取走已写入的字节"""
+        return self._sink.drain()
+
+    def add_directory(self, arcname: str) -> bytes:
+        info = zipfile.ZipInfo(arcname.rstrip('/') + '/', date_time=self._date_time)
+        info.external_attr = (0o40755 << 16) | 0x10
+        self._zip.writestr(info, b"")
+        return self._sink.drain()
+
+    def close(self) -> bytes:
+        self._zip.close()
+        return self._sink.drain()
+
+
+async def fetch_image(job: Dict[str, Any], file_manager: "FileManager") -> bytes:
+    """读取导出图片: 本地文件优先, 否则从WebDAV(经缓存)获取"""
+    if job.get("local_path"):
+        return await run_io(read_file, job["local_path"])
+    return await file_manager.get_file(job["webdav_path"])
+
+
+def _text_value(value: Any) -> Any:
+    return '' if value is None else value
+
+
+def write_xlsx(rows: Iterable[Sequence[Any]], path: str) -> int:
+    """以只写模式把行写入xlsx文件, 返回行数
+
+    只写模式下行逐条序列化到临时文件, 不在内存中保留单元格对象。
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("上传记录")
+    ws.append([header for _, header in EXPORT_COLUMNS])
+    count = 0
+    for row in rows:
+        ws.append(list(row))
+        count += 1
+    wb.save(path)
+    return count
+
+
+def iter_csv(rows: Iterable[Sequence[Any]]) -> Iterator[str]:
+    """逐批生成CSV文本(带BOM, Excel直接打开中文不乱码)"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    buffer.write('\ufeff')
+    writer.writerow([header for _, header in EXPORT_COLUMNS])
+    pending = 0
+    for row in rows:
+        writer.writerow([_text_value(value) for value in row])
+        pending += 1
+        if pending >= _TEXT_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    yield buffer.getvalue()
+
+
+def iter_ndjson(rows: Iterable[Sequence[Any]]) -> Iterator[str]:
+    """逐批生成NDJSON文本, 每行一个JSON对象"""
+    fields = [field for field, _ in EXPORT_COLUMNS]
+    lines: List[str] = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(fields, row)), ensure_ascii=False) + '\n')
+        if len(lines) >= _TEXT_CHUNK_ROWS:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+def iter_text(export_format: str, rows: Iterable[Sequence[Any]]) -> Iterator[str]:
+    return iter_csv(rows) if export_format == "csv" else iter_ndjson(rows)
+
+
+def write_data_file(export_format: str, rows: Iterable[Sequence[Any]], path: str) -> str:
+    """按格式把行写入文件, 返回文件路径"""
+    if export_format == "xlsx":
+        write_xlsx(rows, path)
+        return path
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        for chunk in iter_text(export_format, rows):
+            f.write(chunk)
+    return path
+
+
+async def _aiter_jobs(image_jobs: Iterable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    for job in image_jobs:
+        yield job
+
+
+async def stream_zip(
+    image_jobs: Union[Iterable[Dict[str, Any]], AsyncIterable[Dict[str, Any]]],
+    file_manager: Optional["FileManager"] = None,
+    stats: Optional[Dict[str, Any]] = None,
+    trailing: Optional[Awaitable[Tuple[str, str]]] = None,
+) -> AsyncIterator[bytes]:
+    """逐条生成ZIP字节流
+
+    响应头已经发出, 出错时无法再改为错误响应: 读取任务或生成数据文件失败时,
+    停止写入剩余内容, 追加 EXPORT_ERROR_ARCNAME 说明失败原因, 并正常结束ZIP,
+    客户端拿到的仍是完整可解压的文件。
+
+    Args:
+        image_jobs: 图片任务(可以是同步或异步的惰性迭代器), 每项包含 arcname 以及 local_path 或 webdav_path
+        stats: 传入时填充 written/missing, 出错时还会填充 error(错误信息), 便于调用方记录日志
+        trailing: 图片写完后追加的文件, 结果为 (ZIP内路径, 本地文件路径);
+            通常是后台线程中正在生成的导出数据文件, 图片先发送, 不必等它生成完
+    """
+    settings = get_settings()
+    stats = stats if stats is not None else {}
+    stats.update({'written': 0, 'missing': 0})
+    stats.pop('error', None)
+    zip_stream = ZipStream()
+    managers: List["FileManager"] = [file_manager] if file_manager is not None else []
+    errors: List[str] = []
+
+    def get_file_manager() -> "FileManager":
+        if not managers:
+            from .file_manager import FileManager
+            managers.append(FileManager())
+        return managers[0]
+
+    queue: "asyncio.Queue[Any]" = asyncio.Queue(
+        maxsize=settings.EXPORT_ZIP_QUEUE_SIZE
+    )
+    if hasattr(image_jobs, '__aiter__'):
+        pending = image_jobs.__aiter__()
+    else:
+        pending = _aiter_jobs(image_jobs)
+    # 多个协程共用一个(异步)迭代器, 同一时间只允许一个取任务
+    pending_lock = asyncio.Lock()
+
+    async def worker() -> None:
+        try:
+            while True:
+                async with pending_lock:
+                    try:
+                        job = await pending.__anext__()
+                    except StopAsyncIteration:
+                        break
+                try:
+                    content = await fetch_image(job, None if job.get("local_path") else get_file_manager())
+                except Exception as e:  # noqa: BLE001
+                    logger.warning(
+                        f"[导出] 图片获取失败 doc_number={job.get('doc_number')} "
+                        f"path={job.get('local_path') or job.get('webdav_path')} 错误={str(e)}"
+                    )
+                    content = None
+                await queue.put((job, content))
+        except Exception as e:  # noqa: BLE001
+            # 任务迭代器本身出错(例如读取记录失败): 交给写入端中止图片写入
+            await queue.put(e)
+            return
+        # 任务取完: 通知写入端本协程已结束
+        await queue.put(None)
+
+    async def stop_workers() -> None:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        if hasattr(pending, 'aclose'):
+            await pending.aclose()
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(settings.EXPORT_IMAGE_CONCURRENCY)]
+    try:
+        finished = 0
+        while finished < len(workers):
+            item = await queue.get()
+            if item is None:
+                finished += 1
+                continue
+            if isinstance(item, Exception):
+                logger.error(f"[导出] 读取图片任务失败, 停止写入图片: {str(item)}", exc_info=item)
+                errors.append(f"读取导出记录失败, 图片不完整: {str(item)}")
+                break
+            job, content = item
+            if content is None:
+                stats['missing'] += 1
+                continue
+            stats['written'] += 1
+            yield zip_stream.add(job["arcname"], content)
+        await stop_workers()
+
+        if stats['written'] == 0:
+            yield zip_stream.add_directory("images/")
+
+        if trailing is not None:
+            try:
+                arcname, path = await trailing
+                f = await run_io(open, path, 'rb')
+            except Exception as e:  # noqa: BLE001
+                # 数据文件在写入ZIP之前失败: 不写入这个条目
+                logger.error(f"[导出] 生成数据文件失败: {str(e)}", exc_info=True)
+                errors.append(f"生成数据文件失败: {str(e)}")
+            else:
+                try:
+                    entry = zip_stream.open_entry(arcname, await run_io(os.path.getsize, path))
+                    while True:
+                        chunk = await run_io(f.read, _FILE_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        entry.write(chunk)
+                        yield zip_stream.drain()
+                    entry.close()
+                finally:
+                    await run_io(f.close)
+                yield zip_stream.drain()
+
+        if errors:
+            stats['error'] = "; ".join(errors)
+            yield zip_stream.add(EXPORT_ERROR_ARCNAME, "\n".join(errors).encode("utf-8"))
+
+        yield zip_stream.close()
+    finally:
+        await stop_workers()
@@ -6,26 +6,89 @@ WebDAV故障降级处理
 """
 
 import os
-import json
 import asyncio
 import shutil
-from datetime import datetime, timedelta
-from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+import time
+import uuid
+from typing import Dict, List, Optional, Any, AsyncIterator, Set, Tuple
 from urllib.parse import quote, unquote
 import logging
 
 from .config import get_settings
 from .webdav_client import WebDAVClient
+from .webdav_health import webdav_health
+from .cache_index import CacheIndex, get_cache_index
+from .cache_layout import cache_path_for
+from .memory_cache import MemoryCache, get_memory_cache
+from .cache_warmer import get_cache_warmer
+from . import sync_queue
+from .sync_concurrency import AdaptiveConcurrency, backoff_delay, sync_progress
+from .io_executor import read_file, remove_file, run_io, write_file
 from .database import get_db_connection
 from .timezone import (
-    BEIJING_TZ,
     get_beijing_now_naive,
     get_beijing_now_naive_iso,
 )
 
 logger = logging.getLogger(__name__)
 
+# 正在从WebDAV下载的文件: webdav_path -> Task
+# 结果为文件内容; open_stream 发起的流式下载在文件超出内存缓存上限时为None, 内容只在磁盘缓存中
+# FileManager 在多个模块中各自实例化, 放在模块级才能合并不同实例发起的并发下载
+_inflight_downloads: Dict[str, "asyncio.Task[Optional[bytes]]"] = {}
+# 其中由 open_stream 发起的流式下载: webdav_path -> _StreamDownload, 流式读者可跟随已写入的数据读取
+_inflight_streams: Dict[str, "_StreamDownload"] = {}
+
+# 单飞互斥: sync_progress 为进程内共享, 同一时刻只允许一轮补传(定时与手动共用)
+_sync_lock = asyncio.Lock()
+
+
+class _StreamDownload:
+    """open_stream 发起的后台下载: 按WebDAV速度写入 .part 文件, 各读者按自己的速度跟随读取"""
+
+    def __init__(self, part_path: str):
+        self.part_path = part_path
+        self.task: Optional["asyncio.Task[Optional[bytes]]"] = None
+        self.opened = False
+        self.received = 0
+        self.finished = False
+        self._changed = asyncio.Event()
+
+    def notify(self) -> None:
+        """唤醒所有等待新数据的读者"""
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self) -> None:
+        await self._changed.wait()
+
+
+def _new_part_path(cache_path: str) -> str:
+    """缓存写入使用的同目录临时文件, 完整写入后再原子重命名"""
+    return f"{cache_path}.part-{uuid.uuid4().hex[:8]}"
+
+
+def _append_chunk(part_file, chunk: bytes) -> None:
+    """写入数据块并立即刷出, 跟随读取的读者才能读到"""
+    part_file.write(chunk)
+    part_file.flush()
+
+
+def _remove_part_file(part_path: str) -> None:
+    if os.path.exists(part_path):
+        try:
+            os.remove(part_path)
+        except OSError as e:
+            logger.warning(f"清理未完成的缓存临时文件失败 {part_path}: {str(e)}")
+
+
+def _joinable_download(webdav_path: str) -> "Optional[asyncio.Task[Optional[bytes]]]":
+    """同一事件循环中该路径进行中的下载, 没有时返回None"""
+    task = _inflight_downloads.get(webdav_path)
+    if task is None or task.get_loop() is not asyncio.get_running_loop():
+        return None
+    return task
+
 
 class FileManager:
     """文件管理器，实现混合存储策略"""
@@ -37,16 +100,6 @@ class FileManager:
         # 确保必要的目录存在
         self._ensure_directories()
 
-        # WebDAV状态
-        self._webdav_available = False
-        self._last_health_check = None
-
-        # 待同步文件清单
-        self._pending_sync_file = os.path.join(
-            self.settings.TEMP_STORAGE_DIR,
-            "pending_sync.json"
-        )
-
         logger.info("文件管理器初始化完成")
         logger.info(f"缓存目录: {self.settings.CACHE_DIR}")
         logger.info(f"临时存储目录: {self.settings.TEMP_STORAGE_DIR}")
@@ -70,14 +123,8 @@ class FileManager:
                 raise
 
     def _get_cache_path(self, webdav_path: str) -> str:
-        """获取本地缓存路径"""
-        # 移除开头的files/前缀
-        if webdav_path.startswith('files/'):
-            relative_path = webdav_path[6:]  # 去掉'files/'
-        else:
-            relative_path = webdav_path.lstrip('/')
-
-        return os.path.join(self.settings.CACHE_DIR, relative_path)
+        """获取本地缓存路径(按 CACHE_LAYOUT 镜像WebDAV目录或按哈希分片)"""
+        return cache_path_for(self.settings.CACHE_DIR, webdav_path, self.settings.CACHE_LAYOUT)
 
     def _get_temp_path(self, filename: str) -> str:
         """获取临时存储路径"""
@@ -94,68 +141,105 @@ class FileManager:
         date_path = now.strftime('%Y/%m/%d')
         return f"files/{date_path}/{filename}"
 
-    def _is_cache_valid(self, cache_path: str) -> bool:
-        """检查缓存是否有效（7天内）"""
-        if not os.path.exists(cache_path):
-            return False
+    @property
+    def cache_index(self) -> CacheIndex:
+        """当前缓存目录的共享索引"""
+        return get_cache_index(self.settings.CACHE_DIR)
 
-        try:
-            # 检查文件修改时间
-            mtime = os.path.getmtime(cache_path)
-            file_time = datetime.fromtimestamp(mtime, tz=BEIJING_TZ).replace(tzinfo=None)
-            expiry_time = file_time + timedelta(days=self.settings.CACHE_DAYS)
+    @property
+    def memory_cache(self) -> MemoryCache:
+        """进程内热点对象缓存(位于磁盘缓存之前)"""
+        return get_memory_cache()
 
-            return get_beijing_now_naive() < expiry_time
-        except Exception as e:
-            logger.error(f"检查缓存有效性失败 {cache_path}: {str(e)}")
-            return False
+    def get_hot_object(self, webdav_path: str) -> Optional[bytes]:
+        """从内存热点缓存获取文件内容, 未命中返回None"""
+        return self.memory_cache.get(webdav_path)
 
-    def _load_pending_sync(self) -> Dict[str, Any]:
-        """加载待同步文件清单"""
-        if not os.path.exists(self._pending_sync_file):
-            return {'files': [], 'last_sync': None}
+    def cache_state(self, webdav_path: str) -> str:
+        """文件当前所在的缓存层: memory/disk/remote
 
-        try:
-            with open(self._pending_sync_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            logger.error(f"加载待同步清单失败: {str(e)}")
-            return {'files': [], 'last_sync': None}
+        只查看状态, 不记录访问(不影响LRU顺序、命中统计和淘汰策略)。
+        """
+        if webdav_path in self.memory_cache:
+            return "memory"
+        cache_path = self._get_cache_path(webdav_path)
+        entry = self.cache_index.get(cache_path)
+        if entry is None:
+            return "disk" if os.path.isfile(cache_path) else "remote"
+        if entry.last_access + self.settings.CACHE_DAYS * 86400 < time.time() or not os.path.exists(cache_path):
+            return "remote"
+        return "disk"
 
-    def _save_pending_sync(self, data: Dict[str, Any]):
-        """保存待同步文件清单"""
-        try:
-            os.makedirs(os.path.dirname(self._pending_sync_file), exist_ok=True)
-            with open(self._pending_sync_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存待同步清单失败: {str(e)}")
+    def _is_cache_valid(self, cache_path: str) -> bool:
+        """检查缓存是否有效（CACHE_DAYS内访问过）
 
-    async def check_webdav_health(self) -> bool:
-        """检查WebDAV健康状态"""
+        只在即将读取缓存前调用: 命中时会记录访问(更新LRU顺序、命中次数和文件mtime)。
+        会访问文件系统, 在事件循环中需通过 run_io 调用。
+        """
         try:
-            now = get_beijing_now_naive()
-
-            # 如果距离上次检查时间太短，直接返回缓存结果
-            # 使用total_seconds()获取完整时间差(包括天数)
-            if (self._last_health_check and
-                (now - self._last_health_check).total_seconds() < self.settings.HEALTH_CHECK_INTERVAL):
-                return self._webdav_available
-
-            is_healthy = await self.webdav_client.health_check()
-            self._webdav_available = is_healthy
-            self._last_health_check = now
+            index = self.cache_index
+            entry = index.get(cache_path)
+            if entry is None:
+                # 不在索引中的文件(例如手工拷贝进缓存目录)按需登记
+                if not os.path.isfile(cache_path):
+                    index.record_miss()
+                    return False
+                index.add(cache_path, os.path.getsize(cache_path))
+                entry = index.get(cache_path)
+            elif not os.path.exists(cache_path):
+                # 文件已被外部删除
+                index.discard(cache_path)
+                index.record_miss()
+                return False
+
+            if entry.last_access + self.settings.CACHE_DAYS * 86400 < time.time():
+                index.record_miss()
+                return False
+
+            index.record_hit(cache_path)
+            os.utime(cache_path)
+            return True
+        except Exception as e:
+            logger.error(f"检查缓存有效性失败 {cache_path}: {str(e)}")
+            return False
 
-            if is_healthy:
-                logger.debug("WebDAV服务可用")
-            else:
-                logger.warning("WebDAV服务不可用")
+    def _register_cache(self, cache_path: str, size: int):
+        """登记新写入的缓存文件, 超出 CACHE_MAX_BYTES 时按淘汰策略删除其他缓存"""
+        index = self.cache_index
+        index.add(cache_path, size)
+        victims = index.take_victims(
+            self.settings.CACHE_MAX_BYTES,
+            self.settings.CACHE_EVICTION_POLICY,
+            keep=cache_path
+        )
+        if victims:
+            freed = self._remove_cache_files(victims)
+            logger.info(f"缓存超出容量上限, 淘汰{len(victims)}个文件, 释放{freed}字节")
+
+    def _remove_cache_files(self, victims: List[Tuple[str, int]]) -> int:
+        """删除被淘汰的缓存文件, 返回释放的字节数"""
+        freed = 0
+        for path, size in victims:
+            try:
+                os.remove(path)
+                freed += size
+                logger.debug(f"删除缓存文件: {path}")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"删除缓存文件失败 {path}: {str(e)}")
+        return freed
 
-            return is_healthy
+    async def check_webdav_health(self) -> bool:
+        """检查WebDAV健康状态
 
+        以真实请求结果的滑动窗口为准(进程内共享), 只有空闲或判定不可用超过
+        HEALTH_CHECK_INTERVAL 时才发起一次PROPFIND探测, 上传热路径上通常无额外往返。
+        """
+        try:
+            return await webdav_health.is_available(self.webdav_client.health_check)
         except Exception as e:
             logger.error(f"WebDAV健康检查失败: {str(e)}")
-            self._webdav_available = False
             return False
 
     async def save_file(self, file_content: bytes, filename: str) -> Dict[str, Any]:
@@ -183,8 +267,7 @@ class FileManager:
                 try:
                     # 创建临时文件用于上传
                     temp_path = self._get_temp_path(filename)
-                    with open(temp_path, 'wb') as f:
-                        f.write(file_content)
+                    await run_io(write_file, temp_path, file_content)
 
                     # 上传到WebDAV
                     upload_result = await self.webdav_client.upload_file(
@@ -211,8 +294,7 @@ class FileManager:
                         await self._save_to_temp_storage(file_content, filename, webdav_path, result)
 
                     # 清理临时文件
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
+                    await run_io(remove_file, temp_path)
 
                 except Exception as e:
                     logger.error(f"文件保存过程中出错: {str(e)}")
@@ -235,39 +317,47 @@ class FileManager:
             }
 
     async def _write_cache(self, cache_path: str, file_content: bytes):
-        """写入本地缓存"""
-        try:
-            # 确保缓存目录存在
-            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
-
-            # 写入缓存文件
-            with open(cache_path, 'wb') as f:
-                f.write(file_content)
+        """写入本地缓存(在磁盘I/O线程池中执行)
 
+        先写入同目录临时文件再原子重命名, 并发读者不会看到写了一半的缓存文件。
+        """
+        try:
+            await run_io(self._write_cache_sync, cache_path, file_content)
             logger.debug(f"缓存文件写入成功: {cache_path}")
 
         except Exception as e:
             logger.error(f"写入缓存失败 {cache_path}: {str(e)}")
             # 缓存写入失败不应该影响主流程
 
+    def _write_cache_sync(self, cache_path: str, file_content: bytes):
+        part_path = None
+        try:
+            # 确保缓存目录存在
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+            # 写入缓存文件
+            part_path = _new_part_path(cache_path)
+            write_file(part_path, file_content)
+            os.replace(part_path, cache_path)
+            part_path = None
+            self._register_cache(cache_path, len(file_content))
+        finally:
+            if part_path and os.path.exists(part_path):
+                try:
+                    os.remove(part_path)
+                except OSError:
+                    pass
+
     async def _save_to_temp_storage(self, file_content: bytes, filename: str, webdav_path: str, result: Dict[str, Any]):
         """保存到临时存储（降级处理）"""
         try:
             temp_path = self._get_temp_path(filename)
 
             # 写入临时文件
-            with open(temp_path, 'wb') as f:
-                f.write(file_content)
+            await run_io(write_file, temp_path, file_content)
 
-            # 添加到待同步清单
-            pending_sync = self._load_pending_sync()
-            pending_sync['files'].append({
-                'temp_path': temp_path,
-                'filename': filename,
-                'webdav_path': webdav_path,
-                'created_time': get_beijing_now_naive_iso()
-            })
-            self._save_pending_sync(pending_sync)
+            # 加入待同步队列
+            await run_io(sync_queue.enqueue, temp_path, filename, webdav_path, file_size=len(file_content))
 
             result.update({
                 'success': True,  # 降级存储也认为是成功的
@@ -300,101 +390,338 @@ class FileManager:
         try:
             logger.debug(f"获取文件: {webdav_path}")
 
-            # 检查缓存
+            # 内存热点缓存
+            content = self.memory_cache.get(webdav_path)
+            if content is not None:
+                logger.debug(f"内存缓存命中: {webdav_path}")
+                return content
+
+            # 检查磁盘缓存
             cache_path = self._get_cache_path(webdav_path)
-            if self._is_cache_valid(cache_path):
+            if await run_io(self._is_cache_valid, cache_path):
                 logger.debug(f"缓存命中: {cache_path}")
-                with open(cache_path, 'rb') as f:
-                    content = f.read()
-
-                # 更新访问时间
-                os.utime(cache_path)
+                content = await run_io(read_file, cache_path)
+                self.memory_cache.put(webdav_path, content)
                 return content
 
             # 缓存未命中，从WebDAV下载（带重试机制）
+            content = await self._coalesced_download(webdav_path, cache_path, max_retries)
+            if content is None:
+                # 合并到的流式下载只写入了磁盘缓存
+                content = await run_io(read_file, cache_path)
+            return content
+
+        except Exception as e:
+            error_msg = f"获取文件失败: {str(e)}"
+            logger.error(error_msg)
+            raise Exception(error_msg)
+
+    async def prefetch(self, webdav_path: str) -> bool:
+        """
+        预热: 文件不在磁盘缓存中时从WebDAV下载到磁盘缓存
+
+        只写磁盘缓存, 不放入内存热点缓存(预热的文件未必会被访问), 也不计入缓存命中统计。
+
+        Returns:
+            是否实际下载了文件(已缓存返回False)
+        """
+        cache_path = self._get_cache_path(webdav_path)
+        if self.cache_index.get(cache_path) is not None:
+            return False
+        await self._coalesced_download(webdav_path, cache_path, max_retries=1, keep_in_memory=False)
+        return True
+
+    async def _coalesced_download(
+        self,
+        webdav_path: str,
+        cache_path: str,
+        max_retries: int,
+        keep_in_memory: bool = True
+    ) -> Optional[bytes]:
+        """下载文件到缓存, 同一路径的并发请求只下载一次, 其余调用等待同一结果
+
+        等待的是流式下载时, 文件超出内存缓存上限则返回None(内容只在磁盘缓存中)。
+        """
+        task = _joinable_download(webdav_path)
+        if task is None:
             logger.debug(f"缓存未命中，从WebDAV下载: {webdav_path}")
+            task = asyncio.ensure_future(
+                self._download_to_cache(webdav_path, cache_path, max_retries, keep_in_memory)
+            )
+            _inflight_downloads[webdav_path] = task
+            task.add_done_callback(lambda t, p=webdav_path: self._clear_inflight(p, t))
+        else:
+            logger.debug(f"等待进行中的下载: {webdav_path}")
+
+        # shield: 某个等待方被取消(如客户端断开)时不中断其他等待方共享的下载
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _clear_inflight(webdav_path: str, task: "asyncio.Task[Optional[bytes]]") -> None:
+        if _inflight_downloads.get(webdav_path) is task:
+            _inflight_downloads.pop(webdav_path, None)
+        stream = _inflight_streams.get(webdav_path)
+        if stream is not None and stream.task is task:
+            _inflight_streams.pop(webdav_path, None)
+        if not task.cancelled():
+            # 所有等待方都已取消时避免"exception was never retrieved"告警
+            task.exception()
+
+    async def _download_to_cache(
+        self,
+        webdav_path: str,
+        cache_path: str,
+        max_retries: int,
+        keep_in_memory: bool = True
+    ) -> bytes:
+        """从WebDAV下载文件并写入磁盘与内存缓存(带重试)"""
+        last_error = None
+        for attempt in range(1, max_retries + 1):
+            try:
+                content = await self.webdav_client.download_file(webdav_path)
 
-            last_error = None
-            for attempt in range(1, max_retries + 1):
+                # 下载成功，尝试写入缓存
                 try:
-                    content = await self.webdav_client.download_file(webdav_path)
+                    await self._write_cache(cache_path, content)
+                    logger.debug(f"文件已缓存: {cache_path}")
+                except Exception as e:
+                    logger.warning(f"缓存写入失败: {str(e)}")
+                if keep_in_memory:
+                    self.memory_cache.put(webdav_path, content)
 
-                    # 下载成功，尝试写入缓存
-                    try:
-                        await self._write_cache(cache_path, content)
-                        logger.debug(f"文件已缓存: {cache_path}")
-                    except Exception as e:
-                        logger.warning(f"缓存写入失败: {str(e)}")
+                # 如果有重试，记录成功信息
+                if attempt > 1:
+                    logger.info(f"WebDAV下载成功 (第{attempt}次尝试): {webdav_path}")
 
-                    # 如果有重试，记录成功信息
-                    if attempt > 1:
-                        logger.info(f"WebDAV下载成功 (第{attempt}次尝试): {webdav_path}")
+                return content
 
-                    return content
+            except Exception as e:
+                last_error = e
+                if attempt < max_retries:
+                    # 不是最后一次尝试，记录警告并重试
+                    logger.warning(
+                        f"WebDAV下载失败 (第{attempt}/{max_retries}次): {webdav_path} - {str(e)}, "
+                        f"1秒后重试..."
+                    )
+                    await asyncio.sleep(1)  # 等待1秒后重试
+                else:
+                    # 最后一次尝试也失败了
+                    logger.error(
+                        f"WebDAV下载失败 (已重试{max_retries}次): {webdav_path} - {str(e)}"
+                    )
 
-                except Exception as e:
-                    last_error = e
-                    if attempt < max_retries:
-                        # 不是最后一次尝试，记录警告并重试
-                        logger.warning(
-                            f"WebDAV下载失败 (第{attempt}/{max_retries}次): {webdav_path} - {str(e)}, "
-                            f"1秒后重试..."
-                        )
-                        await asyncio.sleep(1)  # 等待1秒后重试
-                    else:
-                        # 最后一次尝试也失败了
-                        logger.error(
-                            f"WebDAV下载失败 (已重试{max_retries}次): {webdav_path} - {str(e)}"
-                        )
+        # 所有重试都失败
+        raise Exception(f"获取文件失败 (已重试{max_retries}次): {str(last_error)}")
 
-            # 所有重试都失败
-            error_msg = f"获取文件失败 (已重试{max_retries}次): {str(last_error)}"
-            raise Exception(error_msg)
+    async def open_stream(self, webdav_path: str) -> AsyncIterator[bytes]:
+        """
+        打开文件的流式读取（优先从缓存，未命中时边下载边写入缓存）
 
-        except Exception as e:
-            error_msg = f"获取文件失败: {str(e)}"
-            logger.error(error_msg)
-            raise Exception(error_msg)
+        返回前会先取到第一个数据块, 因此文件不存在、WebDAV不可用等错误在这里直接抛出,
+        调用方可以在开始发送响应之前转换为404等错误码。
 
-    async def cleanup_cache(self) -> Dict[str, int]:
-        """清理过期缓存文件"""
-        try:
-            logger.info("开始清理缓存文件")
+        Args:
+            webdav_path: WebDAV文件路径
 
-            stats = {
-                'total_files': 0,
-                'deleted_files': 0,
-                'freed_space': 0
-            }
+        Returns:
+            按块产出文件内容的异步迭代器
+        """
+        stream = self._stream_file(webdav_path)
+        try:
+            first_chunk = await stream.__anext__()
+        except StopAsyncIteration:
+            first_chunk = b''
+        except Exception:
+            await stream.aclose()
+            raise
+
+        async def _chained() -> AsyncIterator[bytes]:
+            try:
+                if first_chunk:
+                    yield first_chunk
+                async for chunk in stream:
+                    yield chunk
+            finally:
+                await stream.aclose()
 
-            cache_dir = Path(self.settings.CACHE_DIR)
-            if not cache_dir.exists():
-                logger.info("缓存目录不存在，跳过清理")
-                return stats
+        return _chained()
 
-            expiry_time = get_beijing_now_naive() - timedelta(days=self.settings.CACHE_DAYS)
+    async def _stream_file(self, webdav_path: str) -> AsyncIterator[bytes]:
+        """按块产出文件内容, 缓存未命中时把下载流同时写入缓存(tee)
 
-            # 遍历缓存目录
-            for file_path in cache_dir.rglob('*'):
-                if not file_path.is_file():
-                    continue
+        下载在后台任务中写入同目录下的临时文件, 完整接收后再原子重命名为缓存文件,
+        下载中断时删除临时文件, 其他读者不会看到不完整的缓存。
+        下载登记在 _inflight_downloads 中, 与 get_file/prefetch 及其他流式读者共享同一次下载。
+        """
+        cache_path = self._get_cache_path(webdav_path)
+        chunk_size = self.settings.WEBDAV_CHUNK_SIZE
+        memory_cache = self.memory_cache
+
+        content = memory_cache.get(webdav_path)
+        if content is not None:
+            logger.debug(f"内存缓存命中(流式): {webdav_path}")
+            for offset in range(0, len(content), chunk_size):
+                yield content[offset:offset + chunk_size]
+            return
+
+        if await run_io(self._is_cache_valid, cache_path):
+            logger.debug(f"缓存命中(流式): {cache_path}")
+            async for chunk in self._iter_cache_file(webdav_path, cache_path):
+                yield chunk
+            return
+
+        # 同一路径已有下载(get_file/prefetch/其他流式读者)时共享, 不重复下载
+        task = _joinable_download(webdav_path)
+        if task is None:
+            logger.debug(f"缓存未命中，从WebDAV流式下载: {webdav_path}")
+            task = self._start_stream_download(webdav_path, cache_path).task
+        else:
+            logger.debug(f"等待进行中的下载(流式): {webdav_path}")
 
-                stats['total_files'] += 1
+        stream = _inflight_streams.get(webdav_path)
+        if stream is not None and stream.task is task:
+            async for chunk in self._follow_download(webdav_path, cache_path, stream):
+                yield chunk
+        else:
+            async for chunk in self._iter_download_result(webdav_path, cache_path, task):
+                yield chunk
+
+    def _start_stream_download(self, webdav_path: str, cache_path: str) -> _StreamDownload:
+        """在后台开始流式下载并登记为进行中的下载"""
+        download = _StreamDownload(_new_part_path(cache_path))
+        download.task = asyncio.ensure_future(self._stream_to_cache(webdav_path, cache_path, download))
+        _inflight_downloads[webdav_path] = download.task
+        _inflight_streams[webdav_path] = download
+        download.task.add_done_callback(lambda t, p=webdav_path: self._clear_inflight(p, t))
+        return download
+
+    async def _stream_to_cache(self, webdav_path: str, cache_path: str, download: _StreamDownload) -> Optional[bytes]:
+        """按WebDAV速度把下载流写入 .part 文件, 完整接收后原子重命名为缓存文件
+
+        下载与读者的读取速度无关: 慢客户端或中途断开都不会拖慢或中断下载,
+        合并等待的 get_file/prefetch 按WebDAV速度拿到结果。
+        返回文件内容; 超出内存缓存上限时返回None(内容只在磁盘缓存中)。
+        """
+        memory_cache = self.memory_cache
+        completed = False
+        buffered: Optional[List[bytes]] = []
+        try:
+            await run_io(os.makedirs, os.path.dirname(cache_path), exist_ok=True)
+            part_file = await run_io(open, download.part_path, 'wb')
+            download.opened = True
+            download.notify()
+            try:
+                async for chunk in self.webdav_client.download_stream(webdav_path, self.settings.WEBDAV_CHUNK_SIZE):
+                    await run_io(_append_chunk, part_file, chunk)
+                    # 只在累计大小仍可放入内存缓存时保留数据块
+                    if buffered is not None:
+                        if memory_cache.accepts(download.received + len(chunk)):
+                            buffered.append(chunk)
+                        else:
+                            buffered = None
+                    download.received += len(chunk)
+                    download.notify()
+            finally:
+                part_file.close()
+            await run_io(os.replace, download.part_path, cache_path)
+            completed = True
+            await run_io(self._register_cache, cache_path, download.received)
+            content = b''.join(buffered) if buffered is not None else None
+            if content is not None:
+                memory_cache.put(webdav_path, content)
+            logger.debug(f"文件已缓存(流式): {cache_path}")
+            return content
+        finally:
+            if not completed:
+                await run_io(_remove_part_file, download.part_path)
+            download.finished = True
+            download.notify()
+
+    async def _follow_download(
+        self, webdav_path: str, cache_path: str, download: _StreamDownload
+    ) -> AsyncIterator[bytes]:
+        """跟随后台下载, 按读者自己的速度读取已写入 .part 文件的数据; 读者断开不影响下载"""
+        chunk_size = self.settings.WEBDAV_CHUNK_SIZE
+        while not (download.opened or download.finished):
+            await download.wait()
+        try:
+            f = await run_io(open, download.part_path, 'rb')
+        except FileNotFoundError:
+            # 下载已结束: 已重命名为缓存文件或失败后已删除
+            async for chunk in self._iter_download_result(webdav_path, cache_path, download.task):
+                yield chunk
+            return
+        try:
+            offset = 0
+            while True:
+                if offset < download.received:
+                    chunk = await run_io(f.read, min(chunk_size, download.received - offset))
+                    offset += len(chunk)
+                    yield chunk
+                elif download.finished:
+                    # 下载失败时抛出原异常
+                    await asyncio.shield(download.task)
+                    return
+                else:
+                    await download.wait()
+        finally:
+            f.close()
+
+    async def _iter_download_result(
+        self, webdav_path: str, cache_path: str, task: "asyncio.Task[Optional[bytes]]"
+    ) -> AsyncIterator[bytes]:
+        """等待进行中的下载完成后按块产出其内容"""
+        chunk_size = self.settings.WEBDAV_CHUNK_SIZE
+        content = await asyncio.shield(task)
+        if content is None:
+            async for chunk in self._iter_cache_file(webdav_path, cache_path):
+                yield chunk
+        else:
+            for offset in range(0, len(content), chunk_size):
+                yield content[offset:offset + chunk_size]
+
+    async def _iter_cache_file(self, webdav_path: str, cache_path: str) -> AsyncIterator[bytes]:
+        """按块读取磁盘缓存文件; 小文件整体读入并放入内存缓存, 大文件按块读取"""
+        chunk_size = self.settings.WEBDAV_CHUNK_SIZE
+        memory_cache = self.memory_cache
+        small = memory_cache.accepts(await run_io(os.path.getsize, cache_path))
+        buffered = []
+        f = await run_io(open, cache_path, 'rb')
+        try:
+            while True:
+                chunk = await run_io(f.read, chunk_size)
+                if not chunk:
+                    break
+                if small:
+                    buffered.append(chunk)
+                yield chunk
+        finally:
+            f.close()
+        if small:
+            memory_cache.put(webdav_path, b''.join(buffered))
 
-                try:
-                    # 检查文件修改时间
-                    mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
-                    if mtime < expiry_time:
-                        file_size = file_path.stat().st_size
-                        file_path.unlink()
+    async def cleanup_cache(self) -> Dict[str, int]:
+        """清理缓存: 删除超过CACHE_DAYS未访问的文件, 并把总量压回CACHE_MAX_BYTES以内
 
-                        stats['deleted_files'] += 1
-                        stats['freed_space'] += file_size
+        基于缓存索引按访问顺序淘汰, 只处理被淘汰的文件, 不再遍历整个缓存目录。
+        """
+        try:
+            logger.info("开始清理缓存文件")
 
-                        logger.debug(f"删除过期缓存文件: {file_path}")
+            index = self.cache_index
+            stats = {
+                'total_files': index.stats()['total_files'],
+                'deleted_files': 0,
+                'freed_space': 0
+            }
 
-                except Exception as e:
-                    logger.error(f"处理缓存文件失败 {file_path}: {str(e)}")
+            victims = index.take_victims(
+                self.settings.CACHE_MAX_BYTES,
+                self.settings.CACHE_EVICTION_POLICY,
+                expire_before=time.time() - self.settings.CACHE_DAYS * 86400
+            )
+            stats['deleted_files'] = len(victims)
+            stats['freed_space'] = self._remove_cache_files(victims)
 
             logger.info(f"缓存清理完成: 删除{stats['deleted_files']}个文件，释放{stats['freed_space']}字节")
             return stats
@@ -404,7 +731,27 @@ class FileManager:
             return {'error': str(e)}
 
     async def sync_pending_files(self) -> Dict[str, Any]:
-        """同步待同步文件到WebDAV"""
+        """同步待同步文件到WebDAV
+
+        最近加入的文件优先, 并行上传, 并发上限按上传耗时与失败自适应调整(AIMD);
+        失败的文件按指数退避推迟下次尝试。进度见 sync_progress。
+        已有一轮同步在运行时直接跳过。
+        """
+        if _sync_lock.locked():
+            logger.info("已有同步任务在运行，跳过本轮")
+            return {
+                'success': False,
+                'skipped': 'running',
+                'error': '同步正在进行中',
+                'synced_count': 0,
+                'failed_count': 0
+            }
+
+        async with _sync_lock:
+            return await self._sync_pending_batch()
+
+    async def _sync_pending_batch(self) -> Dict[str, Any]:
+        """领取一批待同步文件并行上传, 未处理完的条目在结束时放回队列"""
         try:
             logger.info("开始同步待同步文件")
 
@@ -417,10 +764,9 @@ class FileManager:
                     'failed_count': 0
                 }
 
-            pending_sync = self._load_pending_sync()
-            files = pending_sync.get('files', [])
+            items = await run_io(sync_queue.claim_due, limit=self.settings.SYNC_BATCH_SIZE)
 
-            if not files:
+            if not items:
                 return {
                     'success': True,
                     'message': '没有待同步文件',
@@ -435,52 +781,54 @@ class FileManager:
                 'errors': []
             }
 
-            remaining_files = []
-
-            for file_info in files:
-                try:
-                    temp_path = file_info['temp_path']
-                    filename = file_info['filename']
-                    webdav_path = file_info['webdav_path']
+            limiter = AdaptiveConcurrency(
+                self.settings.SYNC_MIN_CONCURRENCY,
+                self.settings.SYNC_MAX_CONCURRENCY,
+                self.settings.SYNC_TARGET_LATENCY_MS / 1000,
+            )
+            sync_progress.start(len(items), limiter.current)
+            running: Set["asyncio.Task[None]"] = set()
+            dispatched: Dict["asyncio.Task[None]", int] = {}
 
-                    # 检查临时文件是否存在
-                    if not os.path.exists(temp_path):
-                        logger.warning(f"临时文件不存在，跳过: {temp_path}")
+            try:
+                for index, item in enumerate(items):
+                    # 并发已满时等待任一上传完成
+                    while len(running) >= limiter.current:
+                        _, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    sync_progress.concurrency = limiter.current
+
+                    # 中途判定WebDAV不可用时停止派发, 剩余文件留给下次同步
+                    if webdav_health.snapshot()['available'] is False:
+                        logger.warning(f"WebDAV不可用, 停止本轮同步, {len(items) - index}个文件留待下次")
+                        break
+
+                    task = asyncio.ensure_future(self._sync_one(item, limiter, stats))
+                    running.add(task)
+                    dispatched[task] = item['id']
+
+                if running:
+                    await asyncio.wait(running)
+            finally:
+                # 本轮被取消时一并取消仍在上传的文件
+                pending = [task for task in dispatched if not task.done()]
+                for task in pending:
+                    task.cancel()
+                if pending:
+                    await asyncio.gather(*pending, return_exceptions=True)
+
+                # 只有正常处理完(已同步/已退避/已移出)的条目不再放回, 未派发、被取消或异常的都放回pending
+                finished: Set[int] = set()
+                for task, item_id in dispatched.items():
+                    if task.cancelled():
                         continue
-
-                    # 上传到WebDAV
-                    upload_result = await self.webdav_client.upload_file(
-                        temp_path, webdav_path
-                    )
-
-                    if upload_result['success']:
-                        # 同步成功，删除临时文件
-                        os.remove(temp_path)
-                        stats['synced_count'] += 1
-                        logger.info(f"文件同步成功: {webdav_path}")
-                    else:
-                        # 同步失败，保留在清单中
-                        remaining_files.append(file_info)
-                        stats['failed_count'] += 1
-                        stats['errors'].append({
-                            'filename': filename,
-                            'error': upload_result.get('error', '未知错误')
-                        })
-                        logger.error(f"文件同步失败: {filename} - {upload_result.get('error')}")
-
-                except Exception as e:
-                    remaining_files.append(file_info)
-                    stats['failed_count'] += 1
-                    stats['errors'].append({
-                        'filename': file_info.get('filename', 'unknown'),
-                        'error': str(e)
-                    })
-                    logger.error(f"同步文件异常: {str(e)}")
-
-            # 更新待同步清单
-            pending_sync['files'] = remaining_files
-            pending_sync['last_sync'] = get_beijing_now_naive_iso()
-            self._save_pending_sync(pending_sync)
+                    if task.exception() is not None:
+                        logger.error(f"同步文件异常 id={item_id}, 放回队列: {task.exception()}")
+                        continue
+                    finished.add(item_id)
+                unfinished = [item['id'] for item in items if item['id'] not in finished]
+                await run_io(sync_queue.release, unfinished)
+                sync_progress.released = len(unfinished)
+                sync_progress.finish()
 
             logger.info(f"同步完成: 成功{stats['synced_count']}，失败{stats['failed_count']}")
             return stats
@@ -495,30 +843,80 @@ class FileManager:
                 'failed_count': 0
             }
 
-    async def get_cache_stats(self) -> Dict[str, Any]:
-        """获取缓存统计信息"""
+    async def _sync_one(self, item: Dict[str, Any], limiter: AdaptiveConcurrency, stats: Dict[str, Any]):
+        """上传单个待同步文件并更新队列、并发上限与进度(队列与文件操作在I/O线程池中执行)"""
+        temp_path = item['temp_path']
+        filename = item['filename']
+        webdav_path = item['webdav_path']
+
+        # 检查临时文件是否存在
+        if not await run_io(os.path.exists, temp_path):
+            logger.warning(f"临时文件不存在，移出队列: {temp_path}")
+            await run_io(sync_queue.discard, item['id'], temp_path)
+            sync_progress.skipped += 1
+            return
+
+        sync_progress.in_flight += 1
+        started = time.monotonic()
         try:
-            cache_dir = Path(self.settings.CACHE_DIR)
-            if not cache_dir.exists():
-                return {
-                    'total_files': 0,
-                    'total_size': 0,
-                    'cache_dir': str(cache_dir)
-                }
-
-            total_files = 0
-            total_size = 0
+            # 上传到WebDAV
+            upload_result = await self.webdav_client.upload_file(temp_path, webdav_path)
+            error = None if upload_result['success'] else (upload_result.get('error') or '未知错误')
+        except Exception as e:
+            error = str(e)
+        finally:
+            sync_progress.in_flight -= 1
+
+        if error is None:
+            # 同步成功，移出队列并删除临时文件
+            limiter.on_success(time.monotonic() - started)
+            await run_io(sync_queue.mark_synced, item['id'], temp_path)
+            try:
+                await run_io(os.remove, temp_path)
+            except OSError as e:
+                logger.warning(f"删除已同步的临时文件失败 {temp_path}: {str(e)}")
+            stats['synced_count'] += 1
+            sync_progress.synced += 1
+            logger.info(f"文件同步成功: {webdav_path}")
+            return
+
+        # 同步失败，按指数退避推迟下次尝试
+        limiter.on_failure()
+        delay = backoff_delay(
+            item['attempts'],
+            self.settings.SYNC_BACKOFF_BASE_SECONDS,
+            self.settings.SYNC_BACKOFF_MAX_SECONDS,
+        )
+        await run_io(sync_queue.mark_failed, item['id'], error, retry_delay=delay, temp_path=temp_path)
+        stats['failed_count'] += 1
+        stats['errors'].append({
+            'filename': filename,
+            'error': error
+        })
+        sync_progress.failed += 1
+        sync_progress.last_error = error
+        logger.error(f"文件同步失败: {filename} - {error}, {delay:.0f}秒后重试")
 
-            for file_path in cache_dir.rglob('*'):
-                if file_path.is_file():
-                    total_files += 1
-                    total_size += file_path.stat().st_size
+    async def get_cache_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息(来自缓存索引, 不遍历目录)"""
+        try:
+            index_stats = self.cache_index.stats()
+            total_size = index_stats['total_size']
+            max_size = self.settings.CACHE_MAX_BYTES
+            lookups = index_stats['hits'] + index_stats['misses']
 
             return {
-                'total_files': total_files,
-                'total_size': total_size,
+                **index_stats,
+                'memory': self.memory_cache.stats(),
+                'warming': get_cache_warmer().stats(),
                 'total_size_mb': round(total_size / 1024 / 1024, 2),
-                'cache_dir': str(cache_dir)
+                'max_size': max_size,
+                'max_size_mb': round(max_size / 1024 / 1024, 2),
+                'usage_percent': round(total_size / max_size * 100, 2) if max_size else None,
+                'hit_rate': round(index_stats['hits'] / lookups, 4) if lookups else None,
+                'eviction_policy': self.settings.CACHE_EVICTION_POLICY,
+                'layout': self.settings.CACHE_LAYOUT,
+                'cache_dir': str(self.settings.CACHE_DIR)
             }
 
         except Exception as e:
@@ -532,8 +930,7 @@ class FileManager:
     async def get_pending_sync_count(self) -> int:
         """获取待同步文件数量"""
         try:
-            pending_sync = self._load_pending_sync()
-            return len(pending_sync.get('files', []))
+            return sync_queue.count_pending()
         except Exception as e:
             logger.error(f"获取待同步文件数量失败: {str(e)}")
             return 0
@@ -0,0 +1,294 @@
+"""
+文件响应的HTTP缓存与分段传输
+为预览/下载/uploaded_files 等文件接口统一处理:
+
+- 强ETag: WebDAV文件名带时间戳、内容不会被改写, 因此用 WebDAV路径+大小 生成,
+  内存热点缓存、磁盘缓存和重新下载后得到的ETag一致; 本地文件用 mtime+大小
+- If-None-Match 命中时返回 304, 不传输内容
+- Range(单段 bytes=) 返回 206, 超出范围返回 416; If-Range 与ETag不一致时返回完整内容
+- 磁盘文件用 FileRangeResponse 发送, ASGI服务器支持 zerocopysend 扩展时走 sendfile
+"""
+
+import os
+import stat
+import hashlib
+from typing import TYPE_CHECKING, Dict, Mapping, Optional, Tuple
+from urllib.parse import quote
+
+import anyio
+from starlette.requests import Request
+from starlette.responses import FileResponse, Response, StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+from .cache_warmer import note_interactive_request
+from .io_executor import run_io
+
+if TYPE_CHECKING:
+    from .file_manager import FileManager
+
+
+class RangeNotSatisfiable(Exception):
+    """Range 请求超出文件范围"""
+
+
+def make_etag(*parts) -> str:
+    """由若干标识字段生成强ETag(带引号)"""
+    digest = hashlib.md5("|".join(str(p) for p in parts).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def webdav_etag(webdav_path: str, size: int) -> str:
+    """WebDAV文件的ETag(与内容来源无关)"""
+    return make_etag(webdav_path, size)
+
+
+def content_disposition(disposition_type: str, filename: str) -> str:
+    """Content-Disposition 头, 非ASCII文件名按 RFC 5987 编码"""
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition_type}; filename*=utf-8''{quoted}"
+    return f'{disposition_type}; filename="{filename}"'
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match 比较(弱比较, 忽略 W/ 前缀)"""
+    if header.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """解析 Range 请求头, 返回闭区间 (start, end)
+
+    - 无法解析或多段范围时返回 None(按完整内容响应)
+    - 范围不可满足时抛出 RangeNotSatisfiable
+    """
+    if not header or not header.startswith("bytes="):
+        return None
+    spec = header[len("bytes="):].strip()
+    if "," in spec or "-" not in spec:
+        return None
+
+    start_text, end_text = (part.strip() for part in spec.split("-", 1))
+    try:
+        if start_text == "":
+            # bytes=-N: 最后N个字节
+            suffix = int(end_text)
+            if suffix <= 0:
+                raise RangeNotSatisfiable()
+            return max(size - suffix, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+
+    if start >= size:
+        raise RangeNotSatisfiable()
+    if start < 0 or end < start:
+        return None
+    return start, min(end, size - 1)
+
+
+def _conditional(
+    request: Request,
+    size: int,
+    etag: str,
+    headers: Mapping[str, str]
+) -> Tuple[Optional[Response], Optional[Tuple[int, int]], Dict[str, str]]:
+    """处理条件请求与Range
+
+    Returns:
+        (直接返回的响应, 分段范围, 响应头); 第一项不为None时直接返回它
+    """
+    response_headers = {**headers, "ETag": etag, "Accept-Ranges": "bytes"}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        not_modified = {
+            k: v for k, v in response_headers.items()
+            if k.lower() in ("etag", "cache-control", "accept-ranges")
+        }
+        return Response(status_code=304, headers=not_modified), None, response_headers
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() != etag:
+        range_header = None
+
+    try:
+        byte_range = parse_range(range_header, size)
+    except RangeNotSatisfiable:
+        return Response(
+            status_code=416,
+            headers={**response_headers, "Content-Range": f"bytes */{size}"},
+        ), None, response_headers
+
+    if byte_range is not None:
+        start, end = byte_range
+        response_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return None, byte_range, response_headers
+
+
+class FileRangeResponse(FileResponse):
+    """只发送文件指定区间的 FileResponse
+
+    文件在发送响应头之前打开, 避免缓存文件在检查之后被淘汰时返回半截响应。
+    """
+
+    def __init__(self, path: str, stat_result: os.stat_result, start: int = 0,
+                 end: Optional[int] = None, **kwargs):
+        self.start = start
+        self.end = stat_result.st_size - 1 if end is None else end
+        super().__init__(path, stat_result=stat_result, **kwargs)
+        self.headers["content-length"] = str(self.end - self.start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        count = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await send({
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            })
+            if self.send_header_only or count <= 0:
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
+            elif "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": file.wrapped.fileno(),
+                    "offset": self.start,
+                    "count": count,
+                    "more_body": False,
+                })
+            else:
+                await file.seek(self.start)
+                remaining = count
+                while remaining > 0:
+                    chunk = await file.read(min(self.chunk_size, remaining))
+                    if not chunk:
+                        break
+                    remaining -= len(chunk)
+                    await send({
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    })
+                if remaining > 0:
+                    # 文件在发送过程中被截断, 结束响应体
+                    await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def file_response(
+    request: Request,
+    path: str,
+    media_type: str,
+    headers: Optional[Mapping[str, str]] = None,
+    etag: Optional[str] = None,
+    stat_result: Optional[os.stat_result] = None,
+) -> Response:
+    """返回磁盘文件, 支持ETag/304与Range
+
+    Args:
+        etag: 为空时使用 mtime+大小
+        stat_result: 调用方已 stat 过时传入, 省去一次系统调用
+
+    Raises:
+        FileNotFoundError: 文件不存在或不是普通文件
+    """
+    stat_result = stat_result or os.stat(path)
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise FileNotFoundError(path)
+    size = stat_result.st_size
+    etag = etag or make_etag(stat_result.st_mtime, size)
+
+    early, byte_range, response_headers = _conditional(request, size, etag, headers or {})
+    if early is not None:
+        return early
+
+    start, end = byte_range if byte_range else (0, size - 1)
+    return FileRangeResponse(
+        path,
+        stat_result,
+        start=start,
+        end=end,
+        status_code=206 if byte_range else 200,
+        headers=response_headers,
+        media_type=media_type,
+        method=request.method,
+    )
+
+
+def bytes_response(
+    request: Request,
+    content: bytes,
+    media_type: str,
+    etag: str,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Response:
+    """返回内存中的文件内容(内存热点缓存命中), 支持ETag/304与Range"""
+    size = len(content)
+    early, byte_range, response_headers = _conditional(request, size, etag, headers or {})
+    if early is not None:
+        return early
+
+    if byte_range:
+        start, end = byte_range
+        return Response(
+            content=content[start:end + 1],
+            status_code=206,
+            media_type=media_type,
+            headers=response_headers,
+        )
+    return Response(content=content, media_type=media_type, headers=response_headers)
+
+
+def _stat_valid_cache(file_manager: "FileManager", cache_path: str) -> Optional[os.stat_result]:
+    """磁盘缓存有效时返回文件状态, 否则返回None(同步, 供 run_io 调用)"""
+    if not file_manager._is_cache_valid(cache_path):
+        return None
+    try:
+        return os.stat(cache_path)
+    except FileNotFoundError:
+        # 检查之后被淘汰, 按未命中处理
+        return None
+
+
+async def cached_file_response(
+    request: Request,
+    file_manager: "FileManager",
+    webdav_path: str,
+    media_type: str,
+    headers: Optional[Mapping[str, str]] = None,
+) -> Tuple[Response, str]:
+    """按 内存热点缓存 -> 磁盘缓存 -> WebDAV 的顺序返回文件
+
+    Returns:
+        (响应, 访问方式 memory/cache/webdav)
+    """
+    note_interactive_request()
+
+    content = file_manager.get_hot_object(webdav_path)
+    if content is not None:
+        etag = webdav_etag(webdav_path, len(content))
+        return bytes_response(request, content, media_type, etag, headers), "memory"
+
+    cache_path = file_manager._get_cache_path(webdav_path)
+    stat_result = await run_io(_stat_valid_cache, file_manager, cache_path)
+    if stat_result is not None:
+        etag = webdav_etag(webdav_path, stat_result.st_size)
+        return file_response(
+            request, cache_path, media_type, headers, etag=etag, stat_result=stat_result
+        ), "cache"
+
+    # 缓存未命中: 边下载边写入缓存, 首次响应不带ETag与Range, 之后的请求走磁盘缓存
+    file_stream = await file_manager.open_stream(webdav_path)
+    return StreamingResponse(file_stream, media_type=media_type, headers=headers), "webdav"
@@ -0,0 +1,313 @@
+"""
+WebDAV文件完整性批量巡检
+
+策略:
+    WebDAV上的文件按 files/YYYY/MM/DD/ 组织。每个日期目录只发一次 Depth:1 PROPFIND,
+    拿到目录下所有文件的大小后在内存中与 upload_history 对比, 取代逐条 get_file_size。
+
+    - 每轮按目录名顺序扫描游标之后的 WEBDAV_INTEGRITY_DIRS_PER_RUN 个目录, 到末尾后回绕,
+      游标持久化在 app_meta 中, 多轮之后覆盖整个归档。
+    - 最近 WEBDAV_INTEGRITY_RECENT_DAYS 个目录每轮都扫描, 兜底 WEBDAV_UPLOAD_VERIFY=deferred
+      时未在上传路径上校验的新文件。
+    - 发现的问题写入 webdav_integrity_findings(每条上传记录一行), 复查正常后标记 resolved_at;
+      与之前一样只记录问题, 不修改 upload_history 的状态。
+
+注意:
+    ``get_db_connection`` 在整个 with 块期间持有全局数据库锁, 因此先读出记录,
+    完成全部网络请求后再开连接落库, 持锁期间不做网络 I/O。
+"""
+
+import asyncio
+import logging
+import posixpath
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import get_settings
+from .database import get_db_connection
+from .timezone import get_beijing_now_naive_iso
+from .webdav_client import WebDAVClient
+
+logger = logging.getLogger(__name__)
+
+META_CURSOR = "webdav_integrity_cursor"
+META_LAST_RUN = "webdav_integrity_last_run"
+
+# 同时进行的目录PROPFIND数
+_SCAN_CONCURRENCY = 4
+# 单条UPDATE ... IN (...) 的参数个数上限(SQLite默认999)
+_SQL_BATCH = 500
+
+ISSUE_MISSING = "missing"
+ISSUE_ZERO_SIZE = "zero_size"
+ISSUE_SIZE_MISMATCH = "size_mismatch"
+
+
+def _load_records_by_directory() -> Dict[str, List[Dict[str, Any]]]:
+    """读取需要校验的记录, 按WebDAV目录分组"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT id, file_name, file_size, webdav_path
+            FROM upload_history
+            WHERE status = 'success'
+              AND deleted_at IS NULL
+              AND webdav_path IS NOT NULL
+              AND webdav_path != ''
+              AND file_size IS NOT NULL
+              AND file_size > 0
+            """
+        )
+        rows = cursor.fetchall()
+
+    by_directory: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        directory = posixpath.dirname(row["webdav_path"].strip('/'))
+        by_directory.setdefault(directory, []).append({
+            "id": row["id"],
+            "file_name": row["file_name"],
+            "file_size": row["file_size"],
+            "webdav_path": row["webdav_path"],
+        })
+    return by_directory
+
+
+def _read_meta(key: str) -> Optional[str]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT value FROM app_meta WHERE key = ?", (key,))
+        row = cursor.fetchone()
+    return row["value"] if row else None
+
+
+def select_directories(
+    directories: List[str],
+    cursor: Optional[str],
+    per_run: int,
+    recent: int
+) -> Tuple[List[str], Optional[str]]:
+    """选出本轮要扫描的目录, 返回 (目录列表, 新游标)
+
+    游标是上一轮轮转扫描到的最后一个目录名; 目录按名称(即日期)排序。
+    """
+    ordered = sorted(directories)
+    if not ordered:
+        return [], cursor
+
+    start = 0
+    if cursor:
+        start = next((i for i, d in enumerate(ordered) if d > cursor), len(ordered))
+    rotating = (ordered[start:] + ordered[:start])[:per_run]
+    new_cursor = rotating[-1] if rotating else cursor
+
+    selected = list(rotating)
+    for directory in ordered[-recent:] if recent else []:
+        if directory not in selected:
+            selected.append(directory)
+    return selected, new_cursor
+
+
+async def _list_directory(
+    webdav_client: WebDAVClient,
+    directory: str,
+    semaphore: asyncio.Semaphore
+) -> Optional[Dict[str, int]]:
+    """列出目录下文件的 名称->大小; 目录不存在返回空字典, 其他错误返回None(本轮跳过)"""
+    async with semaphore:
+        try:
+            entries = await webdav_client.list_files(directory)
+        except Exception as e:
+            if "不存在" in str(e) or "404" in str(e):
+                return {}
+            logger.error(f"[WebDAV完整性巡检] 列出目录失败 {directory}: {str(e)}")
+            return None
+
+    return {
+        entry["name"]: entry.get("size")
+        for entry in entries
+        if not entry.get("is_directory")
+    }
+
+
+def _compare(records: List[Dict[str, Any]], remote: Dict[str, int]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """对比一个目录的记录与远端列表, 返回 (问题列表, 正常记录id列表)"""
+    findings = []
+    ok_ids = []
+    for record in records:
+        name = posixpath.basename(record["webdav_path"])
+        if name not in remote:
+            issue, remote_size = ISSUE_MISSING, None
+        else:
+            remote_size = remote[name]
+            if remote_size is None:
+                # 服务器未返回大小, 无法判断, 不计入问题也不视为已修复
+                continue
+            if remote_size == record["file_size"]:
+                ok_ids.append(record["id"])
+                continue
+            issue = ISSUE_ZERO_SIZE if remote_size == 0 else ISSUE_SIZE_MISMATCH
+
+        findings.append({**record, "remote_size": remote_size, "issue": issue})
+    return findings, ok_ids
+
+
+def _persist_results(
+    findings: List[Dict[str, Any]],
+    ok_ids: List[int],
+    new_cursor: Optional[str],
+    now: str
+) -> int:
+    """写入问题、关闭已恢复的问题并保存游标, 返回关闭的问题数"""
+    resolved = 0
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for finding in findings:
+            cursor.execute(
+                """
+                INSERT INTO webdav_integrity_findings
+                    (record_id, webdav_path, file_name, expected_size, remote_size,
+                     issue, first_seen_at, last_seen_at, resolved_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)
+                ON CONFLICT(record_id) DO UPDATE SET
+                    webdav_path = excluded.webdav_path,
+                    file_name = excluded.file_name,
+                    expected_size = excluded.expected_size,
+                    remote_size = excluded.remote_size,
+                    issue = excluded.issue,
+                    first_seen_at = CASE
+                        WHEN webdav_integrity_findings.resolved_at IS NOT NULL
+                        THEN excluded.first_seen_at
+                        ELSE webdav_integrity_findings.first_seen_at
+                    END,
+                    last_seen_at = excluded.last_seen_at,
+                    resolved_at = NULL
+                """,
+                (
+                    finding["id"], finding["webdav_path"], finding["file_name"],
+                    finding["file_size"], finding["remote_size"], finding["issue"],
+                    now, now,
+                ),
+            )
+
+        for i in range(0, len(ok_ids), _SQL_BATCH):
+            batch = ok_ids[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            cursor.execute(
+                f"""
+                UPDATE webdav_integrity_findings
+                SET resolved_at = ?
+                WHERE resolved_at IS NULL AND record_id IN ({placeholders})
+                """,
+                [now, *batch],
+            )
+            resolved += cursor.rowcount
+
+        for key, value in ((META_CURSOR, new_cursor), (META_LAST_RUN, now)):
+            if value is None:
+                continue
+            cursor.execute(
+                "INSERT INTO app_meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value),
+            )
+        conn.commit()
+    return resolved
+
+
+async def run_integrity_scan(webdav_client: Optional[WebDAVClient] = None) -> Dict[str, Any]:
+    """执行一轮完整性巡检
+
+    Returns:
+        {"directories", "checked", "problems", "resolved", "failed_directories", "cursor"}
+    """
+    settings = get_settings()
+    webdav_client = webdav_client or WebDAVClient()
+
+    by_directory = _load_records_by_directory()
+    directories, new_cursor = select_directories(
+        list(by_directory),
+        _read_meta(META_CURSOR),
+        settings.WEBDAV_INTEGRITY_DIRS_PER_RUN,
+        settings.WEBDAV_INTEGRITY_RECENT_DAYS,
+    )
+
+    semaphore = asyncio.Semaphore(_SCAN_CONCURRENCY)
+    listings = await asyncio.gather(*[
+        _list_directory(webdav_client, directory, semaphore) for directory in directories
+    ])
+
+    findings: List[Dict[str, Any]] = []
+    ok_ids: List[int] = []
+    checked = 0
+    failed_directories = []
+    for directory, remote in zip(directories, listings):
+        if remote is None:
+            failed_directories.append(directory)
+            continue
+        records = by_directory[directory]
+        checked += len(records)
+        dir_findings, dir_ok = _compare(records, remote)
+        findings.extend(dir_findings)
+        ok_ids.extend(dir_ok)
+
+    for finding in findings:
+        logger.error(
+            f"[WebDAV完整性问题] id={finding['id']}, 文件={finding['file_name']}, "
+            f"问题={finding['issue']}, 本地file_size={finding['file_size']}, "
+            f"远端size={finding['remote_size']}, webdav_path={finding['webdav_path']}"
+        )
+
+    resolved = _persist_results(findings, ok_ids, new_cursor, get_beijing_now_naive_iso())
+
+    return {
+        "directories": len(directories),
+        "checked": checked,
+        "problems": len(findings),
+        "resolved": resolved,
+        "failed_directories": failed_directories,
+        "cursor": new_cursor,
+    }
+
+
+def get_integrity_findings(status: str = "open", page: int = 1, limit: int = 50) -> Dict[str, Any]:
+    """分页查询巡检发现的问题
+
+    Args:
+        status: open(未解决) / resolved(已恢复) / all
+    """
+    where = {
+        "open": "WHERE resolved_at IS NULL",
+        "resolved": "WHERE resolved_at IS NOT NULL",
+        "all": "",
+    }[status]
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT COUNT(*) FROM webdav_integrity_findings {where}")
+        total = cursor.fetchone()[0]
+        cursor.execute(
+            f"""
+            SELECT record_id, webdav_path, file_name, expected_size, remote_size,
+                   issue, first_seen_at, last_seen_at, resolved_at
+            FROM webdav_integrity_findings
+            {where}
+            ORDER BY last_seen_at DESC, id DESC
+            LIMIT ? OFFSET ?
+            """,
+            (limit, (page - 1) * limit),
+        )
+        items = [dict(row) for row in cursor.fetchall()]
+        cursor.execute(
+            "SELECT key, value FROM app_meta WHERE key IN (?, ?)",
+            (META_CURSOR, META_LAST_RUN),
+        )
+        meta = {row["key"]: row["value"] for row in cursor.fetchall()}
+
+    return {
+        "items": items,
+        "total": total,
+        "page": page,
+        "limit": limit,
+        "cursor": meta.get(META_CURSOR),
+        "last_run_at": meta.get(META_LAST_RUN),
+    }
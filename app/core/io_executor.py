@@ -0,0 +1,68 @@
+"""
+磁盘I/O线程池
+FileManager 与上传接口中的文件读写(缓存、临时存储、本地备份)都通过这里执行,
+避免几MB的同步写入阻塞事件循环。线程数由 IO_EXECUTOR_WORKERS 限制,
+突发上传时多余的I/O在线程池队列中排队, 不会无限制地创建线程。
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from .config import get_settings
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_io_executor() -> ThreadPoolExecutor:
+    """获取进程内共享的磁盘I/O线程池"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=get_settings().IO_EXECUTOR_WORKERS,
+                    thread_name_prefix="file-io",
+                )
+    return _executor
+
+
+async def run_io(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在磁盘I/O线程池中执行阻塞函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_io_executor(), functools.partial(func, *args, **kwargs))
+
+
+def write_file(path: str, content: bytes) -> None:
+    """写入文件(同步, 供 run_io 调用)"""
+    with open(path, 'wb') as f:
+        f.write(content)
+
+
+def read_file(path: str) -> bytes:
+    """读取整个文件(同步, 供 run_io 调用)"""
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def remove_file(path: str) -> None:
+    """删除文件, 文件不存在时忽略(同步, 供 run_io 调用)"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def shutdown_io_executor() -> None:
+    """应用关闭时等待进行中的I/O完成"""
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
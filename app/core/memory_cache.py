@@ -0,0 +1,100 @@
+"""
+进程内热点对象缓存
+位于磁盘缓存之前, 按字节预算保存最近访问的小文件(预览图片等),
+命中时不再访问磁盘(无 stat / read / utime)。
+
+- 总容量 HOT_CACHE_MAX_BYTES, 超出后按LRU淘汰; 为0时关闭
+- 单个对象超过 HOT_CACHE_MAX_OBJECT_BYTES 不进入内存缓存
+- WebDAV路径对应的文件内容不会被改写(文件名带时间戳), 因此无需失效, 删除记录时再移除
+"""
+
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from .config import get_settings
+
+
+class MemoryCache:
+    """按字节预算的LRU对象缓存(线程安全)"""
+
+    def __init__(self, max_bytes: int, max_object_bytes: int):
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, bytes]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            content = self._items.get(key)
+            if content is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return content
+
+    def __contains__(self, key: str) -> bool:
+        """是否已缓存(不计入命中统计, 不调整LRU顺序)"""
+        with self._lock:
+            return key in self._items
+
+    def accepts(self, size: int) -> bool:
+        """该大小的对象是否会被缓存"""
+        return self.max_bytes > 0 and size <= min(self.max_object_bytes, self.max_bytes)
+
+    def put(self, key: str, content: bytes) -> None:
+        if not self.accepts(len(content)):
+            return
+        with self._lock:
+            previous = self._items.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= len(previous)
+            self._items[key] = content
+            self.total_bytes += len(content)
+            while self.total_bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.total_bytes -= len(evicted)
+                self.evictions += 1
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            content = self._items.pop(key, None)
+            if content is not None:
+                self.total_bytes -= len(content)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'objects': len(self._items),
+                'size': self.total_bytes,
+                'size_mb': round(self.total_bytes / 1024 / 1024, 2),
+                'max_size': self.max_bytes,
+                'max_object_size': self.max_object_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            }
+
+
+_memory_cache: Optional[MemoryCache] = None
+
+
+def get_memory_cache() -> MemoryCache:
+    """获取进程内共享的热点对象缓存"""
+    global _memory_cache
+    if _memory_cache is None:
+        settings = get_settings()
+        _memory_cache = MemoryCache(settings.HOT_CACHE_MAX_BYTES, settings.HOT_CACHE_MAX_OBJECT_BYTES)
+    return _memory_cache
@@ -0,0 +1,322 @@
+"""
+分层存储策略
+同一张图片可能同时存在于 LOCAL_STORAGE_PATH(本地备份)、CACHE_DIR(磁盘缓存)、
+TEMP_STORAGE_DIR(待同步)和WebDAV。定时任务按最近访问时间与访问次数把每个对象归入:
+
+- hot: STORAGE_HOT_DAYS 天内访问过, 或 CACHE_DAYS 内命中次数达到 STORAGE_HOT_MIN_HITS
+  应当本地可读: 不在本地也不在缓存中时预取到磁盘缓存
+- warm: CACHE_DAYS 天内访问过, 保留在磁盘缓存(由缓存容量上限与淘汰策略管理)
+- cold: 只保留在WebDAV, 磁盘缓存由 cleanup_cache 按 CACHE_DAYS 过期淘汰
+
+本地备份(LOCAL_STORAGE_PATH)超过 STORAGE_LOCAL_RETENTION_DAYS 天且对象不是hot时降级:
+先用PROPFIND确认WebDAV上的文件大小一致, 再下载WebDAV文件比对SHA-256, 内容一致后
+warm对象移入磁盘缓存, cold对象直接删除, 并清空记录的 local_file_path。
+待同步队列中的对象(WebDAV上可能还没有)一律不动。默认关闭(STORAGE_TIERING_ENABLED)。
+
+与完整性巡检一样, 先读出记录, 完成网络请求和文件操作后再开连接落库,
+持有全局数据库锁期间不做网络 I/O; 数据库读写与逐条记录的文件检查在I/O线程池中执行。
+"""
+
+import os
+import time
+import shutil
+import hashlib
+import logging
+from datetime import datetime
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set, Tuple
+
+from .cache_warmer import warm_paths
+from .config import get_settings
+from .database import get_db_connection
+from .io_executor import run_io
+from . import sync_queue
+from .timezone import get_beijing_now_naive, get_beijing_now_naive_iso
+
+if TYPE_CHECKING:
+    from .file_manager import FileManager
+
+logger = logging.getLogger(__name__)
+
+TIER_HOT = "hot"
+TIER_WARM = "warm"
+TIER_COLD = "cold"
+
+# 单条UPDATE ... IN (...) 的参数个数上限(SQLite默认999)
+_SQL_BATCH = 500
+
+# 最近一次策略执行的结果(进程内)
+_last_run: Optional[Dict[str, Any]] = None
+
+
+def classify(idle_seconds: float, hits: int, settings=None) -> str:
+    """按距最近一次访问的秒数和缓存命中次数分层"""
+    settings = settings or get_settings()
+    cache_window = settings.CACHE_DAYS * 86400
+    if idle_seconds <= settings.STORAGE_HOT_DAYS * 86400:
+        return TIER_HOT
+    if idle_seconds <= cache_window and hits >= settings.STORAGE_HOT_MIN_HITS:
+        return TIER_HOT
+    if idle_seconds <= cache_window:
+        return TIER_WARM
+    return TIER_COLD
+
+
+def _load_records() -> List[Dict[str, Any]]:
+    """已上传到WebDAV、未删除的记录"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT id, webdav_path, local_file_path, file_size, upload_time
+            FROM upload_history
+            WHERE status = 'success'
+              AND deleted_at IS NULL
+              AND webdav_path IS NOT NULL
+              AND webdav_path != ''
+            """
+        )
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def _clear_local_paths(record_ids: List[int]) -> None:
+    if not record_ids:
+        return
+    now = get_beijing_now_naive_iso()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        for i in range(0, len(record_ids), _SQL_BATCH):
+            batch = record_ids[i:i + _SQL_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            cursor.execute(
+                f"UPDATE upload_history SET local_file_path = NULL, updated_at = ? WHERE id IN ({placeholders})",
+                [now, *batch],
+            )
+        conn.commit()
+
+
+def _upload_age_seconds(upload_time: Optional[str], now: datetime) -> Optional[float]:
+    if not upload_time:
+        return None
+    try:
+        return (now - datetime.fromisoformat(upload_time)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+
+
+def _local_copy(local_file_path: Optional[str], storage_root: str) -> Optional[os.stat_result]:
+    """local_file_path 指向 LOCAL_STORAGE_PATH 下存在的文件时返回其 stat, 否则None(临时存储等)"""
+    if not local_file_path:
+        return None
+    path = os.path.realpath(local_file_path)
+    if os.path.commonpath([storage_root, path]) != storage_root:
+        return None
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None
+    return stat_result if os.path.isfile(path) else None
+
+
+def _directory_usage(root: str) -> Dict[str, int]:
+    files = 0
+    total = 0
+    for directory, _, filenames in os.walk(root):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(directory, name))
+                files += 1
+            except OSError:
+                continue
+    return {'files': files, 'bytes': total}
+
+
+def _move_into_cache(file_manager: "FileManager", source: str, cache_path: str) -> int:
+    """把本地备份移入磁盘缓存(跨文件系统时复制后删除), 返回文件大小"""
+    part_path = f"{cache_path}.part-tier"
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    try:
+        os.replace(source, cache_path)
+    except OSError:
+        shutil.copyfile(source, part_path)
+        os.replace(part_path, cache_path)
+        os.remove(source)
+    size = os.path.getsize(cache_path)
+    file_manager._register_cache(cache_path, size)
+    return size
+
+
+def _file_digest(path: str) -> str:
+    """本地文件的SHA-256(同步, 供 run_io 调用)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def _remote_digest(file_manager: "FileManager", webdav_path: str) -> Optional[str]:
+    """流式下载WebDAV文件计算SHA-256, 下载失败返回None"""
+    digest = hashlib.sha256()
+    try:
+        async for chunk in file_manager.webdav_client.download_stream(webdav_path):
+            digest.update(chunk)
+    except Exception as e:
+        logger.warning(f"分层降级校验下载失败 {webdav_path}: {str(e)}")
+        return None
+    return digest.hexdigest()
+
+
+def _plan(
+    file_manager: "FileManager",
+    records: List[Dict[str, Any]],
+    pending: Set[str],
+    storage_root: str,
+) -> Tuple[Dict[str, int], int, List[str], List[Tuple[Dict[str, Any], str, os.stat_result, str]]]:
+    """逐条记录分层并选出需预取和需降级的对象(同步, 供 run_io 调用)
+
+    Returns:
+        (各层对象数, WebDAV总字节数, 需预取的webdav_path, 需降级的(记录, 缓存路径, 本地stat, 层级))
+    """
+    settings = file_manager.settings
+    retention_seconds = settings.STORAGE_LOCAL_RETENTION_DAYS * 86400
+    index = file_manager.cache_index
+    now_wall = time.time()
+    now_local = get_beijing_now_naive()
+
+    objects = {TIER_HOT: 0, TIER_WARM: 0, TIER_COLD: 0}
+    webdav_bytes = 0
+    promote: List[str] = []
+    demote: List[Tuple[Dict[str, Any], str, os.stat_result, str]] = []
+
+    for record in records:
+        webdav_path = record['webdav_path']
+        webdav_bytes += record['file_size'] or 0
+        cache_path = file_manager._get_cache_path(webdav_path)
+        entry = index.get(cache_path)
+
+        idle = _upload_age_seconds(record['upload_time'], now_local)
+        if entry is not None:
+            access_idle = now_wall - entry.last_access
+            idle = access_idle if idle is None else min(idle, access_idle)
+        tier = classify(idle if idle is not None else float('inf'), entry.hits if entry else 0, settings)
+        objects[tier] += 1
+
+        local_stat = _local_copy(record['local_file_path'], storage_root)
+        if tier == TIER_HOT:
+            if entry is None and local_stat is None:
+                promote.append(webdav_path)
+            continue
+
+        if (
+            local_stat is not None
+            and webdav_path not in pending
+            and now_wall - local_stat.st_mtime > retention_seconds
+            and len(demote) < settings.STORAGE_TIERING_MAX_MOVES
+        ):
+            demote.append((record, cache_path, local_stat, tier))
+
+    return objects, webdav_bytes, promote, demote
+
+
+def get_tier_usage(file_manager: "FileManager") -> Dict[str, Dict[str, Any]]:
+    """各存储层当前占用(不遍历目录的部分; 本地备份层取最近一次策略执行时的统计)"""
+    index_stats = file_manager.cache_index.stats()
+    memory_stats = file_manager.memory_cache.stats()
+    queue_stats = sync_queue.get_queue_stats()
+    local = (_last_run or {}).get('tiers', {}).get('local')
+    return {
+        'memory': {'files': memory_stats['objects'], 'bytes': memory_stats['size']},
+        'cache': {'files': index_stats['total_files'], 'bytes': index_stats['total_size']},
+        'temp': {'files': queue_stats['total'], 'bytes': queue_stats['total_bytes']},
+        'local': local,
+    }
+
+
+async def run_storage_tiering(file_manager: "FileManager") -> Dict[str, Any]:
+    """执行一轮分层策略
+
+    Returns:
+        {"objects": 各层对象数, "promoted", "demoted_to_cache", "removed_local",
+         "verify_failed", "tiers": 各存储层文件数与字节数, "finished_at"}
+    """
+    global _last_run
+    started = time.monotonic()
+    storage_root = os.path.realpath(file_manager.settings.LOCAL_STORAGE_PATH)
+    index = file_manager.cache_index
+
+    records = await run_io(_load_records)
+    pending = set(await run_io(sync_queue.list_webdav_paths))
+    objects, webdav_bytes, promote, demote = await run_io(
+        _plan, file_manager, records, pending, storage_root
+    )
+
+    promoted = warm_paths(promote)
+
+    cleared: List[int] = []
+    demoted_to_cache = 0
+    removed_local = 0
+    verify_failed = 0
+    for record, cache_path, local_stat, tier in demote:
+        remote_size = await file_manager.webdav_client.get_file_size(record['webdav_path'])
+        if remote_size != local_stat.st_size:
+            verify_failed += 1
+            logger.warning(
+                f"分层降级跳过: WebDAV文件大小不一致或不存在 id={record['id']}, "
+                f"本地={local_stat.st_size}, 远端={remote_size}, webdav_path={record['webdav_path']}"
+            )
+            continue
+
+        source = os.path.realpath(record['local_file_path'])
+        # 大小一致还不够: 下载WebDAV文件比对内容, 一致才删除或移走本地备份
+        try:
+            local_digest = await run_io(_file_digest, source)
+        except OSError as e:
+            logger.error(f"分层降级读取本地备份失败 id={record['id']} {source}: {str(e)}")
+            continue
+        remote_digest = await _remote_digest(file_manager, record['webdav_path'])
+        if remote_digest != local_digest:
+            verify_failed += 1
+            logger.warning(
+                f"分层降级跳过: WebDAV文件内容与本地备份不一致或无法下载 id={record['id']}, "
+                f"webdav_path={record['webdav_path']}"
+            )
+            continue
+
+        try:
+            if tier == TIER_WARM and index.get(cache_path) is None:
+                await run_io(_move_into_cache, file_manager, source, cache_path)
+                demoted_to_cache += 1
+            else:
+                await run_io(os.remove, source)
+                removed_local += 1
+        except OSError as e:
+            logger.error(f"分层降级失败 id={record['id']} {source}: {str(e)}")
+            continue
+        cleared.append(record['id'])
+
+    await run_io(_clear_local_paths, cleared)
+
+    tiers = await run_io(get_tier_usage, file_manager)
+    tiers['local'] = await run_io(_directory_usage, storage_root)
+    tiers['webdav'] = {'files': len(records), 'bytes': webdav_bytes}
+
+    result = {
+        'objects': objects,
+        'promoted': promoted,
+        'demoted_to_cache': demoted_to_cache,
+        'removed_local': removed_local,
+        'verify_failed': verify_failed,
+        'tiers': tiers,
+        'duration_seconds': round(time.monotonic() - started, 2),
+        'finished_at': get_beijing_now_naive_iso(),
+    }
+    _last_run = result
+    return result
+
+
+def get_storage_tiers_report(file_manager: "FileManager") -> Dict[str, Any]:
+    """各存储层当前占用与最近一次策略执行结果"""
+    return {
+        'tiers': get_tier_usage(file_manager),
+        'last_run': _last_run,
+    }
@@ -0,0 +1,113 @@
+"""
+待同步文件并行补传的并发控制与进度
+WebDAV恢复后补传积压文件时, 并发数按 AIMD 自适应调整:
+
+- 上传成功且耗时不超过 SYNC_TARGET_LATENCY_MS: 并发上限每轮(约等于当前上限个成功)+1
+- 上传失败或耗时超标: 并发上限减半(不低于 SYNC_MIN_CONCURRENCY), 同一批并发中的多个失败
+  只减半一次
+- 上限不超过 SYNC_MAX_CONCURRENCY
+
+进度保存在进程内共享的 sync_progress 中, 通过 /api/admin/webdav/status 查询。
+"""
+
+import time
+import random
+from typing import Any, Dict, Optional
+
+from .timezone import get_beijing_now_naive_iso
+
+
+def backoff_delay(attempts: int, base: float, maximum: float) -> float:
+    """第 attempts+1 次失败后的重试等待秒数: 指数退避, 带随机抖动避免同时重试"""
+    delay = min(maximum, base * (2 ** attempts))
+    return delay * random.uniform(0.5, 1.0)
+
+
+class AdaptiveConcurrency:
+    """AIMD 并发上限"""
+
+    def __init__(self, minimum: int, maximum: int, target_latency: float, initial: Optional[int] = None):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.limit = float(initial if initial is not None else minimum)
+        self._last_decrease = 0.0
+
+    @property
+    def current(self) -> int:
+        return max(self.minimum, min(self.maximum, int(self.limit)))
+
+    def on_success(self, latency: float) -> None:
+        if latency > self.target_latency:
+            self._decrease()
+            return
+        # 每个成功增加 1/limit, 约等于每轮(limit个请求)+1
+        self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+    def on_failure(self) -> None:
+        self._decrease()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        # 同一批在途请求的失败只减半一次
+        if now - self._last_decrease < self.target_latency:
+            return
+        self._last_decrease = now
+        self.limit = max(float(self.minimum), self.limit / 2)
+
+
+class SyncProgress:
+    """当前(或最近一次)补传的进度"""
+
+    def __init__(self):
+        self.running = False
+        self.started_at: Optional[str] = None
+        self.finished_at: Optional[str] = None
+        self.total = 0
+        self.synced = 0
+        self.failed = 0
+        self.skipped = 0
+        self.released = 0
+        self.in_flight = 0
+        self.concurrency = 0
+        self.last_error: Optional[str] = None
+        self._started_monotonic = 0.0
+
+    def start(self, total: int, concurrency: int) -> None:
+        self.__init__()
+        self.running = True
+        self.started_at = get_beijing_now_naive_iso()
+        self.total = total
+        self.concurrency = concurrency
+        self._started_monotonic = time.monotonic()
+
+    def finish(self) -> None:
+        self.running = False
+        self.in_flight = 0
+        self.finished_at = get_beijing_now_naive_iso()
+
+    def snapshot(self) -> Dict[str, Any]:
+        done = self.synced + self.failed + self.skipped
+        remaining = max(self.total - done - self.released, 0)
+        elapsed = time.monotonic() - self._started_monotonic if self.started_at else 0
+        rate = self.synced / elapsed if elapsed > 0 else None
+        return {
+            'running': self.running,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'total': self.total,
+            'synced': self.synced,
+            'failed': self.failed,
+            'skipped': self.skipped,
+            'released': self.released,
+            'remaining': remaining,
+            'in_flight': self.in_flight,
+            'concurrency': self.concurrency,
+            'files_per_second': round(rate, 2) if rate else None,
+            'eta_seconds': round(remaining / rate) if self.running and rate else None,
+            'last_error': self.last_error,
+        }
+
+
+# 进程内共享的补传进度
+sync_progress = SyncProgress()
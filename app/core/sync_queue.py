@@ -0,0 +1,259 @@
+"""
+待同步文件队列
+WebDAV不可用或上传失败时, 文件先落在 TEMP_STORAGE_DIR, 由定时任务补传到WebDAV。
+队列保存在 pending_sync_queue 表中(每个文件一行), 取代原先整体读写的
+temp_storage/pending_sync.json:
+
+- state: pending(等待同步) / syncing(已被某次同步领取, 处理中)
+- attempts / last_error: 失败次数与最近一次错误
+- next_attempt_at: 下次允许尝试的时间(Unix时间戳), 失败后按指数退避推迟
+- 领取时最近加入的文件优先(管理端最可能先查看新上传的图片)
+- 同步成功或临时文件已不存在时删除该行
+- 同步期间同一路径重新加入新文件时保持syncing, 本次同步结束后放回pending再同步新文件
+
+每个操作都是单条SQL或单个事务, 并发的 save_file 降级写入不会互相覆盖。
+"""
+
+import os
+import json
+import time
+import logging
+from typing import Any, Dict, List, Optional
+
+from .database import get_db_connection
+from .timezone import get_beijing_now_naive_iso
+
+logger = logging.getLogger(__name__)
+
+STATE_PENDING = "pending"
+STATE_SYNCING = "syncing"
+
+_COLUMNS = (
+    "id, webdav_path, temp_path, filename, file_size, state, attempts, "
+    "last_error, next_attempt_at, created_at, updated_at"
+)
+
+
+def enqueue(
+    temp_path: str,
+    filename: str,
+    webdav_path: str,
+    file_size: Optional[int] = None,
+    created_at: Optional[str] = None
+) -> None:
+    """加入待同步队列; 同一WebDAV路径重复加入时更新临时文件, 清零失败次数与退避
+
+    该路径正在同步(syncing)时不改状态, 以免本次同步结束时把新文件一并移出队列;
+    同步结束时发现临时文件已更换, 会把条目放回pending(见 mark_synced / mark_failed)。
+    """
+    now = get_beijing_now_naive_iso()
+    with get_db_connection() as conn:
+        conn.execute(
+            """
+            INSERT INTO pending_sync_queue
+                (webdav_path, temp_path, filename, file_size, state, attempts,
+                 next_attempt_at, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, 0, ?, ?, ?)
+            ON CONFLICT(webdav_path) DO UPDATE SET
+                temp_path = excluded.temp_path,
+                filename = excluded.filename,
+                file_size = excluded.file_size,
+                state = CASE WHEN state = ? THEN state ELSE excluded.state END,
+                attempts = 0,
+                last_error = NULL,
+                next_attempt_at = excluded.next_attempt_at,
+                updated_at = excluded.updated_at
+            """,
+            (webdav_path, temp_path, filename, file_size, STATE_PENDING,
+             time.time(), created_at or now, now, STATE_SYNCING),
+        )
+        conn.commit()
+
+
+def _requeue_if_replaced(conn, item_id: int, temp_path: Optional[str]) -> bool:
+    """同步期间重新加入了新的临时文件时把条目放回pending并立即可领取, 返回是否放回"""
+    if temp_path is None:
+        return False
+    cursor = conn.execute(
+        """
+        UPDATE pending_sync_queue
+        SET state = ?, attempts = 0, last_error = NULL, next_attempt_at = ?, updated_at = ?
+        WHERE id = ? AND temp_path != ?
+        """,
+        (STATE_PENDING, time.time(), get_beijing_now_naive_iso(), item_id, temp_path),
+    )
+    return cursor.rowcount > 0
+
+
+def claim_due(limit: Optional[int] = None, now: Optional[float] = None) -> List[Dict[str, Any]]:
+    """领取已到重试时间的条目并标记为syncing(最近加入的优先)
+
+    同一条目不会被并发的两次同步同时领取。
+    """
+    now = time.time() if now is None else now
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT {_COLUMNS}
+            FROM pending_sync_queue
+            WHERE state = ? AND next_attempt_at <= ?
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+            """,
+            (STATE_PENDING, now, -1 if limit is None else limit),
+        )
+        items = [dict(row) for row in cursor.fetchall()]
+        if items:
+            placeholders = ",".join("?" * len(items))
+            cursor.execute(
+                f"UPDATE pending_sync_queue SET state = ?, updated_at = ? WHERE id IN ({placeholders})",
+                [STATE_SYNCING, get_beijing_now_naive_iso(), *[item["id"] for item in items]],
+            )
+        conn.commit()
+    return items
+
+
+def mark_synced(item_id: int, temp_path: Optional[str] = None) -> None:
+    """同步成功, 移出队列
+
+    传入本次同步的 temp_path 时, 若期间已重新加入新的临时文件则放回pending而不移出。
+    """
+    with get_db_connection() as conn:
+        if not _requeue_if_replaced(conn, item_id, temp_path):
+            conn.execute("DELETE FROM pending_sync_queue WHERE id = ?", (item_id,))
+        conn.commit()
+
+
+def discard(item_id: int, temp_path: Optional[str] = None) -> None:
+    """放弃该条目(临时文件已不存在等), 移出队列"""
+    mark_synced(item_id, temp_path)
+
+
+def mark_failed(item_id: int, error: str, retry_delay: float = 0, temp_path: Optional[str] = None) -> None:
+    """同步失败: 失败次数+1, 放回pending, retry_delay 秒后才会再次被领取
+
+    传入本次同步的 temp_path 时, 若期间已重新加入新的临时文件则不计失败、立即可领取。
+    """
+    with get_db_connection() as conn:
+        if not _requeue_if_replaced(conn, item_id, temp_path):
+            conn.execute(
+                """
+                UPDATE pending_sync_queue
+                SET state = ?, attempts = attempts + 1, last_error = ?,
+                    next_attempt_at = ?, updated_at = ?
+                WHERE id = ?
+                """,
+                (STATE_PENDING, error[:1000], time.time() + retry_delay,
+                 get_beijing_now_naive_iso(), item_id),
+            )
+        conn.commit()
+
+
+def release(item_ids: List[int]) -> None:
+    """把已领取但未处理的条目放回pending(不计失败次数)"""
+    if not item_ids:
+        return
+    with get_db_connection() as conn:
+        placeholders = ",".join("?" * len(item_ids))
+        conn.execute(
+            f"UPDATE pending_sync_queue SET state = ? WHERE state = ? AND id IN ({placeholders})",
+            [STATE_PENDING, STATE_SYNCING, *item_ids],
+        )
+        conn.commit()
+
+
+def release_stale_claims() -> int:
+    """进程重启后把上次未处理完的syncing条目放回pending, 返回条目数"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            "UPDATE pending_sync_queue SET state = ? WHERE state = ?",
+            (STATE_PENDING, STATE_SYNCING),
+        )
+        conn.commit()
+        return cursor.rowcount
+
+
+def count_pending() -> int:
+    """队列中的文件数(含处理中)"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM pending_sync_queue")
+        return cursor.fetchone()[0]
+
+
+def list_webdav_paths() -> List[str]:
+    """队列中全部条目的WebDAV路径(这些文件在WebDAV上可能还不存在)"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT webdav_path FROM pending_sync_queue")
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_queue_stats() -> Dict[str, Any]:
+    """队列统计: 各状态数量、已到期数量、临时文件总字节数、最早加入时间"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT
+                COUNT(*) AS total,
+                SUM(CASE WHEN state = ? THEN 1 ELSE 0 END) AS pending,
+                SUM(CASE WHEN state = ? THEN 1 ELSE 0 END) AS syncing,
+                SUM(CASE WHEN state = ? AND next_attempt_at <= ? THEN 1 ELSE 0 END) AS due,
+                SUM(CASE WHEN attempts > 0 THEN 1 ELSE 0 END) AS retrying,
+                SUM(COALESCE(file_size, 0)) AS total_bytes,
+                MIN(created_at) AS oldest_created_at
+            FROM pending_sync_queue
+            """,
+            (STATE_PENDING, STATE_SYNCING, STATE_PENDING, time.time()),
+        )
+        row = cursor.fetchone()
+    return {
+        "total": row["total"],
+        "pending": row["pending"] or 0,
+        "syncing": row["syncing"] or 0,
+        "due": row["due"] or 0,
+        "retrying": row["retrying"] or 0,
+        "total_bytes": row["total_bytes"] or 0,
+        "oldest_created_at": row["oldest_created_at"],
+    }
+
+
+def import_legacy_manifest(manifest_path: str) -> int:
+    """把旧的 pending_sync.json 导入队列, 导入后重命名为 .migrated, 返回导入条数
+
+    文件不存在或已导入过时直接返回0。
+    """
+    if not os.path.exists(manifest_path):
+        return 0
+
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        logger.error(f"读取旧待同步清单失败 {manifest_path}: {str(e)}")
+        return 0
+
+    imported = 0
+    for item in data.get("files", []):
+        try:
+            temp_path = item["temp_path"]
+            webdav_path = item["webdav_path"]
+        except (KeyError, TypeError):
+            logger.warning(f"跳过无效的待同步条目: {item}")
+            continue
+        file_size = os.path.getsize(temp_path) if os.path.exists(temp_path) else None
+        enqueue(
+            temp_path,
+            item.get("filename") or os.path.basename(temp_path),
+            webdav_path,
+            file_size=file_size,
+            created_at=item.get("created_time"),
+        )
+        imported += 1
+
+    os.replace(manifest_path, f"{manifest_path}.migrated")
+    logger.info(f"旧待同步清单已导入队列: {imported}条, 原文件已重命名为 {manifest_path}.migrated")
+    return imported
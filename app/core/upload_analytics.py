@@ -0,0 +1,113 @@
+"""
+上传分析
+按时间段统计上传量、失败率与用友云上传耗时, 数据来自日汇总表 upload_daily_stats:
+
+- 汇总表以 (日期, 物流公司, 单据类型) 为主键, 由 upload_history 上的触发器在写入事务内增量维护
+  (新增、状态变化、补全物流、软删除都会即时反映), 查询只扫描范围内的汇总行, 与明细行数无关
+- 汇总表首次创建时从 upload_history 回填; rebuild 可随时按明细重新生成
+- 耗时取每条记录最后一次用友云上传请求的毫秒数, 没有耗时的记录(仓库上传、旧数据)不计入平均值
+"""
+
+import logging
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from .database import get_db_connection, rebuild_upload_daily_stats
+
+logger = logging.getLogger(__name__)
+
+# 时间粒度 -> 汇总行日期映射为统计周期的SQL表达式(周以周一的日期表示)
+BUCKETS = {
+    'day': "day",
+    'week': "DATE(day, '-6 days', 'weekday 1')",
+    'month': "SUBSTR(day, 1, 7)",
+}
+GROUP_BY_FIELDS = ('logistics', 'doc_type')
+
+
+def _metrics(total: int, success: int, failed: int, latency_total: int, latency_count: int) -> Dict[str, Any]:
+    finished = success + failed
+    return {
+        'total': total,
+        'success_count': success,
+        'failed_count': failed,
+        # 失败率只按已完成(成功/失败)的记录计算, 进行中的记录不计入
+        'failure_rate': round(failed / finished, 4) if finished else None,
+        'avg_latency_ms': round(latency_total / latency_count) if latency_count else None,
+    }
+
+
+def query_upload_stats(
+    start_date: date,
+    end_date: date,
+    bucket: str = 'day',
+    group_by: Optional[str] = None,
+    logistics: Optional[str] = None,
+    doc_type: Optional[str] = None,
+) -> Dict[str, Any]:
+    """按时间粒度(及可选维度)统计 [start_date, end_date] 内的上传数据
+
+    Args:
+        bucket: day/week/month
+        group_by: 额外的分组维度 logistics/doc_type, None表示只按时间分组
+        logistics/doc_type: 精确筛选
+    """
+    period = BUCKETS[bucket]
+    dimension = f", {group_by}" if group_by else ""
+    where = ["day BETWEEN ? AND ?"]
+    params: List[Any] = [start_date.isoformat(), end_date.isoformat()]
+    if logistics is not None:
+        where.append("logistics = ?")
+        params.append(logistics)
+    if doc_type is not None:
+        where.append("doc_type = ?")
+        params.append(doc_type)
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            SELECT {period} AS period{dimension},
+                   SUM(total), SUM(success_count), SUM(failed_count),
+                   SUM(latency_total_ms), SUM(latency_count)
+            FROM upload_daily_stats
+            WHERE {' AND '.join(where)}
+            GROUP BY period{dimension}
+            HAVING SUM(total) > 0
+            ORDER BY period{dimension}
+            """,
+            params,
+        )
+        rows = cursor.fetchall()
+
+    items = []
+    summary = [0, 0, 0, 0, 0]
+    for row in rows:
+        values = list(row)
+        counts = values[-5:]
+        item: Dict[str, Any] = {'period': values[0]}
+        if group_by:
+            # 汇总表用空字符串表示未知物流/单据类型
+            item[group_by] = values[1] or None
+        item.update(_metrics(*counts))
+        items.append(item)
+        summary = [a + b for a, b in zip(summary, counts)]
+
+    return {
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'bucket': bucket,
+        'group_by': group_by,
+        'items': items,
+        'summary': _metrics(*summary),
+    }
+
+
+def rebuild() -> int:
+    """按 upload_history 重新生成日汇总, 返回汇总行数"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        rows = rebuild_upload_daily_stats(cursor)
+        conn.commit()
+    logger.info(f"[上传分析] 日汇总已重建: {rows}行")
+    return rows
@@ -2,14 +2,17 @@
 WebDAV异步客户端实现
 支持PROPFIND, GET, PUT, DELETE, MKCOL方法
 包含重试机制、错误处理、进度回调
+上传/下载均支持按块流式传输, 单次传输的内存峰值由 WEBDAV_CHUNK_SIZE 决定
 """
 
 import os
+import time
+import random
 import asyncio
 import base64
 import xml.etree.ElementTree as ET
 from urllib.parse import quote, unquote
-from typing import Dict, List, Optional, Any, Callable
+from typing import Dict, List, Optional, Any, AsyncIterator, Callable, Union
 import logging
 
 import httpx
@@ -20,10 +23,68 @@ from .exceptions import (
     WebDAVServerError
 )
 from .logging_config import log_async_function_call, get_logger
+from .webdav_health import webdav_health
+from .io_executor import run_io
 from .timezone import get_beijing_now_naive_iso
 
 logger = get_logger(__name__)
 
+# 已确认存在的远端目录: 规范化路径 -> 过期时间(time.monotonic)
+# WebDAVClient 在多个模块中各自实例化, 目录缓存放在模块级以便进程内共享
+_known_directories: Dict[str, float] = {}
+# 正在创建中的目录: 规范化路径 -> Task, 并发创建同一目录时合并为一次MKCOL
+_pending_directories: Dict[str, "asyncio.Task[bool]"] = {}
+
+
+# 上传后校验耗时统计: 实际采用的校验方式 -> 计数/失败数/累计耗时/最大耗时
+_verification_stats: Dict[str, Dict[str, float]] = {}
+
+
+def _record_verification(method: str, elapsed_ms: float, success: bool) -> None:
+    stats = _verification_stats.setdefault(
+        method, {'count': 0, 'failures': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+    )
+    stats['count'] += 1
+    if not success:
+        stats['failures'] += 1
+    stats['total_ms'] += elapsed_ms
+    stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+
+def get_verification_stats() -> Dict[str, Dict[str, Any]]:
+    """获取各校验方式的次数与耗时统计(进程启动以来)"""
+    return {
+        method: {
+            'count': int(stats['count']),
+            'failures': int(stats['failures']),
+            'avg_ms': round(stats['total_ms'] / stats['count'], 2) if stats['count'] else 0.0,
+            'max_ms': round(stats['max_ms'], 2),
+        }
+        for method, stats in _verification_stats.items()
+    }
+
+
+def _normalize_directory(path: str) -> str:
+    """目录路径统一为以/开头、不以/结尾的形式"""
+    return '/' + path.strip('/')
+
+
+def invalidate_directory_cache(path: Optional[str] = None) -> None:
+    """使目录缓存失效
+
+    Args:
+        path: 目录路径, 该目录及其所有父目录都会被移出缓存; 为None时清空全部缓存
+    """
+    if path is None:
+        _known_directories.clear()
+        return
+
+    path = _normalize_directory(path)
+    while path and path != '/':
+        _known_directories.pop(path, None)
+        path = os.path.dirname(path)
+
+
 
 class WebDAVClient:
     """WebDAV异步客户端"""
@@ -41,6 +102,7 @@ class WebDAVClient:
         self.timeout = httpx.Timeout(self.settings.WEBDAV_TIMEOUT)
         self.retry_count = self.settings.WEBDAV_RETRY_COUNT
         self.retry_delay = self.settings.WEBDAV_RETRY_DELAY
+        self.chunk_size = self.settings.WEBDAV_CHUNK_SIZE
 
         logger.info(f"WebDAV客户端初始化完成: {self.base_url}")
         logger.debug(f"基础路径: {self.base_path}")
@@ -83,10 +145,31 @@ class WebDAVClient:
         self,
         method: str,
         path: str,
-        content: Optional[bytes] = None,
+        content: Optional[Union[bytes, Callable[[], AsyncIterator[bytes]]]] = None,
         headers: Optional[Dict[str, str]] = None
     ) -> httpx.Response:
-        """发起HTTP请求，包含重试机制"""
+        """发起HTTP请求，包含重试机制
+
+        content 可以是bytes, 也可以是返回异步迭代器的工厂函数(流式请求体)。
+        流式请求体只能消费一次, 因此每次重试都通过工厂函数重新打开。
+        请求的最终结果(重试之后)会记入被动健康统计。
+        """
+        try:
+            response = await self._send_request(method, path, content, headers)
+        except Exception as e:
+            webdav_health.record(e)
+            raise
+        webdav_health.record()
+        return response
+
+    async def _send_request(
+        self,
+        method: str,
+        path: str,
+        content: Optional[Union[bytes, Callable[[], AsyncIterator[bytes]]]] = None,
+        headers: Optional[Dict[str, str]] = None
+    ) -> httpx.Response:
+        """发起HTTP请求的具体实现(含重试)"""
         url = self._get_full_url(path)
         request_headers = self._get_headers()
 
@@ -107,7 +190,7 @@ class WebDAVClient:
                     response = await client.request(
                         method=method,
                         url=url,
-                        content=content,
+                        content=content() if callable(content) else content,
                         headers=request_headers
                     )
 
@@ -223,8 +306,9 @@ class WebDAVClient:
         注意:
             - 仅根据HTTP状态码(200/201)判断成功在某些WebDAV/OneDrive网关上不可靠,
               曾出现返回201但远端文件大小为0字节的情况。
-            - 这里在上传成功后通过PROPFIND再次获取文件大小,和本地文件大小对比,
-              不一致则视为上传失败,交由上层降级到临时存储/待同步机制处理。
+            - 默认(WEBDAV_UPLOAD_VERIFY=propfind)在上传成功后通过PROPFIND再次获取文件大小,
+              和本地文件大小对比, 不一致则视为上传失败, 交由上层降级到临时存储/待同步机制处理。
+            - 其他校验策略见 _verify_upload, 实际采用的方式记录在返回结果的 verification 字段。
         """
         try:
             # 检查本地文件是否存在
@@ -234,51 +318,34 @@ class WebDAVClient:
             file_size = os.path.getsize(local_path)
             logger.info(f"开始上传文件: {local_path} -> {webdav_path} ({file_size} bytes)")
 
-            # 确保目标目录存在
+            # 确保目标目录存在(命中目录缓存时不发起MKCOL)
             directory = os.path.dirname(webdav_path)
             if directory and directory != '/':
                 await self.create_directory(directory)
 
-            # 读取文件内容
-            with open(local_path, 'rb') as f:
-                file_content = f.read()
-
-            # 上传文件
-            response = await self._make_request(
-                'PUT',
-                webdav_path,
-                content=file_content
-            )
+            try:
+                response = await self._put_file(local_path, webdav_path, file_size)
+            except WebDAVError as e:
+                # 404/409 表示父目录实际不存在(缓存过期或远端被删除), 失效缓存后重建目录再试一次
+                if not directory or directory == '/' or e.status_code not in (404, 409):
+                    raise
+                logger.warning(f"上传返回{e.status_code}, 目录缓存失效后重建目录重试: {directory}")
+                invalidate_directory_cache(directory)
+                await self.create_directory(directory)
+                response = await self._put_file(local_path, webdav_path, file_size)
 
             # 获取ETag
             etag = response.headers.get('ETag', '').strip('"')
 
-            # === 上传后完整性校验 ===
-            # 部分后端实现(例如通过WebDAV转发到OneDrive)存在偶发写入失败但仍返回201的情况,
-            # 这里通过PROPFIND校验远端文件大小,确保与本地一致。
-            try:
-                remote_size = await self.get_file_size(webdav_path)
-            except Exception as e:
-                # 记录错误并视为上传失败,交由上层降级处理
-                raise Exception(f"WebDAV完整性校验失败: 无法获取远端文件大小 - {str(e)}") from e
-
-            # 如果无法获取大小或者大小为0 / 与本地不一致,都认为是上传失败
-            if remote_size is None:
-                raise Exception("WebDAV完整性校验失败: 远端文件大小未知")
-
-            if remote_size == 0:
-                raise Exception("WebDAV完整性校验失败: 远端文件大小为0字节")
-
-            if remote_size != file_size:
-                raise Exception(
-                    f"WebDAV完整性校验失败: 本地大小={file_size}字节, 远端大小={remote_size}字节"
-                )
+            # === 上传后完整性校验, 策略由 WEBDAV_UPLOAD_VERIFY 决定 ===
+            verification = await self._verify_upload(webdav_path, file_size, response)
 
             result = {
                 'success': True,
                 'webdav_path': webdav_path,
                 'file_size': file_size,
                 'etag': etag,
+                'verification': verification,
                 'upload_time': get_beijing_now_naive_iso()
             }
 
@@ -294,6 +361,102 @@ class WebDAVClient:
                 'webdav_path': webdav_path
             }
 
+    async def _verify_upload(self, webdav_path: str, file_size: int, response: httpx.Response) -> str:
+        """按配置的策略校验上传结果, 返回实际采用的校验方式, 校验失败时抛出异常
+
+        - propfind: 每次通过PROPFIND获取远端大小与本地比对(最可靠, 多一次往返)
+        - trust: 201/204且服务端回显了ETag或与本地一致的Content-Length时直接认为成功,
+          没有任何可信依据时退回PROPFIND
+        - sample: 按 WEBDAV_UPLOAD_VERIFY_SAMPLE_RATE 抽样PROPFIND, 其余按trust处理
+        - deferred: 不在上传路径上校验, 由定时完整性巡检任务批量比对远端大小
+        """
+        strategy = self.settings.WEBDAV_UPLOAD_VERIFY
+        start = time.perf_counter()
+
+        if strategy == 'deferred':
+            method = 'deferred'
+        elif strategy == 'propfind' or (
+            strategy == 'sample' and random.random() < self.settings.WEBDAV_UPLOAD_VERIFY_SAMPLE_RATE
+        ):
+            method = 'propfind'
+        elif self._is_trusted_put_response(response, file_size):
+            method = 'trust'
+        else:
+            logger.debug(f"PUT响应缺少可信的ETag/Content-Length, 退回PROPFIND校验: {webdav_path}")
+            method = 'propfind'
+
+        try:
+            if method == 'propfind':
+                await self._verify_remote_size(webdav_path, file_size)
+        except Exception:
+            _record_verification(method, (time.perf_counter() - start) * 1000, False)
+            raise
+
+        _record_verification(method, (time.perf_counter() - start) * 1000, True)
+        return method
+
+    @staticmethod
+    def _is_trusted_put_response(response: httpx.Response, file_size: int) -> bool:
+        """PUT响应是否足以证明写入成功(不再发起PROPFIND)
+
+        200可能来自网关转发, 不作为可信依据; 响应的Content-Length通常是响应体长度,
+        只有与本地文件大小一致时才视为回显的文件大小。
+        """
+        if response.status_code not in (201, 204):
+            return False
+        if response.headers.get('ETag'):
+            return True
+        echoed_length = response.headers.get('Content-Length', '')
+        return echoed_length.isdigit() and file_size > 0 and int(echoed_length) == file_size
+
+    async def _verify_remote_size(self, webdav_path: str, file_size: int) -> None:
+        """通过PROPFIND校验远端文件大小与本地一致
+
+        部分后端实现(例如通过WebDAV转发到OneDrive)存在偶发写入失败但仍返回201的情况,
+        曾出现远端文件大小为0字节, 因此以远端实际大小为准。
+        """
+        try:
+            remote_size = await self.get_file_size(webdav_path)
+        except Exception as e:
+            # 记录错误并视为上传失败,交由上层降级处理
+            raise Exception(f"WebDAV完整性校验失败: 无法获取远端文件大小 - {str(e)}") from e
+
+        # 如果无法获取大小或者大小为0 / 与本地不一致,都认为是上传失败
+        if remote_size is None:
+            raise Exception("WebDAV完整性校验失败: 远端文件大小未知")
+
+        if remote_size == 0:
+            raise Exception("WebDAV完整性校验失败: 远端文件大小为0字节")
+
+        if remote_size != file_size:
+            raise Exception(
+                f"WebDAV完整性校验失败: 本地大小={file_size}字节, 远端大小={remote_size}字节"
+            )
+
+    async def _put_file(self, local_path: str, webdav_path: str, file_size: int) -> httpx.Response:
+        """按块流式读取本地文件上传
+
+        显式声明Content-Length避免分块传输编码(部分WebDAV/OneDrive网关不接受chunked请求体)
+        """
+        return await self._make_request(
+            'PUT',
+            webdav_path,
+            content=lambda: self._iter_file_chunks(local_path),
+            headers={'Content-Length': str(file_size)}
+        )
+
+    async def _iter_file_chunks(self, local_path: str) -> AsyncIterator[bytes]:
+        """按块读取本地文件(在磁盘I/O线程池中读取), 作为流式PUT请求体"""
+        f = await run_io(open, local_path, 'rb')
+        try:
+            while True:
+                chunk = await run_io(f.read, self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            f.close()
+
     async def get_file_size(self, webdav_path: str) -> Optional[int]:
         """获取远端文件大小(字节)
 
@@ -358,6 +521,79 @@ class WebDAVClient:
             logger.error(error_msg)
             raise Exception(error_msg)
 
+    async def download_stream(
+        self,
+        webdav_path: str,
+        chunk_size: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """流式下载WebDAV文件, 按块产出内容
+
+        只在尚未产出任何数据块之前重试(连接失败、超时、5xx);
+        一旦开始产出数据, 中途失败直接抛出, 由调用方丢弃已收到的不完整数据。
+        """
+        try:
+            async for chunk in self._download_stream(webdav_path, chunk_size):
+                yield chunk
+        except Exception as e:
+            webdav_health.record(e)
+            raise
+        webdav_health.record()
+
+    async def _download_stream(
+        self,
+        webdav_path: str,
+        chunk_size: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """流式下载的具体实现(含重试)"""
+        url = self._get_full_url(webdav_path)
+        headers = self._get_headers()
+        chunk_size = chunk_size or self.chunk_size
+        started = False
+        last_error = None
+
+        for attempt in range(self.retry_count + 1):
+            try:
+                async with httpx.AsyncClient(
+                    timeout=self.timeout,
+                    follow_redirects=True
+                ) as client:
+                    async with client.stream('GET', url, headers=headers) as response:
+                        if response.status_code == 401:
+                            raise WebDAVAuthenticationError()
+                        if response.status_code == 403:
+                            raise WebDAVPermissionError()
+                        if response.status_code == 404:
+                            raise WebDAVNotFoundError(f"WebDAV路径不存在: {webdav_path}", path=webdav_path)
+                        if response.status_code >= 500:
+                            last_error = f"WebDAV服务器错误: {response.status_code}"
+                            if attempt < self.retry_count:
+                                logger.warning(f"{last_error}，{self.retry_delay}秒后重试...")
+                                await asyncio.sleep(self.retry_delay)
+                                continue
+                            raise WebDAVServerError(last_error, response.status_code)
+                        if response.status_code != 200:
+                            raise WebDAVError(f"WebDAV请求失败: {response.status_code}",
+                                              status_code=response.status_code)
+
+                        async for chunk in response.aiter_bytes(chunk_size):
+                            started = True
+                            yield chunk
+                        return
+
+            except httpx.TimeoutException:
+                last_error = "WebDAV请求超时"
+                if started or attempt >= self.retry_count:
+                    raise WebDAVTimeoutError(last_error)
+            except httpx.RequestError as e:
+                last_error = f"WebDAV网络错误: {str(e)}"
+                if started or attempt >= self.retry_count:
+                    raise WebDAVNetworkError(last_error, original_error=e)
+
+            logger.warning(f"{last_error}，{self.retry_delay}秒后重试...")
+            await asyncio.sleep(self.retry_delay)
+
+        raise WebDAVError(last_error or "WebDAV请求失败")
+
     async def delete_file(self, webdav_path: str) -> bool:
         """删除WebDAV文件"""
         try:
@@ -374,37 +610,65 @@ class WebDAVClient:
             return False
 
     async def create_directory(self, path: str) -> bool:
-        """创建目录"""
-        try:
-            if not path or path == '/':
-                return True
+        """创建目录(含所有父目录)
 
-            logger.debug(f"创建目录: {path}")
+        已确认存在的目录在 WEBDAV_DIR_CACHE_TTL 内直接返回, 不再发起MKCOL;
+        并发创建同一目录时只发起一次MKCOL, 其余调用等待同一结果。
+        """
+        if not path or path.strip('/') == '':
+            return True
 
-            # 确保路径以/开头
-            if not path.startswith('/'):
-                path = '/' + path
+        path = _normalize_directory(path)
+        expires_at = _known_directories.get(path)
+        if expires_at is not None and expires_at > time.monotonic():
+            return True
 
-            # 移除末尾的/
-            path = path.rstrip('/')
+        task = _pending_directories.get(path)
+        if task is None or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._create_directory_uncached(path))
+            _pending_directories[path] = task
+            task.add_done_callback(lambda t, p=path: self._clear_pending_directory(p, t))
+
+        # shield: 某个等待方被取消时不影响其他等待同一目录的调用
+        return await asyncio.shield(task)
+
+    @staticmethod
+    def _clear_pending_directory(path: str, task: "asyncio.Task[bool]") -> None:
+        if _pending_directories.get(path) is task:
+            _pending_directories.pop(path, None)
+
+    def _mark_directory_known(self, path: str) -> None:
+        ttl = self.settings.WEBDAV_DIR_CACHE_TTL
+        if ttl > 0:
+            _known_directories[path] = time.monotonic() + ttl
+
+    async def _create_directory_uncached(self, path: str) -> bool:
+        """逐级创建目录, path 已规范化且未命中缓存"""
+        try:
+            logger.debug(f"创建目录: {path}")
 
-            # 递归创建父目录
+            # 递归创建父目录(父目录同样走缓存)
             parent_path = os.path.dirname(path)
             if parent_path and parent_path != '/':
                 await self.create_directory(parent_path)
 
             # 创建当前目录（WebDAV部分服务需要以/结尾）
-            mkcol_path = path if path.endswith('/') else f"{path}/"
+            mkcol_path = f"{path}/"
             await self._make_request('MKCOL', mkcol_path)
 
             logger.debug(f"目录创建成功: {mkcol_path}")
+            self._mark_directory_known(path)
             return True
 
         except WebDAVError as e:
             if e.status_code == 405:
                 # 目录已存在
                 logger.debug(f"目录已存在: {path}")
+                self._mark_directory_known(path)
                 return True
+            if e.status_code == 409:
+                # 父目录不存在, 说明缓存的父目录信息已过时
+                invalidate_directory_cache(path)
             error_msg = f"目录创建失败: {str(e)}"
             logger.error(error_msg)
             return False
@@ -0,0 +1,151 @@
+"""
+WebDAV被动健康统计
+根据真实WebDAV请求的结果(滑动窗口内的成功/失败率)判断服务是否可用,
+只有在一段时间没有真实请求或当前判定为不可用时才主动探测。
+状态在进程内共享, 所有 FileManager / WebDAVClient 实例看到同一份结果。
+"""
+
+import time
+import asyncio
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple
+
+from .config import get_settings
+from .exceptions import (
+    WebDAVError, WebDAVAuthenticationError, WebDAVPermissionError,
+    WebDAVTimeoutError, WebDAVNetworkError, WebDAVServerError
+)
+from .logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def is_service_failure(error: Optional[BaseException]) -> bool:
+    """请求结果是否说明WebDAV服务不可用
+
+    404/405/409等业务状态码说明服务端正常响应, 不计为失败;
+    超时、网络错误、5xx以及认证/权限错误(上传必然失败)计为失败。
+    """
+    if error is None:
+        return False
+    if isinstance(error, (WebDAVTimeoutError, WebDAVNetworkError, WebDAVServerError,
+                          WebDAVAuthenticationError, WebDAVPermissionError)):
+        return True
+    if isinstance(error, WebDAVError):
+        return error.status_code is None
+    return True
+
+
+class WebDAVHealthTracker:
+    """基于滑动窗口的WebDAV健康状态"""
+
+    def __init__(self):
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._last_activity: Optional[float] = None
+        self._last_probe: Optional[float] = None
+        self._healthy: Optional[bool] = None
+        self._probe_task: Optional["asyncio.Task[bool]"] = None
+        self.probe_count = 0
+
+    def record(self, error: Optional[BaseException] = None) -> None:
+        """记录一次真实请求的结果(error为None表示成功)"""
+        self._append(not is_service_failure(error))
+
+    def _append(self, ok: bool) -> None:
+        settings = get_settings()
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while len(self._outcomes) > settings.HEALTH_WINDOW_SIZE:
+            self._outcomes.popleft()
+        self._last_activity = now
+        self._update_state()
+
+    def _prune(self) -> None:
+        expire_before = time.monotonic() - get_settings().HEALTH_WINDOW_SECONDS
+        while self._outcomes and self._outcomes[0][0] < expire_before:
+            self._outcomes.popleft()
+
+    def _failure_rate(self) -> Optional[float]:
+        self._prune()
+        if not self._outcomes:
+            return None
+        failures = sum(1 for _, ok in self._outcomes if not ok)
+        return failures / len(self._outcomes)
+
+    def _update_state(self) -> None:
+        rate = self._failure_rate()
+        if rate is None:
+            return
+        healthy = rate < get_settings().HEALTH_FAILURE_RATE
+        if healthy != self._healthy:
+            if healthy:
+                logger.info("WebDAV服务恢复可用")
+            else:
+                logger.warning(f"WebDAV服务判定为不可用, 最近请求失败率{rate:.0%}")
+        self._healthy = healthy
+
+    def _needs_probe(self) -> bool:
+        interval = get_settings().HEALTH_CHECK_INTERVAL
+        now = time.monotonic()
+        if self._healthy is None or self._failure_rate() is None:
+            return True
+        if self._healthy:
+            # 可用状态下只有空闲(一段时间没有真实请求)时才主动探测
+            return now - self._last_activity >= interval
+        # 不可用状态下真实请求会被降级绕开, 按间隔主动探测以便及时恢复
+        return self._last_probe is None or now - self._last_probe >= interval
+
+    async def is_available(self, probe: Callable[[], Awaitable[bool]]) -> bool:
+        """返回当前是否可用, 必要时执行一次主动探测
+
+        并发调用共享同一次探测。
+        """
+        if not self._needs_probe():
+            return bool(self._healthy)
+
+        task = self._probe_task
+        if task is None or task.done() or task.get_loop() is not asyncio.get_running_loop():
+            task = asyncio.ensure_future(self._run_probe(probe))
+            self._probe_task = task
+        return await asyncio.shield(task)
+
+    async def _run_probe(self, probe: Callable[[], Awaitable[bool]]) -> bool:
+        try:
+            ok = bool(await probe())
+        except Exception as e:
+            logger.error(f"WebDAV主动探测异常: {str(e)}")
+            ok = False
+
+        self.probe_count += 1
+        self._last_probe = time.monotonic()
+        # 主动探测的结论覆盖窗口内的历史结果
+        self._outcomes.clear()
+        self._append(ok)
+        return ok
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前健康统计, 用于状态接口展示"""
+        rate = self._failure_rate()
+        now = time.monotonic()
+        return {
+            'available': self._healthy,
+            'window_size': len(self._outcomes),
+            'failure_rate': round(rate, 3) if rate is not None else None,
+            'seconds_since_activity': (
+                round(now - self._last_activity, 1) if self._last_activity is not None else None
+            ),
+            'probe_count': self.probe_count,
+        }
+
+    def reset(self) -> None:
+        """清空统计(测试或配置变更时使用)"""
+        self._outcomes.clear()
+        self._last_activity = None
+        self._last_probe = None
+        self._healthy = None
+        self._probe_task = None
+        self.probe_count = 0
+
+
+# 进程内共享的健康状态
+webdav_health = WebDAVHealthTracker()
@@ -26,6 +26,7 @@
 
 import logging
 import os
+import time
 from datetime import timedelta
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -97,6 +98,7 @@ def _mark_success(
     logistics: Optional[str],
     customer_name: Optional[str],
     retry_count: int,
+    latency_ms: Optional[int] = None,
 ) -> int:
     """置为成功; 返回受影响行数。
 
@@ -117,6 +119,7 @@ def _mark_success(
                 error_code = NULL,
                 error_message = NULL,
                 retry_count = ?,
+                yonyou_latency_ms = COALESCE(?, yonyou_latency_ms),
                 updated_at = ?
             WHERE id = ?
               AND status = 'failed'
@@ -124,7 +127,7 @@ def _mark_success(
               AND NULLIF(yonyou_file_id, '') IS NULL
               AND deleted_at IS NULL
             """,
-            (yonyou_file_id, logistics, customer_name, retry_count, now_iso, record_id),
+            (yonyou_file_id, logistics, customer_name, retry_count, latency_ms, now_iso, record_id),
         )
         conn.commit()
         return cursor.rowcount
@@ -135,6 +138,7 @@ def _mark_still_failed(
     error_code: Optional[str],
     error_message: Optional[str],
     retry_count: int,
+    latency_ms: Optional[int] = None,
 ) -> int:
     """记录最新失败信息(状态仍为 failed); 返回受影响行数。"""
     now_iso = get_beijing_now_naive().isoformat()
@@ -146,10 +150,11 @@ def _mark_still_failed(
             SET error_code = ?,
                 error_message = ?,
                 retry_count = ?,
+                yonyou_latency_ms = COALESCE(?, yonyou_latency_ms),
                 updated_at = ?
             WHERE id = ? AND status = 'failed' AND deleted_at IS NULL
             """,
-            (error_code, error_message, retry_count, now_iso, record_id),
+            (error_code, error_message, retry_count, latency_ms, now_iso, record_id),
         )
         conn.commit()
         return cursor.rowcount
@@ -223,12 +228,14 @@ async def retry_failed_yonyou_uploads(
                 doc_type, settings.YONYOU_BUSINESS_TYPE
             )
             try:
+                started = time.monotonic()
                 result = await yc.upload_file(
                     file_content,
                     file_name,
                     business_id,
                     business_type=business_type,
                 )
+                latency_ms = int((time.monotonic() - started) * 1000)
             except Exception as e:  # noqa: BLE001
                 stats["failed"] += 1
                 _mark_still_failed(record_id, "NETWORK_ERROR", str(e), new_retry_count)
@@ -239,7 +246,7 @@ async def retry_failed_yonyou_uploads(
                 error_code = result.get("error_code")
                 error_message = result.get("error_message")
                 stats["failed"] += 1
-                _mark_still_failed(record_id, error_code, error_message, new_retry_count)
+                _mark_still_failed(record_id, error_code, error_message, new_retry_count, latency_ms)
                 logger.warning(
                     f"[用友重试] 仍失败 id={record_id} doc={doc_number} "
                     f"code={error_code} msg={error_message}"
@@ -270,7 +277,9 @@ async def retry_failed_yonyou_uploads(
                 except Exception as e:  # noqa: BLE001
                     logger.warning(f"[用友重试] 发货单详情查询异常 id={record_id}: {e}")
 
-            updated = _mark_success(record_id, yonyou_file_id, logistics, customer_name, new_retry_count)
+            updated = _mark_success(
+                record_id, yonyou_file_id, logistics, customer_name, new_retry_count, latency_ms
+            )
             if updated:
                 stats["succeeded"] += 1
                 logger.info(
@@ -1,11 +1,18 @@
-from fastapi import FastAPI, Query, HTTPException
+import os
+import mimetypes
+
+from fastapi import FastAPI, Query, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, Response
+from fastapi.responses import FileResponse
 from fastapi.middleware.cors import CORSMiddleware
+from app.core.api_cache import CacheRule, JSONCacheMiddleware
 from app.core.config import get_settings
 from app.core.database import init_database, verify_database_schema
 from app.core.logging_config import setup_logging
 from app.core.file_manager import FileManager
+from app.core.http_cache import cached_file_response, file_response
+from app.core.io_executor import shutdown_io_executor
+from app.core import deletion_queue, delivery_sync_service, sync_queue
 from app.api import upload, history, admin, migration, webdav, logistics_links, logistics_portal
 
 settings = get_settings()
@@ -16,6 +23,23 @@ app = FastAPI(
     version=settings.APP_VERSION
 )
 
+# JSON接口: 压缩 + 按数据版本号生成ETag(命中返回304, 不执行查询)
+app.add_middleware(
+    JSONCacheMiddleware,
+    rules=[
+        CacheRule(r"^/api/admin/records$", ["upload_history"]),
+        CacheRule(r"^/api/admin/statistics$", ["upload_history"]),
+        CacheRule(r"^/api/history/[^/]+$", ["upload_history"]),
+        CacheRule(r"^/api/admin/(logistics-options|customer-names)$", ["name_dictionary"]),
+        CacheRule(
+            r"^/api/portal/([^/]+)/deliveries$",
+            ["delivery_snapshot", "upload_history", "logistics_tokens", "app_meta"],
+            # 304时不会进入接口, 在这里补记门户访问时间
+            on_not_modified=lambda match: delivery_sync_service.touch_token_access(match.group(1)),
+        ),
+    ],
+)
+
 # CORS配置
 app.add_middleware(
     CORSMiddleware,
@@ -28,16 +52,9 @@ app.add_middleware(
 # 静态文件
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
 
-# 挂载上传文件目录(用于图片预览)
-from pathlib import Path
-uploaded_files_path = Path(settings.LOCAL_STORAGE_PATH)
-if uploaded_files_path.exists():
-    app.mount("/uploaded_files", StaticFiles(directory=str(uploaded_files_path)), name="uploaded_files")
-
-# 挂载缓存目录(用于WebDAV文件缓存访问)
-cache_path = Path(settings.CACHE_DIR)
-if cache_path.exists():
-    app.mount("/cache", StaticFiles(directory=str(cache_path)), name="cache")
+# 上传文件目录(旧数据)与缓存目录都由下方 /uploaded_files/{file_path} 路由统一提供,
+# 不再挂载 StaticFiles: 挂载会遮蔽该路由, 绕过ETag/304/Range与缓存索引记账,
+# 并直接暴露缓存目录中的 .cache_inventory.json 等内部文件
 
 # 路由
 app.include_router(upload.router, prefix="/api", tags=["upload"])
@@ -78,6 +95,18 @@ async def startup_event():
         logger.critical("应用启动失败 - 数据库Schema不完整")
         raise
 
+    # 待同步队列: 导入旧版 pending_sync.json; 待同步与存储回收队列放回上次进程中断时处理中的条目
+    sync_queue.import_legacy_manifest(os.path.join(settings.TEMP_STORAGE_DIR, "pending_sync.json"))
+    released = sync_queue.release_stale_claims()
+    if released:
+        logger.info(f"待同步队列: {released}个处理中的条目已放回等待状态")
+    released = deletion_queue.release_stale_claims()
+    if released:
+        logger.info(f"存储回收队列: {released}个处理中的条目已放回等待状态")
+
+    # 加载缓存索引(容量统计与淘汰顺序): 优先使用上次正常关闭时保存的快照, 否则扫描缓存目录
+    file_manager.cache_index.load()
+
     # 验证WebDAV配置
     validation_result = settings.validate_webdav_health()
     if not validation_result["valid"]:
@@ -113,6 +142,10 @@ async def shutdown_event():
     except Exception as e:
         logger.error(f"定时任务调度器关闭失败: {str(e)}")
 
+    # 保存缓存索引快照, 下次启动无需扫描缓存目录
+    file_manager.cache_index.save_snapshot()
+
+    shutdown_io_executor()
     logger.info("应用已关闭")
 
 
@@ -157,50 +190,36 @@ async def health_check():
 
 # WebDAV文件访问接口（优先从缓存，WebDAV兜底）
 @app.get("/uploaded_files/{file_path:path}")
-async def get_uploaded_file(file_path: str):
+async def get_uploaded_file(file_path: str, request: Request):
     """
     智能文件访问接口
 
-    1. 首先检查本地缓存是否存在且未过期
-    2. 缓存命中则直接返回缓存文件
-    3. 缓存未命中则从WebDAV下载
-    4. 下载后如果文件在7天内则写入缓存
+    1. 本地上传目录(旧数据)中存在则直接返回
+    2. 依次检查内存热点缓存、本地缓存, 命中则直接返回(支持ETag/304与Range)
+    3. 缓存未命中则从WebDAV流式下载
+    4. 下载过程中同时写入缓存（完整接收后才生效）
     """
+    media_type = mimetypes.guess_type(file_path)[0] or "application/octet-stream"
+    headers = {"Cache-Control": "public, max-age=3600"}  # 缓存1小时
+
+    # 旧数据: 本地上传目录(限制在目录内, 防止路径穿越)
+    storage_root = os.path.realpath(settings.LOCAL_STORAGE_PATH)
+    old_path = os.path.realpath(os.path.join(storage_root, file_path))
+    if os.path.commonpath([storage_root, old_path]) == storage_root and os.path.isfile(old_path):
+        return file_response(request, old_path, media_type, headers)
+
     try:
         # 构造WebDAV路径
         webdav_path = f"files/{file_path}"
-
-        # 检查缓存是否存在且有效
-        cache_path = file_manager._get_cache_path(webdav_path)
-
-        if file_manager._is_cache_valid(cache_path):
-            # 缓存命中，直接返回
-            from fastapi.responses import FileResponse
-            return FileResponse(cache_path)
-
-        # 缓存未命中，从WebDAV下载
-        file_content = await file_manager.get_file(webdav_path)
-
-        return Response(
-            content=file_content,
-            media_type="application/octet-stream",
-            headers={
-                "Cache-Control": "public, max-age=3600",  # 缓存1小时
-                "Access-Control-Allow-Origin": "*"
-            }
+        response, _ = await cached_file_response(
+            request,
+            file_manager,
+            webdav_path,
+            media_type,
+            {**headers, "Access-Control-Allow-Origin": "*"},
         )
-
-    except Exception as e:
-        # WebDAV访问失败，尝试从旧路径访问
-        try:
-            old_path = settings.LOCAL_STORAGE_PATH + "/" + file_path
-            from pathlib import Path
-
-            if Path(old_path).exists():
-                return FileResponse(old_path)
-        except:
-            pass
-
+        return response
+    except Exception:
         raise HTTPException(status_code=404, detail=f"文件不存在或访问失败: {file_path}")
 
 
@@ -16,8 +16,10 @@ from apscheduler.executors.asyncio import AsyncIOExecutor
 from .core.config import get_settings
 from .core.file_manager import FileManager
 from .core.backup_service import BackupService
-from .core.database import get_db_connection
-from .core.webdav_client import WebDAVClient
+from .core.integrity_scanner import run_integrity_scan
+from .core.cache_warmer import warm_recent_uploads
+from .core.storage_tiers import run_storage_tiering
+from .core import deletion_queue, export_jobs
 
 logger = logging.getLogger(__name__)
 
@@ -54,7 +56,10 @@ def get_config():
 # ========== 独立的任务函数（避免序列化问题）==========
 
 async def webdav_health_check_task():
-    """WebDAV健康检查任务"""
+    """WebDAV健康检查任务
+
+    健康状态主要由真实请求结果维护, 这里只在空闲或不可用时触发主动探测。
+    """
     try:
         logger.debug("执行WebDAV健康检查任务")
         file_manager = get_file_manager()
@@ -200,20 +205,17 @@ async def delivery_sync_task():
         logger.error(f"发货单快照同步任务异常: {str(e)}")
 
 
-async def webdav_integrity_check_task(max_records: int = 200):
+async def webdav_integrity_check_task():
     """
     WebDAV文件完整性巡检任务
 
-    设计目标:
-        - 定期抽样检查upload_history中标记为success且存在webdav_path的记录,
-          对比本地记录的file_size与WebDAV端实际文件大小,尽早发现远端0字节
-          或大小不一致的问题,避免只有在管理员预览时才暴露。
-        - 目前仅记录日志,不自动修改数据库状态,以免影响现有业务流程。
+    按日期目录批量PROPFIND(Depth:1)并在内存中与upload_history对比,
+    游标轮转覆盖整个归档, 发现的问题写入 webdav_integrity_findings,
+    管理端可通过 /api/admin/webdav/integrity/findings 查询。
     """
     try:
         logger.info("执行WebDAV文件完整性检查任务")
 
-        settings = get_config()
         file_manager = get_file_manager()
 
         # 先确认WebDAV可用
@@ -221,69 +223,105 @@ async def webdav_integrity_check_task(max_records: int = 200):
             logger.warning("WebDAV不可用,跳过完整性检查任务")
             return
 
-        webdav_client = WebDAVClient()
-
-        # 从数据库中抽取最近的记录进行检查,避免一次性全表扫描
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                SELECT id, file_name, file_size, webdav_path
-                FROM upload_history
-                WHERE status = 'success'
-                  AND webdav_path IS NOT NULL
-                  AND file_size IS NOT NULL
-                  AND file_size > 0
-                ORDER BY id DESC
-                LIMIT ?
-                """,
-                (max_records,),
+        result = await run_integrity_scan(file_manager.webdav_client)
+
+        logger.info(
+            f"WebDAV文件完整性检查完成: 扫描{result['directories']}个目录, "
+            f"检查{result['checked']}条记录, 发现{result['problems']}条异常, "
+            f"恢复{result['resolved']}条, 游标={result['cursor']}"
+        )
+        if result['failed_directories']:
+            logger.warning(f"WebDAV完整性检查: {len(result['failed_directories'])}个目录列出失败, 下轮重试")
+
+    except Exception as e:
+        logger.error(f"WebDAV文件完整性检查任务异常: {str(e)}")
+
+
+async def cache_warm_task():
+    """缓存预热任务: 把最近上传的文件预取到磁盘缓存"""
+    try:
+        logger.debug("执行缓存预热任务")
+        result = await warm_recent_uploads()
+        if result.get('queued'):
+            logger.info(
+                f"缓存预热完成: 候选{result['candidates']}个, 入队{result['queued']}个, "
+                f"累计预热{result['warmed']}个, 失败{result['failed']}个"
             )
-            rows = cursor.fetchall()
 
-        if not rows:
-            logger.info("WebDAV完整性检查: 无需检查的记录")
+    except Exception as e:
+        logger.error(f"缓存预热任务异常: {str(e)}")
+
+
+async def storage_tiering_task():
+    """分层存储策略任务: 预取hot对象, 把过期的本地备份降级到磁盘缓存或只留在WebDAV"""
+    try:
+        settings = get_config()
+
+        if not settings.STORAGE_TIERING_ENABLED:
+            logger.debug("分层存储策略任务已禁用，跳过")
             return
 
-        problem_count = 0
-
-        for row in rows:
-            record_id = row["id"] if isinstance(row, dict) else row[0]
-            file_name = row["file_name"] if isinstance(row, dict) else row[1]
-            file_size = row["file_size"] if isinstance(row, dict) else row[2]
-            webdav_path = row["webdav_path"] if isinstance(row, dict) else row[3]
-
-            try:
-                remote_size = await webdav_client.get_file_size(webdav_path)
-
-                # 无法获取大小,记录警告但不中断整个任务
-                if remote_size is None:
-                    logger.warning(
-                        f"[WebDAV完整性检查] 记录id={record_id}, 文件={file_name}, "
-                        f"webdav_path={webdav_path} 无法获取远端大小"
-                    )
-                    continue
-
-                # 远端为0字节或大小不一致,都记为潜在问题
-                if remote_size == 0 or remote_size != file_size:
-                    problem_count += 1
-                    logger.error(
-                        f"[WebDAV完整性问题] id={record_id}, 文件={file_name}, "
-                        f"本地file_size={file_size}, 远端size={remote_size}, "
-                        f"webdav_path={webdav_path}"
-                    )
-            except Exception as e:
-                logger.error(
-                    f"[WebDAV完整性检查异常] id={record_id}, 文件={file_name}, 错误={str(e)}"
-                )
+        logger.info("执行分层存储策略任务")
 
+        file_manager = get_file_manager()
+
+        # 降级前需要在WebDAV上校验文件, 不可用时跳过
+        if not await file_manager.check_webdav_health():
+            logger.warning("WebDAV不可用,跳过分层存储策略任务")
+            return
+
+        result = await run_storage_tiering(file_manager)
+        tiers = result['tiers']
         logger.info(
-            f"WebDAV文件完整性检查完成: 共检查{len(rows)}条记录, "
-            f"发现{problem_count}条疑似异常"
+            f"分层存储策略完成: hot={result['objects']['hot']}, warm={result['objects']['warm']}, "
+            f"cold={result['objects']['cold']}, 预取{result['promoted']}个, "
+            f"移入缓存{result['demoted_to_cache']}个, 删除本地备份{result['removed_local']}个, "
+            f"校验失败{result['verify_failed']}个; "
+            f"本地备份{tiers['local']['bytes']}字节, 磁盘缓存{tiers['cache']['bytes']}字节, "
+            f"待同步{tiers['temp']['bytes']}字节"
         )
 
     except Exception as e:
-        logger.error(f"WebDAV文件完整性检查任务异常: {str(e)}")
+        logger.error(f"分层存储策略任务异常: {str(e)}")
+
+
+async def deletion_reaper_task():
+    """存储回收任务: 删除软删除超过宽限期的记录的本地备份、缓存和WebDAV文件"""
+    try:
+        settings = get_config()
+
+        if not settings.DELETE_REAPER_ENABLED:
+            logger.debug("存储回收任务已禁用，跳过")
+            return
+
+        file_manager = get_file_manager()
+
+        # 回收需要删除WebDAV文件, 不可用时整轮跳过(条目留在队列中)
+        if not await file_manager.check_webdav_health():
+            logger.warning("WebDAV不可用,跳过存储回收任务")
+            return
+
+        result = await deletion_queue.reap_due(file_manager)
+        if result['claimed']:
+            logger.info(
+                f"存储回收完成: 领取{result['claimed']}条, 回收{result['purged']}条, "
+                f"无需回收{result['skipped']}条, 推迟{result['deferred']}条, 失败{result['failed']}条, "
+                f"释放本地{result['freed_bytes']}字节"
+            )
+
+    except Exception as e:
+        logger.error(f"存储回收任务异常: {str(e)}")
+
+
+async def export_jobs_cleanup_task():
+    """导出文件清理任务: 删除超过 EXPORT_JOB_TTL_MINUTES 的导出任务结果"""
+    try:
+        removed = export_jobs.cleanup_expired()
+        if removed:
+            logger.info(f"导出文件清理完成: 删除{removed}个文件")
+
+    except Exception as e:
+        logger.error(f"导出文件清理任务异常: {str(e)}")
 
 
 # ========== 调度器类 ==========
@@ -356,7 +394,7 @@ class TaskScheduler:
         )
         logger.info(f"已设置待同步文件检查任务，间隔{self.settings.SYNC_RETRY_INTERVAL}秒")
 
-        # 5. WebDAV文件完整性检查任务（每日凌晨3点, 抽样最近N条记录）
+        # 5. WebDAV文件完整性检查任务（每日凌晨3点, 按日期目录轮转批量巡检）
         self.scheduler.add_job(
             func=webdav_integrity_check_task,
             trigger=CronTrigger(hour=3, minute=0),
@@ -398,6 +436,63 @@ class TaskScheduler:
         else:
             logger.info("发货单快照同步任务已禁用(DELIVERY_SYNC_ENABLED=False)")
 
+        # 8. 缓存预热任务（默认每10分钟, 预取最近上传的文件到磁盘缓存）
+        if self.settings.CACHE_WARM_ENABLED and self.settings.CACHE_WARM_RECENT_HOURS > 0:
+            self.scheduler.add_job(
+                func=cache_warm_task,
+                trigger=IntervalTrigger(minutes=self.settings.CACHE_WARM_INTERVAL_MINUTES),
+                id='cache_warm',
+                name='缓存预热',
+                replace_existing=True
+            )
+            logger.info(
+                f"已设置缓存预热任务，间隔{self.settings.CACHE_WARM_INTERVAL_MINUTES}分钟，"
+                f"预热最近{self.settings.CACHE_WARM_RECENT_HOURS}小时的上传"
+            )
+        else:
+            logger.info("缓存预热任务已禁用")
+
+        # 9. 分层存储策略任务（默认每小时）
+        if self.settings.STORAGE_TIERING_ENABLED:
+            self.scheduler.add_job(
+                func=storage_tiering_task,
+                trigger=IntervalTrigger(minutes=self.settings.STORAGE_TIERING_INTERVAL_MINUTES),
+                id='storage_tiering',
+                name='分层存储策略',
+                replace_existing=True
+            )
+            logger.info(
+                f"已设置分层存储策略任务，间隔{self.settings.STORAGE_TIERING_INTERVAL_MINUTES}分钟"
+            )
+        else:
+            logger.info("分层存储策略任务已禁用(STORAGE_TIERING_ENABLED=False)")
+
+        # 10. 删除记录的存储回收任务（默认每30分钟, 回收软删除超过宽限期的记录的文件）
+        if self.settings.DELETE_REAPER_ENABLED:
+            self.scheduler.add_job(
+                func=deletion_reaper_task,
+                trigger=IntervalTrigger(minutes=self.settings.DELETE_REAPER_INTERVAL_MINUTES),
+                id='deletion_reaper',
+                name='存储回收',
+                replace_existing=True
+            )
+            logger.info(
+                f"已设置存储回收任务，间隔{self.settings.DELETE_REAPER_INTERVAL_MINUTES}分钟，"
+                f"宽限期{self.settings.DELETE_GRACE_HOURS}小时"
+            )
+        else:
+            logger.info("存储回收任务已禁用(DELETE_REAPER_ENABLED=False)")
+
+        # 11. 导出文件清理任务（每10分钟）
+        self.scheduler.add_job(
+            func=export_jobs_cleanup_task,
+            trigger=IntervalTrigger(minutes=10),
+            id='export_jobs_cleanup',
+            name='导出文件清理',
+            replace_existing=True
+        )
+        logger.info("已设置导出文件清理任务，间隔10分钟")
+
     async def start(self):
         """启动调度器"""
         try:
@@ -475,6 +570,18 @@ class TaskScheduler:
             elif job_id == 'delivery_sync':
                 await delivery_sync_task()
                 return {'success': True, 'message': '发货单快照同步任务已执行'}
+            elif job_id == 'cache_warm':
+                await cache_warm_task()
+                return {'success': True, 'message': '缓存预热任务已执行'}
+            elif job_id == 'storage_tiering':
+                await storage_tiering_task()
+                return {'success': True, 'message': '分层存储策略任务已执行'}
+            elif job_id == 'deletion_reaper':
+                await deletion_reaper_task()
+                return {'success': True, 'message': '存储回收任务已执行'}
+            elif job_id == 'export_jobs_cleanup':
+                await export_jobs_cleanup_task()
+                return {'success': True, 'message': '导出文件清理任务已执行'}
             else:
                 return {'success': False, 'error': f'未知任务ID: {job_id}'}
 
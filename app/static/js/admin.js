@@ -37,8 +37,27 @@ const IMAGE_PREVIEW_CONFIG = {
     LOAD_TIMEOUT_MS: 30000      // 图片加载超时 30秒
 };
 
-// 备注功能防抖定时器存储
-const notesDebounceTimers = new Map();
+// 检查状态/备注的批量提交: 防抖期间的修改按记录合并, 再以一次批量请求提交
+const RECORD_EDIT_DEBOUNCE_MS = 400;
+const RECORD_EDIT_MAX_BATCH = 200;
+const recordEditQueues = {
+    check: { url: '/api/admin/records/check', field: 'checked', pending: new Map(), timer: null },
+    notes: { url: '/api/admin/records/notes', field: 'notes', pending: new Map(), timer: null }
+};
+
+// 预览清单: 当前页记录的预览URL(带内容版本号, 可被浏览器长期缓存)与缓存状态
+const previewManifest = new Map();
+// 已在服务端缓存中的图片在后台预取的数量上限
+const PREVIEW_PREFETCH_LIMIT = 20;
+
+// 筛选选项的记录数: 筛选条件变化时随列表一并请求(facets), 翻页时沿用
+const RECORD_FACETS = ['status', 'logistics', 'doc_type', 'upload_type'];
+let facetFilterKey = null;
+let lastFacets = null;
+
+// 客户名称联想: 输入停顿后再请求
+const CUSTOMER_SUGGEST_DEBOUNCE_MS = 250;
+let customerSuggestTimer = null;
 
 // DOM元素
 const elements = {
@@ -57,6 +76,7 @@ const elements = {
     statusFilter: document.getElementById('statusFilter'),  // 新增
     logisticsFilter: document.getElementById('logisticsFilter'),  // 新增:物流筛选
     customerNameFilter: document.getElementById('customerNameFilter'),  // 新增:客户名称筛选
+    customerNameOptions: document.getElementById('customerNameOptions'),
     startDateInput: document.getElementById('startDateInput'),
     endDateInput: document.getElementById('endDateInput'),
     btnSearch: document.getElementById('btnSearch'),
@@ -102,7 +122,10 @@ function init() {
     // 绑定事件
     elements.btnSearch.addEventListener('click', handleSearch);
     elements.btnReset.addEventListener('click', handleReset);
-    elements.btnRefresh.addEventListener('click', () => loadRecords());
+    elements.btnRefresh.addEventListener('click', () => {
+        facetFilterKey = null;
+        loadRecords();
+    });
     elements.btnExport.addEventListener('click', toggleExportPanel);
     elements.exportExcelCheckbox.addEventListener('change', updateConfirmButtonState);
     elements.exportImagesCheckbox.addEventListener('change', updateConfirmButtonState);
@@ -123,6 +146,10 @@ function init() {
         elements.customerNameFilter.addEventListener('keypress', (e) => {
             if (e.key === 'Enter') handleSearch();
         });
+        elements.customerNameFilter.addEventListener('input', () => {
+            clearTimeout(customerSuggestTimer);
+            customerSuggestTimer = setTimeout(loadCustomerSuggestions, CUSTOMER_SUGGEST_DEBOUNCE_MS);
+        });
     }
 
     // 删除相关事件
@@ -195,6 +222,8 @@ async function loadLogisticsOptions() {
             selectElement.appendChild(option);
         });
 
+        applyFacetCounts();
+
         console.log('✓ 物流选项加载成功:', data.logistics_list.length - 1, '个选项');
     } catch (error) {
         console.error('✗ 加载物流选项失败:', error);
@@ -202,6 +231,55 @@ async function loadLogisticsOptions() {
     }
 }
 
+// 在筛选下拉框的选项后显示记录数(未出现在计数中的选项为0, "全部"选项不显示)
+function applyFacetCounts() {
+    if (!lastFacets) return;
+    const selects = {
+        status: elements.statusFilter,
+        logistics: elements.logisticsFilter,
+        doc_type: elements.docTypeFilter,
+        upload_type: elements.uploadTypeFilter
+    };
+    Object.entries(selects).forEach(([facet, selectElement]) => {
+        if (!selectElement || !lastFacets[facet]) return;
+        const counts = new Map(lastFacets[facet].map(item => [item.value, item.count]));
+        Array.from(selectElement.options).forEach(option => {
+            if (!option.value || option.value === '全部物流') return;
+            if (!option.dataset.label) option.dataset.label = option.textContent;
+            option.textContent = `${option.dataset.label} (${counts.get(option.value) || 0})`;
+        });
+    });
+}
+
+// 客户名称联想(数据来自服务端名称字典)
+async function loadCustomerSuggestions() {
+    const datalist = elements.customerNameOptions;
+    if (!datalist) return;
+
+    const keyword = elements.customerNameFilter.value.trim();
+    if (!keyword) {
+        datalist.innerHTML = '';
+        return;
+    }
+
+    try {
+        const response = await fetch(`/api/admin/customer-names?q=${encodeURIComponent(keyword)}`);
+        if (!response.ok) return;
+        const data = await response.json();
+        // 请求期间输入已变化: 丢弃过期结果
+        if (elements.customerNameFilter.value.trim() !== keyword) return;
+
+        datalist.innerHTML = '';
+        data.names.forEach(name => {
+            const option = document.createElement('option');
+            option.value = name;
+            datalist.appendChild(option);
+        });
+    } catch (error) {
+        console.error('加载客户名称联想失败:', error);
+    }
+}
+
 // 加载记录列表
 async function loadRecords() {
     // 显示加载状态
@@ -226,9 +304,18 @@ async function loadRecords() {
         if (state.filters.startDate) params.append('start_date', state.filters.startDate);
         if (state.filters.endDate) params.append('end_date', state.filters.endDate);
 
+        const filterKey = JSON.stringify(state.filters);
+        if (filterKey !== facetFilterKey) params.append('facets', RECORD_FACETS.join(','));
+
         const response = await fetch(`/api/admin/records?${params}`);
         const data = await response.json();
 
+        if (data.facets) {
+            facetFilterKey = filterKey;
+            lastFacets = data.facets;
+            applyFacetCounts();
+        }
+
         // 更新状态
         state.totalRecords = data.total;
         state.totalPages = data.total_pages;
@@ -242,6 +329,7 @@ async function loadRecords() {
             elements.emptyState.style.display = 'block';
         } else {
             renderTable(data.records);
+            loadPreviewManifest(data.records);
         }
 
         // 更新分页信息
@@ -253,6 +341,37 @@ async function loadRecords() {
     }
 }
 
+// 加载当前页的预览清单, 并预取已在服务端缓存中的图片
+async function loadPreviewManifest(records) {
+    try {
+        const response = await fetch('/api/admin/files/manifest', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ ids: records.map(record => record.id) })
+        });
+        if (!response.ok) return;
+        const data = await response.json();
+
+        data.items.forEach(item => previewManifest.set(String(item.id), item));
+
+        // 缓存命中的图片不会触发WebDAV下载, 预取后打开预览直接使用浏览器缓存
+        document.querySelectorAll('link[data-preview-prefetch]').forEach(link => link.remove());
+        data.items
+            .filter(item => item.url && item.cache !== 'remote')
+            .slice(0, PREVIEW_PREFETCH_LIMIT)
+            .forEach(item => {
+                const link = document.createElement('link');
+                link.rel = 'prefetch';
+                link.as = 'image';
+                link.href = item.url;
+                link.dataset.previewPrefetch = '1';
+                document.head.appendChild(link);
+            });
+    } catch (error) {
+        console.error('加载预览清单失败:', error);
+    }
+}
+
 // 渲染表格
 function renderTable(records) {
     elements.tableBody.innerHTML = records.map(record => `
@@ -481,7 +600,27 @@ function createTimeoutSignal(timeoutMs) {
     return controller.signal;
 }
 
-// 处理确认导出
+// 导出任务轮询间隔
+const EXPORT_POLL_INTERVAL_MS = 1500;
+
+function sleep(ms) {
+    return new Promise((resolve) => setTimeout(resolve, ms));
+}
+
+// 导出进度文案: 行数 / 图片数
+function formatExportProgress(job) {
+    const progress = job.progress || {};
+    const parts = [];
+    if (progress.rows_total) {
+        parts.push(`${progress.rows_done || 0}/${progress.rows_total}行`);
+    }
+    if (progress.images_written || progress.images_missing) {
+        parts.push(`图片${progress.images_written || 0}`);
+    }
+    return parts.length ? `导出中 ${parts.join(' ')}` : '导出中...';
+}
+
+// 处理确认导出: 提交后台导出任务, 轮询进度, 完成后下载(支持断点续传)
 async function handleConfirmExport() {
     if (state.exportInProgress) return;
 
@@ -501,25 +640,59 @@ async function handleConfirmExport() {
     showToast('开始导出，请稍候...', 'success');
 
     try {
-        const params = new URLSearchParams();
+        const payload = {
+            search: state.filters.search || null,
+            upload_type: state.filters.uploadType || null,  // 仅在选择具体业务类型时携带(全部业务时省略)
+            doc_type: state.filters.docType || null,
+            product_type: state.filters.productType || null,
+            status: state.filters.status || null,
+            logistics: state.filters.logistics && state.filters.logistics !== '全部物流' ? state.filters.logistics : null,
+            customer_name: state.filters.customerName || null,
+            start_date: state.filters.startDate || null,
+            end_date: state.filters.endDate || null,
+            include_excel: includeExcel,
+            include_images: includeImages
+        };
+
+        const response = await fetch('/api/admin/export/jobs', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(payload),
+            signal: createTimeoutSignal(30000)
+        });
+        if (!response.ok) {
+            const error = await response.json().catch(() => ({}));
+            throw new Error(error.detail || `HTTP ${response.status}`);
+        }
 
-        if (state.filters.search) params.append('search', state.filters.search);
-        if (state.filters.uploadType) params.append('upload_type', state.filters.uploadType);  // 新增:仅在选择具体业务类型时携带(全部业务时省略)
-        if (state.filters.docType) params.append('doc_type', state.filters.docType);
-        if (state.filters.productType) params.append('product_type', state.filters.productType);
-        if (state.filters.status) params.append('status', state.filters.status);
-        if (state.filters.logistics && state.filters.logistics !== '全部物流') params.append('logistics', state.filters.logistics);
-        if (state.filters.customerName) params.append('customer_name', state.filters.customerName);
-        if (state.filters.startDate) params.append('start_date', state.filters.startDate);
-        if (state.filters.endDate) params.append('end_date', state.filters.endDate);
+        let job = await response.json();
+        if (job.reused && job.status === 'done') {
+            showToast('相同条件的导出文件已生成，直接下载', 'success');
+        } else if (job.empty) {
+            showToast('当前筛选条件下没有可导出的数据', 'warning');
+        }
+
+        // 轮询进度直到完成或失败
+        while (job.status === 'queued' || job.status === 'running') {
+            elements.btnConfirmExport.textContent = formatExportProgress(job);
+            await sleep(EXPORT_POLL_INTERVAL_MS);
+            const statusResponse = await fetch(`/api/admin/export/jobs/${job.job_id}`, {
+                signal: createTimeoutSignal(30000)
+            });
+            if (!statusResponse.ok) {
+                const error = await statusResponse.json().catch(() => ({}));
+                throw new Error(error.detail || `HTTP ${statusResponse.status}`);
+            }
+            job = await statusResponse.json();
+        }
 
-        params.append('include_excel', includeExcel.toString());
-        params.append('include_images', includeImages.toString());
+        if (job.status !== 'done') {
+            throw new Error(job.error || '导出任务失败');
+        }
 
-        // 使用新标签页下载，避免 blob 内存问题导致大文件卡住
-        const downloadUrl = `/api/admin/export?${params}`;
-        window.open(downloadUrl, '_blank');
-        showToast('导出已在新标签页开始，请等待下载完成', 'success');
+        // 由浏览器直接下载, 大文件中断后可续传, 避免 blob 内存问题
+        window.location.href = job.download_url;
+        showToast('导出完成，开始下载', 'success');
     } catch (error) {
         if (error.name === 'TimeoutError' || error.name === 'AbortError') {
             showToast('导出超时，请稍后重试', 'error');
@@ -655,7 +828,7 @@ async function handleBatchDelete() {
         return;
     }
 
-    const confirmMessage = `确定要删除选中的 ${state.selectedIds.size} 条记录吗？\n\n注意：这将标记记录为已删除，但不会删除本地文件。`;
+    const confirmMessage = `确定要删除选中的 ${state.selectedIds.size} 条记录吗？\n\n注意：记录将标记为已删除；若服务端启用了存储回收，宽限期过后其图片文件（本地、缓存及WebDAV）将被清理。`;
 
     if (!confirm(confirmMessage)) {
         return;
@@ -685,7 +858,8 @@ async function handleBatchDelete() {
         elements.selectAll.checked = false;
         updateBatchDeleteButton();
 
-        // 刷新列表和统计
+        // 刷新列表、筛选计数和统计
+        facetFilterKey = null;
         await Promise.all([loadRecords(), loadStatistics()]);
 
     } catch (error) {
@@ -695,7 +869,7 @@ async function handleBatchDelete() {
 
 // 处理单行删除
 async function handleDeleteRow(recordId) {
-    const confirmMessage = '确定要删除这条记录吗？\n\n注意：这将标记记录为已删除，但不会删除本地文件。';
+    const confirmMessage = '确定要删除这条记录吗？\n\n注意：记录将标记为已删除；若服务端启用了存储回收，宽限期过后其图片文件（本地、缓存及WebDAV）将被清理。';
 
     if (!confirm(confirmMessage)) {
         return;
@@ -724,7 +898,8 @@ async function handleDeleteRow(recordId) {
         state.selectedIds.delete(recordId);
         updateBatchDeleteButton();
 
-        // 刷新列表和统计
+        // 刷新列表、筛选计数和统计
+        facetFilterKey = null;
         await Promise.all([loadRecords(), loadStatistics()]);
 
     } catch (error) {
@@ -794,7 +969,8 @@ function openImagePreview(recordId, filename) {
     updateZoomDisplay();
 
     // 使用API端点通过record_id获取图片
-    const imageUrl = `/api/admin/files/${recordId}/preview`;
+    const manifestItem = previewManifest.get(String(recordId));
+    const imageUrl = (manifestItem && manifestItem.url) || `/api/admin/files/${recordId}/preview`;
     const img = new Image();
 
     // 添加加载超时处理
@@ -1034,32 +1210,92 @@ async function handleUncheckConfirm(recordId, buttonElement) {
 }
 
 /**
- * 调用后端API更新检查状态
+ * 排队一条检查状态/备注修改, 返回该记录的处理结果
+ * 同一记录在防抖期间多次修改时只提交最后一次, 所有等待者得到同一结果
+ * @param {'check'|'notes'} kind - 修改类型
  * @param {number} recordId - 记录ID
- * @param {boolean} checked - 检查状态
- * @returns {Promise<boolean>} 是否成功
+ * @param {boolean|string} value - 新值
+ * @returns {Promise<{success: boolean, error?: string}>}
  */
-async function updateCheckStatus(recordId, checked) {
+function queueRecordEdit(kind, recordId, value) {
+    const queue = recordEditQueues[kind];
+
+    return new Promise((resolve) => {
+        const entry = queue.pending.get(recordId) || { resolvers: [] };
+        entry.value = value;
+        entry.resolvers.push(resolve);
+        queue.pending.set(recordId, entry);
+
+        if (queue.pending.size >= RECORD_EDIT_MAX_BATCH) {
+            flushRecordEdits(kind);
+            return;
+        }
+        clearTimeout(queue.timer);
+        queue.timer = setTimeout(() => flushRecordEdits(kind), RECORD_EDIT_DEBOUNCE_MS);
+    });
+}
+
+/**
+ * 立即提交排队中的修改
+ * @param {'check'|'notes'} kind - 修改类型
+ * @param {boolean} keepalive - 页面卸载时仍然发送
+ */
+async function flushRecordEdits(kind, keepalive = false) {
+    const queue = recordEditQueues[kind];
+    clearTimeout(queue.timer);
+    queue.timer = null;
+    if (queue.pending.size === 0) return;
+
+    const batch = queue.pending;
+    queue.pending = new Map();
+    const items = Array.from(batch, ([id, entry]) => ({ id, [queue.field]: entry.value }));
+
+    let results;
     try {
-        const response = await fetch(`/api/admin/records/${recordId}/check`, {
+        const response = await fetch(queue.url, {
             method: 'PATCH',
             headers: {
                 'Content-Type': 'application/json'
             },
-            body: JSON.stringify({ checked })
+            body: JSON.stringify({ items }),
+            keepalive
         });
 
         if (!response.ok) {
             const error = await response.json();
-            throw new Error(error.detail || '更新失败');
+            throw new Error(error.detail || '保存失败');
         }
 
-        return true;
-
+        const data = await response.json();
+        results = new Map(data.results.map((item) => [item.id, item]));
     } catch (error) {
-        showToast('更新检查状态失败: ' + error.message, 'error');
-        return false;
+        results = new Map(items.map((item) => [item.id, { success: false, error: error.message }]));
+    }
+
+    batch.forEach((entry, id) => {
+        const result = results.get(id) || { success: false, error: '保存失败' };
+        entry.resolvers.forEach((resolve) => resolve(result));
+    });
+}
+
+// 离开页面前提交尚未发送的修改
+window.addEventListener('pagehide', () => {
+    flushRecordEdits('check', true);
+    flushRecordEdits('notes', true);
+});
+
+/**
+ * 更新检查状态(经批量接口提交)
+ * @param {number} recordId - 记录ID
+ * @param {boolean} checked - 检查状态
+ * @returns {Promise<boolean>} 是否成功
+ */
+async function updateCheckStatus(recordId, checked) {
+    const result = await queueRecordEdit('check', recordId, checked);
+    if (!result.success) {
+        showToast('更新检查状态失败: ' + result.error, 'error');
     }
+    return result.success;
 }
 
 /**
@@ -1086,52 +1322,22 @@ function updateCheckButtonUI(buttonElement, checked) {
 // ==================== 备注功能 ====================
 
 /**
- * 处理备注输入框失焦事件 - 自动保存（带防抖）
+ * 处理备注输入框失焦事件 - 自动保存（防抖合并后批量提交）
  */
 async function handleNotesBlur(event) {
     const input = event.target;
     const recordId = parseInt(input.dataset.id);
     const notes = input.value.trim();
 
-    // 清除已有的防抖定时器
-    if (notesDebounceTimers.has(recordId)) {
-        clearTimeout(notesDebounceTimers.get(recordId));
-    }
-
-    // 设置300ms防抖延迟
-    const timer = setTimeout(async () => {
-        // 移除错误状态
-        input.classList.remove('error');
-
-        try {
-            const response = await fetch(`/api/admin/records/${recordId}/notes`, {
-                method: 'PATCH',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({ notes })
-            });
-
-            if (!response.ok) {
-                const error = await response.json();
-                throw new Error(error.detail || '保存失败');
-            }
-
-            // 保存成功 - 可选：显示成功提示
-            // showToast('备注已保存', 'success');
-
-        } catch (error) {
-            // 保存失败 - 显示错误状态
-            input.classList.add('error');
-            showToast('保存备注失败: ' + error.message, 'error');
-        } finally {
-            // 清理定时器
-            notesDebounceTimers.delete(recordId);
-        }
-    }, 300);
+    // 移除错误状态
+    input.classList.remove('error');
 
-    // 存储定时器
-    notesDebounceTimers.set(recordId, timer);
+    const result = await queueRecordEdit('notes', recordId, notes);
+    if (!result.success) {
+        // 保存失败 - 显示错误状态
+        input.classList.add('error');
+        showToast('保存备注失败: ' + result.error, 'error');
+    }
 }
 
 /**
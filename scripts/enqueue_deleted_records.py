@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+把启用存储回收(DELETE_REAPER_ENABLED)之前已软删除的记录加入回收队列。
+
+存储回收只自动处理启用后删除的记录; 此前删除的记录当时并未告知会删除文件,
+确认这些记录的图片(本地备份、缓存和WebDAV原件)可以清理后, 再用本脚本显式加入。
+
+用法：
+    在项目根目录下执行：
+
+        python scripts/enqueue_deleted_records.py --dry-run
+        python scripts/enqueue_deleted_records.py --deleted-before 2026-01-01
+
+脚本会：
+    1. 统计已软删除但不在回收队列中的记录(可用 --deleted-before 只处理该日期之前删除的)
+    2. --dry-run 时只输出数量; 否则加入回收队列
+    3. 加入的记录要等宽限期(DELETE_GRACE_HOURS, 可用 --grace-hours 覆盖)过后,
+       且 DELETE_REAPER_ENABLED=true 时才会被回收任务删除文件
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+# 将项目根目录加入 sys.path，方便导入 app.*
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.core.config import get_settings  # type: ignore  # noqa: E402
+from app.core.database import init_database  # type: ignore  # noqa: E402
+from app.core import deletion_queue  # type: ignore  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="把此前已软删除的记录加入存储回收队列")
+    parser.add_argument("--deleted-before", default=None, help="只处理该时间之前删除的记录(YYYY-MM-DD)")
+    parser.add_argument("--grace-hours", type=float, default=None, help="宽限期小时数, 默认读取 DELETE_GRACE_HOURS")
+    parser.add_argument("--dry-run", action="store_true", help="只统计, 不加入队列")
+    args = parser.parse_args()
+
+    settings = get_settings()
+    init_database()
+
+    total = deletion_queue.count_deleted_not_queued(args.deleted_before)
+    print(f"已软删除且不在回收队列中的记录: {total}条")
+    if args.dry_run or total == 0:
+        return
+
+    grace_hours = settings.DELETE_GRACE_HOURS if args.grace_hours is None else args.grace_hours
+    added = deletion_queue.enqueue_deleted(args.deleted_before, grace_seconds=grace_hours * 3600)
+    print(f"已加入回收队列: {added}条, {grace_hours:g}小时后可被回收")
+    if not settings.DELETE_REAPER_ENABLED:
+        print("提示: DELETE_REAPER_ENABLED=false, 启用后回收任务才会删除文件")
+
+
+if __name__ == "__main__":
+    main()
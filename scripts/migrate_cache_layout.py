@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+把现有缓存目录迁移到指定的缓存布局(CACHE_LAYOUT)。
+
+用法：
+    先停止服务，在项目根目录下执行：
+
+        python scripts/migrate_cache_layout.py --to sharded
+        python scripts/migrate_cache_layout.py --to mirror --dry-run
+
+    迁移完成后把 .env 中的 CACHE_LAYOUT 改为目标布局再启动服务。
+
+脚本会：
+    1. 读取 .env 配置中的 CACHE_DIR(可用 --cache-dir 覆盖)
+    2. mirror -> sharded: 把 YYYY/MM/DD 目录下的缓存文件移动到 objects/ab/cd/<哈希>
+    3. sharded -> mirror: 用上传记录中的 webdav_path 反查哈希, 移回日期目录;
+       反查不到的缓存文件直接删除(可随时从WebDAV重新下载)
+    4. 删除缓存索引快照, 下次启动时重新扫描缓存目录
+"""
+
+import argparse
+import sys
+from pathlib import Path
+from typing import List
+
+# 将项目根目录加入 sys.path，方便导入 app.*
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+if str(PROJECT_ROOT) not in sys.path:
+    sys.path.insert(0, str(PROJECT_ROOT))
+
+from app.core.config import get_settings  # type: ignore  # noqa: E402
+from app.core.cache_layout import LAYOUTS, LAYOUT_MIRROR, migrate_cache_dir  # type: ignore  # noqa: E402
+from app.core.database import get_db_connection  # type: ignore  # noqa: E402
+
+
+def load_webdav_paths() -> List[str]:
+    """上传记录中的全部WebDAV路径(包括已软删除的记录)"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            SELECT webdav_path
+            FROM upload_history
+            WHERE webdav_path IS NOT NULL AND webdav_path != ''
+            """
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="迁移缓存目录布局")
+    parser.add_argument("--to", dest="target", choices=LAYOUTS, required=True, help="目标布局")
+    parser.add_argument("--cache-dir", default=None, help="缓存目录, 默认读取 CACHE_DIR 配置")
+    parser.add_argument("--dry-run", action="store_true", help="只统计, 不移动文件")
+    args = parser.parse_args()
+
+    cache_dir = args.cache_dir or get_settings().CACHE_DIR
+    webdav_paths = load_webdav_paths() if args.target == LAYOUT_MIRROR else None
+
+    print(f"缓存目录: {cache_dir}")
+    print(f"目标布局: {args.target}{' (dry-run)' if args.dry_run else ''}")
+
+    stats = migrate_cache_dir(cache_dir, args.target, webdav_paths=webdav_paths, dry_run=args.dry_run)
+
+    print("\n===== 迁移完成 =====")
+    print(f"迁移文件数: {stats['moved']}")
+    print(f"重复文件(已删除): {stats['skipped']}")
+    print(f"无法反查(已删除): {stats['removed']}")
+
+
+if __name__ == "__main__":
+    main()
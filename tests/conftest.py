@@ -54,7 +54,8 @@ def test_db_path() -> Generator[str, None, None]:
             customer_name TEXT DEFAULT NULL,
             webdav_path TEXT,
             is_cached INTEGER DEFAULT 0,
-            cache_expiry_time DATETIME
+            cache_expiry_time DATETIME,
+            yonyou_latency_ms INTEGER DEFAULT NULL
         )
     """)
 
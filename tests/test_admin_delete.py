@@ -88,6 +88,19 @@ def test_db():
         ON upload_history(deleted_at)
     """)
 
+    # 删除记录的存储回收队列(软删除时在同一事务内加入)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS deletion_queue (
+            record_id INTEGER PRIMARY KEY,
+            state TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            next_attempt_at REAL NOT NULL DEFAULT 0,
+            created_at DATETIME,
+            updated_at DATETIME
+        )
+    """)
+
     # 插入测试数据
     test_records = [
         (1, '123456', 'SO20250101001', '销售', 'image1.jpg', 1024, '.jpg',
@@ -690,6 +690,40 @@ class TestNotesErrorHandling:
         assert len(records) > 0
 
 
+class TestNotesBatchUpdate:
+    """测试批量更新备注接口"""
+
+    def test_batch_update_notes(self, client, test_db, sample_record):
+        """测试批量更新: 逐条结果, 超长备注单条失败, 空白保存为NULL"""
+        response = client.patch(
+            "/api/admin/records/notes",
+            json={"items": [
+                {"id": sample_record, "notes": "  批量备注  "},
+                {"id": 999999, "notes": "不存在"},
+                {"id": sample_record + 1, "notes": "a" * 1001},
+            ]}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert (data["updated"], data["failed"]) == (1, 2)
+        assert data["results"][0] == {"id": sample_record, "success": True, "notes": "批量备注"}
+        assert data["results"][1]["error"] == "记录不存在或已删除"
+        assert data["results"][2]["error"] == "备注内容不能超过1000字符"
+
+        response = client.patch(
+            "/api/admin/records/notes",
+            json={"items": [{"id": sample_record, "notes": "   "}]}
+        )
+        assert response.json()["results"][0]["notes"] is None
+
+        conn = sqlite3.connect(test_db)
+        cursor = conn.cursor()
+        cursor.execute("SELECT notes FROM upload_history WHERE id = ?", [sample_record])
+        assert cursor.fetchone()[0] is None
+        conn.close()
+
+
 # ==================== 运行标记 ====================
 
 # 标记关键测试用例
@@ -0,0 +1,149 @@
+"""JSON接口压缩与ETag重验证测试"""
+import sqlite3
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import admin
+from app.core import api_cache, database, delivery_sync_service
+from app.core.config import get_settings
+from app.main import app
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def versions(db_path):
+    with db_context(db_path) as conn:
+        return {row[0]: row[1] for row in conn.execute("SELECT table_name, version FROM data_versions")}
+
+
+@pytest.fixture
+def cache_db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    with patch.object(api_cache, "get_db_connection", side_effect=factory), \
+            patch.object(admin, "get_db_connection", side_effect=factory) as admin_db, \
+            patch.object(delivery_sync_service, "get_db_connection", side_effect=factory):
+        yield db_path, admin_db
+
+
+def add_record(db_path, doc_number):
+    with db_context(db_path) as conn:
+        conn.execute(
+            """
+            INSERT INTO upload_history (business_id, doc_number, file_name, file_size, status, upload_time)
+            VALUES ('1', ?, 'a.jpg', 1, 'success', '2026-01-01T10:00:00')
+            """,
+            (doc_number,),
+        )
+
+
+def test_triggers_bump_versions(cache_db):
+    db_path, _ = cache_db
+    before = versions(db_path)
+    assert set(before) == set(database.VERSIONED_TABLES)
+
+    add_record(db_path, "SO001")
+    with db_context(db_path) as conn:
+        conn.execute("UPDATE upload_history SET notes = 'x'")
+        conn.execute("DELETE FROM upload_history")
+        conn.execute("INSERT INTO logistics_tokens (logistics_name, token) VALUES ('顺丰', 't1')")
+        # 访问时间不影响门户内容, 不计入版本
+        conn.execute("UPDATE logistics_tokens SET last_access_at = '2026-01-01T10:00:00'")
+
+    after = versions(db_path)
+    assert after["upload_history"] == before["upload_history"] + 3
+    assert after["logistics_tokens"] == before["logistics_tokens"] + 1
+    assert after["delivery_snapshot"] == before["delivery_snapshot"]
+
+
+def test_if_none_match_returns_304_without_query(cache_db):
+    db_path, admin_db = cache_db
+    add_record(db_path, "SO001")
+    client = TestClient(app)
+
+    first = client.get("/api/admin/records?page=1")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    assert first.headers["cache-control"] == "no-cache"
+
+    calls = admin_db.call_count
+    cached = client.get("/api/admin/records?page=1", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+    assert admin_db.call_count == calls
+
+    # 查询参数不同ETag不同
+    other = client.get("/api/admin/records?page=2", headers={"If-None-Match": etag})
+    assert other.status_code == 200 and other.headers["etag"] != etag
+
+    add_record(db_path, "SO002")
+    changed = client.get("/api/admin/records?page=1", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+    assert changed.json()["total"] == 2
+
+
+def test_gzip_above_threshold(cache_db):
+    db_path, _ = cache_db
+    for i in range(30):
+        add_record(db_path, f"SO{i:03d}")
+    client = TestClient(app)
+    settings = get_settings().model_copy(update={"API_GZIP_MIN_BYTES": 1024, "API_GZIP_LEVEL": 6})
+
+    with patch.object(api_cache, "get_settings", return_value=settings):
+        large = client.get("/api/admin/records", headers={"Accept-Encoding": "gzip"})
+        small = client.get("/api/admin/statistics", headers={"Accept-Encoding": "gzip"})
+        plain = client.get("/api/admin/records", headers={"Accept-Encoding": "identity"})
+
+    assert large.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in large.headers["vary"]
+    assert int(large.headers["content-length"]) < len(large.content)
+    assert large.json()["total"] == 30
+    assert "content-encoding" not in small.headers
+    assert "content-encoding" not in plain.headers
+    assert plain.json() == large.json()
+
+
+def test_portal_304_records_access_time(cache_db):
+    db_path, _ = cache_db
+    with db_context(db_path) as conn:
+        conn.execute("INSERT INTO logistics_tokens (logistics_name, token) VALUES ('顺丰', 't1')")
+    client = TestClient(app)
+
+    first = client.get("/api/portal/t1/deliveries")
+    assert first.status_code == 200
+    with db_context(db_path) as conn:
+        conn.execute("UPDATE logistics_tokens SET last_access_at = NULL")
+
+    cached = client.get("/api/portal/t1/deliveries", headers={"If-None-Match": first.headers["etag"]})
+    assert cached.status_code == 304
+    with db_context(db_path) as conn:
+        assert conn.execute("SELECT last_access_at FROM logistics_tokens").fetchone()[0] is not None
+
+    assert client.get("/api/portal/unknown/deliveries").status_code == 404
+
+
+def test_missing_version_table_skips_etag(cache_db):
+    db_path, _ = cache_db
+    with db_context(db_path) as conn:
+        conn.execute("DROP TABLE data_versions")
+    assert api_cache.get_data_version(["upload_history"]) is None
+
+    response = TestClient(app).get("/api/admin/statistics", headers={"If-None-Match": "*"})
+    assert response.status_code == 200
+    assert "etag" not in response.headers
@@ -0,0 +1,144 @@
+"""测试缓存索引与容量上限淘汰"""
+import os
+import time
+
+import pytest
+
+from app.core.cache_index import CacheIndex
+from app.core.file_manager import FileManager
+
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+
+
+@pytest.fixture
+def file_manager(tmp_path):
+    fm = FileManager()
+    fm.settings = fm.settings.model_copy(update={
+        "CACHE_DIR": str(tmp_path / "cache"),
+        "TEMP_STORAGE_DIR": str(tmp_path / "temp"),
+        "CACHE_MAX_BYTES": 300,
+        "CACHE_EVICTION_POLICY": "lru",
+    })
+    return fm
+
+
+class TestCacheIndex:
+
+    def test_rebuild_orders_by_mtime_and_removes_part_files(self, tmp_path):
+        root = tmp_path / "cache"
+        write(str(root / "2026/01/01/old.jpg"), 10)
+        write(str(root / "2026/01/02/new.jpg"), 20)
+        write(str(root / "2026/01/02/new.jpg.part-abcd1234"), 5)
+        os.utime(root / "2026/01/01/old.jpg", (time.time() - 100, time.time() - 100))
+
+        index = CacheIndex(str(root))
+        index.rebuild()
+
+        assert index.stats()["total_files"] == 2
+        assert index.total_bytes == 30
+        assert not (root / "2026/01/02/new.jpg.part-abcd1234").exists()
+        victims = index.take_victims(25, "lru")
+        assert [os.path.basename(p) for p, _ in victims] == ["old.jpg"]
+
+    def test_lru_prefers_least_recently_used(self, tmp_path):
+        index = CacheIndex(str(tmp_path))
+        index.ensure_loaded()
+        for name in ("a", "b", "c"):
+            index.add(str(tmp_path / name), 100)
+        index.record_hit(str(tmp_path / "a"))
+
+        victims = index.take_victims(200, "lru")
+
+        assert [os.path.basename(p) for p, _ in victims] == ["b"]
+        assert index.total_bytes == 200
+
+    def test_lfu_prefers_least_frequently_used(self, tmp_path):
+        index = CacheIndex(str(tmp_path))
+        index.ensure_loaded()
+        for name in ("a", "b", "c"):
+            index.add(str(tmp_path / name), 100)
+        for _ in range(3):
+            index.record_hit(str(tmp_path / "a"))
+        index.record_hit(str(tmp_path / "b"))
+        index.record_hit(str(tmp_path / "c"))
+        index.record_hit(str(tmp_path / "c"))
+
+        victims = index.take_victims(100, "lfu")
+
+        assert [os.path.basename(p) for p, _ in victims] == ["b", "c"]
+
+    def test_expiry_only_touches_expired_entries(self, tmp_path):
+        index = CacheIndex(str(tmp_path))
+        index.ensure_loaded()
+        index.add(str(tmp_path / "a"), 10)
+        index.add(str(tmp_path / "b"), 10)
+        index.get(str(tmp_path / "a")).last_access = time.time() - 1000
+
+        victims = index.take_victims(0, "lru", expire_before=time.time() - 500)
+
+        assert [os.path.basename(p) for p, _ in victims] == ["a"]
+        assert index.stats()["total_files"] == 1
+
+    def test_new_entry_kept_when_evicting(self, tmp_path):
+        index = CacheIndex(str(tmp_path))
+        index.ensure_loaded()
+        index.add(str(tmp_path / "a"), 100)
+        index.add(str(tmp_path / "b"), 100)
+
+        victims = index.take_victims(150, "lfu", keep=str(tmp_path / "b"))
+
+        assert [os.path.basename(p) for p, _ in victims] == ["a"]
+        assert index.get(str(tmp_path / "b")) is not None
+
+
+class TestFileManagerBudget:
+
+    @pytest.mark.asyncio
+    async def test_write_cache_enforces_byte_budget(self, file_manager):
+        paths = [file_manager._get_cache_path(f"files/2026/01/01/{i}.jpg") for i in range(4)]
+        for path in paths:
+            await file_manager._write_cache(path, b"x" * 100)
+
+        assert not os.path.exists(paths[0])
+        assert all(os.path.exists(p) for p in paths[1:])
+        stats = await file_manager.get_cache_stats()
+        assert stats["total_size"] == 300
+        assert stats["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_cache_hit_protects_entry_from_eviction(self, file_manager):
+        paths = [file_manager._get_cache_path(f"files/2026/01/01/{i}.jpg") for i in range(4)]
+        for path in paths[:3]:
+            await file_manager._write_cache(path, b"x" * 100)
+
+        assert file_manager._is_cache_valid(paths[0])
+        await file_manager._write_cache(paths[3], b"x" * 100)
+
+        assert os.path.exists(paths[0])
+        assert not os.path.exists(paths[1])
+
+    @pytest.mark.asyncio
+    async def test_cleanup_removes_expired_entries(self, file_manager):
+        path = file_manager._get_cache_path("files/2026/01/01/old.jpg")
+        await file_manager._write_cache(path, b"x" * 10)
+        file_manager.cache_index.get(path).last_access -= 8 * 86400
+
+        result = await file_manager.cleanup_cache()
+
+        assert result["deleted_files"] == 1
+        assert result["freed_space"] == 10
+        assert not os.path.exists(path)
+
+    def test_externally_deleted_file_is_a_miss(self, file_manager):
+        path = file_manager._get_cache_path("files/2026/01/01/gone.jpg")
+        write(path, 10)
+        assert file_manager._is_cache_valid(path)
+
+        os.remove(path)
+
+        assert not file_manager._is_cache_valid(path)
+        assert file_manager.cache_index.get(path) is None
@@ -0,0 +1,121 @@
+"""测试缓存目录布局、索引快照与布局迁移"""
+import os
+
+from app.core.cache_index import INVENTORY_FILE, CacheIndex
+from app.core.cache_layout import (
+    cache_path_for,
+    migrate_cache_dir,
+    sharded_relative_path,
+)
+from app.core.file_manager import FileManager
+
+
+def write(path, size):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+
+
+class TestCacheLayout:
+
+    def test_mirror_layout_keeps_date_tree(self, tmp_path):
+        path = cache_path_for(str(tmp_path), "files/2026/01/02/a.jpg", "mirror")
+        assert path == os.path.join(str(tmp_path), "2026", "01", "02", "a.jpg")
+
+    def test_sharded_layout_uses_hash_prefix(self, tmp_path):
+        path = cache_path_for(str(tmp_path), "files/2026/01/02/a.JPG", "sharded")
+        relative = os.path.relpath(path, str(tmp_path)).split(os.sep)
+
+        assert relative[0] == "objects"
+        digest = relative[3][:-len(".jpg")]
+        assert relative[1:3] == [digest[:2], digest[2:4]]
+        assert relative[3].endswith(".jpg")
+        assert path == cache_path_for(str(tmp_path), "files/2026/01/02/a.JPG", "sharded")
+
+    def test_file_manager_follows_setting(self, tmp_path):
+        fm = FileManager()
+        fm.settings = fm.settings.model_copy(update={
+            "CACHE_DIR": str(tmp_path),
+            "CACHE_LAYOUT": "sharded",
+        })
+        assert fm._get_cache_path("files/2026/01/02/a.jpg") == os.path.join(
+            str(tmp_path), sharded_relative_path("2026/01/02/a.jpg")
+        )
+
+
+class TestInventorySnapshot:
+
+    def test_snapshot_round_trip_preserves_order_and_hits(self, tmp_path):
+        index = CacheIndex(str(tmp_path))
+        index.ensure_loaded()
+        for name in ("a", "b", "c"):
+            index.add(str(tmp_path / name), 100)
+        index.record_hit(str(tmp_path / "a"))
+        assert index.save_snapshot() == str(tmp_path / INVENTORY_FILE)
+
+        restored = CacheIndex(str(tmp_path))
+        restored.load()
+
+        stats = restored.stats()
+        assert stats["inventory_source"] == "snapshot"
+        assert (stats["total_files"], stats["total_size"]) == (3, 300)
+        assert restored.get(str(tmp_path / "a")).hits == 1
+        # 快照加载后即删除, 异常退出后的下次启动会重新扫描
+        assert not (tmp_path / INVENTORY_FILE).exists()
+        victims = restored.take_victims(200, "lru")
+        assert [os.path.basename(p) for p, _ in victims] == ["b"]
+
+    def test_missing_or_corrupt_snapshot_falls_back_to_scan(self, tmp_path):
+        write(str(tmp_path / "2026/01/01/a.jpg"), 10)
+        (tmp_path / INVENTORY_FILE).write_text("{broken", encoding="utf-8")
+
+        index = CacheIndex(str(tmp_path))
+        index.load()
+
+        stats = index.stats()
+        assert stats["inventory_source"] == "scan"
+        assert stats["total_files"] == 1
+        assert not (tmp_path / INVENTORY_FILE).exists()
+
+    def test_rebuild_ignores_snapshot_file(self, tmp_path):
+        index = CacheIndex(str(tmp_path))
+        index.ensure_loaded()
+        index.add(str(tmp_path / "a"), 10)
+        write(str(tmp_path / "a"), 10)
+        index.save_snapshot()
+
+        index.rebuild()
+
+        assert index.stats()["total_files"] == 1
+
+
+class TestMigrateCacheDir:
+
+    def test_mirror_to_sharded_and_back(self, tmp_path):
+        write(str(tmp_path / "2026/01/01/a.jpg"), 10)
+        write(str(tmp_path / "2026/01/02/b.jpg"), 20)
+        write(str(tmp_path / "2026/01/02/b.jpg.part-abcd1234"), 5)
+        (tmp_path / INVENTORY_FILE).write_text("{}", encoding="utf-8")
+
+        stats = migrate_cache_dir(str(tmp_path), "sharded")
+
+        assert stats == {"moved": 2, "skipped": 0, "removed": 0}
+        assert os.path.getsize(tmp_path / sharded_relative_path("2026/01/02/b.jpg")) == 20
+        assert not (tmp_path / "2026" / "01" / "01").exists()
+        assert not (tmp_path / INVENTORY_FILE).exists()
+
+        stats = migrate_cache_dir(
+            str(tmp_path), "mirror", webdav_paths=["files/2026/01/01/a.jpg"]
+        )
+
+        assert stats == {"moved": 1, "skipped": 0, "removed": 1}
+        assert os.path.getsize(tmp_path / "2026/01/01/a.jpg") == 10
+        assert not (tmp_path / "objects").exists()
+
+    def test_dry_run_moves_nothing(self, tmp_path):
+        write(str(tmp_path / "2026/01/01/a.jpg"), 10)
+
+        stats = migrate_cache_dir(str(tmp_path), "sharded", dry_run=True)
+
+        assert stats["moved"] == 1
+        assert (tmp_path / "2026/01/01/a.jpg").exists()
@@ -0,0 +1,195 @@
+"""缓存预热测试"""
+import asyncio
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+
+from app.api import admin
+from app.core import cache_warmer as cache_warmer_module
+from app.core import database
+from app.core import memory_cache as memory_cache_module
+from app.core.cache_warmer import CacheWarmer, load_recent_paths
+from app.core.file_manager import FileManager
+from app.core.memory_cache import MemoryCache
+from app.core.timezone import get_beijing_now_naive
+from app.core.webdav_health import webdav_health
+
+
+class FakeFileManager:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.fetched = []
+
+    async def prefetch(self, webdav_path):
+        await asyncio.sleep(self.delay)
+        self.fetched.append(webdav_path)
+        return True
+
+
+@pytest.fixture(autouse=True)
+def reset_health():
+    webdav_health.reset()
+    yield
+    webdav_health.reset()
+
+
+def make_warmer(concurrency=1, queue_size=10, idle=0.0, delay=0.0):
+    warmer = CacheWarmer(concurrency, queue_size, idle)
+    warmer.file_manager = FakeFileManager(delay)
+    return warmer
+
+
+@pytest.mark.asyncio
+async def test_priority_paths_are_fetched_first_and_deduplicated():
+    warmer = make_warmer()
+
+    warmer._queue.extend(["recent/1", "recent/2"])
+    warmer._queued.update(["recent/1", "recent/2"])
+    added = warmer.enqueue(["next/1", "next/2", "next/1", "recent/1"], priority=True)
+    await warmer.join()
+
+    assert added == 2
+    assert warmer.file_manager.fetched == ["next/1", "next/2", "recent/1", "recent/2"]
+    assert warmer.stats()["warmed"] == 4
+
+
+@pytest.mark.asyncio
+async def test_queue_is_bounded():
+    warmer = make_warmer(queue_size=2, idle=60)
+    warmer.note_interactive()
+
+    warmer.enqueue(["a", "b", "c"])
+    warmer.enqueue(["p"], priority=True)
+
+    assert list(warmer._queue) == ["p", "a"]
+    assert warmer.dropped == 2
+    for worker in warmer._workers:
+        worker.cancel()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_bounded():
+    warmer = make_warmer(concurrency=2, delay=0.01)
+
+    warmer.enqueue([f"files/{i}" for i in range(6)])
+
+    assert len(warmer._workers) == 2
+    await warmer.join()
+    assert len(warmer.file_manager.fetched) == 6
+
+
+@pytest.mark.asyncio
+async def test_yields_to_interactive_requests():
+    warmer = make_warmer(idle=0.05)
+    warmer.note_interactive()
+
+    warmer.enqueue(["files/a"])
+    await asyncio.sleep(0.02)
+    assert warmer.file_manager.fetched == []
+
+    await warmer.join()
+    assert warmer.file_manager.fetched == ["files/a"]
+
+
+@pytest.mark.asyncio
+async def test_pauses_when_webdav_unavailable():
+    warmer = make_warmer()
+    webdav_health.record(Exception("down"))
+
+    warmer.enqueue(["files/a", "files/b"])
+    await warmer.join()
+
+    assert warmer.file_manager.fetched == []
+    assert warmer.dropped == 2
+
+
+@pytest.mark.asyncio
+async def test_prefetch_writes_disk_cache_only(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_cache_module, "_memory_cache", MemoryCache(1000, 1000))
+    fm = FileManager()
+    fm.settings = fm.settings.model_copy(update={"CACHE_DIR": str(tmp_path / "cache")})
+    calls = []
+
+    async def download_file(path):
+        calls.append(path)
+        return b"data"
+    fm.webdav_client.download_file = download_file
+
+    assert await fm.prefetch("files/2026/01/01/a.jpg") is True
+    assert await fm.prefetch("files/2026/01/01/a.jpg") is False
+    assert calls == ["files/2026/01/01/a.jpg"]
+    assert fm.get_hot_object("files/2026/01/01/a.jpg") is None
+    assert fm.cache_index.stats()["hits"] == 0
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    with db_context(db_path) as conn:
+        conn.execute("ALTER TABLE upload_history ADD COLUMN webdav_path TEXT")
+    with patch.object(cache_warmer_module, "get_db_connection", side_effect=factory), \
+            patch.object(admin, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+def seed(db_path, prefix, n, upload_time=None):
+    upload_time = upload_time or get_beijing_now_naive().replace(microsecond=0)
+    with db_context(db_path) as conn:
+        for i in range(n):
+            conn.execute(
+                """
+                INSERT INTO upload_history
+                    (business_id, doc_number, file_name, file_size, status, upload_time, webdav_path)
+                VALUES ('1', 'D1', ?, 1, 'success', ?, ?)
+                """,
+                (f"{i}.jpg", upload_time.replace(second=i).isoformat(), f"files/{prefix}/{i}.jpg"),
+            )
+
+
+def test_load_recent_paths_respects_window_and_limit(db):
+    seed(db, "new", 3)
+    seed(db, "old", 2, upload_time=datetime(2000, 1, 1))
+
+    paths = load_recent_paths(hours=24, limit=2)
+
+    assert len(paths) == 2
+    assert all(p.startswith("files/new/") for p in paths)
+
+
+@pytest.mark.asyncio
+async def test_admin_records_prefetches_next_page(db):
+    seed(db, "new", 5)
+    warmed = []
+
+    with patch.object(admin, "warm_paths", side_effect=lambda paths, priority: warmed.append((paths, priority))):
+        result = await admin.get_admin_records(
+            page=1, page_size=2, search=None, doc_type=None, product_type=None, status=None,
+            start_date=None, end_date=None, logistics=None, customer_name=None, upload_type=None, facets=None,
+        )
+        page_one_names = {r["file_name"] for r in result["records"]}
+        await admin.get_admin_records(
+            page=3, page_size=2, search=None, doc_type=None, product_type=None, status=None,
+            start_date=None, end_date=None, logistics=None, customer_name=None, upload_type=None, facets=None,
+        )
+
+    assert len(warmed) == 1
+    paths, priority = warmed[0]
+    assert priority is True
+    assert len(paths) == 2
+    assert not {p.rsplit("/", 1)[-1] for p in paths} & page_one_names
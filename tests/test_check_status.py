@@ -815,3 +815,60 @@ class TestCheckStatusCompleteWorkflow:
             conn.close()
 
             assert count == 3
+
+
+# ============================================================================
+# 批量更新接口
+# ============================================================================
+
+class TestBatchCheckStatus:
+    """测试批量更新检查状态接口"""
+
+    def test_batch_update_returns_per_item_results(self, test_client, test_db):
+        """测试: 一次请求更新多条记录, 逐条返回结果"""
+        db_path = test_db
+
+        with patch('app.api.admin.get_db_connection', side_effect=create_mock_db_factory(db_path)):
+            response = test_client.patch(
+                "/api/admin/records/check",
+                json={"items": [
+                    {"id": 1, "checked": True},
+                    {"id": 3, "checked": False},
+                    {"id": 5, "checked": True},
+                    {"id": 999, "checked": True},
+                ]}
+            )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data["success"] is False
+        assert (data["updated"], data["failed"]) == (2, 2)
+        assert data["results"][0] == {"id": 1, "success": True, "checked": True}
+        assert data["results"][1] == {"id": 3, "success": True, "checked": False}
+        assert data["results"][2]["success"] is False
+        assert data["results"][3]["error"] == "记录不存在或已删除"
+
+        conn = sqlite3.connect(db_path)
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, checked FROM upload_history WHERE id IN (1, 3, 5) ORDER BY id")
+        assert cursor.fetchall() == [(1, 1), (3, 0), (5, 0)]
+        conn.close()
+
+    def test_batch_update_last_value_wins(self, test_client, test_db):
+        """测试: 同一记录出现多次时以最后一次为准"""
+        db_path = test_db
+
+        with patch('app.api.admin.get_db_connection', side_effect=create_mock_db_factory(db_path)):
+            response = test_client.patch(
+                "/api/admin/records/check",
+                json={"items": [{"id": 2, "checked": True}, {"id": 2, "checked": False}]}
+            )
+
+        assert response.json()["results"] == [{"id": 2, "success": True, "checked": False}]
+
+    def test_batch_update_rejects_empty_and_oversized(self, test_client, test_db):
+        """测试: 空列表或超过上限返回400"""
+        assert test_client.patch("/api/admin/records/check", json={"items": []}).status_code == 400
+
+        items = [{"id": i, "checked": True} for i in range(1, 502)]
+        assert test_client.patch("/api/admin/records/check", json={"items": items}).status_code == 400
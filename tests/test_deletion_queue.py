@@ -0,0 +1,205 @@
+"""删除记录的存储回收队列测试"""
+import sqlite3
+import time
+from contextlib import contextmanager
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import admin
+from app.core import database, deletion_queue, sync_queue
+from app.core import memory_cache as memory_cache_module
+from app.core.file_manager import FileManager
+from app.core.memory_cache import MemoryCache
+from app.main import app
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    # webdav_path 由 migrations/add_webdav_support.sql 添加
+    with db_context(db_path) as conn:
+        conn.execute("ALTER TABLE upload_history ADD COLUMN webdav_path TEXT")
+    with patch.object(deletion_queue, "get_db_connection", side_effect=factory), \
+            patch.object(sync_queue, "get_db_connection", side_effect=factory), \
+            patch.object(admin, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+@pytest.fixture
+def file_manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_cache_module, "_memory_cache", MemoryCache(max_bytes=1000, max_object_bytes=400))
+    fm = FileManager()
+    fm.settings = fm.settings.model_copy(update={
+        "CACHE_DIR": str(tmp_path / "cache"),
+        "LOCAL_STORAGE_PATH": str(tmp_path / "local"),
+        "CACHE_MAX_BYTES": 0,
+        "DELETE_REAPER_CONCURRENCY": 2,
+    })
+    (tmp_path / "cache").mkdir()
+    fm.webdav_client.delete_file = AsyncMock(side_effect=lambda path: path != "files/broken.jpg")
+    fm.webdav_client.file_exists = AsyncMock(side_effect=lambda path: path == "files/broken.jpg")
+    return fm
+
+
+def seed(db_path, webdav_path=None, local_file_path=None, deleted_at="2026-01-02T00:00:00"):
+    with db_context(db_path) as conn:
+        return conn.execute(
+            """
+            INSERT INTO upload_history
+                (business_id, file_name, file_size, status, local_file_path, webdav_path, deleted_at)
+            VALUES ('1', 'a.jpg', 3, 'success', ?, ?, ?)
+            """,
+            (local_file_path, webdav_path, deleted_at),
+        ).lastrowid
+
+
+def enqueue_due(db_path, record_ids):
+    with db_context(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO deletion_queue (record_id, next_attempt_at) VALUES (?, ?)",
+            [(record_id, time.time() - 1) for record_id in record_ids],
+        )
+
+
+def queue(db_path):
+    with db_context(db_path) as conn:
+        return {row["record_id"]: dict(row) for row in conn.execute("SELECT * FROM deletion_queue")}
+
+
+def test_delete_endpoint_enqueues_only_when_enabled(db, monkeypatch):
+    record_id = seed(db, deleted_at=None)
+    monkeypatch.setattr(admin.settings, "DELETE_REAPER_ENABLED", False)
+
+    response = TestClient(app).request("DELETE", "/api/admin/records", json={"ids": [record_id]})
+    assert response.json()["deleted_count"] == 1
+    assert queue(db) == {}
+
+
+def test_delete_endpoint_enqueues_with_grace_period(db, monkeypatch):
+    monkeypatch.setattr(admin.settings, "DELETE_REAPER_ENABLED", True)
+    first = seed(db, deleted_at=None)
+    second = seed(db, deleted_at=None)
+    client = TestClient(app)
+
+    response = client.request("DELETE", "/api/admin/records", json={"ids": [first, second]})
+    assert response.json()["deleted_count"] == 2
+    entries = queue(db)
+    assert set(entries) == {first, second}
+    grace = admin.get_settings().DELETE_GRACE_HOURS * 3600
+    assert entries[first]["next_attempt_at"] == pytest.approx(time.time() + grace, abs=60)
+
+    # 重复删除不重新计算宽限期, 也不会被提前领取
+    client.request("DELETE", "/api/admin/records", json={"ids": [first]})
+    assert queue(db)[first]["next_attempt_at"] == entries[first]["next_attempt_at"]
+    assert deletion_queue.claim_due() == []
+
+
+@pytest.mark.asyncio
+async def test_reaper_removes_local_cache_and_remote(db, file_manager, tmp_path):
+    local = tmp_path / "local" / "a.jpg"
+    local.parent.mkdir()
+    local.write_bytes(b"abc")
+    cache_path = file_manager._get_cache_path("files/a.jpg")
+    with open(cache_path, "wb") as f:
+        f.write(b"abcd")
+    file_manager.cache_index.add(cache_path, 4)
+    file_manager.memory_cache.put("files/a.jpg", b"abc")
+
+    purged = seed(db, "files/a.jpg", str(local))
+    already_gone = seed(db, "files/gone.jpg")
+    enqueue_due(db, [purged, already_gone])
+
+    result = await deletion_queue.reap_due(file_manager)
+
+    assert result["purged"] == 2 and result["freed_bytes"] == 7
+    assert not local.exists()
+    assert file_manager.cache_index.get(cache_path) is None
+    assert "files/a.jpg" not in file_manager.memory_cache
+    assert queue(db) == {}
+
+
+@pytest.mark.asyncio
+async def test_reaper_keeps_shared_restored_and_unsynced_files(db, file_manager):
+    seed(db, "files/shared.jpg", deleted_at=None)
+    shared = seed(db, "files/shared.jpg")
+    restored = seed(db, "files/restored.jpg", deleted_at=None)
+    unsynced = seed(db, "files/unsynced.jpg")
+    sync_queue.enqueue("/tmp/unsynced.jpg", "unsynced.jpg", "files/unsynced.jpg")
+    enqueue_due(db, [shared, restored, unsynced])
+
+    result = await deletion_queue.reap_due(file_manager)
+
+    assert (result["purged"], result["skipped"], result["deferred"]) == (1, 1, 1)
+    file_manager.webdav_client.delete_file.assert_not_called()
+    entries = queue(db)
+    assert list(entries) == [unsynced]
+    assert entries[unsynced]["state"] == deletion_queue.STATE_PENDING
+    assert entries[unsynced]["attempts"] == 0
+    assert entries[unsynced]["next_attempt_at"] > time.time()
+
+
+@pytest.mark.asyncio
+async def test_reaper_backs_off_failed_remote_delete(db, file_manager):
+    broken = seed(db, "files/broken.jpg")
+    enqueue_due(db, [broken])
+
+    result = await deletion_queue.reap_due(file_manager)
+
+    assert result["failed"] == 1
+    entry = queue(db)[broken]
+    assert entry["attempts"] == 1 and entry["state"] == deletion_queue.STATE_PENDING
+    assert entry["next_attempt_at"] > time.time()
+    assert deletion_queue.get_queue_stats()["last_error"] == "WebDAV删除失败: files/broken.jpg"
+
+
+@pytest.mark.asyncio
+async def test_reaper_releases_claims_when_queue_update_fails(db, file_manager):
+    purged = seed(db, "files/a.jpg")
+    unsynced = seed(db, "files/unsynced.jpg")
+    sync_queue.enqueue("/tmp/unsynced.jpg", "unsynced.jpg", "files/unsynced.jpg")
+    enqueue_due(db, [purged, unsynced])
+
+    with patch.object(deletion_queue, "mark_failed", side_effect=sqlite3.OperationalError("database is locked")):
+        result = await deletion_queue.reap_due(file_manager)
+
+    # 已回收的条目移出队列, 出错的条目放回pending而不是停留在reaping
+    assert result["purged"] == 1
+    entries = queue(db)
+    assert list(entries) == [unsynced]
+    assert entries[unsynced]["state"] == deletion_queue.STATE_PENDING
+
+
+def test_previously_deleted_records_are_enqueued_only_explicitly(db):
+    old = seed(db, deleted_at="2025-06-01T00:00:00")
+    recent = seed(db, deleted_at="2026-01-02T00:00:00")
+    seed(db, deleted_at=None)
+
+    # 升级后启动不会把已删除的记录自动加入队列
+    with patch.object(database, "get_db_connection", side_effect=lambda: db_context(db)):
+        database.init_database()
+    assert queue(db) == {}
+
+    assert deletion_queue.count_deleted_not_queued() == 2
+    assert deletion_queue.enqueue_deleted("2026-01-01", grace_seconds=3600) == 1
+    entries = queue(db)
+    assert list(entries) == [old]
+    assert entries[old]["next_attempt_at"] == pytest.approx(time.time() + 3600, abs=60)
+    assert deletion_queue.count_deleted_not_queued() == 1
+    assert deletion_queue.enqueue_deleted() == 1
+    assert set(queue(db)) == {old, recent}
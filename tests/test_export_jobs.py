@@ -0,0 +1,220 @@
+"""后台导出任务测试"""
+import asyncio
+import io
+import os
+import sqlite3
+import time
+import zipfile
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.api import admin
+from app.core import api_cache, database, export_jobs
+from app.core.config import get_settings
+from app.main import app
+
+
+@pytest.fixture
+def jobs_dir(tmp_path):
+    settings = get_settings().model_copy(update={
+        "EXPORT_JOB_DIR": str(tmp_path / "exports"),
+        "EXPORT_JOB_TTL_MINUTES": 60,
+        "EXPORT_JOB_CONCURRENCY": 1,
+    })
+    with patch.object(export_jobs, "get_settings", return_value=settings):
+        yield tmp_path / "exports"
+    export_jobs._jobs.clear()
+    export_jobs._by_key.clear()
+    export_jobs._tasks.clear()
+    export_jobs._semaphore = None
+
+
+async def wait_done(job):
+    for _ in range(200):
+        if job.status in (export_jobs.STATUS_DONE, export_jobs.STATUS_FAILED):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"导出任务未完成: {job.status}")
+
+
+async def write_text(path, progress):
+    progress["rows_total"] = progress["rows_done"] = 1
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("data")
+
+
+def test_job_key_ignores_empty_values_and_order():
+    assert export_jobs.job_key({"a": 1, "b": None, "c": ""}) == export_jobs.job_key({"a": 1})
+    assert export_jobs.job_key({"a": 1, "d": 2}) == export_jobs.job_key({"d": 2, "a": 1})
+    assert export_jobs.job_key({"a": 1}) != export_jobs.job_key({"a": 2})
+
+
+@pytest.mark.asyncio
+async def test_submit_runs_builder_and_reuses_result(jobs_dir):
+    job, reused = export_jobs.submit({"search": "x"}, "records.csv", "text/csv", write_text)
+    assert not reused
+    await wait_done(job)
+
+    assert job.status == export_jobs.STATUS_DONE
+    assert open(job.path, encoding="utf-8").read() == "data"
+    assert job.to_dict()["progress"]["rows_done"] == 1
+    assert not os.path.exists(f"{job.path}.part")
+
+    again, reused = export_jobs.submit({"search": "x"}, "records.csv", "text/csv", write_text)
+    assert reused and again is job
+
+    forced, reused = export_jobs.submit({"search": "x"}, "records.csv", "text/csv", write_text, force=True)
+    assert not reused and forced is not job
+    await wait_done(forced)
+
+
+@pytest.mark.asyncio
+async def test_failed_job_is_not_reused(jobs_dir):
+    async def broken(path, progress):
+        with open(path, "w") as f:
+            f.write("partial")
+        raise RuntimeError("boom")
+
+    job, _ = export_jobs.submit({}, "records.csv", "text/csv", broken)
+    await wait_done(job)
+
+    assert job.status == export_jobs.STATUS_FAILED
+    assert job.error == "boom"
+    assert os.listdir(jobs_dir) == []
+
+    retry, reused = export_jobs.submit({}, "records.csv", "text/csv", write_text)
+    assert not reused and retry is not job
+    await wait_done(retry)
+
+
+@pytest.mark.asyncio
+async def test_cleanup_removes_expired_jobs_and_orphans(jobs_dir):
+    job, _ = export_jobs.submit({}, "records.csv", "text/csv", write_text)
+    await wait_done(job)
+    orphan = jobs_dir / "old.zip"
+    orphan.write_bytes(b"x")
+    os.utime(orphan, (time.time() - 7200, time.time() - 7200))
+
+    assert export_jobs.cleanup_expired() == 1
+    assert not orphan.exists() and os.path.exists(job.path)
+
+    job.expires_at = time.time() - 1
+    assert export_jobs.cleanup_expired() == 1
+    assert export_jobs.get_job(job.job_id) is None
+    assert not os.path.exists(job.path)
+
+
+@pytest.mark.asyncio
+async def test_download_keeps_expired_job_for_grace_period(jobs_dir):
+    job, _ = export_jobs.submit({}, "records.csv", "text/csv", write_text)
+    await wait_done(job)
+    job.expires_at = time.time() + 1
+
+    export_jobs.hold_for_download(job)
+    job.expires_at -= 2
+    assert export_jobs.cleanup_expired() == 0
+    assert export_jobs.get_job(job.job_id) is job and os.path.exists(job.path)
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def export_db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    image = tmp_path / "a.jpg"
+    image.write_bytes(b"jpeg")
+    with db_context(db_path) as conn:
+        conn.executemany(
+            """
+            INSERT INTO upload_history (business_id, doc_number, file_name, file_size, status, upload_time, local_file_path)
+            VALUES (?, ?, ?, 4, 'success', '2026-01-01T10:00:00', ?)
+            """,
+            [(str(i), f"SO{i:03d}", f"{i}.jpg", str(image)) for i in range(3)],
+        )
+    with patch.object(admin, "get_db_connection", side_effect=factory), \
+            patch.object(api_cache, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+@pytest.mark.asyncio
+async def test_export_job_api_progress_and_range_download(jobs_dir, export_db):
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post("/api/admin/export/jobs", json={"format": "csv"})
+        assert response.status_code == 200
+        created = response.json()
+        assert created["reused"] is False
+
+        job = await wait_done(export_jobs.get_job(created["job_id"]))
+        assert job.status == export_jobs.STATUS_DONE
+
+        status = (await client.get(f"/api/admin/export/jobs/{job.job_id}")).json()
+        assert status["status"] == "done"
+        assert status["progress"] == {
+            "rows_total": 3, "rows_done": 3, "images_written": 3, "images_missing": 0,
+        }
+
+        download = await client.get(created["download_url"])
+        assert download.status_code == 200
+        with zipfile.ZipFile(io.BytesIO(download.content)) as zf:
+            names = zf.namelist()
+            assert sorted(names[:3]) == ["images/0.jpg", "images/1.jpg", "images/2.jpg"]
+            assert names[3].endswith(".csv")
+            assert len(zf.read(names[3]).decode("utf-8-sig").splitlines()) == 4
+
+        partial = await client.get(created["download_url"], headers={"Range": "bytes=0-9"})
+        assert partial.status_code == 206
+        assert partial.content == download.content[:10]
+
+        reused = (await client.post("/api/admin/export/jobs", json={"format": "csv"})).json()
+        assert reused["reused"] is True and reused["job_id"] == job.job_id
+
+
+@pytest.mark.asyncio
+async def test_export_job_api_errors(jobs_dir, export_db):
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        response = await client.post(
+            "/api/admin/export/jobs", json={"include_excel": False, "include_images": False}
+        )
+        assert response.status_code == 400
+
+        assert (await client.get("/api/admin/export/jobs/missing")).status_code == 404
+        assert (await client.get("/api/admin/export/jobs/missing/download")).status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_reused_export_job_skips_query(jobs_dir, export_db):
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        created = (await client.post("/api/admin/export/jobs", json={"format": "csv"})).json()
+        await wait_done(export_jobs.get_job(created["job_id"]))
+
+        # 复用已有任务时不再查询记录
+        with patch.object(admin, "_ExportQuery", side_effect=AssertionError("不应查询")):
+            reused = (await client.post("/api/admin/export/jobs", json={"format": "csv"})).json()
+        assert reused["reused"] is True and reused["job_id"] == created["job_id"]
+
+
+@pytest.mark.asyncio
+async def test_export_job_not_reused_after_records_change(jobs_dir, export_db):
+    async with httpx.AsyncClient(app=app, base_url="http://test") as client:
+        created = (await client.post("/api/admin/export/jobs", json={"format": "csv"})).json()
+        await wait_done(export_jobs.get_job(created["job_id"]))
+
+        with db_context(export_db) as conn:
+            conn.execute("UPDATE upload_history SET status = 'failed' WHERE business_id = '0'")
+        fresh = (await client.post("/api/admin/export/jobs", json={"format": "csv"})).json()
+        assert fresh["reused"] is False and fresh["job_id"] != created["job_id"]
+        await wait_done(export_jobs.get_job(fresh["job_id"]))
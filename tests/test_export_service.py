@@ -0,0 +1,313 @@
+"""流式ZIP导出与数据文件生成测试"""
+import asyncio
+import io
+import json
+import sqlite3
+import threading
+import zipfile
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+
+from app.api import admin
+from app.core import database
+from app.core.export_service import (
+    EXPORT_COLUMNS, EXPORT_ERROR_ARCNAME, ZipStream, iter_csv, stream_zip, write_xlsx
+)
+from app.main import app
+
+
+class FakeFileManager:
+    """按WebDAV路径返回预设内容, 记录并发获取数"""
+
+    def __init__(self, files, gate=None):
+        self.files = files
+        self.gate = gate
+        self.active = 0
+        self.peak = 0
+        self.cancelled = 0
+
+    async def get_file(self, webdav_path):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            if self.gate is not None:
+                await self.gate.wait()
+            await asyncio.sleep(0)
+            if webdav_path not in self.files:
+                raise Exception("文件不存在")
+            return self.files[webdav_path]
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.active -= 1
+
+
+async def collect(stream):
+    return b"".join([chunk async for chunk in stream])
+
+
+def ready(value):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(value)
+    return future
+
+
+ROW = ["物流", "SO001", "销售", "", "客户A", "1", "2026-01-01T10:00:00", "a.jpg", 10, "success", ""]
+
+
+def test_zip_stream_stores_entries_and_dedupes_names():
+    zip_stream = ZipStream()
+    data = zip_stream.add("images/a.jpg", b"1" * 100)
+    data += zip_stream.add("images/a.jpg", b"2" * 100)
+    data += zip_stream.close()
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == ["images/a.jpg", "images/a_1.jpg"]
+        assert all(info.compress_type == zipfile.ZIP_STORED for info in zf.infolist())
+        assert zf.read("images/a_1.jpg") == b"2" * 100
+        assert zf.testzip() is None
+
+
+@pytest.mark.asyncio
+async def test_stream_zip_writes_local_and_webdav_images(tmp_path):
+    local = tmp_path / "local.jpg"
+    local.write_bytes(b"local")
+    jobs = [
+        {"arcname": "images/local.jpg", "local_path": str(local), "webdav_path": None},
+        {"arcname": "images/remote.jpg", "local_path": None, "webdav_path": "files/remote.jpg"},
+        {"arcname": "images/gone.jpg", "local_path": None, "webdav_path": "files/gone.jpg"},
+    ]
+    fm = FakeFileManager({"files/remote.jpg": b"remote"})
+    data_file = tmp_path / "records.csv"
+    data_file.write_bytes(b"csv" * 100000)
+    stats = {}
+
+    data = await collect(stream_zip(
+        iter(jobs), fm, stats, trailing=ready(("records.csv", str(data_file)))
+    ))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert sorted(zf.namelist()[:2]) == ["images/local.jpg", "images/remote.jpg"]
+        assert zf.namelist()[2] == "records.csv"
+        assert zf.read("images/remote.jpg") == b"remote"
+        assert zf.read("records.csv") == data_file.read_bytes()
+        assert zf.testzip() is None
+    assert stats == {"written": 2, "missing": 1}
+
+
+@pytest.mark.asyncio
+async def test_stream_zip_sends_images_before_data_file_is_ready(tmp_path):
+    jobs = [{"arcname": "images/a.jpg", "local_path": None, "webdav_path": "files/a.jpg"}]
+    fm = FakeFileManager({"files/a.jpg": b"a"})
+    trailing = asyncio.get_running_loop().create_future()
+    stream = stream_zip(jobs, fm, trailing=trailing)
+
+    first = await asyncio.wait_for(stream.__anext__(), timeout=1)
+    assert b"images/a.jpg" in first
+
+    data_file = tmp_path / "records.xlsx"
+    data_file.write_bytes(b"excel")
+    trailing.set_result(("records.xlsx", str(data_file)))
+    rest = b"".join([chunk async for chunk in stream])
+    with zipfile.ZipFile(io.BytesIO(first + rest)) as zf:
+        assert zf.namelist() == ["images/a.jpg", "records.xlsx"]
+
+
+@pytest.mark.asyncio
+async def test_stream_zip_bounds_concurrency_and_cancels_on_close():
+    gate = asyncio.Event()
+    jobs = [
+        {"arcname": f"images/{i}.jpg", "local_path": None, "webdav_path": f"files/{i}.jpg"}
+        for i in range(50)
+    ]
+    fm = FakeFileManager({j["webdav_path"]: b"x" for j in jobs}, gate=gate)
+    stream = stream_zip(jobs, fm)
+
+    gate.set()
+    await stream.__anext__()
+    gate.clear()
+    await asyncio.sleep(0.01)
+    assert fm.peak == 8
+    assert fm.active == 8
+
+    # 客户端断开: 关闭生成器时取消尚未完成的获取
+    await stream.aclose()
+    assert fm.cancelled == 8
+    assert fm.active == 0
+
+
+@pytest.mark.asyncio
+async def test_stream_zip_without_images_adds_empty_directory():
+    data = await collect(stream_zip([]))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == ["images/"]
+
+
+@pytest.mark.asyncio
+async def test_stream_zip_accepts_async_job_iterator():
+    async def jobs():
+        for i in range(20):
+            await asyncio.sleep(0)
+            yield {"arcname": f"images/{i}.jpg", "local_path": None, "webdav_path": f"files/{i}.jpg"}
+
+    fm = FakeFileManager({f"files/{i}.jpg": b"x" for i in range(20)})
+    stats = {}
+    data = await collect(stream_zip(jobs(), fm, stats))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert sorted(zf.namelist()) == sorted(f"images/{i}.jpg" for i in range(20))
+    assert stats == {"written": 20, "missing": 0}
+
+
+@pytest.mark.asyncio
+async def test_stream_zip_data_file_failure_still_closes_archive():
+    jobs = [{"arcname": "images/a.jpg", "local_path": None, "webdav_path": "files/a.jpg"}]
+    fm = FakeFileManager({"files/a.jpg": b"a"})
+
+    async def failing_data_file():
+        raise RuntimeError("磁盘已满")
+
+    stats = {}
+    data = await collect(stream_zip(jobs, fm, stats, trailing=failing_data_file()))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.namelist() == ["images/a.jpg", EXPORT_ERROR_ARCNAME]
+        assert "磁盘已满" in zf.read(EXPORT_ERROR_ARCNAME).decode("utf-8")
+        assert zf.testzip() is None
+    assert "磁盘已满" in stats["error"]
+
+
+@pytest.mark.asyncio
+async def test_stream_zip_job_iterator_failure_still_closes_archive():
+    async def jobs():
+        yield {"arcname": "images/a.jpg", "local_path": None, "webdav_path": "files/a.jpg"}
+        raise RuntimeError("database is locked")
+
+    fm = FakeFileManager({"files/a.jpg": b"a"})
+    stats = {}
+    data = await collect(stream_zip(jobs(), fm, stats))
+
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert EXPORT_ERROR_ARCNAME in zf.namelist()
+        assert "database is locked" in zf.read(EXPORT_ERROR_ARCNAME).decode("utf-8")
+        assert zf.testzip() is None
+    assert "database is locked" in stats["error"]
+
+
+def test_write_xlsx_and_csv(tmp_path):
+    path = str(tmp_path / "records.xlsx")
+    assert write_xlsx(iter([ROW, ROW]), path) == 2
+
+    ws = load_workbook(path).active
+    assert ws.title == "上传记录"
+    assert [cell.value for cell in ws[1]] == [header for _, header in EXPORT_COLUMNS]
+    assert ws.max_row == 3
+
+    text = "".join(iter_csv([ROW, [None] * len(ROW)]))
+    lines = text.splitlines()
+    assert lines[0].startswith("\ufeff上传业务类型,单据编号")
+    assert lines[1].startswith("物流,SO001,销售,,客户A")
+    assert lines[2] == "," * (len(ROW) - 1)
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def export_db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    with db_context(db_path) as conn:
+        # 2500条记录跨越多个分页批次, 且上传时间大量重复(键集分页需按id区分)
+        conn.executemany(
+            """
+            INSERT INTO upload_history (business_id, doc_number, file_name, file_size, status, upload_time)
+            VALUES (?, ?, ?, 1, 'success', ?)
+            """,
+            [(str(i), f"SO{i:05d}", f"{i}.jpg", f"2026-01-{1 + i // 1000:02d}T10:00:00") for i in range(2500)],
+        )
+    with patch.object(admin, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+def test_export_ndjson_streams_every_row_once(export_db):
+    client = TestClient(app)
+    response = client.get("/api/admin/export?format=ndjson&include_images=false")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    records = [json.loads(line) for line in response.text.splitlines()]
+    assert len(records) == 2500
+    assert len({r["doc_number"] for r in records}) == 2500
+    assert records[0]["upload_time"] == "2026-01-03T10:00:00"
+    assert records[-1]["upload_time"] == "2026-01-01T10:00:00"
+
+
+def test_export_xlsx_with_images_puts_data_file_last(export_db):
+    client = TestClient(app)
+    response = client.get("/api/admin/export?search=SO0001")
+
+    assert response.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(response.content)) as zf:
+        names = zf.namelist()
+        assert names[0] == "images/"
+        assert names[1].endswith(".xlsx")
+        ws = load_workbook(io.BytesIO(zf.read(names[1]))).active
+        assert ws.max_row == 11
+
+
+def test_export_rejects_unknown_format(export_db):
+    client = TestClient(app)
+    response = client.get("/api/admin/export?format=xml")
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_zip_export_stops_data_file_when_client_disconnects(export_db):
+    started, disconnected = threading.Event(), threading.Event()
+    consumed = []
+
+    def slow_write(export_format, rows, path):
+        next(rows)
+        started.set()
+        disconnected.wait(5)
+        consumed.append(1 + len(list(rows)))
+        open(path, "wb").close()
+        return consumed[-1]
+
+    with patch.object(admin, "write_data_file", side_effect=slow_write):
+        response = await admin.export_records(
+            search=None, doc_type=None, product_type=None, status=None, start_date=None,
+            end_date=None, logistics=None, customer_name=None, upload_type=None,
+            include_excel=True, include_images=True, export_format="csv",
+        )
+        body = response.body_iterator
+        await body.__anext__()
+        for _ in range(200):
+            if started.is_set():
+                break
+            await asyncio.sleep(0.01)
+        await body.aclose()
+        disconnected.set()
+        for _ in range(200):
+            if consumed:
+                break
+            await asyncio.sleep(0.01)
+
+    # 客户端断开后当前批次读完即停止, 不再查询后续批次
+    assert consumed == [admin._EXPORT_BATCH_SIZE]
@@ -0,0 +1,105 @@
+"""测试 FileManager.get_file 并发未命中合并与原子缓存写入"""
+import asyncio
+import os
+from unittest.mock import patch
+
+import pytest
+
+from app.core import file_manager as file_manager_module
+from app.core import memory_cache as memory_cache_module
+from app.core.file_manager import FileManager
+from app.core.memory_cache import MemoryCache
+
+
+@pytest.fixture
+def file_manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(memory_cache_module, "_memory_cache", MemoryCache(0, 1))
+    fm = FileManager()
+    fm.settings = fm.settings.model_copy(update={
+        "CACHE_DIR": str(tmp_path / "cache"),
+        "TEMP_STORAGE_DIR": str(tmp_path / "temp"),
+    })
+    return fm
+
+
+def slow_download(calls, content=b"payload", error=None):
+    async def download_file(path):
+        calls.append(path)
+        await asyncio.sleep(0.01)
+        if error:
+            raise error
+        return content
+    return download_file
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_download_once(file_manager):
+    calls = []
+    file_manager.webdav_client.download_file = slow_download(calls)
+
+    results = await asyncio.gather(*[
+        file_manager.get_file("files/2026/01/01/a.jpg") for _ in range(10)
+    ])
+
+    assert results == [b"payload"] * 10
+    assert calls == ["files/2026/01/01/a.jpg"]
+    assert file_manager_module._inflight_downloads == {}
+
+
+@pytest.mark.asyncio
+async def test_coalesced_across_file_manager_instances(file_manager):
+    calls = []
+    other = FileManager()
+    other.settings = file_manager.settings
+    file_manager.webdav_client.download_file = slow_download(calls)
+    other.webdav_client.download_file = slow_download(calls)
+
+    results = await asyncio.gather(
+        file_manager.get_file("files/2026/01/01/b.jpg"),
+        other.get_file("files/2026/01/01/b.jpg"),
+    )
+
+    assert results == [b"payload", b"payload"]
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_failure_is_shared_by_all_waiters(file_manager):
+    calls = []
+    file_manager.webdav_client.download_file = slow_download(calls, error=RuntimeError("boom"))
+
+    results = await asyncio.gather(
+        *[file_manager.get_file("files/2026/01/01/c.jpg", max_retries=1) for _ in range(3)],
+        return_exceptions=True,
+    )
+
+    assert all(isinstance(r, Exception) and "boom" in str(r) for r in results)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_cancel_download(file_manager):
+    calls = []
+    file_manager.webdav_client.download_file = slow_download(calls)
+
+    first = asyncio.ensure_future(file_manager.get_file("files/2026/01/01/d.jpg"))
+    second = asyncio.ensure_future(file_manager.get_file("files/2026/01/01/d.jpg"))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == b"payload"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_write_cache_is_atomic(file_manager):
+    cache_path = file_manager._get_cache_path("files/2026/01/01/e.jpg")
+
+    with patch.object(file_manager_module.os, "replace", side_effect=OSError("disk full")):
+        await file_manager._write_cache(cache_path, b"data")
+
+    assert not os.path.exists(cache_path)
+    assert os.listdir(os.path.dirname(cache_path)) == []
+
+    await file_manager._write_cache(cache_path, b"data")
+    assert os.listdir(os.path.dirname(cache_path)) == ["e.jpg"]
@@ -0,0 +1,192 @@
+"""文件响应 ETag/304/Range 测试"""
+import os
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from app.core import http_cache
+from app.core.http_cache import (
+    RangeNotSatisfiable, bytes_response, cached_file_response, file_response,
+    parse_range, webdav_etag
+)
+
+CONTENT = bytes(range(256)) * 4
+
+
+class FakeFileManager:
+    """只提供 cached_file_response 用到的方法"""
+
+    def __init__(self, cache_path, hot=None):
+        self.cache_path = cache_path
+        self.hot = hot
+        self.streamed = []
+
+    def get_hot_object(self, webdav_path):
+        return self.hot
+
+    def _get_cache_path(self, webdav_path):
+        return self.cache_path
+
+    def _is_cache_valid(self, cache_path):
+        return os.path.exists(cache_path)
+
+    async def open_stream(self, webdav_path):
+        self.streamed.append(webdav_path)
+
+        async def chunks():
+            yield CONTENT
+        return chunks()
+
+
+@pytest.fixture
+def cache_file(tmp_path):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(CONTENT)
+    return str(path)
+
+
+def make_client(file_manager):
+    app = FastAPI()
+
+    @app.get("/file")
+    async def serve(request: Request):
+        response, method = await cached_file_response(
+            request, file_manager, "files/2026/01/01/a.jpg", "image/jpeg",
+            {"Cache-Control": "public, max-age=3600"},
+        )
+        response.headers["X-Access"] = method
+        return response
+
+    @app.get("/local")
+    async def local(request: Request):
+        return file_response(request, file_manager.cache_path, "image/jpeg")
+
+    return TestClient(app)
+
+
+def test_parse_range():
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=50-500", 100) == (50, 99)
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range("bytes=100-", 100)
+
+
+def test_disk_cache_hit_has_strong_etag(cache_file):
+    client = make_client(FakeFileManager(cache_file))
+
+    response = client.get("/file")
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["x-access"] == "cache"
+    assert response.headers["etag"] == webdav_etag("files/2026/01/01/a.jpg", len(CONTENT))
+    assert response.headers["accept-ranges"] == "bytes"
+
+
+def test_if_none_match_returns_304(cache_file):
+    client = make_client(FakeFileManager(cache_file))
+    etag = client.get("/file").headers["etag"]
+
+    response = client.get("/file", headers={"If-None-Match": f'"other", {etag}'})
+
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+
+def test_range_returns_partial_content(cache_file):
+    client = make_client(FakeFileManager(cache_file))
+
+    response = client.get("/file", headers={"Range": "bytes=10-19"})
+
+    assert response.status_code == 206
+    assert response.content == CONTENT[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(CONTENT)}"
+    assert response.headers["content-length"] == "10"
+
+
+def test_unsatisfiable_range_returns_416(cache_file):
+    client = make_client(FakeFileManager(cache_file))
+
+    response = client.get("/file", headers={"Range": f"bytes={len(CONTENT)}-"})
+
+    assert response.status_code == 416
+    assert response.headers["content-range"] == f"bytes */{len(CONTENT)}"
+
+
+def test_stale_if_range_returns_full_content(cache_file):
+    client = make_client(FakeFileManager(cache_file))
+
+    response = client.get("/file", headers={"Range": "bytes=0-9", "If-Range": '"stale"'})
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+
+
+def test_memory_hit_uses_same_etag_and_supports_range(tmp_path):
+    client = make_client(FakeFileManager(str(tmp_path / "missing.jpg"), hot=CONTENT))
+
+    full = client.get("/file")
+    partial = client.get("/file", headers={"Range": "bytes=-4"})
+
+    assert full.headers["x-access"] == "memory"
+    assert full.headers["etag"] == webdav_etag("files/2026/01/01/a.jpg", len(CONTENT))
+    assert partial.status_code == 206
+    assert partial.content == CONTENT[-4:]
+
+
+def test_cache_miss_streams_from_webdav(tmp_path):
+    file_manager = FakeFileManager(str(tmp_path / "missing.jpg"))
+    client = make_client(file_manager)
+
+    response = client.get("/file", headers={"Range": "bytes=0-9"})
+
+    assert response.status_code == 200
+    assert response.content == CONTENT
+    assert response.headers["x-access"] == "webdav"
+    assert file_manager.streamed == ["files/2026/01/01/a.jpg"]
+
+
+def test_local_file_uses_mtime_etag(cache_file):
+    client = make_client(FakeFileManager(cache_file))
+    etag = client.get("/local").headers["etag"]
+
+    assert client.get("/local", headers={"If-None-Match": etag}).status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_zerocopysend_extension_is_used(cache_file):
+    response = http_cache.FileRangeResponse(cache_file, os.stat(cache_file), start=5, end=9)
+    messages = []
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {"type": "http", "extensions": {"http.response.zerocopysend": {}}}
+    await response(scope, None, send)
+
+    assert messages[1]["type"] == "http.response.zerocopysend"
+    assert (messages[1]["offset"], messages[1]["count"]) == (5, 5)
+
+
+def test_bytes_response_without_conditions():
+    class FakeRequest:
+        headers = {}
+
+    response = bytes_response(FakeRequest(), b"abc", "image/png", '"e"')
+
+    assert response.status_code == 200
+    assert response.body == b"abc"
+
+
+def test_cache_directory_is_not_mounted():
+    from app.main import app
+
+    # 缓存文件只能经 /uploaded_files 访问(ETag/Range/缓存索引), 不直接暴露缓存目录
+    assert all(getattr(route, "path", None) != "/cache" for route in app.routes)
+    assert TestClient(app).get("/cache/.cache_inventory.json").status_code == 404
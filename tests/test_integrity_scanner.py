@@ -0,0 +1,152 @@
+"""WebDAV完整性批量巡检测试"""
+import sqlite3
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+
+from app.core import database, integrity_scanner
+from app.core.integrity_scanner import (
+    get_integrity_findings, run_integrity_scan, select_directories
+)
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    # webdav_path 由 migrations/add_webdav_support.sql 添加
+    with db_context(db_path) as conn:
+        conn.execute("ALTER TABLE upload_history ADD COLUMN webdav_path TEXT")
+    with patch.object(integrity_scanner, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+def seed(db_path, webdav_path, file_size=100, status="success", deleted_at=None):
+    with db_context(db_path) as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO upload_history
+                (business_id, file_name, file_size, status, webdav_path, deleted_at)
+            VALUES ('1', ?, ?, ?, ?, ?)
+            """,
+            (webdav_path.rsplit("/", 1)[-1], file_size, status, webdav_path, deleted_at),
+        )
+        return cursor.lastrowid
+
+
+class FakeWebDAV:
+    """按目录返回预设文件列表, 记录PROPFIND次数"""
+
+    def __init__(self, listing):
+        self.listing = listing
+        self.calls = []
+
+    async def list_files(self, path):
+        self.calls.append(path)
+        if path not in self.listing:
+            raise Exception("列出目录失败: WebDAV路径不存在")
+        return [
+            {"name": name, "path": f"/{path}/{name}", "is_directory": False, "size": size}
+            for name, size in self.listing[path].items()
+        ]
+
+
+def test_select_directories_rotates_and_wraps():
+    dirs = [f"files/2026/01/0{i}" for i in range(1, 6)]
+
+    first, cursor = select_directories(dirs, None, per_run=2, recent=0)
+    second, cursor = select_directories(dirs, cursor, per_run=2, recent=0)
+    third, cursor = select_directories(dirs, cursor, per_run=2, recent=0)
+
+    assert first == dirs[0:2]
+    assert second == dirs[2:4]
+    assert third == [dirs[4], dirs[0]]
+
+
+def test_select_directories_always_includes_recent():
+    dirs = [f"files/2026/01/0{i}" for i in range(1, 6)]
+
+    selected, cursor = select_directories(dirs, None, per_run=1, recent=2)
+
+    assert selected == [dirs[0], dirs[3], dirs[4]]
+    assert cursor == dirs[0]
+
+
+@pytest.mark.asyncio
+async def test_scan_uses_one_propfind_per_directory_and_records_findings(db):
+    ok_id = seed(db, "files/2026/01/01/ok.jpg", 100)
+    zero_id = seed(db, "files/2026/01/01/zero.jpg", 100)
+    missing_id = seed(db, "files/2026/01/01/missing.jpg", 100)
+    mismatch_id = seed(db, "files/2026/01/02/mismatch.jpg", 100)
+    seed(db, "files/2026/01/02/deleted.jpg", 100, deleted_at="2026-01-03 00:00:00")
+    client = FakeWebDAV({
+        "files/2026/01/01": {"ok.jpg": 100, "zero.jpg": 0},
+        "files/2026/01/02": {"mismatch.jpg": 50},
+    })
+
+    result = await run_integrity_scan(client)
+
+    assert sorted(client.calls) == ["files/2026/01/01", "files/2026/01/02"]
+    assert result["checked"] == 4
+    assert result["problems"] == 3
+    findings = {f["record_id"]: f["issue"] for f in get_integrity_findings()["items"]}
+    assert findings == {zero_id: "zero_size", missing_id: "missing", mismatch_id: "size_mismatch"}
+    assert ok_id not in findings
+
+
+@pytest.mark.asyncio
+async def test_fixed_file_is_marked_resolved(db):
+    record_id = seed(db, "files/2026/01/01/a.jpg", 100)
+
+    await run_integrity_scan(FakeWebDAV({"files/2026/01/01": {"a.jpg": 0}}))
+    result = await run_integrity_scan(FakeWebDAV({"files/2026/01/01": {"a.jpg": 100}}))
+
+    assert result["resolved"] == 1
+    assert get_integrity_findings("open")["total"] == 0
+    resolved = get_integrity_findings("resolved")["items"]
+    assert [f["record_id"] for f in resolved] == [record_id]
+
+
+@pytest.mark.asyncio
+async def test_cursor_persists_between_runs(db):
+    for day in range(1, 5):
+        seed(db, f"files/2026/01/0{day}/a.jpg")
+    listing = {f"files/2026/01/0{day}": {"a.jpg": 100} for day in range(1, 5)}
+    client = FakeWebDAV(listing)
+
+    with patch.object(integrity_scanner, "get_settings") as get_settings:
+        get_settings.return_value.WEBDAV_INTEGRITY_DIRS_PER_RUN = 2
+        get_settings.return_value.WEBDAV_INTEGRITY_RECENT_DAYS = 0
+        await run_integrity_scan(client)
+        await run_integrity_scan(client)
+
+    assert client.calls == [f"files/2026/01/0{day}" for day in range(1, 5)]
+    assert get_integrity_findings()["cursor"] == "files/2026/01/04"
+
+
+@pytest.mark.asyncio
+async def test_listing_error_skips_directory(db):
+    seed(db, "files/2026/01/01/a.jpg")
+
+    class BrokenWebDAV(FakeWebDAV):
+        async def list_files(self, path):
+            raise Exception("列出目录失败: WebDAV服务器错误: 503")
+
+    result = await run_integrity_scan(BrokenWebDAV({}))
+
+    assert result["failed_directories"] == ["files/2026/01/01"]
+    assert get_integrity_findings()["total"] == 0
@@ -0,0 +1,44 @@
+"""磁盘I/O线程池测试"""
+import threading
+
+import pytest
+
+from app.core import io_executor
+from app.core.file_manager import FileManager
+from app.core.io_executor import run_io
+
+
+@pytest.mark.asyncio
+async def test_run_io_runs_in_bounded_pool():
+    names = set()
+
+    def work():
+        names.add(threading.current_thread().name)
+        return threading.get_ident()
+
+    idents = [await run_io(work) for _ in range(5)]
+
+    assert threading.get_ident() not in idents
+    assert all(name.startswith("file-io") for name in names)
+    assert io_executor.get_io_executor()._max_workers == io_executor.get_settings().IO_EXECUTOR_WORKERS
+
+
+@pytest.mark.asyncio
+async def test_cache_write_happens_off_the_event_loop(tmp_path, monkeypatch):
+    fm = FileManager()
+    fm.settings = fm.settings.model_copy(update={"CACHE_DIR": str(tmp_path / "cache")})
+    writer_threads = []
+    original = io_executor.write_file
+
+    def recording_write(path, content):
+        writer_threads.append(threading.current_thread().name)
+        original(path, content)
+
+    monkeypatch.setattr("app.core.file_manager.write_file", recording_write)
+    cache_path = fm._get_cache_path("files/2026/01/01/a.jpg")
+
+    await fm._write_cache(cache_path, b"x" * 1024)
+
+    assert writer_threads and writer_threads[0].startswith("file-io")
+    with open(cache_path, "rb") as f:
+        assert f.read() == b"x" * 1024
@@ -0,0 +1,108 @@
+"""测试进程内热点对象缓存"""
+import os
+
+import pytest
+
+from app.core import memory_cache as memory_cache_module
+from app.core.file_manager import FileManager
+from app.core.memory_cache import MemoryCache
+
+
+@pytest.fixture
+def hot_cache(monkeypatch):
+    cache = MemoryCache(max_bytes=1000, max_object_bytes=400)
+    monkeypatch.setattr(memory_cache_module, "_memory_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def file_manager(tmp_path, hot_cache):
+    fm = FileManager()
+    fm.settings = fm.settings.model_copy(update={
+        "CACHE_DIR": str(tmp_path / "cache"),
+        "TEMP_STORAGE_DIR": str(tmp_path / "temp"),
+        "WEBDAV_CHUNK_SIZE": 4 * 1024,
+    })
+    return fm
+
+
+class TestMemoryCache:
+
+    def test_lru_eviction_by_bytes(self):
+        cache = MemoryCache(max_bytes=300, max_object_bytes=300)
+        cache.put("a", b"a" * 100)
+        cache.put("b", b"b" * 100)
+        cache.put("c", b"c" * 100)
+        assert cache.get("a") is not None
+
+        cache.put("d", b"d" * 100)
+
+        assert cache.get("b") is None
+        assert cache.get("a") is not None
+        assert cache.total_bytes == 300
+        assert cache.evictions == 1
+
+    def test_large_objects_are_not_cached(self):
+        cache = MemoryCache(max_bytes=1000, max_object_bytes=10)
+        cache.put("big", b"x" * 11)
+        assert cache.get("big") is None
+
+    def test_disabled_when_budget_zero(self):
+        cache = MemoryCache(max_bytes=0, max_object_bytes=10)
+        cache.put("a", b"x")
+        assert cache.get("a") is None
+
+    def test_stats_report_hit_rate(self):
+        cache = MemoryCache(max_bytes=100, max_object_bytes=100)
+        cache.put("a", b"x")
+        cache.get("a")
+        cache.get("missing")
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == 0.5
+
+
+class TestFileManagerHotCache:
+
+    @pytest.mark.asyncio
+    async def test_get_file_serves_second_read_from_memory(self, file_manager, hot_cache):
+        cache_path = file_manager._get_cache_path("files/2026/01/01/a.jpg")
+        await file_manager._write_cache(cache_path, b"img")
+
+        assert await file_manager.get_file("files/2026/01/01/a.jpg") == b"img"
+        # 磁盘文件被删除后仍能从内存命中
+        os.remove(cache_path)
+        assert await file_manager.get_file("files/2026/01/01/a.jpg") == b"img"
+        assert hot_cache.hits == 1
+
+    @pytest.mark.asyncio
+    async def test_stream_download_populates_memory(self, file_manager, hot_cache):
+        async def fake_stream(path, chunk_size=None):
+            yield b"ab"
+            yield b"cd"
+
+        file_manager.webdav_client.download_stream = fake_stream
+
+        stream = await file_manager.open_stream("files/2026/01/01/b.jpg")
+        assert b"".join([c async for c in stream]) == b"abcd"
+
+        assert file_manager.get_hot_object("files/2026/01/01/b.jpg") == b"abcd"
+
+    @pytest.mark.asyncio
+    async def test_large_stream_not_kept_in_memory(self, file_manager, hot_cache):
+        async def fake_stream(path, chunk_size=None):
+            yield b"x" * 300
+            yield b"x" * 300
+
+        file_manager.webdav_client.download_stream = fake_stream
+
+        stream = await file_manager.open_stream("files/2026/01/01/c.jpg")
+        assert len(b"".join([c async for c in stream])) == 600
+
+        assert file_manager.get_hot_object("files/2026/01/01/c.jpg") is None
+
+    @pytest.mark.asyncio
+    async def test_cache_stats_include_memory_metrics(self, file_manager):
+        stats = await file_manager.get_cache_stats()
+        assert stats["memory"]["max_size"] == 1000
@@ -0,0 +1,113 @@
+"""名称字典(物流公司选项/客户名称联想)测试"""
+import sqlite3
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import admin
+from app.core import api_cache, database
+from app.main import app
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def names_db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    with patch.object(admin, "get_db_connection", side_effect=factory), \
+            patch.object(api_cache, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+def add_record(db_path, logistics=None, customer_name=None):
+    with db_context(db_path) as conn:
+        return conn.execute(
+            """
+            INSERT INTO upload_history (business_id, file_name, file_size, status, upload_time, logistics, customer_name)
+            VALUES ('1', 'a.jpg', 1, 'success', '2026-01-01T10:00:00', ?, ?)
+            """,
+            (logistics, customer_name),
+        ).lastrowid
+
+
+def names(db_path, kind):
+    with db_context(db_path) as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT name FROM name_dictionary WHERE kind = ? ORDER BY name", (kind,)
+        )]
+
+
+def test_dictionary_tracks_distinct_names(names_db):
+    first = add_record(names_db, "顺丰", "客户A")
+    second = add_record(names_db)
+    add_record(names_db, "", "")
+    assert names(names_db, "logistics") == ["顺丰"]
+    assert names(names_db, "customer_name") == ["客户A"]
+
+    # 上传成功后补全物流/客户
+    with db_context(names_db) as conn:
+        conn.execute("UPDATE upload_history SET logistics = '德邦', customer_name = '客户A' WHERE id = ?", (second,))
+    assert names(names_db, "logistics") == ["德邦", "顺丰"]
+
+    # 最后一条使用该名称的记录删除后移出字典, 仍有记录使用的名称保留
+    with db_context(names_db) as conn:
+        conn.execute("DELETE FROM upload_history WHERE id = ?", (first,))
+    assert names(names_db, "logistics") == ["德邦"]
+    assert names(names_db, "customer_name") == ["客户A"]
+
+
+def test_init_backfills_existing_names(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+        add_record(db_path, "顺丰", "客户A")
+        with db_context(db_path) as conn:
+            conn.execute("DROP TABLE name_dictionary")
+        database.init_database()
+    assert names(db_path, "logistics") == ["顺丰"]
+    assert names(db_path, "customer_name") == ["客户A"]
+
+
+def test_logistics_options_revalidate_until_new_carrier(names_db):
+    add_record(names_db, "顺丰")
+    client = TestClient(app)
+
+    first = client.get("/api/admin/logistics-options")
+    assert first.json() == {"logistics_list": ["全部物流", "顺丰"]}
+
+    # 已有物流公司的新记录不影响选项列表
+    add_record(names_db, "顺丰")
+    cached = client.get("/api/admin/logistics-options", headers={"If-None-Match": first.headers["etag"]})
+    assert cached.status_code == 304
+
+    add_record(names_db, "德邦")
+    changed = client.get("/api/admin/logistics-options", headers={"If-None-Match": first.headers["etag"]})
+    assert changed.status_code == 200
+    assert changed.json() == {"logistics_list": ["全部物流", "德邦", "顺丰"]}
+
+
+def test_customer_names_prefix_first(names_db):
+    for name in ["天津佳士达", "北京天津商贸", "天津港", "上海100%_公司"]:
+        add_record(names_db, customer_name=name)
+    client = TestClient(app)
+
+    assert client.get("/api/admin/customer-names?q=天津").json() == {
+        "names": ["天津佳士达", "天津港", "北京天津商贸"],
+    }
+    assert client.get("/api/admin/customer-names?q=天津&limit=1").json() == {"names": ["天津佳士达"]}
+    assert client.get("/api/admin/customer-names?q=%25_").json() == {"names": ["上海100%_公司"]}
+    assert client.get("/api/admin/customer-names?q=").json() == {"names": []}
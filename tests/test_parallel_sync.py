@@ -0,0 +1,203 @@
+"""待同步文件并行补传测试"""
+import asyncio
+import sqlite3
+from contextlib import contextmanager
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core import database, sync_queue
+from app.core.file_manager import FileManager
+from app.core.sync_concurrency import AdaptiveConcurrency, SyncProgress, backoff_delay, sync_progress
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    with patch.object(sync_queue, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+def test_adaptive_concurrency_increases_and_halves():
+    limiter = AdaptiveConcurrency(1, 8, target_latency=1.0)
+    for _ in range(20):
+        limiter.on_success(0.1)
+    grown = limiter.current
+    assert grown > 1
+
+    limiter.on_failure()
+    assert limiter.current == max(1, grown // 2)
+    # 同一窗口内的多个失败只减半一次
+    limiter.on_failure()
+    assert limiter.current == max(1, grown // 2)
+
+
+def test_adaptive_concurrency_bounds():
+    limiter = AdaptiveConcurrency(2, 4, target_latency=1.0)
+    for _ in range(100):
+        limiter.on_success(0.1)
+    assert limiter.current == 4
+
+    limiter.on_success(5.0)
+    assert limiter.current == 2
+
+
+def test_backoff_delay_grows_and_caps():
+    for attempts, expected in ((0, 30), (3, 240), (20, 3600)):
+        delay = backoff_delay(attempts, 30, 3600)
+        assert expected * 0.5 <= delay <= expected
+
+
+def test_claim_due_returns_newest_first(db):
+    sync_queue.enqueue("/tmp/a", "a.jpg", "files/a.jpg", created_at="2025-01-01T00:00:00")
+    sync_queue.enqueue("/tmp/b", "b.jpg", "files/b.jpg", created_at="2025-01-03T00:00:00")
+    sync_queue.enqueue("/tmp/c", "c.jpg", "files/c.jpg", created_at="2025-01-02T00:00:00")
+
+    items = sync_queue.claim_due(limit=2)
+
+    assert [i["webdav_path"] for i in items] == ["files/b.jpg", "files/c.jpg"]
+
+
+def test_release_returns_items_without_counting_failure(db):
+    sync_queue.enqueue("/tmp/a", "a.jpg", "files/a.jpg")
+    item = sync_queue.claim_due()[0]
+
+    sync_queue.release([item["id"]])
+
+    retried = sync_queue.claim_due()
+    assert retried[0]["attempts"] == 0
+
+
+def test_progress_snapshot_reports_remaining():
+    progress = SyncProgress()
+    progress.start(total=10, concurrency=2)
+    progress.synced = 3
+    progress.failed = 1
+
+    snapshot = progress.snapshot()
+
+    assert snapshot["running"] is True
+    assert snapshot["remaining"] == 6
+    assert snapshot["concurrency"] == 2
+
+
+@pytest.mark.asyncio
+async def test_sync_pending_files_runs_in_parallel(db, tmp_path):
+    for i in range(12):
+        temp_file = tmp_path / f"{i}.jpg"
+        temp_file.write_bytes(b"x")
+        sync_queue.enqueue(str(temp_file), f"{i}.jpg", f"files/{i}.jpg")
+
+    fm = FileManager()
+    fm.check_webdav_health = AsyncMock(return_value=True)
+    fm.settings.SYNC_MIN_CONCURRENCY = 2
+    fm.settings.SYNC_MAX_CONCURRENCY = 3
+
+    active = 0
+    peak = 0
+
+    async def upload_file(local_path, webdav_path):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return {"success": True}
+    fm.webdav_client.upload_file = upload_file
+
+    try:
+        stats = await fm.sync_pending_files()
+    finally:
+        fm.settings.SYNC_MIN_CONCURRENCY = 1
+        fm.settings.SYNC_MAX_CONCURRENCY = 8
+
+    assert stats["synced_count"] == 12
+    assert 2 <= peak <= 3
+    assert sync_queue.count_pending() == 0
+    snapshot = sync_progress.snapshot()
+    assert (snapshot["running"], snapshot["synced"], snapshot["remaining"]) == (False, 12, 0)
+
+
+@pytest.mark.asyncio
+async def test_failed_sync_is_backed_off(db, tmp_path):
+    temp_file = tmp_path / "a.jpg"
+    temp_file.write_bytes(b"x")
+    sync_queue.enqueue(str(temp_file), "a.jpg", "files/a.jpg")
+
+    fm = FileManager()
+    fm.check_webdav_health = AsyncMock(return_value=True)
+    fm.webdav_client.upload_file = AsyncMock(return_value={"success": False, "error": "503"})
+
+    stats = await fm.sync_pending_files()
+
+    assert stats["failed_count"] == 1
+    assert temp_file.exists()
+    # 退避期间不会被再次领取
+    assert sync_queue.claim_due() == []
+    assert sync_queue.get_queue_stats()["retrying"] == 1
+
+
+def queue_states(db_path):
+    with db_context(db_path) as conn:
+        return [row["state"] for row in conn.execute("SELECT state FROM pending_sync_queue")]
+
+
+@pytest.mark.asyncio
+async def test_overlapping_sync_is_skipped_and_cancel_releases_claims(db, tmp_path):
+    for i in range(3):
+        temp_file = tmp_path / f"{i}.jpg"
+        temp_file.write_bytes(b"x")
+        sync_queue.enqueue(str(temp_file), f"{i}.jpg", f"files/{i}.jpg")
+
+    fm = FileManager()
+    fm.check_webdav_health = AsyncMock(return_value=True)
+    started = asyncio.Event()
+
+    async def upload_file(local_path, webdav_path):
+        started.set()
+        await asyncio.sleep(60)
+    fm.webdav_client.upload_file = upload_file
+
+    first = asyncio.ensure_future(fm.sync_pending_files())
+    await asyncio.wait_for(started.wait(), 1)
+
+    # 同一时刻只允许一轮同步
+    second = await FileManager().sync_pending_files()
+    assert second["skipped"] == "running"
+
+    first.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    assert queue_states(db) == [sync_queue.STATE_PENDING] * 3
+    assert sync_progress.snapshot()["running"] is False
+
+
+@pytest.mark.asyncio
+async def test_sync_task_error_releases_claim(db, tmp_path):
+    temp_file = tmp_path / "a.jpg"
+    temp_file.write_bytes(b"x")
+    sync_queue.enqueue(str(temp_file), "a.jpg", "files/a.jpg")
+
+    fm = FileManager()
+    fm.check_webdav_health = AsyncMock(return_value=True)
+    fm.webdav_client.upload_file = AsyncMock(return_value={"success": False, "error": "503"})
+
+    with patch.object(sync_queue, "mark_failed", side_effect=sqlite3.OperationalError("database is locked")):
+        await fm.sync_pending_files()
+
+    assert queue_states(db) == [sync_queue.STATE_PENDING]
+    assert sync_progress.snapshot()["released"] == 1
@@ -0,0 +1,121 @@
+"""预览清单接口测试"""
+import sqlite3
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import admin
+from app.core import database
+from app.core import memory_cache as memory_cache_module
+from app.core.file_manager import FileManager
+from app.core.memory_cache import MemoryCache
+from app.main import app
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class FakeFileManager:
+    """按WebDAV路径返回预设的缓存状态"""
+
+    states = {}
+
+    def cache_state(self, webdav_path):
+        return self.states.get(webdav_path, "remote")
+
+
+@pytest.fixture
+def manifest_db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    local = tmp_path / "local.jpg"
+    local.write_bytes(b"jpeg")
+    with db_context(db_path) as conn:
+        # webdav_path 由迁移脚本添加, init_database 不创建
+        conn.execute("ALTER TABLE upload_history ADD COLUMN webdav_path TEXT")
+        conn.executemany(
+            """
+            INSERT INTO upload_history
+                (id, business_id, file_name, file_size, file_extension, status, local_file_path, webdav_path, deleted_at)
+            VALUES (?, '1', 'a.jpg', 4, '.jpg', 'success', ?, ?, ?)
+            """,
+            [
+                (1, str(local), None, None),
+                (2, None, "files/2026/01/01/b.jpg", None),
+                (3, None, "files/2026/01/01/c.png", None),
+                (4, None, None, None),
+                (5, str(local), None, "2026-01-02T00:00:00"),
+            ],
+        )
+    FakeFileManager.states = {"files/2026/01/01/b.jpg": "disk"}
+    with patch.object(admin, "get_db_connection", side_effect=factory), \
+            patch("app.core.file_manager.FileManager", FakeFileManager):
+        yield db_path
+
+
+def test_manifest_reports_urls_and_cache_state(manifest_db):
+    response = TestClient(app).post("/api/admin/files/manifest", json={"ids": [3, 1, 2, 4, 5, 99, 1]})
+
+    assert response.status_code == 200
+    data = response.json()
+    items = data["items"]
+    assert [item["id"] for item in items] == [3, 1, 2, 4]
+    assert [item["cache"] for item in items] == ["remote", "local", "disk", "missing"]
+    assert items[0]["media_type"] == "image/jpeg"
+    assert items[1]["url"] == f"/api/admin/files/1/preview?v={items[1]['version']}"
+    assert items[3]["url"] is None
+    assert data["missing_ids"] == [5, 99]
+
+    # 内容不变时版本号稳定
+    again = TestClient(app).post("/api/admin/files/manifest", json={"ids": [1, 2]}).json()
+    assert [item["url"] for item in again["items"]] == [items[1]["url"], items[2]["url"]]
+
+
+def test_preview_with_current_version_is_immutable(manifest_db):
+    client = TestClient(app)
+    url = client.post("/api/admin/files/manifest", json={"ids": [1]}).json()["items"][0]["url"]
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.content == b"jpeg"
+    assert "immutable" in response.headers["cache-control"]
+
+    stale = client.get("/api/admin/files/1/preview?v=0000000000000000")
+    assert stale.headers["cache-control"] == "public, max-age=3600"
+
+
+@pytest.mark.parametrize("ids", [[], list(range(201))])
+def test_manifest_rejects_empty_or_oversized_batches(manifest_db, ids):
+    response = TestClient(app).post("/api/admin/files/manifest", json={"ids": ids})
+    assert response.status_code == 400
+
+
+def test_cache_state_does_not_record_access(tmp_path, monkeypatch):
+    hot_cache = MemoryCache(max_bytes=1000, max_object_bytes=400)
+    monkeypatch.setattr(memory_cache_module, "_memory_cache", hot_cache)
+    fm = FileManager()
+    fm.settings = fm.settings.model_copy(update={"CACHE_DIR": str(tmp_path / "cache")})
+
+    hot_cache.put("files/hot.jpg", b"hot")
+    cache_path = fm._get_cache_path("files/disk.jpg")
+    (tmp_path / "cache").mkdir()
+    with open(cache_path, "wb") as f:
+        f.write(b"disk")
+    fm._register_cache(cache_path, 4)
+
+    assert fm.cache_state("files/hot.jpg") == "memory"
+    assert fm.cache_state("files/disk.jpg") == "disk"
+    assert fm.cache_state("files/none.jpg") == "remote"
+    assert hot_cache.hits == 0 and hot_cache.misses == 0
+    assert fm.cache_index.get(cache_path).hits == 0
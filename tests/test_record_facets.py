@@ -0,0 +1,84 @@
+"""记录列表筛选维度分组计数(facets)测试"""
+import sqlite3
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import admin
+from app.core import api_cache, database
+from app.main import app
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def facets_db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    with db_context(db_path) as conn:
+        conn.executemany(
+            """
+            INSERT INTO upload_history
+                (business_id, file_name, file_size, status, upload_time, logistics, doc_type, upload_type, deleted_at)
+            VALUES ('1', 'a.jpg', 1, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                ("success", "2026-01-01T10:00:00", "顺丰", "销售", None, None),
+                ("success", "2026-01-01T11:00:00", "顺丰", "销售", "物流", None),
+                ("failed", "2026-01-02T10:00:00", "顺丰", "转库", "物流", None),
+                ("success", "2026-01-02T11:00:00", "德邦", "销售", "物流", None),
+                ("success", "2026-01-03T10:00:00", None, "销售", "仓库", None),
+                ("failed", "2026-01-03T11:00:00", "德邦", "销售", "物流", "2026-01-04T00:00:00"),
+            ],
+        )
+    with patch.object(admin, "get_db_connection", side_effect=factory), \
+            patch.object(api_cache, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+def counts(facet):
+    return {item["value"]: item["count"] for item in facet}
+
+
+def test_facets_exclude_own_filter(facets_db):
+    data = TestClient(app).get(
+        "/api/admin/records?status=success&logistics=顺丰&facets=status,logistics,doc_type,upload_type"
+    ).json()
+
+    assert data["total"] == 2
+    facets = data["facets"]
+    # 每个维度的计数不应用该维度自身的条件, 已删除记录不计入
+    assert counts(facets["status"]) == {"success": 2, "failed": 1}
+    assert counts(facets["logistics"]) == {"顺丰": 2, "德邦": 1, None: 1}
+    assert counts(facets["doc_type"]) == {"销售": 2}
+    # upload_type 为空的历史记录计入物流
+    assert counts(facets["upload_type"]) == {"物流": 2}
+    assert facets["logistics"][0] == {"value": "顺丰", "count": 2}
+
+
+def test_facets_apply_shared_filters(facets_db):
+    data = TestClient(app).get(
+        "/api/admin/records?start_date=2026-01-02&upload_type=物流&facets=upload_type,status"
+    ).json()
+
+    assert list(data["facets"]) == ["upload_type", "status"]
+    assert counts(data["facets"]["upload_type"]) == {"物流": 2, "仓库": 1}
+    assert counts(data["facets"]["status"]) == {"success": 1, "failed": 1}
+
+
+def test_facets_are_optional_and_validated(facets_db):
+    client = TestClient(app)
+    assert "facets" not in client.get("/api/admin/records").json()
+    assert client.get("/api/admin/records?facets=customer_name").status_code == 400
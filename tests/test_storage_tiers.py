@@ -0,0 +1,194 @@
+"""分层存储策略测试"""
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core import database, storage_tiers, sync_queue
+from app.core.file_manager import FileManager
+from app.core.timezone import get_beijing_now_naive
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    # webdav_path 由 migrations/add_webdav_support.sql 添加
+    with db_context(db_path) as conn:
+        conn.execute("ALTER TABLE upload_history ADD COLUMN webdav_path TEXT")
+    with patch.object(storage_tiers, "get_db_connection", side_effect=factory), \
+            patch.object(sync_queue, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+@pytest.fixture
+def file_manager(tmp_path):
+    fm = FileManager()
+    fm.settings = fm.settings.model_copy(update={
+        "CACHE_DIR": str(tmp_path / "cache"),
+        "LOCAL_STORAGE_PATH": str(tmp_path / "local"),
+        "CACHE_DAYS": 7,
+        "CACHE_MAX_BYTES": 0,
+        "STORAGE_HOT_DAYS": 3,
+        "STORAGE_HOT_MIN_HITS": 3,
+        "STORAGE_LOCAL_RETENTION_DAYS": 30,
+        "STORAGE_TIERING_MAX_MOVES": 10,
+    })
+    fm.webdav_client.get_file_size = AsyncMock(return_value=3)
+    fm.webdav_client.download_stream = remote_stream(b"abc")
+    return fm
+
+
+def remote_stream(content):
+    async def download_stream(webdav_path, chunk_size=None):
+        yield content
+    return download_stream
+
+
+def seed(db_path, webdav_path, days_ago, local_file_path=None):
+    upload_time = (get_beijing_now_naive() - timedelta(days=days_ago)).isoformat()
+    with db_context(db_path) as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO upload_history
+                (business_id, file_name, file_size, status, upload_time, local_file_path, webdav_path)
+            VALUES ('1', ?, 3, 'success', ?, ?, ?)
+            """,
+            (webdav_path.rsplit("/", 1)[-1], upload_time, local_file_path, webdav_path),
+        )
+        return cursor.lastrowid
+
+
+def local_file(tmp_path, name, days_old):
+    path = tmp_path / "local" / name
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"abc")
+    mtime = time.time() - days_old * 86400
+    os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def local_path_of(db_path, record_id):
+    with db_context(db_path) as conn:
+        return conn.execute(
+            "SELECT local_file_path FROM upload_history WHERE id = ?", (record_id,)
+        ).fetchone()[0]
+
+
+def test_classify(file_manager):
+    settings = file_manager.settings
+    day = 86400
+    assert storage_tiers.classify(1 * day, 0, settings) == "hot"
+    assert storage_tiers.classify(5 * day, 3, settings) == "hot"
+    assert storage_tiers.classify(5 * day, 0, settings) == "warm"
+    assert storage_tiers.classify(30 * day, 10, settings) == "cold"
+
+
+@pytest.mark.asyncio
+async def test_hot_objects_are_promoted_into_cache(db, file_manager):
+    seed(db, "files/2026/01/01/new.jpg", days_ago=1)
+
+    with patch.object(storage_tiers, "warm_paths", return_value=1) as warm:
+        result = await storage_tiers.run_storage_tiering(file_manager)
+
+    warm.assert_called_once_with(["files/2026/01/01/new.jpg"])
+    assert result["objects"] == {"hot": 1, "warm": 0, "cold": 0}
+    assert result["promoted"] == 1
+
+
+@pytest.mark.asyncio
+async def test_old_local_copies_are_demoted(db, file_manager, tmp_path):
+    cold_path = local_file(tmp_path, "cold.jpg", days_old=60)
+    cold_id = seed(db, "files/2025/01/01/cold.jpg", days_ago=60, local_file_path=cold_path)
+
+    warm_path = local_file(tmp_path, "warm.jpg", days_old=60)
+    warm_id = seed(db, "files/2025/01/02/warm.jpg", days_ago=60, local_file_path=warm_path)
+    warm_cache = file_manager._get_cache_path("files/2025/01/02/warm.jpg")
+    os.makedirs(os.path.dirname(warm_cache), exist_ok=True)
+    with open(warm_cache, "wb") as f:
+        f.write(b"abc")
+    file_manager.cache_index.add(warm_cache, 3)
+    file_manager.cache_index.get(warm_cache).last_access = time.time() - 5 * 86400
+
+    with patch.object(storage_tiers, "warm_paths", return_value=0):
+        result = await storage_tiers.run_storage_tiering(file_manager)
+
+    assert result["objects"] == {"hot": 0, "warm": 1, "cold": 1}
+    assert (result["removed_local"], result["verify_failed"]) == (2, 0)
+    assert not os.path.exists(cold_path) and not os.path.exists(warm_path)
+    assert local_path_of(db, cold_id) is None
+    assert local_path_of(db, warm_id) is None
+    assert result["tiers"]["local"] == {"files": 0, "bytes": 0}
+    assert result["tiers"]["webdav"] == {"files": 2, "bytes": 6}
+
+
+@pytest.mark.asyncio
+async def test_warm_local_copy_moves_into_cache(db, file_manager, tmp_path):
+    path = local_file(tmp_path, "warm.jpg", days_old=40)
+    record_id = seed(db, "files/2026/01/01/warm.jpg", days_ago=40, local_file_path=path)
+    # 上传40天、CACHE_DAYS=60: 对象为warm且不在缓存中, 本地备份直接移入缓存
+    file_manager.settings = file_manager.settings.model_copy(update={"CACHE_DAYS": 60})
+
+    with patch.object(storage_tiers, "warm_paths", return_value=0):
+        result = await storage_tiers.run_storage_tiering(file_manager)
+
+    cache_path = file_manager._get_cache_path("files/2026/01/01/warm.jpg")
+    assert result["demoted_to_cache"] == 1
+    assert os.path.exists(cache_path) and not os.path.exists(path)
+    assert file_manager.cache_index.get(cache_path).size == 3
+    assert local_path_of(db, record_id) is None
+
+
+@pytest.mark.asyncio
+async def test_local_copy_kept_when_remote_mismatch_or_pending(db, file_manager, tmp_path):
+    mismatch = local_file(tmp_path, "a.jpg", days_old=60)
+    seed(db, "files/2025/01/01/a.jpg", days_ago=60, local_file_path=mismatch)
+    pending = local_file(tmp_path, "b.jpg", days_old=60)
+    seed(db, "files/2025/01/01/b.jpg", days_ago=60, local_file_path=pending)
+    sync_queue.enqueue("/tmp/b.jpg", "b.jpg", "files/2025/01/01/b.jpg")
+
+    async def get_file_size(webdav_path):
+        return None if webdav_path.endswith("a.jpg") else 3
+    file_manager.webdav_client.get_file_size = get_file_size
+
+    with patch.object(storage_tiers, "warm_paths", return_value=0):
+        result = await storage_tiers.run_storage_tiering(file_manager)
+
+    assert result["verify_failed"] == 1
+    assert result["removed_local"] == 0
+    assert os.path.exists(mismatch) and os.path.exists(pending)
+    report = storage_tiers.get_storage_tiers_report(file_manager)
+    assert report["tiers"]["local"] == {"files": 2, "bytes": 6}
+    assert report["last_run"]["verify_failed"] == 1
+
+
+@pytest.mark.asyncio
+async def test_local_copy_kept_when_remote_content_differs(db, file_manager, tmp_path):
+    path = local_file(tmp_path, "a.jpg", days_old=60)
+    record_id = seed(db, "files/2025/01/01/a.jpg", days_ago=60, local_file_path=path)
+    # 大小相同但内容不同(例如上传时被截断后补零)
+    file_manager.webdav_client.download_stream = remote_stream(b"ab\x00")
+
+    with patch.object(storage_tiers, "warm_paths", return_value=0):
+        result = await storage_tiers.run_storage_tiering(file_manager)
+
+    assert (result["verify_failed"], result["removed_local"]) == (1, 0)
+    assert os.path.exists(path)
+    assert local_path_of(db, record_id) == path
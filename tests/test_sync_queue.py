@@ -0,0 +1,152 @@
+"""待同步队列测试"""
+import json
+import sqlite3
+from contextlib import contextmanager
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.core import database, sync_queue
+from app.core.file_manager import FileManager
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    with patch.object(sync_queue, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+def test_enqueue_is_idempotent_per_webdav_path(db):
+    sync_queue.enqueue("/tmp/a1", "a.jpg", "files/a.jpg")
+    sync_queue.enqueue("/tmp/a2", "a.jpg", "files/a.jpg")
+    sync_queue.enqueue("/tmp/b", "b.jpg", "files/b.jpg")
+
+    items = sync_queue.claim_due()
+
+    assert sync_queue.count_pending() == 2
+    assert {i["webdav_path"]: i["temp_path"] for i in items} == {
+        "files/a.jpg": "/tmp/a2", "files/b.jpg": "/tmp/b"
+    }
+
+
+def test_claimed_items_are_not_claimed_twice(db):
+    sync_queue.enqueue("/tmp/a", "a.jpg", "files/a.jpg")
+
+    first = sync_queue.claim_due()
+    second = sync_queue.claim_due()
+
+    assert len(first) == 1
+    assert second == []
+    assert sync_queue.get_queue_stats()["syncing"] == 1
+
+
+def test_failed_item_waits_until_next_attempt(db):
+    sync_queue.enqueue("/tmp/a", "a.jpg", "files/a.jpg")
+    item = sync_queue.claim_due()[0]
+
+    sync_queue.mark_failed(item["id"], "503", retry_delay=60)
+
+    assert sync_queue.claim_due() == []
+    retried = sync_queue.claim_due(now=item["next_attempt_at"] + 61)
+    assert retried[0]["attempts"] == 1
+    assert retried[0]["last_error"] == "503"
+
+
+def test_reenqueue_during_sync_is_not_dropped(db):
+    sync_queue.enqueue("/tmp/a1", "a.jpg", "files/a.jpg")
+    item = sync_queue.claim_due()[0]
+
+    # 同步期间同一路径加入了新文件: 保持syncing, 不会被再次领取
+    sync_queue.enqueue("/tmp/a2", "a.jpg", "files/a.jpg")
+    assert sync_queue.claim_due() == []
+
+    # 旧文件同步完成后条目放回pending, 立即同步新文件
+    sync_queue.mark_synced(item["id"], item["temp_path"])
+    retried = sync_queue.claim_due()
+    assert [(i["temp_path"], i["attempts"]) for i in retried] == [("/tmp/a2", 0)]
+
+    sync_queue.mark_synced(retried[0]["id"], retried[0]["temp_path"])
+    assert sync_queue.count_pending() == 0
+
+
+def test_reenqueue_resets_backoff(db):
+    sync_queue.enqueue("/tmp/a1", "a.jpg", "files/a.jpg")
+    item = sync_queue.claim_due()[0]
+    sync_queue.mark_failed(item["id"], "503", retry_delay=600, temp_path=item["temp_path"])
+    assert sync_queue.claim_due() == []
+
+    sync_queue.enqueue("/tmp/a2", "a.jpg", "files/a.jpg")
+    retried = sync_queue.claim_due()
+    assert [(i["temp_path"], i["attempts"], i["last_error"]) for i in retried] == [("/tmp/a2", 0, None)]
+
+
+def test_release_stale_claims(db):
+    sync_queue.enqueue("/tmp/a", "a.jpg", "files/a.jpg")
+    sync_queue.claim_due()
+
+    assert sync_queue.release_stale_claims() == 1
+    assert len(sync_queue.claim_due()) == 1
+
+
+def test_import_legacy_manifest(db, tmp_path):
+    temp_file = tmp_path / "a.jpg"
+    temp_file.write_bytes(b"abc")
+    manifest = tmp_path / "pending_sync.json"
+    manifest.write_text(json.dumps({"files": [
+        {"temp_path": str(temp_file), "filename": "a.jpg",
+         "webdav_path": "files/a.jpg", "created_time": "2025-11-19T11:16:15"},
+        {"temp_path": str(tmp_path / "gone.jpg"), "webdav_path": "files/gone.jpg"},
+        {"filename": "broken"},
+    ], "last_sync": None}), encoding="utf-8")
+
+    assert sync_queue.import_legacy_manifest(str(manifest)) == 2
+    assert not manifest.exists()
+    assert (tmp_path / "pending_sync.json.migrated").exists()
+    assert sync_queue.import_legacy_manifest(str(manifest)) == 0
+
+    items = {i["webdav_path"]: i for i in sync_queue.claim_due()}
+    assert items["files/a.jpg"]["file_size"] == 3
+    assert items["files/a.jpg"]["created_at"] == "2025-11-19T11:16:15"
+
+
+@pytest.mark.asyncio
+async def test_sync_pending_files_uses_queue(db, tmp_path):
+    ok_file = tmp_path / "ok.jpg"
+    ok_file.write_bytes(b"ok")
+    bad_file = tmp_path / "bad.jpg"
+    bad_file.write_bytes(b"bad")
+    sync_queue.enqueue(str(ok_file), "ok.jpg", "files/ok.jpg")
+    sync_queue.enqueue(str(bad_file), "bad.jpg", "files/bad.jpg")
+    sync_queue.enqueue(str(tmp_path / "missing.jpg"), "missing.jpg", "files/missing.jpg")
+
+    fm = FileManager()
+    fm.check_webdav_health = AsyncMock(return_value=True)
+
+    async def upload_file(local_path, webdav_path):
+        if webdav_path == "files/ok.jpg":
+            return {"success": True}
+        return {"success": False, "error": "503"}
+    fm.webdav_client.upload_file = upload_file
+
+    stats = await fm.sync_pending_files()
+
+    assert (stats["synced_count"], stats["failed_count"]) == (1, 1)
+    assert not ok_file.exists()
+    assert await fm.get_pending_sync_count() == 1
+    queue = sync_queue.get_queue_stats()
+    assert (queue["pending"], queue["retrying"]) == (1, 1)
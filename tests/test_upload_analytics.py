@@ -0,0 +1,135 @@
+"""上传日汇总与分析接口测试"""
+import sqlite3
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import database, upload_analytics
+from app.main import app
+
+
+@contextmanager
+def db_context(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def analytics_db(tmp_path):
+    db_path = str(tmp_path / "test.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+    with patch.object(upload_analytics, "get_db_connection", side_effect=factory):
+        yield db_path
+
+
+def add_record(db_path, upload_time, status="pending", logistics=None, doc_type="销售", latency_ms=None):
+    with db_context(db_path) as conn:
+        cursor = conn.execute(
+            """
+            INSERT INTO upload_history
+                (business_id, doc_number, doc_type, file_name, file_size, status, upload_time, logistics, yonyou_latency_ms)
+            VALUES ('1', 'SO001', ?, 'a.jpg', 1, ?, ?, ?, ?)
+            """,
+            (doc_type, status, upload_time, logistics, latency_ms),
+        )
+        return cursor.lastrowid
+
+
+def rollup(db_path):
+    with db_context(db_path) as conn:
+        return conn.execute(
+            "SELECT day, logistics, doc_type, total, success_count, failed_count, latency_total_ms, latency_count "
+            "FROM upload_daily_stats WHERE total > 0 ORDER BY day, logistics, doc_type"
+        ).fetchall()
+
+
+def test_triggers_follow_upload_lifecycle(analytics_db):
+    record_id = add_record(analytics_db, "2026-01-01T10:00:00.123456")
+    assert rollup(analytics_db) == [("2026-01-01", "", "销售", 1, 0, 0, 0, 0)]
+
+    # 上传成功: 补全物流与耗时, 计数从未知物流移到顺丰
+    with db_context(analytics_db) as conn:
+        conn.execute(
+            "UPDATE upload_history SET status = 'success', logistics = '顺丰', yonyou_latency_ms = 800 WHERE id = ?",
+            (record_id,),
+        )
+        conn.execute("UPDATE upload_history SET notes = '备注'")
+    assert rollup(analytics_db) == [("2026-01-01", "顺丰", "销售", 1, 1, 0, 800, 1)]
+
+    # 软删除移出汇总
+    with db_context(analytics_db) as conn:
+        conn.execute("UPDATE upload_history SET deleted_at = '2026-01-02T00:00:00' WHERE id = ?", (record_id,))
+    assert rollup(analytics_db) == []
+
+
+def test_rebuild_matches_incremental_rollup(analytics_db):
+    add_record(analytics_db, "2026-01-01T10:00:00", "success", "顺丰", latency_ms=500)
+    add_record(analytics_db, "2026-01-01T11:00:00", "failed", "顺丰", latency_ms=1500)
+    add_record(analytics_db, "2026-01-02T09:00:00", "success", None, doc_type="转库")
+    incremental = rollup(analytics_db)
+
+    with db_context(analytics_db) as conn:
+        conn.execute("DELETE FROM upload_daily_stats")
+    assert upload_analytics.rebuild() == 2
+    assert rollup(analytics_db) == incremental
+
+
+def test_init_backfills_existing_records(tmp_path):
+    db_path = str(tmp_path / "legacy.db")
+    factory = lambda: db_context(db_path)  # noqa: E731
+    with patch.object(database, "get_db_connection", side_effect=factory):
+        database.init_database()
+        add_record(db_path, "2026-01-01T10:00:00", "success")
+        with db_context(db_path) as conn:
+            conn.execute("DROP TABLE upload_daily_stats")
+        database.init_database()
+    assert rollup(db_path) == [("2026-01-01", "", "销售", 1, 1, 0, 0, 0)]
+
+
+def test_analytics_endpoint_buckets_and_groups(analytics_db):
+    add_record(analytics_db, "2026-01-05T10:00:00", "success", "顺丰", latency_ms=400)
+    add_record(analytics_db, "2026-01-06T10:00:00", "failed", "顺丰", latency_ms=600)
+    add_record(analytics_db, "2026-01-06T11:00:00", "success", "德邦")
+    add_record(analytics_db, "2026-01-07T11:00:00", "pending", "德邦")
+    add_record(analytics_db, "2026-02-01T11:00:00", "success", "德邦")
+    client = TestClient(app)
+
+    daily = client.get("/api/admin/analytics?start_date=2026-01-01&end_date=2026-01-31").json()
+    assert [item["period"] for item in daily["items"]] == ["2026-01-05", "2026-01-06", "2026-01-07"]
+    assert daily["summary"] == {
+        "total": 4, "success_count": 2, "failed_count": 1,
+        "failure_rate": 0.3333, "avg_latency_ms": 500,
+    }
+
+    weekly = client.get(
+        "/api/admin/analytics?start_date=2026-01-01&end_date=2026-02-28&bucket=week&group_by=logistics"
+    ).json()
+    assert [(i["period"], i["logistics"], i["total"]) for i in weekly["items"]] == [
+        ("2026-01-05", "德邦", 2), ("2026-01-05", "顺丰", 2), ("2026-01-26", "德邦", 1),
+    ]
+
+    monthly = client.get(
+        "/api/admin/analytics?start_date=2026-01-01&end_date=2026-02-28&bucket=month&logistics=顺丰"
+    ).json()
+    assert monthly["items"] == [{
+        "period": "2026-01", "total": 2, "success_count": 1, "failed_count": 1,
+        "failure_rate": 0.5, "avg_latency_ms": 500,
+    }]
+
+
+@pytest.mark.parametrize("query", [
+    "bucket=year",
+    "group_by=customer",
+    "start_date=2026/01/01",
+    "start_date=2026-02-01&end_date=2026-01-01",
+])
+def test_analytics_endpoint_rejects_invalid_params(analytics_db, query):
+    assert TestClient(app).get(f"/api/admin/analytics?{query}").status_code == 400
@@ -0,0 +1,127 @@
+"""测试WebDAV远端目录存在性缓存(减少重复MKCOL)"""
+import asyncio
+
+import httpx
+import pytest
+
+from app.core import webdav_client as webdav_module
+from app.core.webdav_client import WebDAVClient, invalidate_directory_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_directory_cache():
+    invalidate_directory_cache()
+    yield
+    invalidate_directory_cache()
+
+
+def patch_transport(monkeypatch, handler):
+    """让 WebDAVClient 内部创建的 httpx.AsyncClient 使用 MockTransport"""
+    real_client = httpx.AsyncClient
+
+    def factory(*args, **kwargs):
+        kwargs["transport"] = httpx.MockTransport(handler)
+        return real_client(*args, **kwargs)
+
+    monkeypatch.setattr(webdav_module.httpx, "AsyncClient", factory)
+
+
+def make_server(put_statuses=None):
+    """模拟WebDAV服务端, 记录请求; put_statuses 依次作为PUT的返回码"""
+    calls = []
+    put_statuses = list(put_statuses or [])
+
+    def handler(request: httpx.Request):
+        calls.append((request.method, request.url.path))
+        if request.method == "MKCOL":
+            return httpx.Response(201)
+        if request.method == "PUT":
+            request.read()
+            return httpx.Response(put_statuses.pop(0) if put_statuses else 201)
+        if request.method == "PROPFIND":
+            body = (
+                '<?xml version="1.0"?><D:multistatus xmlns:D="DAV:"><D:response>'
+                '<D:propstat><D:prop><D:getcontentlength>4</D:getcontentlength>'
+                '</D:prop></D:propstat></D:response></D:multistatus>'
+            )
+            return httpx.Response(207, content=body.encode())
+        return httpx.Response(200)
+
+    return handler, calls
+
+
+def mkcol_calls(calls):
+    return [path for method, path in calls if method == "MKCOL"]
+
+
+@pytest.mark.asyncio
+async def test_mkcol_only_on_first_upload_to_directory(tmp_path, monkeypatch):
+    local = tmp_path / "a.jpg"
+    local.write_bytes(b"data")
+    handler, calls = make_server()
+    patch_transport(monkeypatch, handler)
+    client = WebDAVClient()
+
+    first = await client.upload_file(str(local), "files/2026/01/02/a.jpg")
+    mkcol_after_first = len(mkcol_calls(calls))
+    second = await client.upload_file(str(local), "files/2026/01/02/b.jpg")
+
+    assert first["success"] and second["success"]
+    assert mkcol_after_first == 4
+    assert len(mkcol_calls(calls)) == 4
+
+
+@pytest.mark.asyncio
+async def test_cache_shared_between_client_instances(monkeypatch):
+    handler, calls = make_server()
+    patch_transport(monkeypatch, handler)
+
+    assert await WebDAVClient().create_directory("files/2026/01")
+    assert await WebDAVClient().create_directory("files/2026/01/")
+
+    assert len(mkcol_calls(calls)) == 3
+
+
+@pytest.mark.asyncio
+async def test_concurrent_creations_are_coalesced(monkeypatch):
+    handler, calls = make_server()
+    patch_transport(monkeypatch, handler)
+    client = WebDAVClient()
+
+    results = await asyncio.gather(*[
+        client.create_directory("files/2026/01/02") for _ in range(10)
+    ])
+
+    assert all(results)
+    assert sorted(mkcol_calls(calls)) == sorted(set(mkcol_calls(calls)))
+    assert len(mkcol_calls(calls)) == 4
+
+
+@pytest.mark.asyncio
+async def test_put_conflict_invalidates_cache_and_retries(tmp_path, monkeypatch):
+    local = tmp_path / "a.jpg"
+    local.write_bytes(b"data")
+    handler, calls = make_server(put_statuses=[201, 409, 201])
+    patch_transport(monkeypatch, handler)
+    client = WebDAVClient()
+
+    assert (await client.upload_file(str(local), "files/2026/01/02/a.jpg"))["success"]
+    # 远端目录被外部删除, 下一次PUT返回409
+    result = await client.upload_file(str(local), "files/2026/01/02/b.jpg")
+
+    assert result["success"]
+    assert len(mkcol_calls(calls)) == 8
+    assert [m for m, _ in calls].count("PUT") == 3
+
+
+@pytest.mark.asyncio
+async def test_zero_ttl_disables_cache(monkeypatch):
+    handler, calls = make_server()
+    patch_transport(monkeypatch, handler)
+    client = WebDAVClient()
+    client.settings = client.settings.model_copy(update={"WEBDAV_DIR_CACHE_TTL": 0})
+
+    await client.create_directory("files")
+    await client.create_directory("files")
+
+    assert len(mkcol_calls(calls)) == 2
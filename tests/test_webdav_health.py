@@ -0,0 +1,104 @@
+"""测试WebDAV被动健康统计"""
+import asyncio
+
+import pytest
+
+from app.core.exceptions import (
+    WebDAVError, WebDAVNetworkError, WebDAVNotFoundError, WebDAVServerError
+)
+from app.core.file_manager import FileManager
+from app.core.webdav_health import WebDAVHealthTracker, is_service_failure, webdav_health
+
+
+@pytest.fixture(autouse=True)
+def reset_tracker():
+    webdav_health.reset()
+    yield
+    webdav_health.reset()
+
+
+def make_probe(result=True, delay=0):
+    calls = []
+
+    async def probe():
+        calls.append(1)
+        if delay:
+            await asyncio.sleep(delay)
+        return result
+
+    return probe, calls
+
+
+def test_business_status_codes_are_not_failures():
+    assert not is_service_failure(None)
+    assert not is_service_failure(WebDAVNotFoundError())
+    assert not is_service_failure(WebDAVError("exists", status_code=405))
+    assert is_service_failure(WebDAVServerError())
+    assert is_service_failure(WebDAVNetworkError("reset"))
+    assert is_service_failure(WebDAVError("unknown"))
+
+
+@pytest.mark.asyncio
+async def test_first_check_probes_then_uses_real_traffic():
+    tracker = WebDAVHealthTracker()
+    probe, calls = make_probe(True)
+
+    assert await tracker.is_available(probe) is True
+    tracker.record()
+    tracker.record(WebDAVNotFoundError())
+    assert await tracker.is_available(probe) is True
+
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_failures_in_window_mark_unavailable_without_probe():
+    tracker = WebDAVHealthTracker()
+    probe, calls = make_probe(True)
+    await tracker.is_available(probe)
+
+    for _ in range(3):
+        tracker.record(WebDAVNetworkError("reset"))
+
+    assert tracker.snapshot()["available"] is False
+    assert tracker.probe_count == 1
+
+
+@pytest.mark.asyncio
+async def test_unavailable_state_reprobes_after_interval(monkeypatch):
+    tracker = WebDAVHealthTracker()
+    failing, _ = make_probe(False)
+    assert await tracker.is_available(failing) is False
+
+    # 间隔内不再探测
+    recovered, calls = make_probe(True)
+    assert await tracker.is_available(recovered) is False
+    assert calls == []
+
+    monkeypatch.setattr(tracker, "_last_probe", tracker._last_probe - 3600)
+    assert await tracker.is_available(recovered) is True
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_checks_share_one_probe():
+    tracker = WebDAVHealthTracker()
+    probe, calls = make_probe(True, delay=0.01)
+
+    results = await asyncio.gather(*[tracker.is_available(probe) for _ in range(10)])
+
+    assert all(results)
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_state_is_shared_across_file_managers():
+    first, second = FileManager(), FileManager()
+    probe, calls = make_probe(True)
+    first.webdav_client.health_check = probe
+    second.webdav_client.health_check = probe
+
+    assert await first.check_webdav_health() is True
+    assert await second.check_webdav_health() is True
+
+    assert len(calls) == 1
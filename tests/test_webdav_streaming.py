@@ -0,0 +1,231 @@
+"""测试WebDAV流式上传/下载以及FileManager的边下载边缓存"""
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from app.core import file_manager as file_manager_module
+from app.core import memory_cache as memory_cache_module
+from app.core import webdav_client as webdav_module
+from app.core.exceptions import WebDAVNotFoundError
+from app.core.file_manager import FileManager
+from app.core.memory_cache import MemoryCache
+from app.core.webdav_client import WebDAVClient
+
+
+@pytest.fixture
+def file_manager(tmp_path, monkeypatch):
+    """使用临时目录(及独立内存缓存)的文件管理器"""
+    monkeypatch.setattr(memory_cache_module, "_memory_cache", MemoryCache(1024 * 1024, 64 * 1024))
+    fm = FileManager()
+    fm.settings = fm.settings.model_copy(update={
+        "CACHE_DIR": str(tmp_path / "cache"),
+        "TEMP_STORAGE_DIR": str(tmp_path / "temp"),
+        "WEBDAV_CHUNK_SIZE": 4 * 1024,
+    })
+    return fm
+
+
+async def collect(stream):
+    return b"".join([chunk async for chunk in stream])
+
+
+def patch_transport(monkeypatch, handler):
+    """让 WebDAVClient 内部创建的 httpx.AsyncClient 使用 MockTransport"""
+    real_client = httpx.AsyncClient
+
+    def factory(*args, **kwargs):
+        kwargs["transport"] = httpx.MockTransport(handler)
+        return real_client(*args, **kwargs)
+
+    monkeypatch.setattr(webdav_module.httpx, "AsyncClient", factory)
+
+
+class TestUploadStreaming:
+
+    @pytest.mark.asyncio
+    async def test_iter_file_chunks_bounded_by_chunk_size(self, tmp_path):
+        local = tmp_path / "a.bin"
+        local.write_bytes(b"x" * 10000)
+        client = WebDAVClient()
+        client.chunk_size = 4096
+
+        chunks = [c async for c in client._iter_file_chunks(str(local))]
+
+        assert [len(c) for c in chunks] == [4096, 4096, 1808]
+
+    @pytest.mark.asyncio
+    async def test_put_sends_content_length_not_chunked(self, tmp_path, monkeypatch):
+        local = tmp_path / "a.jpg"
+        local.write_bytes(b"y" * 9000)
+        seen = {}
+
+        def handler(request: httpx.Request):
+            if request.method == "PUT":
+                seen["content_length"] = request.headers.get("Content-Length")
+                seen["transfer_encoding"] = request.headers.get("Transfer-Encoding")
+                seen["body"] = request.read()
+                return httpx.Response(201)
+            return httpx.Response(201)
+
+        patch_transport(monkeypatch, handler)
+        client = WebDAVClient()
+        client.chunk_size = 4096
+        response = await client._make_request(
+            "PUT", "files/a.jpg",
+            content=lambda: client._iter_file_chunks(str(local)),
+            headers={"Content-Length": "9000"},
+        )
+
+        assert response.status_code == 201
+        assert seen["content_length"] == "9000"
+        assert seen["transfer_encoding"] is None
+        assert seen["body"] == b"y" * 9000
+
+
+class TestDownloadStreaming:
+
+    @pytest.mark.asyncio
+    async def test_download_stream_yields_chunks(self, monkeypatch):
+        patch_transport(monkeypatch, lambda request: httpx.Response(200, content=b"z" * 10000))
+        client = WebDAVClient()
+
+        chunks = [c async for c in client.download_stream("files/a.jpg", chunk_size=4096)]
+
+        assert b"".join(chunks) == b"z" * 10000
+        assert max(len(c) for c in chunks) <= 4096
+
+    @pytest.mark.asyncio
+    async def test_download_stream_not_found(self, monkeypatch):
+        patch_transport(monkeypatch, lambda request: httpx.Response(404))
+        client = WebDAVClient()
+
+        with pytest.raises(WebDAVNotFoundError):
+            async for _ in client.download_stream("files/missing.jpg"):
+                pass
+
+
+class TestFileManagerStreamTee:
+
+    @pytest.mark.asyncio
+    async def test_stream_miss_writes_cache_after_completion(self, file_manager):
+        gate = asyncio.Event()
+
+        async def fake_stream(path, chunk_size=None):
+            yield b"part1-"
+            await gate.wait()
+            yield b"part2"
+
+        file_manager.webdav_client.download_stream = fake_stream
+        cache_path = file_manager._get_cache_path("files/2026/01/02/a.jpg")
+
+        stream = await file_manager.open_stream("files/2026/01/02/a.jpg")
+        assert not os.path.exists(cache_path)
+        gate.set()
+        content = b"".join([c async for c in stream])
+
+        assert content == b"part1-part2"
+        with open(cache_path, "rb") as f:
+            assert f.read() == b"part1-part2"
+        assert os.listdir(os.path.dirname(cache_path)) == ["a.jpg"]
+
+    @pytest.mark.asyncio
+    async def test_stream_interrupted_leaves_no_partial_cache(self, file_manager):
+        async def broken_stream(path, chunk_size=None):
+            yield b"partial"
+            await asyncio.sleep(0)
+            raise RuntimeError("connection reset")
+
+        file_manager.webdav_client.download_stream = broken_stream
+        cache_path = file_manager._get_cache_path("files/2026/01/02/b.jpg")
+
+        stream = await file_manager.open_stream("files/2026/01/02/b.jpg")
+        with pytest.raises(RuntimeError):
+            async for _ in stream:
+                pass
+
+        assert not os.path.exists(cache_path)
+        assert os.listdir(os.path.dirname(cache_path)) == []
+
+    @pytest.mark.asyncio
+    async def test_open_stream_raises_before_response(self, file_manager):
+        async def missing_stream(path, chunk_size=None):
+            raise WebDAVNotFoundError(path=path)
+            yield b""  # pragma: no cover
+
+        file_manager.webdav_client.download_stream = missing_stream
+
+        with pytest.raises(WebDAVNotFoundError):
+            await file_manager.open_stream("files/2026/01/02/c.jpg")
+
+    @pytest.mark.asyncio
+    async def test_stream_hit_reads_from_cache(self, file_manager):
+        cache_path = file_manager._get_cache_path("files/2026/01/02/d.jpg")
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, "wb") as f:
+            f.write(b"cached" * 2000)
+
+        async def unexpected(path, chunk_size=None):
+            raise AssertionError("缓存命中时不应访问WebDAV")
+            yield b""  # pragma: no cover
+
+        file_manager.webdav_client.download_stream = unexpected
+
+        stream = await file_manager.open_stream("files/2026/01/02/d.jpg")
+        content = b"".join([c async for c in stream])
+
+        assert content == b"cached" * 2000
+
+    @pytest.mark.asyncio
+    async def test_concurrent_stream_and_get_file_download_once(self, file_manager):
+        calls = []
+
+        async def slow_stream(path, chunk_size=None):
+            calls.append(path)
+            yield b"part1-"
+            await asyncio.sleep(0.01)
+            yield b"part2"
+
+        async def unexpected(path):
+            raise AssertionError("进行中的流式下载应被合并")
+
+        file_manager.webdav_client.download_stream = slow_stream
+        file_manager.webdav_client.download_file = unexpected
+
+        async def read_stream():
+            return await collect(await file_manager.open_stream("files/2026/01/02/e.jpg"))
+
+        # 第一个流式读者已开始下载后, 并发的 get_file 与其他流式读者共享这次下载
+        first = await file_manager.open_stream("files/2026/01/02/e.jpg")
+        results = await asyncio.gather(
+            collect(first),
+            file_manager.get_file("files/2026/01/02/e.jpg"),
+            read_stream(),
+        )
+
+        assert results == [b"part1-part2"] * 3
+        assert calls == ["files/2026/01/02/e.jpg"]
+        assert file_manager_module._inflight_downloads == {}
+
+    @pytest.mark.asyncio
+    async def test_slow_reader_does_not_hold_back_download(self, file_manager):
+        async def fake_stream(path, chunk_size=None):
+            for i in range(4):
+                await asyncio.sleep(0)
+                yield b"chunk%d-" % i
+
+        file_manager.webdav_client.download_stream = fake_stream
+        cache_path = file_manager._get_cache_path("files/2026/01/02/f.jpg")
+
+        stream = await file_manager.open_stream("files/2026/01/02/f.jpg")
+        # 流式读者不再读取时, 合并等待的 get_file 仍按WebDAV速度拿到完整内容
+        content = await asyncio.wait_for(file_manager.get_file("files/2026/01/02/f.jpg"), 1)
+        assert content == b"chunk0-chunk1-chunk2-chunk3-"
+
+        # 读者中途断开不影响已完成的缓存
+        await stream.aclose()
+        with open(cache_path, "rb") as f:
+            assert f.read() == content
+        assert file_manager_module._inflight_downloads == {}
+        assert file_manager_module._inflight_streams == {}
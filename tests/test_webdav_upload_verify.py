@@ -0,0 +1,124 @@
+"""测试WebDAV上传后校验策略"""
+import httpx
+import pytest
+
+from app.core import webdav_client as webdav_module
+from app.core.webdav_client import WebDAVClient, get_verification_stats, invalidate_directory_cache
+
+
+@pytest.fixture(autouse=True)
+def reset_state():
+    invalidate_directory_cache()
+    webdav_module._verification_stats.clear()
+    yield
+    webdav_module._verification_stats.clear()
+
+
+def make_client(monkeypatch, strategy, put_response, remote_size=4, sample_rate=0.1):
+    """构造使用MockTransport的客户端, 返回 (client, 请求方法列表)"""
+    calls = []
+
+    def handler(request: httpx.Request):
+        calls.append(request.method)
+        if request.method == "PUT":
+            request.read()
+            return put_response
+        if request.method == "PROPFIND":
+            body = (
+                '<?xml version="1.0"?><D:multistatus xmlns:D="DAV:"><D:response>'
+                f'<D:propstat><D:prop><D:getcontentlength>{remote_size}</D:getcontentlength>'
+                '</D:prop></D:propstat></D:response></D:multistatus>'
+            )
+            return httpx.Response(207, content=body.encode())
+        return httpx.Response(201)
+
+    real_client = httpx.AsyncClient
+
+    def factory(*args, **kwargs):
+        kwargs["transport"] = httpx.MockTransport(handler)
+        return real_client(*args, **kwargs)
+
+    monkeypatch.setattr(webdav_module.httpx, "AsyncClient", factory)
+    client = WebDAVClient()
+    client.settings = client.settings.model_copy(update={
+        "WEBDAV_UPLOAD_VERIFY": strategy,
+        "WEBDAV_UPLOAD_VERIFY_SAMPLE_RATE": sample_rate,
+    })
+    return client, calls
+
+
+@pytest.fixture
+def local_file(tmp_path):
+    path = tmp_path / "a.jpg"
+    path.write_bytes(b"data")
+    return str(path)
+
+
+@pytest.mark.asyncio
+async def test_propfind_strategy_detects_size_mismatch(monkeypatch, local_file):
+    client, calls = make_client(monkeypatch, "propfind", httpx.Response(201), remote_size=0)
+
+    result = await client.upload_file(local_file, "files/a.jpg")
+
+    assert result["success"] is False
+    assert "PROPFIND" in calls
+    assert get_verification_stats()["propfind"]["failures"] == 1
+
+
+@pytest.mark.asyncio
+async def test_trust_strategy_skips_propfind_with_etag(monkeypatch, local_file):
+    client, calls = make_client(monkeypatch, "trust", httpx.Response(201, headers={"ETag": '"abc"'}))
+
+    result = await client.upload_file(local_file, "files/a.jpg")
+
+    assert result["success"] is True
+    assert result["verification"] == "trust"
+    assert result["etag"] == "abc"
+    assert "PROPFIND" not in calls
+    assert get_verification_stats()["trust"]["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_trust_strategy_accepts_echoed_content_length(monkeypatch, local_file):
+    client, calls = make_client(monkeypatch, "trust", httpx.Response(204, headers={"Content-Length": "4"}))
+
+    result = await client.upload_file(local_file, "files/a.jpg")
+
+    assert result["verification"] == "trust"
+    assert "PROPFIND" not in calls
+
+
+@pytest.mark.asyncio
+async def test_trust_strategy_falls_back_without_evidence(monkeypatch, local_file):
+    # 200 且无ETag: 不可信, 退回PROPFIND
+    client, calls = make_client(monkeypatch, "trust", httpx.Response(200))
+
+    result = await client.upload_file(local_file, "files/a.jpg")
+
+    assert result["success"] is True
+    assert result["verification"] == "propfind"
+    assert "PROPFIND" in calls
+
+
+@pytest.mark.asyncio
+async def test_sample_strategy_always_verifies_at_full_rate(monkeypatch, local_file):
+    client, calls = make_client(
+        monkeypatch, "sample", httpx.Response(201, headers={"ETag": '"abc"'}), sample_rate=1.0
+    )
+
+    result = await client.upload_file(local_file, "files/a.jpg")
+
+    assert result["verification"] == "propfind"
+    assert "PROPFIND" in calls
+
+
+@pytest.mark.asyncio
+async def test_deferred_strategy_skips_verification(monkeypatch, local_file):
+    client, calls = make_client(monkeypatch, "deferred", httpx.Response(200))
+
+    result = await client.upload_file(local_file, "files/a.jpg")
+
+    assert result["success"] is True
+    assert result["verification"] == "deferred"
+    assert "PROPFIND" not in calls
+    assert get_verification_stats()["deferred"]["count"] == 1